@@ -0,0 +1,90 @@
+"""Benchmarks the AMDIM ``FeatureMapContrastiveTask`` on random feature maps.
+
+Compares the former implementation, which samples the source vectors with ``masked_select()``, creates an identity
+matrix on every comparison and extracts the positive and negative scores with dense ``(b, b, num_feat_vectors)``
+masks, with the current one, which gathers the source vectors from flat locations and reads the positives from the
+diagonal. Prints the time of a forward and backward pass and, on CUDA, the peak memory, and checks that the losses
+are the same.
+
+    python benchmarks/amdim_contrastive_task.py --device cuda --batch_size 200 --channels 1536
+
+"""
+import argparse
+import time
+from typing import Callable, Tuple
+
+import torch
+from pl_bolts.losses.self_supervised_learning import FeatureMapContrastiveTask
+from torch import Tensor
+
+
+class _DenseMaskTask(FeatureMapContrastiveTask):
+    """The implementation that the gather and diagonal indexing replaced."""
+
+    def _sample_src_ftr(self, r_cnv: Tensor, masks: Tensor) -> Tensor:
+        n_batch, feat_dim = r_cnv.shape[:2]
+        mask_idx = torch.randint(0, masks.size(0), (n_batch,), device=r_cnv.device)
+        return torch.masked_select(r_cnv, masks[mask_idx]).reshape(n_batch, feat_dim)
+
+    def _compare_maps_with_dense_masks(self, m1: Tensor, m2: Tensor) -> Tuple[Tensor, Tensor]:
+        b, c, h, w = m1.size()
+        src = self._sample_src_ftr(m1, self.masks[h])
+        tgt = m2.permute(1, 0, 2, 3).reshape(c, -1)
+        return self.nce_loss(src, tgt, torch.eye(b, device=m1.device))
+
+    _FeatureMapContrastiveTask__compare_maps = _compare_maps_with_dense_masks
+
+
+def _measure(fn: Callable[[], Tensor], device: torch.device, repeats: int) -> Tuple[float, float]:
+    """Returns the average time in seconds and the peak memory in MiB (0 on the CPU)."""
+    fn().backward()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn().backward()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = (time.perf_counter() - start) / repeats
+    peak = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20 if device.type == "cuda" else 0.0
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--channels", type=int, default=512)
+    parser.add_argument("--map_sizes", type=int, nargs="+", default=[1, 5, 7])
+    parser.add_argument("--comparisons", type=str, default="01, 02, 11")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    def feature_maps() -> Tuple[Tensor, ...]:
+        shapes = [(args.batch_size, args.channels, size, size) for size in args.map_sizes]
+        return tuple(torch.randn(shape, device=device, requires_grad=True) for shape in shapes)
+
+    anchor_maps, positive_maps = feature_maps(), feature_maps()
+    dense_task, task = _DenseMaskTask(args.comparisons), FeatureMapContrastiveTask(args.comparisons)
+
+    def run(task: FeatureMapContrastiveTask) -> Tensor:
+        losses, regularizer = task(anchor_maps, positive_maps)
+        return losses.sum() + regularizer
+
+    torch.manual_seed(0)
+    expected = run(dense_task)
+    torch.manual_seed(0)
+    torch.testing.assert_close(run(task), expected)
+
+    dense_time, dense_memory = _measure(lambda: run(dense_task), device, args.repeats)
+    current_time, current_memory = _measure(lambda: run(task), device, args.repeats)
+    print(f"{args.batch_size} x {args.channels} feature maps of sizes {args.map_sizes} on {device}")
+    print(f"dense masks:   {1000 * dense_time:9.2f} ms {dense_memory:9.1f} MiB")
+    print(f"gather + diag: {1000 * current_time:9.2f} ms {current_memory:9.1f} MiB ({dense_time / current_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmarks the CPC InfoNCE loss on a random feature map.
+
+Compares the former ``CPCTask.forward()``, which calls ``compute_loss_h()`` for every number of rows to skip and every
+offset after them and checks every loss for NaN on the host, with the single-pass implementation, which scores all the
+predictions once and gathers the positives of all the offsets with cached indices. Prints the time of a forward and
+backward pass of both, with and without the convolutions that compute the predictions and the targets.
+
+    python benchmarks/cpc_loss.py --device cuda --batch_size 64 --channels 1024 --grid_size 7
+
+"""
+import argparse
+import time
+from typing import Callable
+
+import torch
+from pl_bolts.losses.self_supervised_learning import CPCTask
+from torch import Tensor
+
+
+def _loop_loss(task: CPCTask, targets: Tensor, preds: Tensor) -> Tensor:
+    """The implementation that the single-pass ``CPCTask.forward()`` replaced, after the convolutions."""
+    losses = []
+    h = targets.shape[2]
+    for steps_to_ignore in range(h - 1):
+        for i in range(steps_to_ignore + 1, h):
+            loss = task.compute_loss_h(targets, preds, i)
+            if not torch.isnan(loss):
+                losses.append(loss)
+    return torch.stack(losses).sum()
+
+
+def _time(fn: Callable[[], Tensor], device: torch.device, repeats: int) -> float:
+    fn().backward()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn().backward()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--channels", type=int, default=256)
+    parser.add_argument("--grid_size", type=int, default=7, help="height and width of the patch grid")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    task = CPCTask(num_input_channels=args.channels).to(device)
+    z = torch.randn((args.batch_size, args.channels, args.grid_size, args.grid_size), device=device)
+    # the outputs of the convolutions, as leaves that require gradients
+    targets = task.target_cnn(z).detach().requires_grad_()
+    preds = task.pred_cnn(task.context_cnn(z)).detach().requires_grad_()
+    torch.testing.assert_close(task._info_nce_loss(targets, preds), _loop_loss(task, targets, preds))
+
+    def loop_forward() -> Tensor:
+        return _loop_loss(task, task.target_cnn(z), task.pred_cnn(task.context_cnn(z)))
+
+    times = {
+        "loop": _time(loop_forward, device, args.repeats),
+        "single pass": _time(lambda: task(z), device, args.repeats),
+        "loop, loss only": _time(lambda: _loop_loss(task, targets, preds), device, args.repeats),
+        "single pass, loss only": _time(lambda: task._info_nce_loss(targets, preds), device, args.repeats),
+    }
+    print(f"{args.batch_size} x {args.channels} x {args.grid_size} x {args.grid_size} features on {device}")
+    for name, elapsed in times.items():
+        print(f"{name:>22}: {1000 * elapsed:9.2f} ms")
+    speed_up = times["loop"] / times["single pass"]
+    loss_speed_up = times["loop, loss only"] / times["single pass, loss only"]
+    print(f"speed-up {speed_up:.1f}x, loss only {loss_speed_up:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmarks cutting the CPC inputs into patches per sample versus once per batch.
+
+With ``patchify=True``, the CPC transforms cut every image into overlapping patches in the DataLoader workers, so the
+collated batch, which the workers send to the main process and which is copied to the device, is as large as all the
+patches. With ``patchify=False``, the workers send the whole images and ``CPC_v2`` cuts the batch into patches on the
+device. Prints the size of a collated batch and the time spent creating the patches and collating them for both modes,
+and the time of ``patchify_batch()`` compared to the former ``F.unfold`` implementation.
+
+    python benchmarks/cpc_patches.py --device cuda --image_size 64 --patch_size 16 --batch_size 256
+
+"""
+import argparse
+import time
+from typing import Callable
+
+import torch
+from pl_bolts.transforms.self_supervised import Patchify
+from pl_bolts.transforms.self_supervised.batch_transforms import patchify_batch
+from torch import Tensor
+from torch.nn import functional as F  # noqa: N812
+from torch.utils.data import default_collate
+
+
+def _unfold_patches(x: Tensor, patch_size: int, overlap: int) -> Tensor:
+    """The ``F.unfold`` implementation that ``patchify_batch()`` replaced."""
+    b, c = x.shape[:2]
+    x = F.unfold(x, kernel_size=patch_size, stride=patch_size - overlap)
+    return x.transpose(2, 1).reshape(b, -1, c, patch_size, patch_size)
+
+
+def _milliseconds(fn: Callable[[], object], device: torch.device, repeats: int) -> float:
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return 1000 * (time.perf_counter() - start) / repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--image_size", type=int, default=64)
+    parser.add_argument("--patch_size", type=int, default=16)
+    parser.add_argument("--overlap", type=int, default=None, help="by default half of the patch size")
+    parser.add_argument("--batch_size", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+    overlap = args.patch_size // 2 if args.overlap is None else args.overlap
+
+    images = list(torch.rand((args.batch_size, 3, args.image_size, args.image_size)))
+    patchify = Patchify(patch_size=args.patch_size, overlap_size=overlap)
+
+    patched_batch = default_collate([patchify(image) for image in images])
+    image_batch = default_collate(images)
+    patched_mib = patched_batch.numel() * patched_batch.element_size() / 2**20
+    image_mib = image_batch.numel() * image_batch.element_size() / 2**20
+    per_sample_ms = _milliseconds(lambda: default_collate([patchify(image) for image in images]), device, args.repeats)
+    whole_ms = _milliseconds(lambda: default_collate(images), device, args.repeats)
+
+    image_batch = image_batch.to(device)
+    unfold_ms = _milliseconds(lambda: _unfold_patches(image_batch, args.patch_size, overlap), device, args.repeats)
+    view_ms = _milliseconds(lambda: patchify_batch(image_batch, args.patch_size, overlap), device, args.repeats)
+
+    size, patch_size = args.image_size, args.patch_size
+    print(f"{args.batch_size} images of {size}x{size}, patches of {patch_size}x{patch_size}")
+    print(f"{'':>22} {'batch MiB':>10} {'workers ms':>11}")
+    print(f"{'patches per sample':>22} {patched_mib:>10.1f} {per_sample_ms:>11.2f}")
+    ratio = patched_mib / image_mib
+    print(f"{'whole images':>22} {image_mib:>10.1f} {whole_ms:>11.2f} ({ratio:.1f}x smaller)")
+    print(f"patches of the batch on {device}: F.unfold {unfold_ms:.2f} ms, strided views {view_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
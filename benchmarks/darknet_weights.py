@@ -0,0 +1,91 @@
+"""Benchmarks loading Darknet weight files into ``DarknetNetwork``.
+
+Writes random weights for the network defined by a Darknet configuration file, and compares the former loader, which
+reads every tensor with a separate ``np.fromfile()`` call, with ``DarknetNetwork.load_weights()``, which memory-maps the
+file and copies every tensor from its precomputed offset.
+
+    wget https://raw.githubusercontent.com/AlexeyAB/darknet/master/cfg/yolov4.cfg
+    python benchmarks/darknet_weights.py --config yolov4.cfg
+
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+import torch
+import torch.nn as nn
+from pl_bolts.models.detection.yolo.darknet_network import DarknetNetwork
+from pl_bolts.models.detection.yolo.layers import Conv
+
+_TEST_CONFIG = os.path.join(os.path.dirname(__file__), "..", "tests", "_data_configs", "yolo.cfg")
+
+
+def _per_tensor_load(network: DarknetNetwork, weights_path: str) -> None:
+    """The loader that ``load_weights()`` replaced."""
+    with open(weights_path) as weight_file:
+        np.fromfile(weight_file, count=3, dtype=np.int32)
+        np.fromfile(weight_file, count=1, dtype=np.int64)
+
+        def read(tensor: torch.Tensor) -> int:
+            np_array = np.fromfile(weight_file, count=tensor.numel(), dtype=np.float32)
+            if np_array.size > 0:
+                with torch.no_grad():
+                    tensor.copy_(torch.from_numpy(np_array).view_as(tensor))
+            return np_array.size
+
+        for layer in network.layers:
+            if not isinstance(layer, Conv):
+                continue
+            if isinstance(layer.norm, nn.Identity):
+                read(layer.conv.bias)
+            else:
+                read(layer.norm.bias)
+                read(layer.norm.weight)
+                read(layer.norm.running_mean)
+                read(layer.norm.running_var)
+            if read(layer.conv.weight) == 0:
+                return
+
+
+def _time(fn: Callable[[], object], repeats: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", type=str, default=_TEST_CONFIG)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    network = DarknetNetwork(args.config)
+    num_elements = sum(count for _, _, _, count in network.weight_offsets())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        weights_path = os.path.join(tmp_dir, "random.weights")
+        with open(weights_path, "wb") as weight_file:
+            np.array([0, 2, 5], dtype=np.int32).tofile(weight_file)
+            np.array([0], dtype=np.int64).tofile(weight_file)
+            np.random.default_rng(0).random(num_elements, dtype=np.float32).tofile(weight_file)
+
+        per_tensor_time = _time(lambda: _per_tensor_load(network, weights_path), args.repeats)
+        expected = {name: tensor.clone() for name, tensor in network.state_dict().items()}
+        for tensor in network.state_dict().values():
+            tensor.zero_()
+        mapped_time = _time(lambda: network.load_weights(weights_path), args.repeats)
+        if not all(torch.equal(expected[name], tensor) for name, tensor in network.state_dict().items()):
+            raise RuntimeError("The loaded weights differ.")
+
+    num_tensors = len(network.weight_offsets())
+    print(f"{num_tensors} tensors, {4 * num_elements / 2**20:.1f} MiB")
+    print(f"per-tensor reads: {1000 * per_tensor_time:9.2f} ms")
+    print(f"memory map:       {1000 * mapped_time:9.2f} ms ({per_tensor_time / mapped_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
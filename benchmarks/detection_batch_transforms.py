@@ -0,0 +1,65 @@
+"""Benchmarks the batched detection augmentations on a synthetic batch.
+
+Prints the throughput in images per second of ``DetectionMosaic``, ``DetectionMixUp`` and ``DetectionMultiScale``,
+applied to a packed batch of ``--image_size`` images with ``--boxes`` boxes each, and of the three in sequence.
+
+    python benchmarks/detection_batch_transforms.py --device cuda --batch_size 16 --image_size 608
+
+"""
+import argparse
+import time
+from typing import Callable
+
+import torch
+from pl_bolts.datamodules.detection_collate import DetectionCollate
+from pl_bolts.transforms.detection_batch_transforms import DetectionMixUp, DetectionMosaic, DetectionMultiScale
+from torch import nn
+
+
+def _images_per_second(fn: Callable[[], object], batch_size: int, device: torch.device, repeats: int) -> float:
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return batch_size * repeats / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--image_size", type=int, default=608)
+    parser.add_argument("--boxes", type=int, default=20, help="boxes per image")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    generator = torch.Generator().manual_seed(0)
+    samples = []
+    for _ in range(args.batch_size):
+        xy = torch.rand((args.boxes, 2), generator=generator) * args.image_size * 0.8
+        wh = torch.rand((args.boxes, 2), generator=generator) * args.image_size * 0.2 + 4
+        target = {"boxes": torch.cat((xy, xy + wh), 1), "labels": torch.randint(20, (args.boxes,), generator=generator)}
+        samples.append((torch.rand((3, args.image_size, args.image_size), generator=generator), target))
+    images, targets = DetectionCollate()(samples)
+    batch = (images.to(device), targets._replace(**{k: v.to(device) for k, v in targets._asdict().items()}))
+
+    sizes = range(args.image_size // 2, args.image_size + 1, 32)
+    transforms = {
+        "mosaic": DetectionMosaic(prob=1.0),
+        "mixup": DetectionMixUp(prob=1.0),
+        "multi-scale": DetectionMultiScale(sizes, change_every=1),
+        "all": nn.Sequential(DetectionMosaic(0.5), DetectionMixUp(0.5), DetectionMultiScale(sizes, change_every=1)),
+    }
+    print(f"batches of {args.batch_size} images of {args.image_size}x{args.image_size} on {device}, images/s")
+    for name, transform in transforms.items():
+        throughput = _images_per_second(lambda: transform(batch), args.batch_size, device, args.repeats)
+        print(f"{name:>12} {throughput:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
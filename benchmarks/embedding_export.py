@@ -0,0 +1,56 @@
+"""Benchmarks the export of self-supervised embeddings to memory-mapped shards.
+
+Exports the embeddings of random images with the encoder of a randomly initialized SimCLR model, in ``float16`` and in
+``int8``, and prints the throughput in images per second, the size of the shards on disk, and the largest error of the
+stored embeddings relative to the largest ``float32`` embedding value.
+
+    python benchmarks/embedding_export.py --device cuda --arch resnet50 --num_samples 10000 --image_size 224
+
+"""
+import argparse
+import os
+import tempfile
+
+import torch
+from pl_bolts.models.self_supervised import EmbeddingShards, SimCLR, export_embeddings
+from torch.utils.data import TensorDataset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--arch", type=str, default="resnet18")
+    parser.add_argument("--num_samples", type=int, default=512)
+    parser.add_argument("--image_size", type=int, default=64)
+    parser.add_argument("--batch_size", type=int, default=128)
+    parser.add_argument("--samples_per_shard", type=int, default=200)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    torch.manual_seed(0)
+    dataset = TensorDataset(torch.rand(args.num_samples, 3, args.image_size, args.image_size))
+    model = SimCLR(gpus=0, num_samples=args.num_samples, batch_size=args.batch_size, dataset="", arch=args.arch)
+    model = model.to(device).eval()
+    with torch.inference_mode():
+        expected = torch.cat([model(images.to(device)).cpu() for images, in torch.utils.data.DataLoader(dataset, 256)])
+
+    print(f"{args.arch}, {args.num_samples} {args.image_size}x{args.image_size} images on {device}")
+    print(f"{'dtype':>8} {'images/s':>9} {'MiB':>8} {'max error':>10}")
+    for dtype in ("float16", "int8"):
+        with tempfile.TemporaryDirectory() as root:
+            stats = export_embeddings(
+                model,
+                dataset,
+                root,
+                dtype=dtype,
+                samples_per_shard=args.samples_per_shard,
+                batch_size=args.batch_size,
+            )
+            size = sum(os.path.getsize(os.path.join(root, name)) for name in os.listdir(root)) / 2**20
+            error = (EmbeddingShards(root).read(0, args.num_samples) - expected).abs().max() / expected.abs().max()
+        print(f"{dtype:>8} {stats['images_per_second']:>9.1f} {size:>8.2f} {error.item():>10.2e}")
+    print(f"float32 embeddings would take {expected.numel() * 4 / 2**20:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmarks ImageGPT sampling and training steps.
+
+Sampling: compares ``ImageGPT.sample()``, which keeps the keys and values of the previous pixels in every layer, with
+recomputing the whole sequence for every pixel, which is what the model supported before. Prints the throughput in
+sampled pixels per second.
+
+Training: compares the attention with ``scaled_dot_product_attention(is_causal=True)`` with the former block, which
+created a new ``[L, L]`` mask and ran ``nn.MultiheadAttention`` in every layer. Prints the time of a forward and
+backward pass and, on CUDA, the peak memory.
+
+    python benchmarks/image_gpt.py --device cuda --pixels 28 --embed_dim 256 --layers 8 --heads 8
+
+"""
+import argparse
+import time
+from typing import Callable, Tuple
+
+import torch
+from pl_bolts.models.vision import ImageGPT
+from pl_bolts.models.vision.image_gpt.gpt2 import Block
+from torch import Tensor
+
+
+def _former_block_forward(self: Block, x: Tensor, kv_cache: None = None) -> Tensor:
+    """The implementation of ``Block.forward()`` that the fused attention replaced."""
+    attn_mask = torch.full((len(x), len(x)), -float("Inf"), device=x.device, dtype=x.dtype)
+    attn_mask = torch.triu(attn_mask, diagonal=1)
+    x = self.ln_1(x)
+    a, _ = self.attn(x, x, x, attn_mask=attn_mask, need_weights=False)
+    x = x + a
+    m = self.mlp(self.ln_2(x))
+    return x + m
+
+
+@torch.no_grad()
+def _sample_without_cache(model: ImageGPT, num_samples: int) -> Tensor:
+    """Samples every pixel by running the model on the whole sequence so far."""
+    length = model.hparams.pixels**2
+    tokens = torch.zeros((length, num_samples), dtype=torch.long, device=model.device)
+    for position in range(length):
+        logits = model.gpt(tokens[: position + 1])[-1]
+        tokens[position] = torch.multinomial(torch.softmax(logits, dim=-1), 1).squeeze(1)
+    return tokens
+
+
+def _measure(fn: Callable[[], object], device: torch.device, repeats: int) -> Tuple[float, float]:
+    """Returns the average time in seconds and the peak memory in MiB (0 on the CPU)."""
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = (time.perf_counter() - start) / repeats
+    peak = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20 if device.type == "cuda" else 0.0
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--pixels", type=int, default=28)
+    parser.add_argument("--embed_dim", type=int, default=64)
+    parser.add_argument("--heads", type=int, default=4)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--num_samples", type=int, default=8)
+    parser.add_argument("--batch_size", type=int, default=32, help="batch size of the training steps")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    model = ImageGPT(embed_dim=args.embed_dim, heads=args.heads, layers=args.layers, pixels=args.pixels).to(device)
+    model.eval()
+    num_pixels = args.num_samples * args.pixels**2
+    print(f"ImageGPT with {args.layers} layers, {args.embed_dim} channels and {args.pixels}x{args.pixels} images")
+
+    without_cache, _ = _measure(lambda: _sample_without_cache(model, args.num_samples), device, 1)
+    with_cache, _ = _measure(lambda: model.sample(args.num_samples), device, args.repeats)
+    print(f"sampling {args.num_samples} images on {device}, pixels/s")
+    print(f"recompute:       {num_pixels / without_cache:8.1f}")
+    print(f"key/value cache: {num_pixels / with_cache:8.1f} ({without_cache / with_cache:.1f}x)")
+
+    model.train()
+    images = torch.rand((args.batch_size, 1, args.pixels, args.pixels), device=device)
+
+    def training_step() -> None:
+        logits = model(images)
+        model.criterion(logits.view(-1, logits.size(-1)), images.view(-1).mul(15).round().long()).backward()
+
+    fused_time, fused_memory = _measure(training_step, device, args.repeats)
+    Block.forward, fused_forward = _former_block_forward, Block.forward
+    try:
+        former_time, former_memory = _measure(training_step, device, args.repeats)
+    finally:
+        Block.forward = fused_forward
+    print(f"training step with batch size {args.batch_size} on {device}")
+    print(f"former block:    {1000 * former_time:9.2f} ms {former_memory:9.1f} MiB")
+    print(f"fused attention: {1000 * fused_time:9.2f} ms {fused_memory:9.1f} MiB ({former_time / fused_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmarks encoding multi-crop batches with one encoder call per crop versus one call per resolution.
+
+Passes ``--large_crops`` views of ``--large_size`` pixels and ``--small_crops`` views of ``--small_size`` pixels through
+a ResNet, calling the encoder once per crop like the default SimCLR and BYOL steps, once per resolution with
+``multi_crop_forward()``, and in micro-batches of at most ``--micro_batch_pixels`` input pixels. Prints the time of a
+forward and backward pass and, on CUDA, the peak memory.
+
+    python benchmarks/multi_crop_forward.py --device cuda --batch_size 256 --arch resnet50 --micro_batch_pixels 6000000
+
+"""
+import argparse
+import time
+from typing import Callable, Tuple
+
+import torch
+from pl_bolts.models.self_supervised import resnets
+from pl_bolts.utils.self_supervised import multi_crop_forward
+from torch import Tensor
+
+
+def _measure(fn: Callable[[], object], device: torch.device, repeats: int) -> Tuple[float, float]:
+    """Returns the average time in milliseconds and the peak memory in MiB (0 on the CPU)."""
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = 1000 * (time.perf_counter() - start) / repeats
+    peak = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20 if device.type == "cuda" else 0.0
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--arch", type=str, default="resnet18")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--large_crops", type=int, default=2)
+    parser.add_argument("--large_size", type=int, default=96)
+    parser.add_argument("--small_crops", type=int, default=6)
+    parser.add_argument("--small_size", type=int, default=36)
+    parser.add_argument("--micro_batch_pixels", type=int, default=None, help="by default a quarter of the batch")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    encoder = getattr(resnets, args.arch)(return_all_feature_maps=False).to(device)
+    large = [torch.rand((args.batch_size, 3, args.large_size, args.large_size), device=device)] * args.large_crops
+    small = [torch.rand((args.batch_size, 3, args.small_size, args.small_size), device=device)] * args.small_crops
+    crops = large + small
+    micro_batch_pixels = args.micro_batch_pixels
+    if micro_batch_pixels is None:
+        micro_batch_pixels = sum(crop[0, 0].numel() * len(crop) for crop in crops) // 4
+
+    def encode(x: Tensor) -> Tensor:
+        return encoder(x)[-1]
+
+    def per_crop() -> None:
+        return torch.cat([encode(crop) for crop in crops]).sum().backward()
+
+    def per_resolution() -> None:
+        multi_crop_forward(encode, crops).sum().backward()
+
+    def micro_batches() -> None:
+        multi_crop_forward(encode, crops, max_pixels=micro_batch_pixels).sum().backward()
+
+    print(
+        f"{args.arch}, batch size {args.batch_size}, {args.large_crops}x{args.large_size}px"
+        f" + {args.small_crops}x{args.small_size}px crops on {device}"
+    )
+    print(f"{'':>28} {'ms':>9} {'peak MiB':>9}")
+    for name, fn in [
+        ("one call per crop", per_crop),
+        ("one call per resolution", per_resolution),
+        (f"{micro_batch_pixels} pixels per call", micro_batches),
+    ]:
+        elapsed, peak = _measure(fn, device, args.repeats)
+        print(f"{name:>28} {elapsed:>9.1f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
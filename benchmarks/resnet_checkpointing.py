@@ -0,0 +1,80 @@
+"""Benchmarks activation checkpointing of the ResNet stages used by the self-supervised models.
+
+Trains a ResNet with different ``checkpoint_stages`` settings and prints, for each setting, the time of a forward and
+backward pass, the size of the activations that the forward pass keeps for the backward pass, and, on CUDA, the peak
+memory. The activation size is measured with saved tensor hooks, so it is also reported on the CPU.
+
+    python benchmarks/resnet_checkpointing.py --device cuda --arch resnet50 --batch_size 128 --image_size 224
+
+"""
+import argparse
+import time
+from typing import Dict, Tuple
+
+import torch
+from pl_bolts.models.self_supervised import resnets
+from torch import Tensor, nn
+
+
+def _saved_activation_mib(model: nn.Module, images: Tensor) -> float:
+    """Returns the total size of the distinct tensors, other than the parameters, that the forward pass saves for the
+    backward pass."""
+    parameters = {param.untyped_storage().data_ptr() for param in model.parameters()}
+    storages: Dict[int, int] = {}
+
+    def pack(tensor: Tensor) -> Tensor:
+        storage = tensor.untyped_storage()
+        if storage.data_ptr() not in parameters:
+            storages[storage.data_ptr()] = storage.nbytes()
+        return tensor
+
+    with torch.autograd.graph.saved_tensors_hooks(pack, lambda tensor: tensor):
+        output = model(images)[-1]
+    output.sum().backward()
+    return sum(storages.values()) / 2**20
+
+
+def _measure(model: nn.Module, images: Tensor, repeats: int) -> Tuple[float, float]:
+    """Returns the average time of a training step in milliseconds and the peak memory in MiB (0 on the CPU)."""
+    device = images.device
+
+    def step() -> None:
+        model(images)[-1].sum().backward()
+
+    step()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        step()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = 1000 * (time.perf_counter() - start) / repeats
+    peak = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20 if device.type == "cuda" else 0.0
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--arch", type=str, default="resnet18")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--image_size", type=int, default=96)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    images = torch.rand((args.batch_size, 3, args.image_size, args.image_size), device=device)
+    print(f"{args.arch}, batch size {args.batch_size}, {args.image_size}x{args.image_size} images on {device}")
+    print(f"{'checkpoint_stages':>18} {'ms':>9} {'activation MiB':>15} {'peak MiB':>9}")
+    for stages in [(), (1,), (1, 2), (1, 2, 3), (1, 2, 3, 4)]:
+        model = getattr(resnets, args.arch)(checkpoint_stages=stages).to(device)
+        activations = _saved_activation_mib(model, images)
+        elapsed, peak = _measure(model, images, args.repeats)
+        print(f"{str(stages):>18} {elapsed:>9.1f} {activations:>15.1f} {peak:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Benchmarks the channels-last and mixed precision fast path of the self-supervised models.
+
+Runs training steps of SimCLR or SwAV on random multi-view batches with the contiguous and the channels-last memory
+format, in float32 and under autocast, and prints, for each setting, the time of a forward and backward pass, the peak
+memory on CUDA, and the difference between the loss and the float32 loss of the same weights and views. Use
+``--dtype bfloat16`` on the CPU, where autocast supports only bf16.
+
+    python benchmarks/ssl_fast_path.py --device cuda --model swav --dtype float16 --batch_size 64 --image_size 224
+
+"""
+import argparse
+import time
+from typing import Any, Callable, Tuple
+
+import torch
+from pl_bolts.models.self_supervised import SimCLR, SwAV
+from pytorch_lightning import LightningModule
+from torch import Tensor
+
+
+def _measure(step: Callable[[], Tensor], device: torch.device, repeats: int) -> Tuple[float, float]:
+    """Returns the average time of a training step in milliseconds and the peak memory in MiB (0 on the CPU)."""
+    step()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        step()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = 1000 * (time.perf_counter() - start) / repeats
+    peak = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20 if device.type == "cuda" else 0.0
+    return elapsed, peak
+
+
+def _create_model(name: str, args: argparse.Namespace, channels_last: bool) -> LightningModule:
+    kwargs = {"gpus": 0, "num_samples": args.batch_size, "batch_size": args.batch_size, "dataset": "cifar10"}
+    kwargs.update(arch=args.arch, channels_last=channels_last)
+    if name == "simclr":
+        return SimCLR(**kwargs, hidden_mlp=512 if args.arch == "resnet18" else 2048)
+    return SwAV(**kwargs, num_crops=(2, 2), num_prototypes=512)
+
+
+def _create_batch(name: str, args: argparse.Namespace, device: torch.device) -> Any:
+    size = args.image_size
+    views = [torch.rand(args.batch_size, 3, size, size, device=device) for _ in range(2)]
+    if name == "swav":
+        views += [torch.rand(args.batch_size, 3, size // 2, size // 2, device=device) for _ in range(2)]
+    # the last view is used by the online evaluator
+    views.append(torch.rand(args.batch_size, 3, size, size, device=device))
+    return views, torch.zeros(args.batch_size, dtype=torch.long, device=device)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--model", type=str, default="simclr", choices=["simclr", "swav"])
+    parser.add_argument("--arch", type=str, default="resnet18")
+    parser.add_argument("--dtype", type=str, default="bfloat16", choices=["bfloat16", "float16"])
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--image_size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+    dtype = getattr(torch, args.dtype)
+
+    torch.manual_seed(0)
+    batch = _create_batch(args.model, args, device)
+    reference = _create_model(args.model, args, channels_last=False).to(device)
+    state = reference.state_dict()
+    expected = reference.shared_step(batch).item()
+
+    print(f"{args.model} {args.arch}, batch size {args.batch_size}, {args.image_size}x{args.image_size} on {device}")
+    print(f"{'memory format':>14} {'precision':>10} {'ms':>9} {'peak MiB':>9} {'loss':>9} {'loss diff':>10}")
+    for channels_last in (False, True):
+        model = _create_model(args.model, args, channels_last=channels_last).to(device)
+        model.load_state_dict(state)
+        model_batch = model.on_after_batch_transfer(batch, 0)
+        for autocast in (False, True):
+
+            def step() -> Tensor:
+                with torch.autocast(device.type, dtype=dtype, enabled=autocast):
+                    loss = model.shared_step(model_batch)
+                loss.backward()
+                return loss
+
+            loss = step().item()
+            elapsed, peak = _measure(step, device, args.repeats)
+            memory_format = "channels_last" if channels_last else "contiguous"
+            precision = args.dtype if autocast else "float32"
+            print(
+                f"{memory_format:>14} {precision:>10} {elapsed:>9.1f} {peak:>9.1f} {loss:>9.4f}"
+                f" {abs(loss - expected):>10.2e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmarks the linear evaluation of a frozen self-supervised backbone from images and from cached features.
+
+Trains the linear layer of :class:`~pl_bolts.models.self_supervised.SSLFineTuner` on random images whose class shifts
+the mean of one color channel, once by running the backbone, the encoder of a randomly initialized SimCLR model, in
+every epoch, and once from the features that ``SSLFineTuner.cache_features`` exports before the first epoch. Prints
+the time of the export, the time of the training, and the test accuracy of both runs.
+
+    python benchmarks/ssl_linear_eval_cache.py --device cuda --arch resnet50 --num_samples 10000 --epochs 90
+
+"""
+import argparse
+import tempfile
+import time
+from typing import Tuple
+
+import torch
+from pl_bolts.models.self_supervised import SimCLR, SSLFineTuner
+from pytorch_lightning import LightningDataModule, Trainer
+from torch.utils.data import TensorDataset
+
+
+def _create_dataset(num_samples: int, image_size: int, num_classes: int) -> TensorDataset:
+    labels = torch.randint(num_classes, (num_samples,))
+    images = torch.rand(num_samples, 3, image_size, image_size)
+    images[:, labels % 3] += 0.5 * (labels // 3 + 1)[:, None, None, None] / num_classes
+    return TensorDataset(images, labels)
+
+
+def _fit(tuner: SSLFineTuner, dm: LightningDataModule, args: argparse.Namespace) -> Tuple[float, float]:
+    """Returns the training time in seconds and the test accuracy."""
+    trainer = Trainer(
+        accelerator=args.device,
+        devices=1,
+        max_epochs=args.epochs,
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        enable_model_summary=False,
+        num_sanity_val_steps=0,
+        log_every_n_steps=1,
+    )
+    start = time.perf_counter()
+    trainer.fit(tuner, datamodule=dm)
+    elapsed = time.perf_counter() - start
+    accuracy = trainer.test(tuner, datamodule=dm, verbose=False)[0]["test_acc"]
+    return elapsed, accuracy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--arch", type=str, default="resnet18")
+    parser.add_argument("--num_samples", type=int, default=512)
+    parser.add_argument("--image_size", type=int, default=32)
+    parser.add_argument("--num_classes", type=int, default=6)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--cache_batch_size", type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    train_dataset = _create_dataset(args.num_samples, args.image_size, args.num_classes)
+    test_dataset = _create_dataset(args.num_samples // 4, args.image_size, args.num_classes)
+    backbone = SimCLR(gpus=0, num_samples=args.num_samples, batch_size=args.batch_size, dataset="", arch=args.arch)
+    in_features = 2048 if args.arch == "resnet50" else 512
+    state = None
+
+    print(f"{args.arch}, {args.num_samples} {args.image_size}x{args.image_size} images, {args.epochs} epochs")
+    print(f"{'features':>8} {'export s':>9} {'train s':>9} {'test acc':>9}")
+    for cached in (False, True):
+        torch.manual_seed(0)
+        tuner = SSLFineTuner(backbone, in_features=in_features, num_classes=args.num_classes, epochs=args.epochs)
+        if state is None:
+            state = tuner.linear_layer.state_dict()
+        tuner.linear_layer.load_state_dict(state)
+        with tempfile.TemporaryDirectory() as root:
+            export = 0.0
+            if cached:
+                start = time.perf_counter()
+                dm = tuner.cache_features(
+                    root,
+                    train_dataset,
+                    test_dataset,
+                    test_dataset,
+                    batch_size=args.cache_batch_size,
+                    device=args.device,
+                )
+                export = time.perf_counter() - start
+            else:
+                dm = LightningDataModule.from_datasets(
+                    train_dataset, test_dataset, test_dataset, batch_size=args.batch_size
+                )
+            elapsed, accuracy = _fit(tuner, dm, args)
+        name = "cached" if cached else "images"
+        print(f"{name:>8} {export:>9.1f} {elapsed:>9.1f} {accuracy:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
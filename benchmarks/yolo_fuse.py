@@ -0,0 +1,85 @@
+"""Benchmarks the inference latency of YOLO networks before and after ``fuse_for_inference()``.
+
+Folds batch normalization into the convolutions and fuses the Mish activations, checks that the outputs stay the same
+within tolerance, and prints the mean forward pass time in the fastest of a few rounds.
+
+    python benchmarks/yolo_fuse.py --networks yolov4 yolov4-tiny --image_size 416 --batch_size 1
+
+"""
+import argparse
+import copy
+import time
+from typing import Callable, Dict, List
+
+import torch
+from pl_bolts.models.detection.yolo.layers import fuse_for_inference
+from pl_bolts.models.detection.yolo.torch_networks import (
+    YOLOV4Network,
+    YOLOV4TinyNetwork,
+    YOLOV5Network,
+    YOLOV7Network,
+    YOLOXNetwork,
+)
+from torch import nn
+
+_NETWORKS: Dict[str, Callable[[int], nn.Module]] = {
+    "yolov4": lambda num_classes: YOLOV4Network(num_classes, activation="mish"),
+    "yolov4-tiny": lambda num_classes: YOLOV4TinyNetwork(num_classes),
+    "yolov5": lambda num_classes: YOLOV5Network(num_classes),
+    "yolov7": lambda num_classes: YOLOV7Network(num_classes),
+    "yolox": lambda num_classes: YOLOXNetwork(num_classes),
+}
+
+
+def _time(networks: List[nn.Module], images: torch.Tensor, repeats: int, rounds: int) -> List[float]:
+    """Returns the mean forward pass time of every network in its fastest round, alternating the networks between
+    the rounds, so that they are measured under the same load."""
+    best = [float("inf")] * len(networks)
+    with torch.inference_mode():
+        for network in networks:
+            network(images)
+        for _ in range(rounds):
+            for network_idx, network in enumerate(networks):
+                if images.is_cuda:
+                    torch.cuda.synchronize(images.device)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    network(images)
+                if images.is_cuda:
+                    torch.cuda.synchronize(images.device)
+                best[network_idx] = min(best[network_idx], (time.perf_counter() - start) / repeats)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--networks", type=str, nargs="+", default=["yolov4-tiny", "yolov4"], choices=_NETWORKS)
+    parser.add_argument("--num_classes", type=int, default=80)
+    parser.add_argument("--image_size", type=int, default=320)
+    parser.add_argument("--batch_size", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    images = torch.rand(args.batch_size, 3, args.image_size, args.image_size, device=device)
+    print(f"{args.batch_size} images of {args.image_size}x{args.image_size} on {device}")
+    for name in args.networks:
+        torch.manual_seed(0)
+        network = _NETWORKS[name](args.num_classes).to(device).eval()
+        fused = fuse_for_inference(copy.deepcopy(network))
+        with torch.inference_mode():
+            for expected, actual in zip(network(images)[0], fused(images)[0]):
+                if not torch.allclose(expected, actual, rtol=1e-3, atol=1e-2):
+                    raise RuntimeError(f"The outputs of the fused {name} network differ.")
+
+        original_time, fused_time = _time([network, fused], images, args.repeats, args.rounds)
+        print(
+            f"{name:>12}: {1000 * original_time:8.2f} ms -> {1000 * fused_time:8.2f} ms"
+            f" ({original_time / fused_time:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
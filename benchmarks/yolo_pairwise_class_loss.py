@@ -0,0 +1,81 @@
+"""Benchmarks the class cost of the SimOTA matching.
+
+Compares the former implementation, which broadcasts the predictions and the one-hot targets to a
+``[predictions, targets, classes]`` tensor and sums the element-wise binary cross entropy, with
+``_pairwise_class_loss``, which gathers the target class columns of per-prediction loss differences. Prints the time
+and, on CUDA, the peak memory of both, and checks that they give the same costs.
+
+    python benchmarks/yolo_pairwise_class_loss.py --device cuda --predictions 4000 --targets 300 --classes 80
+
+"""
+import argparse
+import time
+from typing import Callable, Tuple
+
+import torch
+from pl_bolts.models.detection.yolo.loss import _pairwise_class_loss, _target_labels_to_probs
+from torch import Tensor
+from torch.nn.functional import binary_cross_entropy_with_logits
+
+
+def _broadcast_class_loss(preds: Tensor, labels: Tensor, label_smoothing: float) -> Tensor:
+    """The implementation that ``_pairwise_class_loss`` replaced."""
+    target_probs = _target_labels_to_probs(labels, preds.shape[-1], preds.dtype, label_smoothing)
+    preds, target_probs = torch.broadcast_tensors(preds.unsqueeze(1), target_probs.unsqueeze(0))
+    return binary_cross_entropy_with_logits(preds, target_probs, reduction="none").sum(-1)
+
+
+def _measure(fn: Callable[[], object], device: torch.device, repeats: int) -> Tuple[float, float]:
+    """Returns the average time in seconds and the peak memory in MiB (0 on the CPU)."""
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+        torch.cuda.reset_peak_memory_stats(device)
+        baseline = torch.cuda.memory_allocated(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    elapsed = (time.perf_counter() - start) / repeats
+    peak = (torch.cuda.max_memory_allocated(device) - baseline) / 2**20 if device.type == "cuda" else 0.0
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--predictions", type=int, default=4000, help="number of candidate anchors")
+    parser.add_argument("--targets", type=int, default=300)
+    parser.add_argument("--classes", type=int, default=80)
+    parser.add_argument("--label_smoothing", type=float, default=0.1)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    generator = torch.Generator().manual_seed(0)
+    preds = torch.randn((args.predictions, args.classes), generator=generator).to(device)
+    labels = torch.randint(args.classes, (args.targets,), generator=generator).to(device)
+
+    expected = _broadcast_class_loss(preds, labels, args.label_smoothing)
+    actual = _pairwise_class_loss(preds, labels, binary_cross_entropy_with_logits, args.label_smoothing)
+    torch.testing.assert_close(actual, expected)
+
+    broadcast_time, broadcast_memory = _measure(
+        lambda: _broadcast_class_loss(preds, labels, args.label_smoothing), device, args.repeats
+    )
+    factorized_time, factorized_memory = _measure(
+        lambda: _pairwise_class_loss(preds, labels, binary_cross_entropy_with_logits, args.label_smoothing),
+        device,
+        args.repeats,
+    )
+    print(f"{args.predictions} predictions, {args.targets} targets and {args.classes} classes on {device}")
+    print(f"broadcast:  {1000 * broadcast_time:9.2f} ms {broadcast_memory:9.1f} MiB")
+    print(
+        f"factorized: {1000 * factorized_time:9.2f} ms {factorized_memory:9.1f} MiB "
+        f"({broadcast_time / factorized_time:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
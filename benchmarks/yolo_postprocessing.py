@@ -0,0 +1,92 @@
+"""Benchmarks the YOLO post-processing on synthetic predictions.
+
+Compares the former ``YOLO.process_detections()``, which thresholds the scores and calls NMS once per image, with
+``batched_detections()``, which filters the whole batch in one pass and runs NMS once per batch (once per image on the
+CPU), with and without a pre-NMS top-k. Prints the throughput in images per second at batch sizes 1, 8 and 64.
+
+    python benchmarks/yolo_postprocessing.py --device cuda --anchors 22743 --classes 80
+
+"""
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import torch
+from pl_bolts.models.detection.yolo.postprocessing import batched_detections
+from torch import Tensor
+from torchvision.ops import batched_nms
+
+
+def _per_image_detections(
+    preds: Tensor, confidence_threshold: float, nms_threshold: float, detections_per_image: int
+) -> List[Dict[str, Tensor]]:
+    """The per-image implementation that ``batched_detections()`` replaced."""
+    results = []
+    for image_preds in preds:
+        boxes, confidences, classprobs = image_preds[..., :4], image_preds[..., 4], image_preds[..., 5:]
+        scores = classprobs * confidences[:, None]
+        idxs, labels = (scores > confidence_threshold).nonzero().T
+        boxes = boxes[idxs]
+        scores = scores[idxs, labels]
+        keep = batched_nms(boxes, scores, labels, nms_threshold)
+        keep = keep[:detections_per_image]
+        results.append({"boxes": boxes[keep], "scores": scores[keep], "labels": labels[keep]})
+    return results
+
+
+def _synthetic_preds(batch_size: int, args: argparse.Namespace, generator: torch.Generator) -> Tensor:
+    """Random predictions, where most of the confidences are low like in the output of a trained model."""
+    xy = torch.rand((batch_size, args.anchors, 2), generator=generator) * args.image_size
+    wh = torch.rand((batch_size, args.anchors, 2), generator=generator) * args.image_size / 4 + 4
+    confidences = torch.sigmoid(torch.randn((batch_size, args.anchors, 1), generator=generator) * 2 - 6)
+    classprobs = torch.softmax(torch.randn((batch_size, args.anchors, args.classes), generator=generator) * 3, -1)
+    return torch.cat((xy, xy + wh, confidences, classprobs), -1).to(args.device)
+
+
+def _images_per_second(fn: Callable[[], object], batch_size: int, device: torch.device, repeats: int) -> float:
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return batch_size * repeats / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--anchors", type=int, default=22743, help="predictions per image, 22743 for YOLOv4 at 608")
+    parser.add_argument("--classes", type=int, default=80)
+    parser.add_argument("--image_size", type=int, default=608)
+    parser.add_argument("--confidence_threshold", type=float, default=0.05)
+    parser.add_argument("--nms_threshold", type=float, default=0.45)
+    parser.add_argument("--detections_per_image", type=int, default=300)
+    parser.add_argument("--pre_nms_top_k", type=int, default=1000)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+    thresholds = (args.confidence_threshold, args.nms_threshold, args.detections_per_image)
+
+    print(f"{args.anchors} predictions and {args.classes} classes per image on {device}, images/s")
+    print(f"{'batch size':>10} {'per image':>12} {'batched':>12} {'top-k':>12}")
+    for batch_size in args.batch_sizes:
+        preds = _synthetic_preds(batch_size, args, torch.Generator().manual_seed(batch_size))
+        per_image = _images_per_second(
+            lambda: _per_image_detections(preds, *thresholds), batch_size, device, args.repeats
+        )
+        batched = _images_per_second(lambda: batched_detections(preds, *thresholds), batch_size, device, args.repeats)
+        top_k = _images_per_second(
+            lambda: batched_detections(preds, *thresholds, pre_nms_top_k=args.pre_nms_top_k),
+            batch_size,
+            device,
+            args.repeats,
+        )
+        print(f"{batch_size:>10} {per_image:>12.1f} {batched:>12.1f} {top_k:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmarks ``YOLOPredictor`` against calling ``YOLO.infer()`` for one image at a time.
+
+Feeds a stream of images of random sizes to a randomly initialized YOLOv4-tiny network and prints the throughput in
+images per second and the mean time per batch of every stage, for a few maximum batch sizes.
+
+    python benchmarks/yolo_predictor.py --device cuda --images 512 --max_batch_sizes 1 8 32
+
+"""
+import argparse
+import time
+from typing import List
+
+import torch
+from pl_bolts.models.detection import YOLO, YOLOPredictor, YOLOV4TinyNetwork
+from torch import Tensor
+
+
+def _random_images(args: argparse.Namespace, generator: torch.Generator) -> List[Tensor]:
+    sizes = torch.randint(args.min_size, args.max_size + 1, (args.images, 2), generator=generator)
+    return [torch.randint(0, 256, (3, int(h), int(w)), dtype=torch.uint8, generator=generator) for h, w in sizes]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--images", type=int, default=128)
+    parser.add_argument("--min_size", type=int, default=200)
+    parser.add_argument("--max_size", type=int, default=640)
+    parser.add_argument("--bucket_sizes", type=int, nargs="+", default=[320, 416, 608])
+    parser.add_argument("--max_batch_sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--max_latency", type=float, default=0.01)
+    parser.add_argument("--confidence_threshold", type=float, default=0.3)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    model = YOLO(YOLOV4TinyNetwork(num_classes=80), confidence_threshold=args.confidence_threshold).to(device)
+    images = _random_images(args, torch.Generator().manual_seed(0))
+
+    predictor = YOLOPredictor(model, bucket_sizes=args.bucket_sizes, max_batch_size=1)
+    # Warm up the network with every bucket size.
+    predictor.predict([torch.zeros(3, size, size, dtype=torch.uint8) for size in args.bucket_sizes])
+    start = time.perf_counter()
+    for image in images:
+        # infer() needs an input size that the network accepts, so the image is letterboxed in the same way.
+        image = image.to(device).float() / 255
+        model.infer(predictor.letterbox(image, predictor.select_bucket(*image.shape[-2:]))[0])
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    print(f"{len(images)} images, sizes {args.min_size}-{args.max_size}, on {device}")
+    print(f"YOLO.infer(): {len(images) / (time.perf_counter() - start):.1f} images/s")
+
+    print(f"{'max batch':>10} {'images/s':>10} {'batch':>8} {'preprocess':>12} {'forward':>10} {'nms':>8}")
+    for max_batch_size in args.max_batch_sizes:
+        predictor = YOLOPredictor(
+            model, bucket_sizes=args.bucket_sizes, max_batch_size=max_batch_size, max_latency=args.max_latency
+        )
+        with predictor:
+            start = time.perf_counter()
+            futures = [predictor.submit(image) for image in images]
+            for future in futures:
+                future.result()
+            images_per_second = len(images) / (time.perf_counter() - start)
+        metrics = predictor.metrics()
+        print(
+            f"{max_batch_size:>10} {images_per_second:>10.1f} {metrics['mean_batch_size']:>8.1f}"
+            f" {metrics['preprocess_ms']:>10.1f}ms {metrics['forward_ms']:>8.1f}ms {metrics['nms_ms']:>6.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
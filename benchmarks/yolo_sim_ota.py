@@ -0,0 +1,96 @@
+"""Benchmarks the SimOTA assignment on synthetic crowded scenes.
+
+Compares the former implementation, which calls ``torch.topk`` once per target and image, with
+``_sim_ota_match_batch``, which matches a padded batch of images at once, and checks that both give the same
+assignments.
+
+    python benchmarks/yolo_sim_ota.py --device cuda --batch_size 16 --targets 300
+
+"""
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+import torch
+from pl_bolts.models.detection.yolo.target_matching import _sim_ota_match, _sim_ota_match_batch
+from torch import Tensor
+
+
+def _loop_sim_ota_match(costs: Tensor, ious: Tensor) -> Tuple[Tensor, Tensor]:
+    """The per-target implementation that ``_sim_ota_match_batch`` replaced."""
+    num_preds, num_targets = ious.shape
+    matching_matrix = torch.zeros_like(costs, dtype=torch.bool)
+    if ious.numel() > 0:
+        top10_iou = torch.topk(ious, min(10, num_preds), dim=0).values.sum(0)
+        ks = torch.clip(top10_iou.int(), min=1)
+        for target_idx, (target_costs, k) in enumerate(zip(costs.T, ks)):
+            pred_idx = torch.topk(target_costs, k, largest=False).indices
+            matching_matrix[pred_idx, target_idx] = True
+        more_than_one_match = matching_matrix.sum(1) > 1
+        best_targets = costs[more_than_one_match, :].argmin(1)
+        matching_matrix[more_than_one_match, :] = False
+        matching_matrix[more_than_one_match, best_targets] = True
+    pred_mask = matching_matrix.sum(1) > 0
+    target_selector = matching_matrix[pred_mask, :].int().argmax(1)
+    return pred_mask, target_selector
+
+
+def _crowded_scenes(args: argparse.Namespace, generator: torch.Generator) -> List[Tuple[Tensor, Tensor]]:
+    scenes = []
+    for _ in range(args.batch_size):
+        num_targets = int(torch.randint(args.targets // 2, args.targets + 1, (1,), generator=generator))
+        shape = (args.candidates, num_targets)
+        ious = torch.rand(shape, generator=generator) ** 4
+        costs = torch.rand(shape, generator=generator) * 10 + 100000.0 * (torch.rand(shape, generator=generator) > 0.3)
+        scenes.append((costs.to(args.device), ious.to(args.device)))
+    return scenes
+
+
+def _time(fn: Callable[[], object], device: torch.device, repeats: int) -> float:
+    fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / repeats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--targets", type=int, default=300, help="maximum number of targets per image")
+    parser.add_argument("--candidates", type=int, default=2000, help="number of candidate anchors per image")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    device = torch.device(args.device)
+
+    scenes = _crowded_scenes(args, torch.Generator().manual_seed(0))
+    num_preds = torch.tensor([costs.shape[0] for costs, _ in scenes], device=device)
+    num_targets = torch.tensor([costs.shape[1] for costs, _ in scenes], device=device)
+    costs = torch.full((len(scenes), args.candidates, int(num_targets.max())), float("inf"), device=device)
+    ious = torch.zeros_like(costs)
+    for image_idx, (image_costs, image_ious) in enumerate(scenes):
+        costs[image_idx, :, : image_costs.shape[1]] = image_costs
+        ious[image_idx, :, : image_ious.shape[1]] = image_ious
+
+    for image_costs, image_ious in scenes:
+        expected, actual = _loop_sim_ota_match(image_costs, image_ious), _sim_ota_match(image_costs, image_ious)
+        if not all(torch.equal(x, y) for x, y in zip(expected, actual)):
+            raise RuntimeError("The assignments differ.")
+
+    loop_time = _time(lambda: [_loop_sim_ota_match(c, i) for c, i in scenes], device, args.repeats)
+    image_time = _time(lambda: [_sim_ota_match(c, i) for c, i in scenes], device, args.repeats)
+    batch_time = _time(lambda: _sim_ota_match_batch(costs, ious, num_preds, num_targets), device, args.repeats)
+
+    print(f"{args.batch_size} images, up to {args.targets} targets and {args.candidates} candidates on {device}")
+    print(f"per-target loop:  {1000 * loop_time:9.2f} ms")
+    print(f"per-image:        {1000 * image_time:9.2f} ms ({loop_time / image_time:.1f}x)")
+    print(f"batched:          {1000 * batch_time:9.2f} ms ({loop_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """Collection of PyTorchLightning callbacks."""
 from pl_bolts.callbacks.byol_updates import BYOLMAWeightUpdate
 from pl_bolts.callbacks.data_monitor import ModuleDataMonitor, TrainingDataMonitor
+from pl_bolts.callbacks.dataset_epoch import DatasetEpochCallback
 from pl_bolts.callbacks.printing import PrintTableMetricsCallback
 from pl_bolts.callbacks.sparseml import SparseMLCallback
 from pl_bolts.callbacks.ssl_online import SSLOnlineEvaluator
@@ -14,6 +15,7 @@ from pl_bolts.callbacks.vision.sr_image_logger import SRImageLoggerCallback
 __all__ = [
     "BatchGradientVerificationCallback",
     "BYOLMAWeightUpdate",
+    "DatasetEpochCallback",
     "ModuleDataMonitor",
     "TrainingDataMonitor",
     "PrintTableMetricsCallback",
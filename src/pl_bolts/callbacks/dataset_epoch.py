@@ -0,0 +1,36 @@
+from typing import Any
+
+from pytorch_lightning import Callback, LightningModule, Trainer
+from pytorch_lightning.utilities.apply_func import apply_to_collection
+from torch.utils.data import DataLoader
+
+
+class DatasetEpochCallback(Callback):
+    """Passes the current epoch to the ``set_epoch`` method of the training datasets.
+
+    Lightning only calls ``set_epoch`` on the samplers of the dataloaders, but an ``IterableDataset`` such as
+    :class:`~pl_bolts.datasets.sharded_dataset.ShardedTarDataset` cannot have one and shuffles itself. Without this
+    callback, such a dataset repeats the order of its first epoch in every epoch.
+
+    The epoch is set before the workers of the epoch are started, so it does not reach DataLoaders with
+    ``persistent_workers=True``, whose workers keep their own copy of the dataset.
+
+    Example::
+
+        from pl_bolts.callbacks import DatasetEpochCallback
+
+        trainer = Trainer(callbacks=[DatasetEpochCallback()])
+
+    """
+
+    def on_train_epoch_start(self, trainer: Trainer, pl_module: LightningModule) -> None:
+        # the trainer wraps the dataloaders in a CombinedLoader
+        loaders = getattr(trainer.train_dataloader, "loaders", trainer.train_dataloader)
+        apply_to_collection(loaders, DataLoader, self._set_epoch, trainer.current_epoch)
+
+    @staticmethod
+    def _set_epoch(loader: DataLoader, epoch: int) -> Any:
+        set_epoch = getattr(loader.dataset, "set_epoch", None)
+        if callable(set_epoch):
+            set_epoch(epoch)
+        return loader
@@ -1,47 +1,164 @@
 import collections.abc as container_abcs
 import re
-from queue import Queue
-from threading import Thread
-from typing import Any, Optional, Union
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Tuple, Union
 
 import torch
 from torch import Tensor
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, DistributedSampler
 
 from pl_bolts.utils.stability import under_review
 
+_np_str_obj_array_pattern = re.compile(r"[SaUO]")
+
+
+def _map_tensors(fn: Callable[[Tensor], Tensor], sample: Any) -> Any:
+    """Applies ``fn`` to every tensor (and numeric numpy array) of a batch, following
+    ``torch.utils.data.default_collate``."""
+    elem_type = type(sample)
+    if torch.is_tensor(sample):
+        return fn(sample)
+    if elem_type.__module__ == "numpy" and elem_type.__name__ not in ("str_", "string_"):
+        if elem_type.__name__ == "ndarray" and _np_str_obj_array_pattern.search(sample.dtype.str) is not None:
+            return sample
+        return fn(torch.as_tensor(sample))
+    if isinstance(sample, container_abcs.Mapping):
+        return {key: _map_tensors(fn, sample[key]) for key in sample}
+    if isinstance(sample, tuple) and hasattr(sample, "_fields"):  # namedtuple
+        return elem_type(*(_map_tensors(fn, d) for d in sample))
+    if isinstance(sample, container_abcs.Sequence) and not isinstance(sample, str):
+        return [_map_tensors(fn, s) for s in sample]
+    return sample
+
+
+class _PinnedBufferPool:
+    """Reusable page-locked host buffers, keyed by shape and dtype.
+
+    At most ``max_buffers_per_key`` free buffers are kept for every key, so the pool stays bounded when the batch
+    shapes vary, e.g. for the last batch of an epoch.
+    """
+
+    def __init__(self, max_buffers_per_key: int) -> None:
+        self.max_buffers_per_key = max_buffers_per_key
+        self.num_allocations = 0
+        self._free: Dict[Tuple[torch.Size, torch.dtype], List[Tensor]] = {}
+        self._lock = Lock()
+
+    def acquire(self, like: Tensor) -> Tensor:
+        key = (like.shape, like.dtype)
+        with self._lock:
+            buffers = self._free.get(key)
+            if buffers:
+                return buffers.pop()
+            self.num_allocations += 1
+        return torch.empty(like.shape, dtype=like.dtype, pin_memory=True)
+
+    def release(self, buffer: Tensor) -> None:
+        key = (buffer.shape, buffer.dtype)
+        with self._lock:
+            buffers = self._free.setdefault(key, [])
+            if len(buffers) < self.max_buffers_per_key:
+                buffers.append(buffer)
+
+
+class _CopyBackend:
+    """Host to device copies on a side stream, so they overlap with the compute on the default stream.
+
+    Devices without streams (e.g. the CPU) get a no-op stream: the copy is synchronous and there is nothing to wait
+    for, which keeps the loader usable and testable without a GPU.
+    """
+
+    def __init__(self, device: torch.device) -> None:
+        self.device = device
+        self.uses_streams = device.type == "cuda"
+        self.stream = torch.cuda.Stream(device=device) if self.uses_streams else None
+
+    def stream_context(self) -> ContextManager:
+        return torch.cuda.stream(self.stream) if self.uses_streams else nullcontext()
+
+    def record_event(self) -> Optional[torch.cuda.Event]:
+        if not self.uses_streams:
+            return None
+        event = torch.cuda.Event()
+        event.record(self.stream)
+        return event
+
+    def wait(self, event: Optional[torch.cuda.Event], batch: Any) -> None:
+        """Makes the current stream of the consumer wait for the copy of ``batch``."""
+        if event is None:
+            return
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_event(event)
+
+        def record_stream(tensor: Tensor) -> Tensor:
+            # the tensors were allocated on the side stream but are used on the current one
+            if tensor.is_cuda:
+                tensor.record_stream(current_stream)
+            return tensor
+
+        _map_tensors(record_stream, batch)
+
+
+_END = object()
+
 
 @under_review()
 class AsynchronousLoader:
     """Class for asynchronously loading from CPU memory to device memory with DataLoader.
 
-    Note that this only works for single GPU training, multiGPU uses PyTorch's DataParallel or
-    DistributedDataParallel which uses its own code for transferring data across GPUs. This could just
-    break or make things slower with DataParallel or DistributedDataParallel.
+    A background thread reads the batches of the DataLoader and hands them to ``num_transfer_threads`` threads,
+    which stage every tensor in a reusable page-locked buffer and copy it to the device on a side stream. Up to
+    ``q_size`` transferred batches are kept ready, so the copies overlap with the computation on the current
+    stream, and the pinned buffers are recycled instead of allocated for every batch.
+
+    On devices without streams, e.g. the CPU, the copies are plain synchronous ``.to(device)`` calls.
+
+    With ``DistributedDataParallel``, create one loader per rank on the device of the rank. When a dataset is passed
+    and the default process group is initialized, a ``DistributedSampler`` is used, see :meth:`set_epoch`.
+
+    The transfer latency of every batch and the time spent waiting for it are recorded in
+    :attr:`transfer_latencies` and :attr:`wait_latencies` (in seconds) and summarized by :meth:`metrics`.
 
     Args:
         data: The PyTorch Dataset or DataLoader we're using to load.
-        device: The PyTorch device we are loading to
-        q_size: Size of the queue used to store the data loaded to the device
+        device: The PyTorch device we are loading to, defaults to the current CUDA device if there is one
+        q_size: Size of the queue used to store the data loaded to the device, i.e. the prefetch depth
         num_batches: Number of batches to load. This must be set if the dataloader
             doesn't have a finite __len__. It will also override DataLoader.__len__
             if set and DataLoader has a __len__. Otherwise it can be left as None
+        num_transfer_threads: Number of threads copying the batches to the device
         **kwargs: Any additional arguments to pass to the dataloader if we're
             constructing one here
 
+    Example::
+
+        dataloader = AsynchronousLoader(DataLoader(ds, batch_size=16), device=device, q_size=4)
+
+        for batch in dataloader:
+            ...
+
+        print(dataloader.metrics())
+
     """
 
     def __init__(
         self,
         data: Union[DataLoader, Dataset],
-        device: torch.device = torch.device("cuda", 0),
+        device: Optional[torch.device] = None,
         q_size: int = 10,
         num_batches: Optional[int] = None,
+        num_transfer_threads: int = 1,
         **kwargs: Any,
     ) -> None:
         if isinstance(data, torch.utils.data.DataLoader):
             self.dataloader = data
         else:
+            if "sampler" not in kwargs and torch.distributed.is_available() and torch.distributed.is_initialized():
+                kwargs["sampler"] = DistributedSampler(data, shuffle=kwargs.pop("shuffle", False))
             self.dataloader = DataLoader(data, **kwargs)
 
         if num_batches is not None:
@@ -51,71 +168,150 @@ class AsynchronousLoader:
         else:
             raise Exception("num_batches must be specified or data must have finite __len__")
 
-        self.device = device
+        if device is None:
+            device = torch.device("cuda", torch.cuda.current_device()) if torch.cuda.is_available() else "cpu"
+        self.device = torch.device(device)
         self.q_size = q_size
+        self.num_transfer_threads = num_transfer_threads
 
-        self.load_stream = torch.cuda.Stream(device=device)
+        self._backend = _CopyBackend(self.device)
+        self._pool = _PinnedBufferPool(max_buffers_per_key=q_size + num_transfer_threads)
+        self._use_pinned_buffers = self._backend.uses_streams
         self.queue: Queue = Queue(maxsize=self.q_size)
+        self.transfer_latencies: List[float] = []
+        self.wait_latencies: List[float] = []
 
         self.idx = 0
+        self._stop = Event()
+        self.worker: Optional[Thread] = None
+        self._error: Optional[BaseException] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def set_epoch(self, epoch: int) -> None:
+        """Forwards the epoch to the sampler of the DataLoader, e.g. a ``DistributedSampler``."""
+        sampler = getattr(self.dataloader, "sampler", None)
+        if hasattr(sampler, "set_epoch"):
+            sampler.set_epoch(epoch)
 
-        self.np_str_obj_array_pattern = re.compile(r"[SaUO]")
+    def _copy(self, tensor: Tensor) -> Tuple[Tensor, Optional[Tensor]]:
+        if not self._use_pinned_buffers or tensor.is_cuda:
+            return tensor.to(self.device, non_blocking=True), None
+        if tensor.is_pinned():
+            return tensor.to(self.device, non_blocking=True), None
+        buffer = self._pool.acquire(tensor)
+        buffer.copy_(tensor)
+        return buffer.to(self.device, non_blocking=True), buffer
+
+    def load_instance(self, sample: Any) -> Tuple[Any, Optional[torch.cuda.Event]]:
+        """Copies every tensor of ``sample`` to the device and returns the copy and the event marking its end."""
+        start = time.perf_counter()
+        buffers = []
+
+        def copy(tensor: Tensor) -> Tensor:
+            copied, buffer = self._copy(tensor)
+            if buffer is not None:
+                buffers.append(buffer)
+            return copied
+
+        with self._backend.stream_context():
+            sample = _map_tensors(copy, sample)
+            event = self._backend.record_event()
+
+        if buffers:
+            # the buffers can be reused once the copies out of them are done
+            event.synchronize()
+            for buffer in buffers:
+                self._pool.release(buffer)
+        self.transfer_latencies.append(time.perf_counter() - start)
+        return sample, event
+
+    def _put(self, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
 
     def load_loop(self) -> None:  # The loop that will load into the queue in the background
-        for i, sample in enumerate(self.dataloader):
-            self.queue.put(self.load_instance(sample))
-            if i == len(self):
-                break
-
-    # Recursive loading for each instance based on torch.utils.data.default_collate
-    def load_instance(self, sample: Any) -> Any:
-        elem_type = type(sample)
-
-        if torch.is_tensor(sample):
-            with torch.cuda.stream(self.load_stream):
-                # Can only do asynchronous transfer if we use pin_memory
-                if not sample.is_pinned():
-                    sample = sample.pin_memory()
-                return sample.to(self.device, non_blocking=True)
-        elif elem_type.__module__ == "numpy" and elem_type.__name__ != "str_" and elem_type.__name__ != "string_":
-            if elem_type.__name__ == "ndarray" and self.np_str_obj_array_pattern.search(sample.dtype.str) is not None:
-                return self.load_instance(sample)
-            return self.load_instance(torch.as_tensor(sample))
-        elif isinstance(sample, container_abcs.Mapping):
-            return {key: self.load_instance(sample[key]) for key in sample}
-        elif isinstance(sample, tuple) and hasattr(sample, "_fields"):  # namedtuple
-            return elem_type(*(self.load_instance(d) for d in sample))
-        elif isinstance(sample, container_abcs.Sequence) and not isinstance(sample, str):
-            return [self.load_instance(s) for s in sample]
-        else:
-            return sample
+        try:
+            for i, sample in enumerate(self.dataloader):
+                if i >= len(self) or not self._put(self._executor.submit(self.load_instance, sample)):
+                    break
+        except BaseException as err:  # re-raised by the consumer
+            self._error = err
+        finally:
+            self._put(_END)
+
+    @property
+    def pinned_allocations(self) -> int:
+        """Number of pinned host buffers allocated so far."""
+        return self._pool.num_allocations
+
+    def metrics(self) -> Dict[str, float]:
+        """Summarizes the latencies recorded in the current or last epoch, in milliseconds."""
+
+        def mean_ms(latencies: List[float]) -> float:
+            return 1000 * sum(latencies) / len(latencies) if latencies else 0.0
+
+        return {
+            "batches": float(len(self.wait_latencies)),
+            "transfer_ms": mean_ms(self.transfer_latencies),
+            "wait_ms": mean_ms(self.wait_latencies),
+            "pinned_allocations": float(self.pinned_allocations),
+        }
+
+    def close(self) -> None:
+        """Stops the background threads, e.g. when the iteration is abandoned before the end of the epoch."""
+        self._stop.set()
+        if self.worker is not None:
+            while self.worker.is_alive():
+                try:
+                    self.queue.get(timeout=0.1)
+                except Empty:
+                    continue
+            self.worker.join()
+            self.worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.queue = Queue(maxsize=self.q_size)
+        self._stop.clear()
 
     def __iter__(self) -> "AsynchronousLoader":
-        # We don't want to run the thread more than once
-        # Start a new thread if we are at the beginning of a new epoch, and our current worker is dead
-
-        if_worker = not hasattr(self, "worker") or not self.worker.is_alive()  # type: ignore[has-type]
-        if if_worker and self.queue.empty() and self.idx == 0:
-            self.worker = Thread(target=self.load_loop)
-            self.worker.daemon = True
-            self.worker.start()
+        # a new iteration starts a new epoch, abandoning the previous one if it was not finished
+        self.close()
+        self.idx = 0
+        self.transfer_latencies, self.wait_latencies = [], []
+        self._executor = ThreadPoolExecutor(max_workers=self.num_transfer_threads)
+        self.worker = Thread(target=self.load_loop, daemon=True)
+        self.worker.start()
         return self
 
-    def __next__(self) -> Tensor:
-        # If we've reached the number of batches to return
-        # or the queue is empty and the worker is dead then exit
-        done = not self.worker.is_alive() and self.queue.empty()
-        done = done or self.idx >= len(self)
-        if done:
-            self.idx = 0
-            self.queue.join()
-            self.worker.join()
+    def __next__(self) -> Any:
+        if self.worker is None:
+            raise StopIteration
+
+        start = time.perf_counter()
+        item = self.queue.get()
+        if item is _END or self.idx >= len(self):
+            error, self._error = self._error, None
+            self.close()
+            if error is not None:
+                raise error
             raise StopIteration
-        # Otherwise return the next batch
-        out = self.queue.get()
-        self.queue.task_done()
+
+        future: Future = item
+        batch, event = future.result()
+        self._backend.wait(event, batch)
+        self.wait_latencies.append(time.perf_counter() - start)
         self.idx += 1
-        return out
+        return batch
 
     def __len__(self) -> int:
         return self.num_batches
+
+    def __del__(self) -> None:
+        if getattr(self, "worker", None) is not None:
+            self.close()
@@ -0,0 +1,40 @@
+from typing import Any, Callable, Optional
+
+
+class BatchTransformsMixin:
+    """Mixin for datamodules that adds an optional post-collate transform stage.
+
+    The ``train_batch_transforms``, ``val_batch_transforms`` and ``test_batch_transforms`` are applied to the whole
+    batch in ``on_after_batch_transfer``, i.e. after the batch has been moved to the device, depending on the stage
+    the trainer is running. This allows batched augmentations such as
+    :class:`~pl_bolts.transforms.self_supervised.batch_transforms.MultiViewBatchTransform` to replace per-sample
+    augmentations in the DataLoader workers.
+
+    Example::
+
+        dm = CIFAR10DataModule(PATH, train_transforms=transforms.PILToTensor())
+        dm.train_batch_transforms = SimCLRTrainBatchTransform(input_height=32)
+
+    """
+
+    train_batch_transforms: Optional[Callable] = None
+    val_batch_transforms: Optional[Callable] = None
+    test_batch_transforms: Optional[Callable] = None
+
+    def on_after_batch_transfer(self, batch: Any, dataloader_idx: int) -> Any:
+        trainer = getattr(self, "trainer", None)
+        if trainer is None:
+            return batch
+
+        if trainer.training:
+            batch_transforms = self.train_batch_transforms
+        elif trainer.sanity_checking or trainer.validating:
+            batch_transforms = self.val_batch_transforms
+        elif trainer.testing:
+            batch_transforms = self.test_batch_transforms
+        else:
+            batch_transforms = None
+
+        if batch_transforms is None:
+            return batch
+        return batch_transforms(batch)
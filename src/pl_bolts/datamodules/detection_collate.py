@@ -0,0 +1,105 @@
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple, Union
+
+import torch
+from torch import Tensor
+
+
+class PackedDetectionTargets(NamedTuple):
+    """The targets of a detection batch packed into flat tensors.
+
+    The boxes and labels of all the images are concatenated, image ``i`` owns the rows ``offsets[i]:offsets[i + 1]``.
+    A batch is moved to the device with a handful of copies instead of two per image, and batched code can use
+    ``image_index`` to tell the images apart without a Python loop.
+
+    Attributes:
+        boxes: ``[total_boxes, 4]`` boxes in `(x1, y1, x2, y2)` format
+        labels: ``[total_boxes]`` class labels or ``[total_boxes, num_classes]`` boolean class masks
+        offsets: ``[batch_size + 1]`` start of the boxes of every image, followed by the total number of boxes
+        image_index: ``[total_boxes]`` index of the image of every box
+        image_sizes: ``[batch_size, 2]`` `(height, width)` of every image before padding
+    """
+
+    boxes: Tensor
+    labels: Tensor
+    offsets: Tensor
+    image_index: Tensor
+    image_sizes: Tensor
+
+    @property
+    def num_images(self) -> int:
+        return len(self.image_sizes)
+
+    def split(self) -> List[Dict[str, Tensor]]:
+        """Returns one target dictionary per image, the tensors are views into the packed tensors."""
+        counts = self.offsets.diff().tolist()
+        return [
+            {"boxes": boxes, "labels": labels}
+            for boxes, labels in zip(self.boxes.split(counts), self.labels.split(counts))
+        ]
+
+    def image_list(self, images: Tensor) -> List[Tensor]:
+        """Returns the images of a padded batch with their padding removed, as views into ``images``."""
+        return [image[:, :height, :width] for image, (height, width) in zip(images, self.image_sizes.tolist())]
+
+
+class DetectionCollate:
+    """Collates ``(image, target)`` pairs into a padded image tensor and :class:`PackedDetectionTargets`.
+
+    The images are copied into one preallocated ``[batch_size, channels, height, width]`` tensor. They are aligned to
+    the top left corner, so the box coordinates stay valid, and padded to the largest image in the batch, rounded up to
+    a multiple of ``size_divisible``. Only the "boxes" and "labels" of the target dictionaries are kept.
+
+    Args:
+        size_divisible: the padded height and width are multiples of this value, e.g. the stride of the network
+        pad_value: value of the padding pixels
+
+    Example::
+
+        loader = DataLoader(dataset, batch_size=16, collate_fn=DetectionCollate(size_divisible=32))
+        images, targets = next(iter(loader))
+        model(images, targets)
+
+    """
+
+    def __init__(self, size_divisible: int = 1, pad_value: float = 0.0) -> None:
+        self.size_divisible = size_divisible
+        self.pad_value = pad_value
+
+    def __call__(self, batch: Sequence[Tuple[Tensor, Dict[str, Any]]]) -> Tuple[Tensor, PackedDetectionTargets]:
+        images, targets = zip(*batch)
+
+        image_sizes = torch.tensor([image.shape[-2:] for image in images], dtype=torch.int64)
+        height, width = (
+            (int(size) + self.size_divisible - 1) // self.size_divisible * self.size_divisible
+            for size in image_sizes.max(0).values
+        )
+        padded = images[0].new_full((len(images), images[0].shape[0], height, width), self.pad_value)
+        for image, padded_image in zip(images, padded):
+            padded_image[:, : image.shape[-2], : image.shape[-1]].copy_(image)
+
+        counts = torch.tensor([len(target["boxes"]) for target in targets], dtype=torch.int64)
+        offsets = torch.zeros(len(targets) + 1, dtype=torch.int64)
+        torch.cumsum(counts, 0, out=offsets[1:])
+        packed = PackedDetectionTargets(
+            boxes=torch.cat(
+                [torch.as_tensor(target["boxes"], dtype=torch.float32).reshape(-1, 4) for target in targets]
+            ),
+            labels=torch.cat([torch.as_tensor(target["labels"]) for target in targets]),
+            offsets=offsets,
+            image_index=torch.repeat_interleave(torch.arange(len(targets)), counts),
+            image_sizes=image_sizes,
+        )
+        return padded, packed
+
+
+def unpack_detection_batch(
+    images: Union[Tensor, Sequence[Tensor]], targets: Union[PackedDetectionTargets, Sequence[Dict[str, Any]]]
+) -> Tuple[List[Tensor], List[Dict[str, Any]]]:
+    """Returns a list of images and a list of target dictionaries for both collated and packed batches.
+
+    Packed batches are unpadded and split into views, so the models that take lists, e.g. the torchvision detection
+    models, accept both formats.
+    """
+    if isinstance(targets, PackedDetectionTargets):
+        return targets.image_list(images), targets.split()
+    return list(images), [dict(target.items()) for target in targets]
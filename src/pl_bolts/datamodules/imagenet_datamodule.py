@@ -3,9 +3,12 @@ from argparse import ArgumentParser
 from typing import Any, Callable, Optional
 
 from pytorch_lightning import LightningDataModule
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Dataset
 
+from pl_bolts.datamodules.batch_transforms_mixin import BatchTransformsMixin
 from pl_bolts.datasets import UnlabeledImagenet
+from pl_bolts.datasets.packed_dataset import BlockShuffleSampler, PackedImageDataset, is_packed, write_packed_images
+from pl_bolts.datasets.sharded_dataset import SHARDS_FILE, ShardedTarDataset, write_tar_shards
 from pl_bolts.transforms.dataset_normalizations import imagenet_normalization
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
@@ -18,7 +21,7 @@ else:  # pragma: no cover
 
 
 @under_review()
-class ImagenetDataModule(LightningDataModule):
+class ImagenetDataModule(BatchTransformsMixin, LightningDataModule):
     """
     .. figure:: https://3qeqpr26caki16dnhd19sv6by6v-wpengine.netdna-ssl.com/wp-content/uploads/2017/08/
         Sample-of-Images-from-the-ImageNet-Dataset-used-in-the-ILSVRC-Challenge.png
@@ -38,7 +41,7 @@ class ImagenetDataModule(LightningDataModule):
 
     The test set is the official imagenet validation set.
 
-     Example::
+    Example::
 
         from pl_bolts.datamodules import ImagenetDataModule
 
@@ -46,6 +49,19 @@ class ImagenetDataModule(LightningDataModule):
         model = LitModel()
 
         Trainer().fit(model, datamodule=dm)
+
+    To avoid decoding the JPEG files every epoch, the images can be decoded once into memory-mapped shards.
+
+    Example::
+
+        dm = ImagenetDataModule(IMAGENET_PATH, cache_dir=CACHE_PATH, packed=True)
+
+    On network filesystems, ``sharded=True`` streams the train split from a few large tar files instead, see
+    :class:`~pl_bolts.datasets.sharded_dataset.ShardedTarDataset`. Add a
+    :class:`~pl_bolts.callbacks.DatasetEpochCallback` to the trainer to reshuffle them every epoch::
+
+        dm = ImagenetDataModule(IMAGENET_PATH, cache_dir=CACHE_PATH, sharded=True)
+        Trainer(callbacks=[DatasetEpochCallback()]).fit(model, datamodule=dm)
     """
 
     name = "imagenet"
@@ -61,6 +77,10 @@ class ImagenetDataModule(LightningDataModule):
         shuffle: bool = True,
         pin_memory: bool = True,
         drop_last: bool = False,
+        cache_dir: Optional[str] = None,
+        packed: bool = False,
+        packed_image_size: Optional[int] = None,
+        sharded: bool = False,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -76,6 +96,12 @@ class ImagenetDataModule(LightningDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            cache_dir: folder where the split lists (and the packed images) are cached between runs
+            packed: If true, ``prepare_data`` decodes every image once into memory-mapped shards in ``cache_dir``
+                and the dataloaders read from them instead of the JPEG files
+            packed_image_size: shorter side of the packed images, defaults to ``image_size + 32``
+            sharded: If true, ``prepare_data`` writes the train split into tar shards in ``cache_dir`` and the train
+                dataloader streams them sequentially
         """
         super().__init__(*args, **kwargs)
 
@@ -83,6 +109,12 @@ class ImagenetDataModule(LightningDataModule):
             raise ModuleNotFoundError(
                 "You want to use ImageNet dataset loaded from `torchvision` which is not installed yet."
             )
+        if packed and cache_dir is None:
+            raise ValueError("`packed=True` requires a `cache_dir` to write the packed images to.")
+        if sharded and cache_dir is None:
+            raise ValueError("`sharded=True` requires a `cache_dir` to write the shards to.")
+        if sharded and packed:
+            raise ValueError("Only one of `packed` and `sharded` can be set.")
 
         self.image_size = image_size
         self.dims = (3, self.image_size, self.image_size)
@@ -94,6 +126,10 @@ class ImagenetDataModule(LightningDataModule):
         self.shuffle = shuffle
         self.pin_memory = pin_memory
         self.drop_last = drop_last
+        self.cache_dir = cache_dir
+        self.packed = packed
+        self.packed_image_size = packed_image_size if packed_image_size is not None else image_size + 32
+        self.sharded = sharded
         self.num_samples = 1281167 - self.num_imgs_per_val_class * self.num_classes
 
     @property
@@ -144,22 +180,64 @@ class ImagenetDataModule(LightningDataModule):
                 """
                 )
 
-    def train_dataloader(self) -> DataLoader:
-        """Uses the train split of imagenet2012 and puts away a portion of it for the validation split."""
-        transforms = self.train_transform() if self.train_transforms is None else self.train_transforms
-
-        dataset = UnlabeledImagenet(
+        if self.packed:
+            for split in ["train", "val", "test"]:
+                packed_dir = os.path.join(self.cache_dir, "packed", split)
+                if not is_packed(packed_dir):
+                    write_packed_images(
+                        self._imagenet_split(split, transform=None),
+                        packed_dir,
+                        image_size=self.packed_image_size,
+                        num_workers=self.num_workers,
+                    )
+
+        if self.sharded and not os.path.isfile(os.path.join(self._shards_dir(), SHARDS_FILE)):
+            write_tar_shards(self._imagenet_split("train", transform=None), self._shards_dir())
+
+    def _shards_dir(self) -> str:
+        return os.path.join(self.cache_dir, "shards", "train")
+
+    def _imagenet_split(self, split: str, transform: Optional[Callable]) -> Dataset:
+        return UnlabeledImagenet(
             self.data_dir,
             num_imgs_per_class=-1,
             num_imgs_per_class_val_split=self.num_imgs_per_val_class,
             meta_dir=self.meta_dir,
-            split="train",
-            transform=transforms,
+            split=split,
+            transform=transform,
+            cache_dir=None if self.cache_dir is None else os.path.join(self.cache_dir, "splits"),
         )
+
+    def _dataset(self, split: str, transform: Optional[Callable]) -> Dataset:
+        if self.packed:
+            return PackedImageDataset(os.path.join(self.cache_dir, "packed", split), transform=transform)
+        return self._imagenet_split(split, transform)
+
+    def train_dataloader(self) -> DataLoader:
+        """Uses the train split of imagenet2012 and puts away a portion of it for the validation split."""
+        transforms = self.train_transform() if self.train_transforms is None else self.train_transforms
+
+        if self.sharded:
+            dataset = ShardedTarDataset(self._shards_dir(), transform=transforms, shuffle=self.shuffle)
+            if self.trainer is not None:
+                # also reshuffles when the dataloaders are reloaded every epoch, without DatasetEpochCallback
+                dataset.set_epoch(self.trainer.current_epoch)
+            return DataLoader(
+                dataset,
+                batch_size=self.batch_size,
+                num_workers=self.num_workers,
+                drop_last=self.drop_last,
+                pin_memory=self.pin_memory,
+            )
+
+        dataset = self._dataset("train", transforms)
+        # with packed images, shuffling whole blocks keeps the reads of a worker close to sequential
+        sampler = BlockShuffleSampler(dataset) if self.packed and self.shuffle else None
         loader: DataLoader = DataLoader(
             dataset,
             batch_size=self.batch_size,
-            shuffle=self.shuffle,
+            shuffle=self.shuffle if sampler is None else False,
+            sampler=sampler,
             num_workers=self.num_workers,
             drop_last=self.drop_last,
             pin_memory=self.pin_memory,
@@ -176,13 +254,7 @@ class ImagenetDataModule(LightningDataModule):
         """
         transforms = self.val_transform() if self.val_transforms is None else self.val_transforms
 
-        dataset = UnlabeledImagenet(
-            self.data_dir,
-            num_imgs_per_class_val_split=self.num_imgs_per_val_class,
-            meta_dir=self.meta_dir,
-            split="val",
-            transform=transforms,
-        )
+        dataset = self._dataset("val", transforms)
         loader: DataLoader = DataLoader(
             dataset,
             batch_size=self.batch_size,
@@ -197,9 +269,7 @@ class ImagenetDataModule(LightningDataModule):
         """Uses the validation split of imagenet2012 for testing."""
         transforms = self.val_transform() if self.test_transforms is None else self.test_transforms
 
-        dataset = UnlabeledImagenet(
-            self.data_dir, num_imgs_per_class=-1, meta_dir=self.meta_dir, split="test", transform=transforms
-        )
+        dataset = self._dataset("test", transforms)
         loader: DataLoader = DataLoader(
             dataset,
             batch_size=self.batch_size,
@@ -268,5 +338,7 @@ class ImagenetDataModule(LightningDataModule):
         parser.add_argument("--data_dir", type=str, default=".")
         parser.add_argument("--num_workers", type=int, default=0)
         parser.add_argument("--batch_size", type=int, default=32)
+        parser.add_argument("--cache_dir", type=str, default=None)
+        parser.add_argument("--packed", action="store_true")
 
         return parser
@@ -7,6 +7,11 @@ from torch.utils.data import DataLoader
 from torch.utils.data.dataset import random_split
 
 from pl_bolts.datasets import KittiDataset
+from pl_bolts.datasets.segmentation_cache import (
+    CachedSegmentationDataset,
+    is_segmentation_cached,
+    write_segmentation_cache,
+)
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
 from pl_bolts.utils.warnings import warn_missing_pkg
@@ -32,6 +37,7 @@ class KittiDataModule(LightningDataModule):
         shuffle: bool = True,
         pin_memory: bool = True,
         drop_last: bool = False,
+        cache_dir: Optional[str] = None,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -69,6 +75,8 @@ class KittiDataModule(LightningDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                         returning them
             drop_last: If true drops the last incomplete batch
+            cache_dir: if set, ``prepare_data`` writes the resized images and encoded masks to this folder once and
+                the dataloaders read them from there instead of decoding and resizing every sample
 
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
@@ -82,6 +90,7 @@ class KittiDataModule(LightningDataModule):
         self.shuffle = shuffle
         self.pin_memory = pin_memory
         self.drop_last = drop_last
+        self.cache_dir = cache_dir
 
         # split into train, val, test
         kitti_dataset = KittiDataset(self.data_dir, transform=self._default_transforms())
@@ -94,6 +103,17 @@ class KittiDataModule(LightningDataModule):
             kitti_dataset, lengths=[train_len, val_len, test_len], generator=torch.Generator().manual_seed(self.seed)
         )
 
+    def prepare_data(self) -> None:
+        if self.cache_dir is not None and not is_segmentation_cached(self.cache_dir):
+            write_segmentation_cache(KittiDataset(self.data_dir), self.cache_dir, num_workers=self.num_workers)
+
+    def setup(self, stage: Optional[str] = None) -> None:
+        if self.cache_dir is not None:
+            # the cache holds the samples in the order of the dataset, so the splits are kept as they are
+            cached = CachedSegmentationDataset(self.cache_dir, transform=self._default_transforms())
+            for subset in (self.trainset, self.valset, self.testset):
+                subset.dataset = cached
+
     def train_dataloader(self) -> DataLoader:
         return DataLoader(
             self.trainset,
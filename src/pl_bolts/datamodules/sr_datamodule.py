@@ -1,13 +1,14 @@
-from typing import Any
+from typing import Any, Callable, Optional
 
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader, Dataset
 
+from pl_bolts.datamodules.batch_transforms_mixin import BatchTransformsMixin
 from pl_bolts.utils.stability import under_review
 
 
 @under_review()
-class TVTDataModule(LightningDataModule):
+class TVTDataModule(BatchTransformsMixin, LightningDataModule):
     """Simple DataModule creating train, val, and test dataloaders from given train, val, and test dataset.
 
     Example::
@@ -19,6 +20,16 @@ class TVTDataModule(LightningDataModule):
         dataset_test = SRMNIST(scale_factor=4, root=".", train=True)
         dm = TVTDataModule(dataset_train, dataset_val, dataset_test)
 
+    To create the low resolution images for the whole batch instead of per sample, use ``hr_only`` datasets and a
+    :class:`~pl_bolts.transforms.sr_transforms.SRCollate`.
+
+    Example::
+        from pl_bolts.transforms.sr_transforms import SRCollate
+
+        dataset_dev = SRMNIST(scale_factor=4, root=".", train=True, hr_only=True)
+        ...
+        dm = TVTDataModule(dataset_train, dataset_val, dataset_test, collate_fn=SRCollate(scale_factor=4))
+
     """
 
     def __init__(
@@ -31,6 +42,7 @@ class TVTDataModule(LightningDataModule):
         num_workers: int = 8,
         pin_memory: bool = True,
         drop_last: bool = True,
+        collate_fn: Optional[Callable] = None,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -45,6 +57,7 @@ class TVTDataModule(LightningDataModule):
             pin_memory: If true, the data loader will copy Tensors into CUDA pinned memory before
                 returning them
             drop_last: If true drops the last incomplete batch
+            collate_fn: merges the samples into a batch, uses the default collation if not set
         """
         super().__init__()
 
@@ -56,6 +69,7 @@ class TVTDataModule(LightningDataModule):
         self.shuffle = shuffle
         self.pin_memory = pin_memory
         self.drop_last = drop_last
+        self.collate_fn = collate_fn
 
     def train_dataloader(self) -> DataLoader:
         return self._dataloader(self.dataset_train, shuffle=self.shuffle)
@@ -74,4 +88,5 @@ class TVTDataModule(LightningDataModule):
             num_workers=self.num_workers,
             drop_last=self.drop_last,
             pin_memory=self.pin_memory,
+            collate_fn=self.collate_fn,
         )
@@ -4,6 +4,7 @@ from typing import Any, Callable, Optional
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader
 
+from pl_bolts.datamodules.batch_transforms_mixin import BatchTransformsMixin
 from pl_bolts.datasets import UnlabeledImagenet
 from pl_bolts.transforms.dataset_normalizations import imagenet_normalization
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
@@ -17,7 +18,7 @@ else:  # pragma: no cover
 
 
 @under_review()
-class SSLImagenetDataModule(LightningDataModule):  # pragma: no cover
+class SSLImagenetDataModule(BatchTransformsMixin, LightningDataModule):  # pragma: no cover
     name = "imagenet"
 
     def __init__(
@@ -6,6 +6,7 @@ import torch
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader, random_split
 
+from pl_bolts.datamodules.batch_transforms_mixin import BatchTransformsMixin
 from pl_bolts.datasets import ConcatDataset
 from pl_bolts.transforms.dataset_normalizations import stl10_normalization
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
@@ -20,7 +21,7 @@ else:  # pragma: no cover
 
 
 @under_review()
-class STL10DataModule(LightningDataModule):  # pragma: no cover
+class STL10DataModule(BatchTransformsMixin, LightningDataModule):  # pragma: no cover
     """
     .. figure:: https://samyzaf.com/ML/cifar10/cifar1.jpg
         :width: 400
@@ -6,8 +6,10 @@ import torch
 from pytorch_lightning import LightningDataModule
 from torch.utils.data import DataLoader, Dataset, random_split
 
+from pl_bolts.datamodules.batch_transforms_mixin import BatchTransformsMixin
 
-class VisionDataModule(LightningDataModule):
+
+class VisionDataModule(BatchTransformsMixin, LightningDataModule):
     EXTRA_ARGS: dict = {}
     name: str = ""
     #: Dataset class to use
@@ -1,20 +1,31 @@
 import os
 from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 import torch
 from pytorch_lightning import LightningDataModule
 from torch import Tensor
 from torch.utils.data import DataLoader, Dataset
 
-from pl_bolts.utils import _TORCHVISION_AVAILABLE
+from pl_bolts.datamodules.batch_transforms_mixin import BatchTransformsMixin
+from pl_bolts.datamodules.detection_collate import DetectionCollate
+from pl_bolts.datasets.shared_image_cache import SharedImageCache
+from pl_bolts.utils import _PIL_AVAILABLE, _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
 from pl_bolts.utils.warnings import warn_missing_pkg
 
 if _TORCHVISION_AVAILABLE:
     from torchvision import transforms as transform_lib
     from torchvision.datasets import VOCDetection
+    from torchvision.datasets.voc import ET_parse
 else:  # pragma: no cover
     warn_missing_pkg("torchvision")
+    VOCDetection = object
+
+if _PIL_AVAILABLE:
+    from PIL import Image
+else:  # pragma: no cover
+    warn_missing_pkg("PIL", pypi_name="Pillow")
 
 
 @under_review()
@@ -105,9 +116,40 @@ def _prepare_voc_instance(image: Any, target: Dict[str, Any]):
     return image, target
 
 
+class _CachedVOCDetection(VOCDetection):
+    """``VOCDetection`` that reads the decoded images from a :class:`SharedImageCache`, when they are cached."""
+
+    def __init__(self, *args: Any, cache_size: int, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.cache = SharedImageCache(len(self.images), cache_size)
+
+    def __getitem__(self, index: int) -> Tuple[Any, Any]:
+        pixels = self.cache.get(index)
+        if pixels is None:
+            pixels = np.asarray(Image.open(self.images[index]).convert("RGB"))
+            self.cache.put(index, pixels)
+        # fromarray() shares the read-only cache memory, the transforms create new images and tensors.
+        img = Image.fromarray(pixels)
+        target = self.parse_voc_xml(ET_parse(self.annotations[index]).getroot())
+
+        if self.transforms is not None:
+            img, target = self.transforms(img, target)
+
+        return img, target
+
+
 @under_review()
-class VOCDetectionDataModule(LightningDataModule):
-    """TODO(teddykoker) docstring."""
+class VOCDetectionDataModule(BatchTransformsMixin, LightningDataModule):
+    """TODO(teddykoker) docstring.
+
+    By default, a batch is a tuple of image tensors and a tuple of target dictionaries. With ``packed=True``, the
+    images are padded into one tensor and the boxes and labels of the batch are packed into flat tensors, see
+    :class:`~pl_bolts.datamodules.detection_collate.DetectionCollate`. Packed batches can be augmented on the device by
+    setting ``train_batch_transforms``, e.g. to the modules in :mod:`pl_bolts.transforms.detection_batch_transforms`.
+
+    With ``cache_images=True``, the decoded images are kept in a shared memory block of ``cache_size`` bytes, so every
+    image is decoded only once, by the first DataLoader worker that reads it, instead of once per worker and epoch.
+    """
 
     name = "vocdetection"
 
@@ -125,6 +167,9 @@ class VOCDetectionDataModule(LightningDataModule):
         val_transforms: Optional[Callable] = None,
         test_transforms: Optional[Callable] = None,
         target_transforms: Optional[Callable] = None,
+        packed: bool = False,
+        cache_images: bool = False,
+        cache_size: int = 8 * 2**30,
         *args: Any,
         **kwargs: Any,
     ) -> None:
@@ -147,6 +192,10 @@ class VOCDetectionDataModule(LightningDataModule):
         self.val_transforms = val_transforms
         self.test_transforms = test_transforms
         self.target_transforms = target_transforms
+        self.packed = packed
+        self.cache_images = cache_images
+        self.cache_size = cache_size
+        self._datasets: Dict[str, Dataset] = {}
 
     @property
     def num_classes(self) -> int:
@@ -173,7 +222,7 @@ class VOCDetectionDataModule(LightningDataModule):
         ]
         transforms = Compose(transforms, image_transforms)
 
-        dataset = VOCDetection(self.data_dir, year=self.year, image_set="train", transforms=transforms)
+        dataset = self._dataset("train", transforms)
         return self._data_loader(dataset, shuffle=self.shuffle)
 
     def val_dataloader(self, image_transforms: Optional[Callable] = None) -> DataLoader:
@@ -188,7 +237,7 @@ class VOCDetectionDataModule(LightningDataModule):
         ]
         transforms = Compose(transforms, image_transforms)
 
-        dataset = VOCDetection(self.data_dir, year=self.year, image_set="val", transforms=transforms)
+        dataset = self._dataset("val", transforms)
         return self._data_loader(dataset, shuffle=False)
 
     def default_transforms(self) -> Callable:
@@ -198,6 +247,18 @@ class VOCDetectionDataModule(LightningDataModule):
         voc_transforms = transform_lib.Compose(voc_transforms)
         return lambda image, target: (voc_transforms(image), target)
 
+    def _dataset(self, image_set: str, transforms: Callable) -> Dataset:
+        if not self.cache_images:
+            return VOCDetection(self.data_dir, year=self.year, image_set=image_set, transforms=transforms)
+        # The cache is kept when the dataloaders are reloaded, only the transforms are replaced.
+        if image_set not in self._datasets:
+            self._datasets[image_set] = _CachedVOCDetection(
+                self.data_dir, year=self.year, image_set=image_set, cache_size=self.cache_size
+            )
+        dataset = self._datasets[image_set]
+        dataset.transforms = transforms
+        return dataset
+
     def _data_loader(self, dataset: Dataset, shuffle: bool = False) -> DataLoader:
         return DataLoader(
             dataset,
@@ -206,5 +267,5 @@ class VOCDetectionDataModule(LightningDataModule):
             num_workers=self.num_workers,
             drop_last=self.drop_last,
             pin_memory=self.pin_memory,
-            collate_fn=_collate_fn,
+            collate_fn=DetectionCollate() if self.packed else _collate_fn,
         )
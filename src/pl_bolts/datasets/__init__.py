@@ -15,6 +15,9 @@ from pl_bolts.datasets.emnist_dataset import BinaryEMNIST
 from pl_bolts.datasets.imagenet_dataset import UnlabeledImagenet, extract_archive, parse_devkit_archive
 from pl_bolts.datasets.kitti_dataset import KittiDataset
 from pl_bolts.datasets.mnist_dataset import MNIST, BinaryMNIST
+from pl_bolts.datasets.packed_dataset import PackedImageDataset, write_packed_images
+from pl_bolts.datasets.sharded_dataset import ShardedTarDataset, write_tar_shards
+from pl_bolts.datasets.shared_image_cache import SharedImageCache
 from pl_bolts.datasets.ssl_amdim_datasets import CIFAR10Mixed, SSLDatasetMixin
 
 __all__ = [
@@ -38,6 +41,11 @@ __all__ = [
     "CIFAR10Mixed",
     "SSLDatasetMixin",
     "BinaryEMNIST",
+    "PackedImageDataset",
+    "write_packed_images",
+    "ShardedTarDataset",
+    "write_tar_shards",
+    "SharedImageCache",
 ]
 
 # TorchVision hotfix https://github.com/pytorch/vision/issues/1938
@@ -3,6 +3,7 @@ import os
 import shutil
 import tempfile
 from contextlib import contextmanager
+from typing import List, Optional, Tuple
 
 import numpy as np
 import torch
@@ -13,7 +14,8 @@ from pl_bolts.utils.stability import under_review
 from pl_bolts.utils.warnings import warn_missing_pkg
 
 if _TORCHVISION_AVAILABLE:
-    from torchvision.datasets import ImageNet
+    from torchvision.datasets import ImageNet, VisionDataset
+    from torchvision.datasets.folder import IMG_EXTENSIONS, default_loader
     from torchvision.datasets.imagenet import load_meta_file
 else:  # pragma: no cover
     warn_missing_pkg("torchvision")
@@ -37,6 +39,7 @@ class UnlabeledImagenet(ImageNet):
         num_imgs_per_class: int = -1,
         num_imgs_per_class_val_split: int = 50,
         meta_dir=None,
+        cache_dir: Optional[str] = None,
         **kwargs,
     ) -> None:
         """
@@ -46,6 +49,10 @@ class UnlabeledImagenet(ImageNet):
             num_classes: Sets the limit of classes
             num_imgs_per_class: Limits the number of images per class
             num_imgs_per_class_val_split: How many images per class to generate the val split
+            meta_dir: path to the folder with the meta.bin file
+            cache_dir: if set, the selected split is saved to this folder and later instances with the same
+                arguments and image folder load it instead of scanning the image folders. The cache is rebuilt when
+                images have been added to or removed from the folder.
             download:
             kwargs:
         """
@@ -69,63 +76,98 @@ class UnlabeledImagenet(ImageNet):
         meta_dir = meta_dir if meta_dir is not None else split_root
         wnid_to_classes = load_meta_file(meta_dir)[0]
 
-        super(ImageNet, self).__init__(self.split_folder, **kwargs)
+        split_folder = self.split_folder
+        cache_file = fingerprint = None
+        if cache_dir is not None:
+            # several datasets can share a cache folder, so the name of the cache identifies the split folder
+            folder_id = hashlib.md5(os.path.abspath(split_folder).encode()).hexdigest()[:12]
+            cache_name = f"{original_split}_c{num_classes}_n{num_imgs_per_class}_v{num_imgs_per_class_val_split}"
+            cache_file = os.path.join(os.path.expanduser(cache_dir), f"{cache_name}_{folder_id}.npz")
+            fingerprint = _folder_fingerprint(split_folder)
+
+        if cache_file is not None and os.path.isfile(cache_file) and _cached_fingerprint(cache_file) == fingerprint:
+            # skip the folder scan of ImageFolder and restore the split computed in a previous run
+            VisionDataset.__init__(
+                self,
+                split_folder,
+                transform=kwargs.get("transform"),
+                target_transform=kwargs.get("target_transform"),
+            )
+            self.loader = kwargs.get("loader", default_loader)
+            self.extensions = IMG_EXTENSIONS
+            cache = np.load(cache_file)
+            self.classes = cache["classes"].tolist()
+            self.class_to_idx = {cls_name: i for i, cls_name in enumerate(self.classes)}
+            paths = [os.path.join(split_folder, path) for path in np.char.decode(cache["paths"]).tolist()]
+            self.imgs = list(zip(paths, cache["labels"].tolist()))
+        else:
+            super(ImageNet, self).__init__(split_folder, **kwargs)
+            self.imgs = self._select_split(
+                original_split, split, num_classes, num_imgs_per_class, num_imgs_per_class_val_split
+            )
+            if cache_file is not None:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                paths = [os.path.relpath(path, split_folder) for path, _ in self.imgs]
+                np.savez(
+                    cache_file,
+                    classes=np.array(self.classes),
+                    paths=np.char.encode(np.array(paths, dtype=str)),
+                    labels=np.array([idx for _, idx in self.imgs], dtype=np.int64),
+                    fingerprint=np.array(fingerprint),
+                )
         self.root = root
 
+        # list of class_nbs for each image
+        idcs = [idx for _, idx in self.imgs]
+
+        self.wnids = self.classes
+        self.wnid_to_idx = {wnid: idx for idx, wnid in zip(idcs, self.wnids)}
+        self.classes = [wnid_to_classes[wnid] for wnid in self.wnids]
+        self.class_to_idx = {cls: idx for clss, idx in zip(self.classes, idcs) for cls in clss}
+
+        # update the root data
+        self.samples = self.imgs
+        self.targets = [s[1] for s in self.imgs]
+
+    def _select_split(
+        self,
+        original_split: str,
+        split: str,
+        num_classes: int,
+        num_imgs_per_class: int,
+        num_imgs_per_class_val_split: int,
+    ) -> List[Tuple[str, int]]:
+        """Selects the images of the split.
+
+        The selection is done on index arrays instead of the list of samples, which gives the same result as
+        shuffling and filtering the list in Python while scaling to the 1.28M images of the train split.
+
+        """
+        labels = np.asarray(self.targets, dtype=np.int64)
+
         # shuffle images first
-        np.random.seed(1234)
-        np.random.shuffle(self.imgs)
+        selected = np.random.RandomState(1234).permutation(len(labels))
 
         # partition train set into [train, val]
         if split == "train":
-            train, val = self.partition_train_set(self.imgs, num_imgs_per_class_val_split)
+            is_val = _rank_within_class(labels[selected]) < num_imgs_per_class_val_split
             if original_split == "train":
-                self.imgs = train
+                selected = selected[~is_val]
             if original_split == "val":
-                self.imgs = val
+                selected = selected[is_val]
 
         # limit the number of images in train or test set since the limit was already applied to the val set
         if split in ["train", "test"] and num_imgs_per_class != -1:
-            clean_imgs = []
-            cts = {x: 0 for x in range(len(self.classes))}
-            for img_name, idx in self.imgs:
-                if cts[idx] < num_imgs_per_class:
-                    clean_imgs.append((img_name, idx))
-                    cts[idx] += 1
-
-            self.imgs = clean_imgs
+            selected = selected[_rank_within_class(labels[selected]) < num_imgs_per_class]
 
         # limit the number of classes
         if num_classes != -1:
-            # choose the classes at random (but deterministic)
-            ok_classes = list(range(num_classes))
-            np.random.seed(1234)
-            np.random.shuffle(ok_classes)
-            ok_classes = ok_classes[:num_classes]
-            ok_classes = set(ok_classes)
-
-            clean_imgs = []
-            for img_name, idx in self.imgs:
-                if idx in ok_classes:
-                    clean_imgs.append((img_name, idx))
-
-            self.imgs = clean_imgs
+            selected = selected[labels[selected] < num_classes]
 
         # shuffle again for final exit
-        np.random.seed(1234)
-        np.random.shuffle(self.imgs)
-
-        # list of class_nbs for each image
-        idcs = [idx for _, idx in self.imgs]
-
-        self.wnids = self.classes
-        self.wnid_to_idx = {wnid: idx for idx, wnid in zip(idcs, self.wnids)}
-        self.classes = [wnid_to_classes[wnid] for wnid in self.wnids]
-        self.class_to_idx = {cls: idx for clss, idx in zip(self.classes, idcs) for cls in clss}
+        selected = selected[np.random.RandomState(1234).permutation(len(selected))]
 
-        # update the root data
-        self.samples = self.imgs
-        self.targets = [s[1] for s in self.imgs]
+        return [self.imgs[i] for i in selected]
 
     def partition_train_set(self, imgs, num_imgs_in_val):
         val = []
@@ -155,6 +197,31 @@ class UnlabeledImagenet(ImageNet):
         print(f"meta.bin generated at {devkit_dir}/meta.bin")
 
 
+def _folder_fingerprint(folder: str) -> str:
+    """Hashes the modification times of a split folder and of its class folders, which change whenever images are
+    added, removed or renamed."""
+    md5 = hashlib.md5()
+    with os.scandir(folder) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            md5.update(f"{entry.name}:{entry.stat().st_mtime_ns}\n".encode())
+    return md5.hexdigest()
+
+
+def _cached_fingerprint(cache_file: str) -> Optional[str]:
+    with np.load(cache_file) as cache:
+        return str(cache["fingerprint"]) if "fingerprint" in cache else None
+
+
+def _rank_within_class(labels: np.ndarray) -> np.ndarray:
+    """Returns, for every element, how many elements with the same label precede it."""
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    class_start = np.searchsorted(sorted_labels, sorted_labels, side="left")
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(labels)) - class_start
+    return ranks
+
+
 @under_review()
 def _verify_archive(root, file, md5):
     if not _check_integrity(os.path.join(root, file), md5):
@@ -4,6 +4,7 @@ from typing import Callable, Optional, Tuple
 import numpy as np
 from torch.utils.data import Dataset
 
+from pl_bolts.datasets.segmentation_cache import apply_lookup_table, label_lookup_table
 from pl_bolts.utils import _PIL_AVAILABLE
 from pl_bolts.utils.warnings import warn_missing_pkg
 
@@ -55,6 +56,7 @@ class KittiDataset(Dataset):
         self.void_labels = tuple(label for label in KITTI_LABELS if label not in self.valid_labels)
         self.ignore_index = 250
         self.class_map = dict(zip(self.valid_labels, range(len(self.valid_labels))))
+        self.label_lut = label_lookup_table(self.valid_labels, self.ignore_index)
         self.transform = transform
 
         self.data_dir = data_dir
@@ -86,14 +88,9 @@ class KittiDataset(Dataset):
 
         It also sets all of the valid pixels to the appropriate value between 0 and `len(valid_labels)` (the number of
         valid classes), so it can be used properly by the loss function when comparing with the output.
+        The remapping is a single lookup in :attr:`label_lut`.
         """
-        for voidc in self.void_labels:
-            mask[mask == voidc] = self.ignore_index
-        for validc in self.valid_labels:
-            mask[mask == validc] = self.class_map[validc]
-        # remove extra idxs from updated dataset
-        mask[mask > 33] = self.ignore_index
-        return mask
+        return apply_lookup_table(mask, self.label_lut, self.ignore_index)
 
     def get_filenames(self, path: str):
         """Returns a list of absolute paths to images inside given `path`"""
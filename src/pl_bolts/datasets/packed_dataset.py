@@ -0,0 +1,218 @@
+"""Packed storage of decoded images.
+
+Decoding JPEGs is often the most expensive part of an epoch on CPU-bound nodes. :func:`write_packed_images` decodes
+every image of a dataset once, optionally resizes it, and appends the raw ``uint8`` pixels to a few large shard files.
+An index with the shard, byte offset, shape and label of every image is written next to the shards. The
+:class:`PackedImageDataset` memory-maps the shards, so reading an image is a slice of the page cache instead of a file
+open and a decode.
+
+"""
+import os
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset, Sampler
+
+from pl_bolts.utils import _PIL_AVAILABLE
+from pl_bolts.utils.warnings import warn_missing_pkg
+
+if _PIL_AVAILABLE:
+    from PIL import Image
+else:  # pragma: no cover
+    warn_missing_pkg("PIL", pypi_name="Pillow")
+
+INDEX_FILE = "index.npy"
+SHARD_FILE = "shard-{:05d}.bin"
+INDEX_DTYPE = np.dtype(
+    [
+        ("shard", np.int32),
+        ("offset", np.int64),
+        ("height", np.int32),
+        ("width", np.int32),
+        ("channels", np.int32),
+        ("label", np.int64),
+    ]
+)
+
+
+class _DecodedImages(Dataset):
+    """Wraps a dataset of ``(PIL image, label)`` pairs and returns the decoded, resized pixels as an array."""
+
+    def __init__(self, dataset: Dataset, image_size: Optional[int]) -> None:
+        self.dataset = dataset
+        self.image_size = image_size
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, int]:
+        image, label = self.dataset[index]
+        if self.image_size is not None:
+            # resize the shorter side like ``transforms.Resize(image_size)``
+            width, height = image.size
+            scale = self.image_size / min(width, height)
+            size = (max(1, round(width * scale)), max(1, round(height * scale)))
+            image = image.resize(size, Image.BILINEAR)
+        pixels = np.asarray(image, dtype=np.uint8)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        return pixels, int(label)
+
+
+def _identity(sample: Any) -> Any:
+    return sample
+
+
+def write_packed_images(
+    dataset: Dataset,
+    root: str,
+    image_size: Optional[int] = None,
+    max_shard_bytes: int = 2**30,
+    num_workers: int = 0,
+) -> None:
+    """Decodes every image of ``dataset`` and writes the pixels to memory-mappable shards in ``root``.
+
+    The index file is written last, so an interrupted run never leaves a readable but incomplete pack behind.
+
+    Args:
+        dataset: a dataset returning ``(PIL image, label)`` pairs, e.g. a torchvision ``ImageFolder`` without
+            transforms. The images are stored in the order of the dataset.
+        root: output folder
+        image_size: if set, the shorter side of every image is resized to this size before it is stored
+        max_shard_bytes: a new shard file is started once the current one exceeds this size
+        num_workers: how many workers decode the images in parallel
+    """
+    os.makedirs(root, exist_ok=True)
+    loader = DataLoader(
+        _DecodedImages(dataset, image_size), batch_size=None, num_workers=num_workers, collate_fn=_identity
+    )
+
+    index = np.zeros(len(dataset), dtype=INDEX_DTYPE)
+    shard, offset = 0, 0
+    shard_file = open(os.path.join(root, SHARD_FILE.format(shard)), "wb")  # noqa: SIM115
+    try:
+        for i, (pixels, label) in enumerate(loader):
+            if offset > 0 and offset + pixels.nbytes > max_shard_bytes:
+                shard_file.close()
+                shard, offset = shard + 1, 0
+                shard_file = open(os.path.join(root, SHARD_FILE.format(shard)), "wb")  # noqa: SIM115
+            shard_file.write(np.ascontiguousarray(pixels).tobytes())
+            height, width, channels = pixels.shape
+            index[i] = (shard, offset, height, width, channels, label)
+            offset += pixels.nbytes
+    finally:
+        shard_file.close()
+
+    np.save(os.path.join(root, INDEX_FILE), index)
+
+
+def is_packed(root: str) -> bool:
+    """Returns whether ``root`` contains a complete pack written by :func:`write_packed_images`."""
+    return os.path.isfile(os.path.join(root, INDEX_FILE))
+
+
+class PackedImageDataset(Dataset):
+    """Dataset over the images written by :func:`write_packed_images`.
+
+    The shards are memory-mapped lazily in every worker, so the dataset is cheap to pickle and the operating system
+    page cache is shared between the workers. Images are returned as PIL images, so the usual torchvision transforms
+    apply unchanged, or as ``uint8`` ``[C, H, W]`` tensors with ``as_tensor=True``.
+
+    Args:
+        root: folder containing the shards and the index
+        transform: transform applied to the image
+        target_transform: transform applied to the label
+        as_tensor: return ``uint8`` tensors instead of PIL images
+
+    Example::
+
+        from pl_bolts.datasets import UnlabeledImagenet
+        from pl_bolts.datasets.packed_dataset import PackedImageDataset, write_packed_images
+
+        write_packed_images(UnlabeledImagenet(IMAGENET_PATH, split="val"), "packed/val", image_size=256)
+        dataset = PackedImageDataset("packed/val", transform=transforms.ToTensor())
+
+    """
+
+    def __init__(
+        self,
+        root: str,
+        transform: Optional[Callable] = None,
+        target_transform: Optional[Callable] = None,
+        as_tensor: bool = False,
+    ) -> None:
+        if not is_packed(root):
+            raise FileNotFoundError(f"No packed images found in {root}, use `write_packed_images` to create them.")
+
+        self.root = root
+        self.transform = transform
+        self.target_transform = target_transform
+        self.as_tensor = as_tensor
+        self.index = np.load(os.path.join(root, INDEX_FILE))
+        self.targets = self.index["label"].tolist()
+        self._shards: Dict[int, np.memmap] = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getstate__(self) -> dict:
+        # memory maps are reopened in every worker process
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def _shard(self, shard: int) -> np.memmap:
+        if shard not in self._shards:
+            self._shards[shard] = np.memmap(os.path.join(self.root, SHARD_FILE.format(shard)), dtype=np.uint8, mode="r")
+        return self._shards[shard]
+
+    def __getitem__(self, index: int) -> Tuple[Any, Any]:
+        shard, offset, height, width, channels, label = self.index[index].tolist()
+        pixels = self._shard(shard)[offset : offset + height * width * channels].reshape(height, width, channels)
+
+        if self.as_tensor:
+            image = torch.from_numpy(np.array(pixels)).permute(2, 0, 1)
+        else:
+            image = Image.fromarray(pixels[:, :, 0] if channels == 1 else pixels)
+
+        if self.transform is not None:
+            image = self.transform(image)
+        if self.target_transform is not None:
+            label = self.target_transform(label)
+        return image, label
+
+
+class BlockShuffleSampler(Sampler):
+    """Shuffles contiguous blocks of indices, then the indices within each block.
+
+    With a :class:`PackedImageDataset`, consecutive reads of a block hit neighbouring bytes of the same shard, which
+    keeps access close to sequential while the epoch order stays random at the block level. Since the packs are
+    written in the (already shuffled) order of the source dataset, blocks still mix classes.
+
+    Args:
+        data_source: the dataset to sample from
+        block_size: number of consecutive samples in a block
+        seed: base seed, combined with the epoch set through :meth:`set_epoch`
+    """
+
+    def __init__(self, data_source: Dataset, block_size: int = 1024, seed: int = 0) -> None:
+        self.data_source = data_source
+        self.block_size = block_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        return len(self.data_source)
+
+    def __iter__(self) -> Iterator[int]:
+        generator = torch.Generator().manual_seed(self.seed + self.epoch)
+        num_samples = len(self.data_source)
+        num_blocks = (num_samples + self.block_size - 1) // self.block_size
+        for block in torch.randperm(num_blocks, generator=generator).tolist():
+            start = block * self.block_size
+            length = min(self.block_size, num_samples - start)
+            yield from (start + torch.randperm(length, generator=generator)).tolist()
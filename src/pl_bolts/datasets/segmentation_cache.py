@@ -0,0 +1,206 @@
+"""Pre-resized, pre-encoded cache of segmentation samples.
+
+Segmentation datasets decode a full-resolution image and mask, resize both and remap the mask labels on every access.
+:func:`write_segmentation_cache` does this once and stores the resulting images and masks as two ``.npy`` arrays,
+which :class:`CachedSegmentationDataset` memory-maps, so reading a sample is a copy out of the page cache.
+
+"""
+import json
+import os
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from torch.utils.data import DataLoader, Dataset
+
+from pl_bolts.utils import _PIL_AVAILABLE
+from pl_bolts.utils.warnings import warn_missing_pkg
+
+if _PIL_AVAILABLE:
+    from PIL import Image
+else:  # pragma: no cover
+    warn_missing_pkg("PIL", pypi_name="Pillow")
+
+IMAGES_FILE = "images.npy"
+MASKS_FILE = "masks.npy"
+SETTINGS_FILE = "settings.json"
+
+
+def label_lookup_table(valid_labels: Sequence[int], ignore_index: int = 250) -> np.ndarray:
+    """Returns a 256 entry table mapping the ``i``-th of ``valid_labels`` to ``i`` and every other value to
+    ``ignore_index``, so ``table[mask]`` encodes a whole ``uint8`` mask in one pass."""
+    table = np.full(256, ignore_index, dtype=np.uint8)
+    table[list(valid_labels)] = np.arange(len(valid_labels))
+    return table
+
+
+def apply_lookup_table(mask: np.ndarray, table: np.ndarray, ignore_index: int = 250) -> np.ndarray:
+    """Maps every value of ``mask`` through ``table``, values outside of the table become ``ignore_index``."""
+    if mask.dtype == np.uint8:
+        return table[mask]
+    encoded = np.full(mask.shape, ignore_index, dtype=mask.dtype)
+    in_table = (mask >= 0) & (mask < len(table))
+    encoded[in_table] = table[mask[in_table]]
+    return encoded
+
+
+class _ResizedSamples(Dataset):
+    """Wraps a dataset of ``(image, mask)`` pairs and returns them resized and encoded as arrays."""
+
+    def __init__(self, dataset: Dataset, img_size: Optional[Tuple[int, int]], label_lut: Optional[np.ndarray]) -> None:
+        self.dataset = dataset
+        self.img_size = img_size
+        self.label_lut = label_lut
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __getitem__(self, index: int) -> Tuple[np.ndarray, np.ndarray]:
+        image, mask = self.dataset[index]
+        if self.img_size is not None:
+            image = image.resize(self.img_size, Image.BILINEAR)
+            mask = mask.resize(self.img_size, Image.NEAREST)
+        mask = np.asarray(mask)
+        if self.label_lut is not None:
+            mask = apply_lookup_table(mask, self.label_lut)
+        return np.asarray(image, dtype=np.uint8), mask
+
+
+def _identity(sample: Any) -> Any:
+    return sample
+
+
+def write_segmentation_cache(
+    dataset: Dataset,
+    root: str,
+    img_size: Optional[Tuple[int, int]] = None,
+    label_lut: Optional[np.ndarray] = None,
+    num_workers: int = 0,
+    settings: Optional[Dict[str, Any]] = None,
+) -> None:
+    """Writes the images and masks of ``dataset`` to a cache in ``root`` read by :class:`CachedSegmentationDataset`.
+
+    The arrays are written under temporary names and renamed once complete, so an interrupted run never leaves a
+    readable but incomplete cache behind.
+
+    Args:
+        dataset: a dataset returning ``(image, mask)`` pairs of the same size, either arrays that are already resized
+            and encoded (e.g. a :class:`~pl_bolts.datasets.KittiDataset` without transform) or PIL images
+        root: output folder
+        img_size: if set, images are resized bilinearly and masks with nearest neighbours to this ``(width, height)``,
+            the samples must be PIL images then
+        label_lut: if set, the masks are encoded with this lookup table, see :func:`label_lookup_table`
+        num_workers: how many workers read the samples in parallel
+        settings: JSON serializable options the samples were created with, stored next to the arrays so that
+            :func:`is_segmentation_cached` can tell a cache written with different options apart
+    """
+    os.makedirs(root, exist_ok=True)
+    # the settings of a previous cache must not survive next to the new arrays if the run is interrupted
+    settings_file = os.path.join(root, SETTINGS_FILE)
+    if os.path.isfile(settings_file):
+        os.remove(settings_file)
+    samples = _ResizedSamples(dataset, img_size, label_lut)
+    loader = DataLoader(samples, batch_size=None, num_workers=num_workers, collate_fn=_identity)
+
+    first_image, first_mask = samples[0]
+    images_tmp = os.path.join(root, IMAGES_FILE + ".tmp")
+    masks_tmp = os.path.join(root, MASKS_FILE + ".tmp")
+    images = np.lib.format.open_memmap(images_tmp, mode="w+", dtype=np.uint8, shape=(len(samples), *first_image.shape))
+    masks = np.lib.format.open_memmap(
+        masks_tmp, mode="w+", dtype=first_mask.dtype, shape=(len(samples), *first_mask.shape)
+    )
+    for i, (image, mask) in enumerate(loader):
+        images[i] = image
+        masks[i] = mask
+    images.flush()
+    masks.flush()
+    del images, masks
+
+    os.replace(masks_tmp, os.path.join(root, MASKS_FILE))
+    os.replace(images_tmp, os.path.join(root, IMAGES_FILE))
+    with open(settings_file, "w") as fp:
+        json.dump(settings, fp)
+
+
+def is_segmentation_cached(root: str, settings: Optional[Dict[str, Any]] = None) -> bool:
+    """Returns whether ``root`` contains a complete cache written by :func:`write_segmentation_cache`.
+
+    If ``settings`` is given, the cache must also have been written with the same settings.
+    """
+    if not all(os.path.isfile(os.path.join(root, name)) for name in (IMAGES_FILE, MASKS_FILE)):
+        return False
+    if settings is None:
+        return True
+    settings_file = os.path.join(root, SETTINGS_FILE)
+    if not os.path.isfile(settings_file):
+        return False
+    with open(settings_file) as fp:
+        # compare after a round trip, which turns tuples into lists
+        return json.load(fp) == json.loads(json.dumps(settings))
+
+
+class CachedSegmentationDataset(Dataset):
+    """Dataset over the samples written by :func:`write_segmentation_cache`.
+
+    The arrays are memory-mapped lazily in every worker. Images are returned as ``uint8`` ``[H, W, C]`` arrays and
+    masks as ``[H, W]`` arrays like :class:`~pl_bolts.datasets.KittiDataset`, or both as PIL images with
+    ``as_pil=True`` like the torchvision ``Cityscapes`` dataset.
+
+    Args:
+        root: folder containing the cache
+        transform: transform applied to the image
+        target_transform: transform applied to the mask
+        as_pil: return PIL images instead of arrays
+
+    Example::
+
+        from pl_bolts.datasets import KittiDataset
+        from pl_bolts.datasets.segmentation_cache import CachedSegmentationDataset, write_segmentation_cache
+
+        write_segmentation_cache(KittiDataset(PATH), "cache/kitti")
+        dataset = CachedSegmentationDataset("cache/kitti", transform=transforms.ToTensor())
+
+    """
+
+    def __init__(
+        self,
+        root: str,
+        transform: Optional[Callable] = None,
+        target_transform: Optional[Callable] = None,
+        as_pil: bool = False,
+    ) -> None:
+        if not is_segmentation_cached(root):
+            raise FileNotFoundError(f"No cached samples in {root}, use `write_segmentation_cache` to create them.")
+
+        self.root = root
+        self.transform = transform
+        self.target_transform = target_transform
+        self.as_pil = as_pil
+        self._images = None
+        self._masks = None
+        self._length = len(np.load(os.path.join(root, MASKS_FILE), mmap_mode="r"))
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getstate__(self) -> dict:
+        # memory maps are reopened in every worker process
+        state = self.__dict__.copy()
+        state["_images"] = state["_masks"] = None
+        return state
+
+    def __getitem__(self, index: int) -> Tuple[Any, Any]:
+        if self._images is None:
+            self._images = np.load(os.path.join(self.root, IMAGES_FILE), mmap_mode="r")
+            self._masks = np.load(os.path.join(self.root, MASKS_FILE), mmap_mode="r")
+
+        image = np.array(self._images[index])
+        mask = np.array(self._masks[index])
+        if self.as_pil:
+            image = Image.fromarray(image[:, :, 0] if image.shape[-1] == 1 else image)
+            mask = Image.fromarray(mask)
+
+        if self.transform is not None:
+            image = self.transform(image)
+        if self.target_transform is not None:
+            mask = self.target_transform(mask)
+        return image, mask
@@ -0,0 +1,324 @@
+"""Streaming dataset over sequential tar shards, in the spirit of WebDataset.
+
+Map-style datasets open one file per sample, which is slow on network filesystems and object-store mounts where the
+latency of an ``open`` dominates. :func:`write_tar_shards` converts any map-style dataset into a few large tar files
+and :class:`ShardedTarDataset` streams them back sequentially, so the throughput is bounded by the sequential read
+bandwidth of the storage instead.
+
+Every sample is stored as consecutive tar members sharing the same key, one member per field of the sample tuple, e.g.
+``000042.0.png`` and ``000042.1.cls`` for an ``(image, label)`` pair. A ``shards.json`` file lists the shards and the
+number of samples they contain.
+
+"""
+import io
+import json
+import os
+import pickle
+import random
+import tarfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch import Tensor
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
+
+from pl_bolts.utils import _PIL_AVAILABLE
+from pl_bolts.utils.warnings import warn_missing_pkg
+
+if _PIL_AVAILABLE:
+    from PIL import Image
+else:  # pragma: no cover
+    warn_missing_pkg("PIL", pypi_name="Pillow")
+
+SHARDS_FILE = "shards.json"
+SHARD_NAME = "shard-{:06d}.tar"
+_IMAGE_EXTENSIONS = ("png", "jpg", "jpeg")
+
+
+def _encode(value: Any, image_format: str) -> Tuple[str, bytes]:
+    """Serializes one field of a sample and returns the extension identifying its type and the payload."""
+    if _PIL_AVAILABLE and isinstance(value, Image.Image):
+        buffer = io.BytesIO()
+        value.save(buffer, format="JPEG" if image_format in ("jpg", "jpeg") else image_format.upper())
+        return image_format, buffer.getvalue()
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return "cls", str(int(value)).encode()
+    if isinstance(value, Tensor):
+        value = value.numpy()
+    if isinstance(value, np.ndarray):
+        buffer = io.BytesIO()
+        np.save(buffer, value, allow_pickle=False)
+        return "npy", buffer.getvalue()
+    return "pyd", pickle.dumps(value)
+
+
+def _decode(extension: str, payload: bytes) -> Any:
+    if extension in _IMAGE_EXTENSIONS:
+        image = Image.open(io.BytesIO(payload))
+        image.load()
+        return image
+    if extension == "cls":
+        return int(payload)
+    if extension == "npy":
+        return torch.from_numpy(np.load(io.BytesIO(payload), allow_pickle=False))
+    if extension == "pyd":
+        return pickle.loads(payload)  # noqa: S301
+    raise ValueError(f"Unsupported tar member extension: {extension}")
+
+
+def write_tar_shards(
+    dataset: Dataset,
+    root: str,
+    samples_per_shard: int = 10000,
+    image_format: str = "png",
+) -> List[str]:
+    """Converts a map-style dataset into tar shards that can be streamed by :class:`ShardedTarDataset`.
+
+    Works with any dataset returning tuples, e.g. a :class:`~pl_bolts.datasets.LightDataset` or the datasets of a
+    :class:`~pl_bolts.datamodules.vision_datamodule.VisionDataModule`. PIL images are encoded with ``image_format``,
+    integers are stored as class labels, tensors and arrays as ``.npy`` and anything else is pickled. To keep the
+    augmentations random, convert the dataset without transforms and pass them to the reader instead.
+
+    Args:
+        dataset: the dataset to convert
+        root: output folder
+        samples_per_shard: number of samples in every shard
+        image_format: ``"png"`` (lossless) or ``"jpg"``
+
+    Returns:
+        the paths of the written shards
+    """
+    os.makedirs(root, exist_ok=True)
+    shards, counts = [], []
+    tar = None
+    for index in range(len(dataset)):
+        if index % samples_per_shard == 0:
+            if tar is not None:
+                tar.close()
+            shards.append(SHARD_NAME.format(len(shards)))
+            counts.append(0)
+            tar = tarfile.open(os.path.join(root, shards[-1]), "w")  # noqa: SIM115
+
+        sample = dataset[index]
+        if not isinstance(sample, (tuple, list)):
+            sample = (sample,)
+        for field, value in enumerate(sample):
+            extension, payload = _encode(value, image_format)
+            info = tarfile.TarInfo(f"{index:09d}.{field}.{extension}")
+            info.size = len(payload)
+            tar.addfile(info, io.BytesIO(payload))
+        counts[-1] += 1
+    if tar is not None:
+        tar.close()
+
+    with open(os.path.join(root, SHARDS_FILE), "w") as fp:
+        json.dump({"shards": shards, "counts": counts}, fp)
+    return [os.path.join(root, shard) for shard in shards]
+
+
+def _read_shard(path: str) -> Iterator[List[Tuple[str, bytes]]]:
+    """Yields the raw ``(extension, payload)`` fields of every sample of a shard, in order."""
+    current_key, fields = None, []
+    with tarfile.open(path, "r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            key, field, extension = member.name.rsplit(".", 2)
+            if key != current_key and fields:
+                yield [value for _, value in sorted(fields)]
+                fields = []
+            current_key = key
+            fields.append((int(field), (extension, tar.extractfile(member).read())))
+    if fields:
+        yield [value for _, value in sorted(fields)]
+
+
+def _distributed_info() -> Tuple[int, int]:
+    if torch.distributed.is_available() and torch.distributed.is_initialized():
+        return torch.distributed.get_rank(), torch.distributed.get_world_size()
+    return 0, 1
+
+
+class ShardedTarDataset(IterableDataset):
+    """Streams samples from the tar shards written by :func:`write_tar_shards`.
+
+    Every epoch, the shards are shuffled with a seed shared by all processes and concatenated, and every rank reads a
+    contiguous range of ``len(dataset)`` samples of them, which the DataLoader workers split again. Every rank thus
+    yields the same number of samples, as distributed training requires, and the ``num_samples % world_size`` samples
+    left over are dropped for the epoch. Shards are read sequentially, and only by the workers whose range overlaps
+    them. Samples go through a shuffle buffer before they are decoded.
+
+    Lightning only calls ``set_epoch`` on samplers, add a :class:`~pl_bolts.callbacks.DatasetEpochCallback` to the
+    trainer to reshuffle the samples every epoch.
+
+    The order only depends on ``seed``, the epoch and the number of ranks and workers, which makes the iteration
+    resumable: :meth:`load_state_dict` skips the batches already consumed in the current epoch. The skip assumes the
+    DataLoader batches round-robin over its workers, which holds until the first worker runs out of samples.
+
+    Args:
+        root: folder containing the shards and ``shards.json``, or a list of shard paths. Without ``shards.json``,
+            the number of samples is unknown and the dataset can only be read by a single rank
+        transform: transform applied to the first field of every sample
+        target_transform: transform applied to the second field of every sample
+        shuffle: shuffle the shards and the samples
+        shuffle_buffer: number of samples in the shuffle buffer
+        seed: base seed for the shuffling, combined with the epoch
+        rank: rank of this process, read from ``torch.distributed`` by default
+        world_size: number of processes, read from ``torch.distributed`` by default
+
+    Example::
+
+        from pl_bolts.datasets.sharded_dataset import ShardedTarDataset, write_tar_shards
+
+        write_tar_shards(CIFAR10(PATH, train=True), "shards/train", samples_per_shard=5000)
+        dataset = ShardedTarDataset("shards/train", transform=transforms.ToTensor())
+        loader = DataLoader(dataset, batch_size=256, num_workers=8)
+
+    """
+
+    def __init__(
+        self,
+        root: Any,
+        transform: Optional[Callable] = None,
+        target_transform: Optional[Callable] = None,
+        shuffle: bool = True,
+        shuffle_buffer: int = 1000,
+        seed: int = 0,
+        rank: Optional[int] = None,
+        world_size: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        if isinstance(root, str):
+            with open(os.path.join(root, SHARDS_FILE)) as fp:
+                meta = json.load(fp)
+            self.shards = [os.path.join(root, shard) for shard in meta["shards"]]
+            self.counts: Optional[List[int]] = meta["counts"]
+            self.num_samples = sum(meta["counts"])
+        else:
+            self.shards = list(root)
+            self.counts = None
+            self.num_samples = None
+
+        self.transform = transform
+        self.target_transform = target_transform
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+        self._resume_batches = 0
+        self._resume_batch_size = 1
+
+    def __len__(self) -> int:
+        if self.num_samples is None:
+            raise TypeError("The length is only known when the shards are listed in a `shards.json` file.")
+        _, world_size = self._ranks()
+        return self.num_samples // world_size
+
+    def set_epoch(self, epoch: int) -> None:
+        if epoch != self.epoch:
+            # the batches skipped after load_state_dict belong to the resumed epoch only
+            self._resume_batches = 0
+            self._resume_batch_size = 1
+        self.epoch = epoch
+
+    def state_dict(self, num_batches: int, batch_size: int) -> Dict[str, int]:
+        """Returns the state to resume from after ``num_batches`` batches of ``batch_size`` of the current epoch."""
+        return {"epoch": self.epoch, "num_batches": num_batches, "batch_size": batch_size}
+
+    def load_state_dict(self, state: Dict[str, int]) -> None:
+        """Resumes the epoch of ``state``, the following epochs set with :meth:`set_epoch` run in full."""
+        self.epoch = state["epoch"]
+        self._resume_batches = state["num_batches"]
+        self._resume_batch_size = state["batch_size"]
+
+    def _ranks(self) -> Tuple[int, int]:
+        rank, world_size = _distributed_info()
+        return (
+            rank if self.rank is None else self.rank,
+            world_size if self.world_size is None else self.world_size,
+        )
+
+    def _worker_ranges(self) -> Tuple[List[Tuple[str, int, Optional[int], int]], int, int]:
+        """Returns the ``(shard, start, stop, stride)`` sample ranges of this worker, its part id and the number of
+        workers."""
+        rank, world_size = self._ranks()
+        worker_info = get_worker_info()
+        worker_id, num_workers = (0, 1) if worker_info is None else (worker_info.id, worker_info.num_workers)
+        # the DataLoader restarts its round-robin at worker 0, so after resuming, worker 0 takes over the part of the
+        # worker that was due to produce the next batch
+        worker_id = (worker_id + self._resume_batches) % num_workers
+
+        order = list(range(len(self.shards)))
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(order)
+
+        if self.counts is None:
+            if world_size > 1:
+                raise ValueError(
+                    "Splitting the samples evenly between ranks requires their number, pass the folder containing"
+                    " `shards.json` instead of a list of shards."
+                )
+            if len(order) >= num_workers:
+                return [(self.shards[i], 0, None, 1) for i in order[worker_id::num_workers]], worker_id, num_workers
+            return [(self.shards[i], worker_id, None, num_workers) for i in order], worker_id, num_workers
+
+        # sample range of this worker in the concatenation of the shuffled shards
+        per_rank = self.num_samples // world_size
+        start = rank * per_rank + per_rank * worker_id // num_workers
+        stop = rank * per_rank + per_rank * (worker_id + 1) // num_workers
+
+        ranges = []
+        offset = 0
+        for i in order:
+            count = self.counts[i]
+            if offset < stop and start < offset + count:
+                ranges.append((self.shards[i], max(start - offset, 0), min(stop - offset, count), 1))
+            offset += count
+        return ranges, worker_id, num_workers
+
+    def __iter__(self) -> Iterator[Any]:
+        ranges, worker_id, num_workers = self._worker_ranges()
+        rank, _ = self._ranks()
+
+        # with round-robin batching, this part produced every `num_workers`-th of the consumed batches
+        num_skip = len(range(worker_id, self._resume_batches, num_workers)) * self._resume_batch_size
+
+        def raw_samples() -> Iterator[List[Tuple[str, bytes]]]:
+            for shard, start, stop, stride in ranges:
+                for position, sample in enumerate(_read_shard(shard)):
+                    if stop is not None and position >= stop:
+                        break
+                    if position >= start and (position - start) % stride == 0:
+                        yield sample
+
+        samples = raw_samples()
+        if self.shuffle:
+            samples = self._shuffled(samples, random.Random(f"{self.seed}-{self.epoch}-{rank}-{worker_id}"))
+
+        for index, sample in enumerate(samples):
+            if index < num_skip:
+                continue
+            yield self._decode_sample(sample)
+
+    def _shuffled(self, samples: Iterator[Any], rng: random.Random) -> Iterator[Any]:
+        buffer = []
+        for sample in samples:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            idx = rng.randrange(len(buffer))
+            yield buffer[idx]
+            buffer[idx] = sample
+        rng.shuffle(buffer)
+        yield from buffer
+
+    def _decode_sample(self, fields: List[Tuple[str, bytes]]) -> Any:
+        sample = [_decode(extension, payload) for extension, payload in fields]
+        if self.transform is not None:
+            sample[0] = self.transform(sample[0])
+        if self.target_transform is not None and len(sample) > 1:
+            sample[1] = self.target_transform(sample[1])
+        return tuple(sample) if len(sample) > 1 else sample[0]
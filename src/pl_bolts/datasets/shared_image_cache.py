@@ -0,0 +1,145 @@
+"""Shared-memory cache of decoded images.
+
+Every DataLoader worker decodes the images of its own samples, so without a cache each worker decodes every image
+again in every epoch. :class:`SharedImageCache` keeps the decoded pixels in one shared memory block that the main
+process and all the workers map. The first worker that decodes an image stores it, and the other workers and later
+epochs read the pixels from the block.
+
+"""
+import contextlib
+import multiprocessing
+import os
+import shutil
+import weakref
+from multiprocessing import shared_memory
+from typing import Any, Optional
+
+import numpy as np
+
+_MISSING, _WRITING, _READY = 0, 1, 2
+_SHM_DIR = "/dev/shm"  # noqa: S108
+
+
+def _release(block: shared_memory.SharedMemory, owner: bool) -> None:
+    # If arrays that view the block are still alive, the mapping is released together with them.
+    with contextlib.suppress(BufferError):
+        block.close()
+    if owner:
+        block.unlink()
+
+
+class SharedImageCache:
+    """A fixed-size store of decoded ``uint8`` images in shared memory, indexed by the sample index.
+
+    The block holds a small header, with the state, the byte offset and the shape of every image, followed by the
+    pixel data. Space is allocated by bumping a shared offset under a lock, so the images are stored in the order
+    they are first decoded. When the block is full, further images are not cached and have to be decoded every time.
+
+    Create the cache in the main process, before the DataLoader workers are started. The cache is pickled by the name
+    of the shared memory block, so it works with both the "fork" and the "spawn" start methods, as long as
+    ``multiprocessing_context`` matches the one of the DataLoader. The block is removed when the cache object of the
+    main process is garbage collected.
+
+    Args:
+        num_images: number of samples in the dataset
+        capacity: size of the pixel data area in bytes. Pages are allocated only when they are written. On Linux, the
+            capacity is limited to half of the free space in ``/dev/shm``, because writing past the free space would
+            kill the process.
+        multiprocessing_context: start method of the worker processes, e.g. "spawn". By default, the default start
+            method of the platform.
+
+    Example::
+
+        cache = SharedImageCache(len(dataset), capacity=8 * 2**30)
+        pixels = cache.get(index)
+        if pixels is None:
+            pixels = np.asarray(Image.open(path).convert("RGB"))
+            cache.put(index, pixels)
+
+    """
+
+    def __init__(self, num_images: int, capacity: int, multiprocessing_context: Optional[str] = None) -> None:
+        if os.path.isdir(_SHM_DIR):
+            capacity = min(capacity, shutil.disk_usage(_SHM_DIR).free // 2)
+        self.num_images = num_images
+        self.capacity = capacity
+        # state (1 byte per image), padding to 8 bytes, offset and shape (4 x 8 bytes per image), next free offset
+        self._header_size = (num_images + 7) // 8 * 8 + num_images * 32 + 8
+        self._block = shared_memory.SharedMemory(create=True, size=self._header_size + capacity)
+        self._lock = multiprocessing.get_context(multiprocessing_context).Lock()
+        self._finalizer = weakref.finalize(self, _release, self._block, True)
+        self._map_views()
+
+    def _map_views(self) -> None:
+        buffer = self._block.buf
+        state_size = (self.num_images + 7) // 8 * 8
+        self._state = np.ndarray((self.num_images,), dtype=np.int8, buffer=buffer)
+        self._index = np.ndarray((self.num_images, 4), dtype=np.int64, buffer=buffer, offset=state_size)
+        self._next_offset = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=state_size + self.num_images * 32)
+        self._data = np.ndarray((self.capacity,), dtype=np.uint8, buffer=buffer, offset=self._header_size)
+
+    def __getstate__(self) -> dict:
+        return {
+            "num_images": self.num_images,
+            "capacity": self.capacity,
+            "_header_size": self._header_size,
+            "_name": self._block.name,
+            "_lock": self._lock,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        name = state.pop("_name")
+        self.__dict__.update(state)
+        # Worker processes share the resource tracker of the main process, so attaching registers the same name again
+        # and the block is still unlinked only once, by the main process.
+        self._block = shared_memory.SharedMemory(name=name)
+        self._finalizer = weakref.finalize(self, _release, self._block, False)
+        self._map_views()
+
+    def __len__(self) -> int:
+        """Number of cached images."""
+        return int(np.count_nonzero(self._state == _READY))
+
+    @property
+    def used_bytes(self) -> int:
+        return int(self._next_offset[0])
+
+    def get(self, index: int) -> Optional[np.ndarray]:
+        """Returns the ``[height, width, channels]`` pixels of an image, or ``None`` if the image is not cached.
+
+        The array is a read-only view into the shared memory block.
+        """
+        if self._state[index] != _READY:
+            return None
+        offset, height, width, channels = self._index[index].tolist()
+        pixels = self._data[offset : offset + height * width * channels].reshape(height, width, channels)
+        pixels.flags.writeable = False
+        return pixels
+
+    def put(self, index: int, pixels: Any) -> bool:
+        """Stores the pixels of an image, unless the image is already cached or there's not enough space left.
+
+        Args:
+            index: index of the sample
+            pixels: a ``uint8`` array of shape ``[height, width]`` or ``[height, width, channels]``
+
+        Returns:
+            ``True`` if the image was stored.
+
+        """
+        pixels = np.asarray(pixels, dtype=np.uint8)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        with self._lock:
+            if self._state[index] != _MISSING:
+                return False
+            offset = int(self._next_offset[0])
+            if offset + pixels.nbytes > self.capacity:
+                return False
+            self._next_offset[0] = offset + pixels.nbytes
+            self._state[index] = _WRITING
+
+        self._data[offset : offset + pixels.nbytes] = pixels.reshape(-1)
+        self._index[index] = (offset, *pixels.shape)
+        self._state[index] = _READY
+        return True
@@ -1,5 +1,5 @@
 """Adapted from: https://github.com/https-deeplearning-ai/GANs-Public."""
-from typing import Any, Tuple
+from typing import Any, Tuple, Union
 
 import torch
 
@@ -24,10 +24,22 @@ class SRDatasetMixin:
 
     Scales range of high resolution images to [-1, 1] and range or low resolution images to [0, 1].
 
+    With ``hr_only=True`` only the high resolution images are returned, the low resolution images are then created
+    for the whole batch by :class:`~pl_bolts.transforms.sr_transforms.SRBatchDownsample`.
+
     """
 
-    def __init__(self, hr_image_size: int, lr_image_size: int, image_channels: int, *args: Any, **kwargs: Any) -> None:
+    def __init__(
+        self,
+        hr_image_size: int,
+        lr_image_size: int,
+        image_channels: int,
+        *args: Any,
+        hr_only: bool = False,
+        **kwargs: Any,
+    ) -> None:
         super().__init__(*args, **kwargs)
+        self.hr_only = hr_only
 
         self.hr_transforms = transform_lib.Compose(
             [
@@ -46,10 +58,12 @@ class SRDatasetMixin:
             ]
         )
 
-    def __getitem__(self, index: int) -> Tuple[torch.Tensor, torch.Tensor]:
+    def __getitem__(self, index: int) -> Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
         image = self._get_image(index)
 
         hr_image = self.hr_transforms(image)
+        if self.hr_only:
+            return hr_image
         lr_image = self.lr_transforms(hr_image)
 
         return hr_image, lr_image
@@ -15,13 +15,15 @@ from pl_bolts.utils.types import TArrays
 
 
 @under_review()
-def prepare_sr_datasets(dataset: str, scale_factor: int, data_dir: str):
+def prepare_sr_datasets(dataset: str, scale_factor: int, data_dir: str, hr_only: bool = False):
     """Creates train, val, and test datasets for training a Super Resolution GAN.
 
     Args:
         dataset: string indicating which dataset class to use (celeba, mnist, or stl10).
         scale_factor: scale factor between low- and high resolution images.
         data_dir: root dir of dataset.
+        hr_only: if true, the datasets only return the high resolution images, see
+            :class:`~pl_bolts.transforms.sr_transforms.SRBatchDownsample`.
 
     Returns:
         sr_datasets: tuple containing train, val, and test dataset.
@@ -31,21 +33,21 @@ def prepare_sr_datasets(dataset: str, scale_factor: int, data_dir: str):
 
     if dataset == "celeba":
         dataset_cls = SRCelebA
-        dataset_train = dataset_cls(scale_factor, root=data_dir, split="train", download=True)
-        dataset_val = dataset_cls(scale_factor, root=data_dir, split="valid", download=True)
-        dataset_test = dataset_cls(scale_factor, root=data_dir, split="test", download=True)
+        dataset_train = dataset_cls(scale_factor, root=data_dir, split="train", download=True, hr_only=hr_only)
+        dataset_val = dataset_cls(scale_factor, root=data_dir, split="valid", download=True, hr_only=hr_only)
+        dataset_test = dataset_cls(scale_factor, root=data_dir, split="test", download=True, hr_only=hr_only)
 
     elif dataset == "mnist":
         dataset_cls = SRMNIST
-        dataset_dev = dataset_cls(scale_factor, root=data_dir, train=True, download=True)
+        dataset_dev = dataset_cls(scale_factor, root=data_dir, train=True, download=True, hr_only=hr_only)
         dataset_train, dataset_val = random_split(dataset_dev, lengths=[55_000, 5_000])
-        dataset_test = dataset_cls(scale_factor, root=data_dir, train=False, download=True)
+        dataset_test = dataset_cls(scale_factor, root=data_dir, train=False, download=True, hr_only=hr_only)
 
     elif dataset == "stl10":
         dataset_cls = SRSTL10
-        dataset_dev = dataset_cls(scale_factor, root=data_dir, split="train", download=True)
+        dataset_dev = dataset_cls(scale_factor, root=data_dir, split="train", download=True, hr_only=hr_only)
         dataset_train, dataset_val = random_split(dataset_dev, lengths=[4_500, 500])
-        dataset_test = dataset_cls(scale_factor, root=data_dir, split="test", download=True)
+        dataset_test = dataset_cls(scale_factor, root=data_dir, split="test", download=True, hr_only=hr_only)
 
     return (dataset_train, dataset_val, dataset_test)
 
@@ -3,32 +3,45 @@ import torch
 from torch import nn
 
 from pl_bolts.models.vision.pixel_cnn import PixelCNN
+from pl_bolts.utils.fast_path import float32_region
 from pl_bolts.utils.stability import under_review
 
 
 @under_review()
 def nt_xent_loss(out_1, out_2, temperature):
-    """Loss used in SimCLR."""
-    out = torch.cat([out_1, out_2], dim=0)
-    n_samples = len(out)
+    """Loss used in SimCLR.
 
-    # Full similarity matrix
-    cov = torch.mm(out, out.t().contiguous())
-    sim = torch.exp(cov / temperature)
+    The similarities and their exponentials are computed in float32, also under autocast.
+    """
+    with float32_region(out_1):
+        out_1, out_2 = out_1.float(), out_2.float()
+        out = torch.cat([out_1, out_2], dim=0)
+        n_samples = len(out)
+
+        # Full similarity matrix
+        cov = torch.mm(out, out.t().contiguous())
+        sim = torch.exp(cov / temperature)
 
-    # Negative similarity
-    mask = ~torch.eye(n_samples, device=sim.device).bool()
-    neg = sim.masked_select(mask).view(n_samples, -1).sum(dim=-1)
+        # Negative similarity
+        mask = ~torch.eye(n_samples, device=sim.device).bool()
+        neg = sim.masked_select(mask).view(n_samples, -1).sum(dim=-1)
 
-    # Positive similarity :
-    pos = torch.exp(torch.sum(out_1 * out_2, dim=-1) / temperature)
-    pos = torch.cat([pos, pos], dim=0)
-    return -torch.log(pos / neg).mean()
+        # Positive similarity :
+        pos = torch.exp(torch.sum(out_1 * out_2, dim=-1) / temperature)
+        pos = torch.cat([pos, pos], dim=0)
+        return -torch.log(pos / neg).mean()
 
 
 @under_review()
 class CPCTask(nn.Module):
-    """Loss used in CPC."""
+    """Loss used in CPC.
+
+    Every context vector predicts the target vectors below it, at every offset ``i + 1`` for ``i`` in ``1, ..., h - 1``.
+    The loss of offset ``i`` is an InfoNCE loss, where the scores of a prediction against all the target vectors of the
+    batch are the logits and the target ``i + 1`` rows below is the positive. Offset ``i`` is weighted by ``i``, which
+    is how many times it's counted by a loop over the number of rows to skip and the offsets after them.
+
+    """
 
     def __init__(self, num_input_channels, target_dim=64, embed_scale=0.1) -> None:
         super().__init__()
@@ -38,13 +51,39 @@ class CPCTask(nn.Module):
         self.target_cnn = torch.nn.Conv2d(num_input_channels, self.target_dim, kernel_size=1)
         self.pred_cnn = torch.nn.Conv2d(num_input_channels, self.target_dim, kernel_size=1)
         self.context_cnn = PixelCNN(num_input_channels)
+        self._label_cache = {}
+
+    def _labels(self, b, h, w, device):
+        """Returns the indices of the positive (prediction, target) pairs of all the offsets, the offset of every pair,
+        and the number of pairs and the weight of every offset.
+
+        The indices depend only on the shape of the feature map, so they're created once per shape and device.
+
+        """
+        key = (b, h, w, device)
+        if key not in self._label_cache:
+            rows, offsets = [], []
+            for i in range(1, h):
+                # the predictions of rows 0 ... h - i - 2 have a positive i + 1 rows below them
+                n = b * (h - i - 1) * w
+                b1 = torch.arange(n, device=device) // ((h - i - 1) * w)
+                c1 = torch.arange(n, device=device) % ((h - i - 1) * w)
+                rows.append(b1 * h * w + c1)
+                offsets.append(torch.full((n,), i, dtype=torch.long, device=device))
+            rows = torch.cat(rows)
+            offsets = torch.cat(offsets)
+            cols = rows + (offsets + 1) * w
+            counts = torch.bincount(offsets, minlength=h).float()
+            weights = torch.arange(h, device=device, dtype=torch.float)
+            self._label_cache[key] = (rows, cols, offsets, counts, weights)
+        return self._label_cache[key]
 
     def compute_loss_h(self, targets, preds, i):
         b, c, h, w = targets.shape
 
         # (b, c, h, w) -> (num_vectors, emb_dim)
         # every vector (c-dim) is a target
-        targets = targets.permute(0, 2, 3, 1).contiguous().reshape([-1, c])
+        targets = targets.permute(0, 2, 3, 1).reshape([-1, c])
 
         # select the future (south) targets to predict
         # selects all of the ones south of the current source
@@ -52,38 +91,43 @@ class CPCTask(nn.Module):
 
         # (b, c, h, w) -> (b*w*h, c) (all features)
         # this ordering matches the targets
-        preds_i = preds_i.permute(0, 2, 3, 1).contiguous().reshape([-1, self.target_dim])
+        preds_i = preds_i.permute(0, 2, 3, 1).reshape([-1, self.target_dim])
 
         # calculate the strength scores
         logits = torch.matmul(preds_i, targets.transpose(-1, -2))
 
         # generate the labels
-        n = b * (h - i - 1) * w
-        b1 = torch.arange(n) // ((h - i - 1) * w)
-        c1 = torch.arange(n) % ((h - i - 1) * w)
-        labels = b1 * h * w + (i + 1) * w + c1
-        labels = labels.to(logits.device)
-        labels = labels.long()
+        rows, cols, offsets, _, _ = self._labels(b, h, w, logits.device)
+        labels = cols[offsets == i]
 
         return nn.functional.cross_entropy(logits, labels)
 
     def forward(self, z):
-        losses = []
-
         context = self.context_cnn(z)
         targets = self.target_cnn(z)
 
-        _, _, h, w = z.shape
-
         # future prediction
         preds = self.pred_cnn(context)
-        for steps_to_ignore in range(h - 1):
-            for i in range(steps_to_ignore + 1, h):
-                loss = self.compute_loss_h(targets, preds, i)
-                if not torch.isnan(loss):
-                    losses.append(loss)
+        return self._info_nce_loss(targets, preds)
 
-        return torch.stack(losses).sum()
+    def _info_nce_loss(self, targets, preds):
+        b, _, h, w = targets.shape
+        # the scores and the log-softmax are computed in float32, also under autocast
+        preds = preds.float() * self.embed_scale
+
+        # The logits of a prediction against all the targets don't depend on the offset, so the scores and their
+        # log-softmax are calculated once, and the loss of every offset is a mean over the positive pairs.
+        preds = preds.permute(0, 2, 3, 1).reshape([-1, self.target_dim])
+        targets = targets.float().permute(0, 2, 3, 1).reshape([-1, self.target_dim])
+        with float32_region(preds):
+            log_probs = torch.log_softmax(torch.matmul(preds, targets.t()), dim=-1)
+
+        rows, cols, offsets, counts, weights = self._labels(b, h, w, log_probs.device)
+        nll_sums = log_probs.new_zeros(h).index_add_(0, offsets, -log_probs[rows, cols])
+        losses = nll_sums / counts
+
+        # The offsets that have no predictions and the losses that aren't finite are left out of the sum.
+        return torch.nansum(losses * weights)
 
 
 @under_review()
@@ -93,26 +137,41 @@ class AmdimNCELoss(nn.Module):
     def __init__(self, tclip) -> None:
         super().__init__()
         self.tclip = tclip
+        self._diagonal_masks = {}
 
-    def forward(self, anchor_representations, positive_representations, mask_mat):
+    def _diagonal_mask(self, batch_size, device):
+        # (b, b, 1) boolean matrix with ones in the diagonal, cached per batch size and device
+        key = (batch_size, device)
+        if key not in self._diagonal_masks:
+            self._diagonal_masks[key] = torch.eye(batch_size, dtype=torch.bool, device=device).unsqueeze(2)
+        return self._diagonal_masks[key]
+
+    def forward(self, anchor_representations, positive_representations, mask_mat=None):
         """
         Args:
             anchor_representations: (batch_size, emb_dim)
             positive_representations: (emb_dim, n_batch * w* h) (ie: num_feat_vectors x embedding_dim)
-            mask_mat: (n_batch_gpu, n_batch)
+            mask_mat: (n_batch_gpu, n_batch), ones for the positive pairs. ``None`` means that the positives are in
+                the diagonal, which is computed without dense masks.
 
         Output:
             raw_scores: (n_batch_gpu, n_locs)
             nce_scores: (n_batch_gpu, n_locs)
             lgt_reg : scalar
+
+        The scores are computed in float32, also under autocast.
         """
-        r_src = anchor_representations
-        r_trg = positive_representations
+        with float32_region(anchor_representations):
+            return self._nce(anchor_representations.float(), positive_representations.float(), mask_mat)
 
+    def _nce(self, r_src, r_trg, mask_mat):
         # RKHS = embedding dim
         batch_size, emb_dim = r_src.size()
         num_feat_vectors = r_trg.size(1) // batch_size
 
+        if mask_mat is None:
+            return self._diagonal_nce(r_src, r_trg, batch_size, emb_dim, num_feat_vectors)
+
         # (b, b) -> (b, b, num_feat_vectors)
         # all zeros with ones in diagonal tensor... (ie: b1 b1 are all 1s, b1 b2 are all zeros)
         mask_pos = mask_mat.unsqueeze(dim=2).expand(-1, -1, num_feat_vectors).float()
@@ -125,7 +184,7 @@ class AmdimNCELoss(nn.Module):
         # compute src->trg raw scores for batch
         # (b, dim) x (dim, num_feats*b) -> (b, b, num_feats)
         # vector for each img in batch times all the vectors of all images in batch
-        raw_scores = torch.mm(r_src, r_trg).float()
+        raw_scores = torch.mm(r_src, r_trg)
         raw_scores = raw_scores.reshape(batch_size, batch_size, num_feat_vectors)
 
         # -----------------------
@@ -177,6 +236,39 @@ class AmdimNCELoss(nn.Module):
 
         return nce_scores, lgt_reg
 
+    def _diagonal_nce(self, r_src, r_trg, batch_size, emb_dim, num_feat_vectors):
+        """Same as ``forward`` with an identity ``mask_mat``, without the dense ``(b, b, num_feat_vectors)`` masks."""
+        raw_scores = torch.mm(r_src, r_trg)
+        raw_scores = raw_scores.reshape(batch_size, batch_size, num_feat_vectors)
+
+        # STABILITY TRICKS
+        raw_scores = raw_scores / emb_dim**0.5
+        lgt_reg = 5e-2 * (raw_scores**2.0).mean()
+        raw_scores = tanh_clip(raw_scores, clip_val=self.tclip)
+
+        # EXTRACT POSITIVE SCORES
+        # the diagonal b1 x b1 is a strided view, (num_feat_vectors, batch_size) -> (batch_size, num_feat_vectors)
+        pos_scores = raw_scores.diagonal(dim1=0, dim2=1).t()
+
+        # EXTRACT NEGATIVE SCORES
+        # The positives don't contribute to the denominator. They take part in the max with the score -tclip.
+        neg_scores = raw_scores.masked_fill(self._diagonal_mask(batch_size, raw_scores.device), float("-inf"))
+        neg_scores = neg_scores.reshape(batch_size, -1)
+        neg_maxes = torch.max(neg_scores, dim=1, keepdim=True)[0].clamp(min=-self.tclip)
+
+        # DENOMINATOR
+        neg_sumexp = torch.exp(neg_scores - neg_maxes).sum(dim=1, keepdim=True)
+        all_logsumexp = torch.log(torch.exp(pos_scores - neg_maxes) + neg_sumexp)
+
+        # NUMERATOR
+        pos_shiftexp = pos_scores - neg_maxes
+
+        # FULL NCE
+        nce_scores = pos_shiftexp - all_logsumexp
+        nce_scores = -nce_scores.mean()
+
+        return nce_scores, lgt_reg
+
 
 @under_review()
 class FeatureMapContrastiveTask(nn.Module):
@@ -251,10 +343,8 @@ class FeatureMapContrastiveTask(nn.Module):
         return map_indexes
 
     def feat_size_w_mask(self, w, feature_map):
-        masks_r5 = torch.zeros((w, w, 1, w, w), device=feature_map.device).type(torch.bool)
-        for i in range(w):
-            for j in range(w):
-                masks_r5[i, j, 0, i, j] = 1
+        # mask i * w + j selects the location (i, j)
+        masks_r5 = torch.eye(w * w, dtype=torch.bool, device=feature_map.device)
         return masks_r5.reshape(-1, 1, w, w)
 
     def _sample_src_ftr(self, r_cnv, masks):
@@ -263,10 +353,10 @@ class FeatureMapContrastiveTask(nn.Module):
         feat_dim = r_cnv.size(1)
 
         if masks is not None:
-            # subsample from conv-ish r_cnv to get a single vector
+            # subsample from conv-ish r_cnv to get a single vector. Mask i selects the location i of the flattened
+            # feature map, so the vectors are gathered from the flat locations, without a data-dependent mask selection.
             mask_idx = torch.randint(0, masks.size(0), (n_batch,), device=r_cnv.device)
-            mask = masks[mask_idx]
-            r_cnv = torch.masked_select(r_cnv, mask)
+            r_cnv = r_cnv.flatten(2).gather(2, mask_idx.view(-1, 1, 1).expand(-1, feat_dim, 1))
 
         # flatten features for use as globals in glb->lcl nce cost
         return r_cnv.reshape(n_batch, feat_dim)
@@ -292,12 +382,8 @@ class FeatureMapContrastiveTask(nn.Module):
         # (b, c, h, w) -> (c, b * h * w)
         tgt = m2.permute(1, 0, 2, 3).reshape(c, -1)
 
-        # make masking matrix to help compute nce costs
-        # (b x b) zero matrix with 1s in the diag
-        diag_mat = torch.eye(b, device=m1.device)
-
-        # compare
-        loss, regularizer = self.nce_loss(src, tgt, diag_mat)
+        # compare, the positives are in the (b x b) diagonal
+        loss, regularizer = self.nce_loss(src, tgt)
 
         return loss, regularizer
 
@@ -364,5 +450,11 @@ class FeatureMapContrastiveTask(nn.Module):
 
 @under_review()
 def tanh_clip(x, clip_val=10.0):
-    """Soft clip values to the range [-clip_val, +clip_val]"""
-    return clip_val * torch.tanh(1.0 / clip_val * x) if clip_val is not None else x
+    """Soft clip values to the range [-clip_val, +clip_val]
+
+    Half precision inputs are clipped in float32 and the result is cast back to their dtype.
+    """
+    if clip_val is None:
+        return x
+    with float32_region(x):
+        return (clip_val * torch.tanh(1.0 / clip_val * x.float())).to(x.dtype)
@@ -2,6 +2,7 @@ from pl_bolts.models.detection import components
 from pl_bolts.models.detection.faster_rcnn import FasterRCNN
 from pl_bolts.models.detection.retinanet import RetinaNet
 from pl_bolts.models.detection.yolo.darknet_network import DarknetNetwork
+from pl_bolts.models.detection.yolo.predictor import YOLOPredictor
 from pl_bolts.models.detection.yolo.torch_networks import (
     YOLOV4Backbone,
     YOLOV4Network,
@@ -32,4 +33,5 @@ __all__ = [
     "YOLOV7Network",
     "YOLOXNetwork",
     "YOLO",
+    "YOLOPredictor",
 ]
@@ -4,6 +4,7 @@ from typing import Any, Optional, Union
 import torch
 from pytorch_lightning import LightningModule, Trainer, seed_everything
 
+from pl_bolts.datamodules.detection_collate import unpack_detection_batch
 from pl_bolts.models.detection.faster_rcnn import create_fasterrcnn_backbone
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
@@ -43,6 +44,8 @@ class FasterRCNN(LightningModule):
         - boxes (`FloatTensor[N, 4]`): the ground truth boxes in `[x1, y1, x2, y2]` format.
         - labels (`Int64Tensor[N]`): the class label for each ground truh box
 
+    The batches can also be packed with :class:`~pl_bolts.datamodules.detection_collate.DetectionCollate`.
+
     CLI command::
 
         # PascalVOC
@@ -113,8 +116,7 @@ class FasterRCNN(LightningModule):
         return self.model(x)
 
     def training_step(self, batch, batch_idx):
-        images, targets = batch
-        targets = [dict(t.items()) for t in targets]
+        images, targets = unpack_detection_batch(*batch)
 
         # fasterrcnn takes both images and targets for training, returns
         loss_dict = self.model(images, targets)
@@ -122,7 +124,7 @@ class FasterRCNN(LightningModule):
         return {"loss": loss, "log": loss_dict}
 
     def validation_step(self, batch, batch_idx):
-        images, targets = batch
+        images, targets = unpack_detection_batch(*batch)
         # fasterrcnn takes only images for eval() mode
         outs = self.model(images)
         iou = torch.stack([_evaluate_iou(t, o) for t, o in zip(targets, outs)]).mean()
@@ -3,6 +3,7 @@ from typing import Any, Optional
 import torch
 from pytorch_lightning import LightningModule
 
+from pl_bolts.datamodules.detection_collate import unpack_detection_batch
 from pl_bolts.models.detection.retinanet import create_retinanet_backbone
 from pl_bolts.utils import _TORCHVISION_AVAILABLE, _TORCHVISION_LESS_THAN_0_13
 from pl_bolts.utils.stability import under_review
@@ -31,6 +32,8 @@ class RetinaNet(LightningModule):
         - boxes (`FloatTensor[N, 4]`): the ground truth boxes in `[x1, y1, x2, y2]` format.
         - labels (`Int64Tensor[N]`): the class label for each ground truh box
 
+    The batches can also be packed with :class:`~pl_bolts.datamodules.detection_collate.DetectionCollate`.
+
     CLI command::
 
         # PascalVOC using LightningCLI
@@ -97,8 +100,7 @@ class RetinaNet(LightningModule):
         return self.model(x)
 
     def training_step(self, batch, batch_idx):
-        images, targets = batch
-        targets = [dict(t.items()) for t in targets]
+        images, targets = unpack_detection_batch(*batch)
 
         # fasterrcnn takes both images and targets for training, returns
         loss_dict = self.model(images, targets)
@@ -107,7 +109,7 @@ class RetinaNet(LightningModule):
         return loss
 
     def validation_step(self, batch, batch_idx):
-        images, targets = batch
+        images, targets = unpack_detection_batch(*batch)
         # fasterrcnn takes only images for eval() mode
         preds = self.model(images)
         iou = torch.stack([self._evaluate_iou(p, t) for p, t in zip(preds, targets)]).mean()
@@ -1,5 +1,8 @@
 import io
+import os
 import re
+from copy import deepcopy
+from functools import lru_cache
 from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from warnings import warn
 
@@ -17,11 +20,12 @@ from torch import Tensor
 
 from .layers import Conv, DetectionLayer, MaxPool, RouteLayer, ShortcutLayer, create_detection_layer
 from .torch_networks import NETWORK_OUTPUT
-from .types import TARGETS
+from .types import TARGET, TARGETS
 from .utils import get_image_size
 
 CONFIG = Dict[str, Any]
 CREATE_LAYER_OUTPUT = Tuple[nn.Module, int]  # layer, num_outputs
+WEIGHT_OFFSET = Tuple[int, str, int, int]  # layer index, tensor name, offset, number of elements
 
 
 class DarknetNetwork(nn.Module):
@@ -65,8 +69,7 @@ class DarknetNetwork(nn.Module):
     ) -> None:
         super().__init__()
 
-        with open(config_path) as config_file:
-            sections = self._read_config(config_file)
+        sections = _read_config_file(config_path)
 
         if len(sections) < 2:
             raise MisconfigurationException("The model configuration file should include at least two sections.")
@@ -90,10 +93,9 @@ class DarknetNetwork(nn.Module):
             num_inputs.append(num_outputs)
 
         if weights_path is not None:
-            with open(weights_path) as weight_file:
-                self.load_weights(weight_file)
+            self.load_weights(weights_path)
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         outputs: List[Tensor] = []  # Outputs from all layers
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
@@ -118,43 +120,76 @@ class DarknetNetwork(nn.Module):
 
         return detections, losses, hits
 
-    def load_weights(self, weight_file: io.IOBase) -> None:
+    def load_weights(
+        self, weight_file: Union[str, "os.PathLike[str]", io.IOBase], layers: Optional[Iterable[int]] = None
+    ) -> None:
         """Loads weights to layer modules from a pretrained Darknet model.
 
+        A weight file is memory-mapped and every tensor is copied directly from its position in the file, which is
+        looked up in :meth:`weight_offsets`. A file-like object is read into memory with one read.
+
         One may want to continue training from pretrained weights, on a dataset with a different number of object
         categories. The number of kernels in the convolutional layers just before each detection layer depends on the
         number of output classes. The Darknet solution is to truncate the weight file and stop reading weights at the
         first incompatible layer. For this reason the function silently leaves the rest of the layers unchanged, when
-        the weight file ends.
+        the weight file ends. Alternatively, ``layers`` selects the layers to load and leaves the rest unchanged.
 
         Args:
-            weight_file: A file-like object containing model weights in the Darknet binary format.
+            weight_file: A path to a Darknet model file, or a file-like object containing model weights in the Darknet
+                binary format.
+            layers: Indices of the layers (in ``self.layers``) whose weights will be loaded. By default, all the
+                convolutional layers are loaded.
 
         """
-        if not isinstance(weight_file, io.IOBase):
-            raise ValueError("weight_file must be a file-like object.")
-
-        version = np.fromfile(weight_file, count=3, dtype=np.int32)
-        images_seen = np.fromfile(weight_file, count=1, dtype=np.int64)
+        if isinstance(weight_file, (str, os.PathLike)):
+            # Copy-on-write mapping gives writable arrays that can be wrapped as tensors without copying the file.
+            data = np.memmap(weight_file, dtype=np.uint8, mode="c")
+        elif isinstance(weight_file, io.IOBase):
+            try:
+                weight_file.fileno()
+                data = np.fromfile(weight_file, dtype=np.uint8)
+            except (OSError, io.UnsupportedOperation):
+                data = np.frombuffer(bytearray(weight_file.read()), dtype=np.uint8)
+        else:
+            raise ValueError("weight_file must be a path or a file-like object.")
+
+        version, images_seen, header_size = _read_weights_header(data)
         rank_zero_info(
             f"Loading weights from Darknet model version {version[0]}.{version[1]}.{version[2]} "
-            f"that has been trained on {images_seen[0]} images."
+            f"that has been trained on {images_seen} images."
         )
+        num_elements = (len(data) - header_size) // 4
+        values = data[header_size : header_size + num_elements * 4].view(np.float32)
+
+        selected_layers = None if layers is None else set(layers)
+        tensors = {**dict(self.named_parameters()), **dict(self.named_buffers())}
+        with torch.no_grad():
+            for layer_idx, layer_offsets in _group_by_layer(self.weight_offsets()):
+                # The weights of a layer are only loaded if the file contains all of them.
+                _, _, last_offset, last_count = layer_offsets[-1]
+                if last_offset + last_count > num_elements:
+                    return
+                if (selected_layers is not None) and (layer_idx not in selected_layers):
+                    continue
+                for _, name, offset, count in layer_offsets:
+                    tensor = tensors[f"layers.{layer_idx}.{name}"]
+                    tensor.copy_(torch.from_numpy(values[offset : offset + count]).view_as(tensor))
+
+    def weight_offsets(self) -> List[WEIGHT_OFFSET]:
+        """Returns the position of every tensor in a Darknet weight file that matches this network.
+
+        The tensors are listed in the order of the file. Every convolutional layer stores either the convolution bias
+        or the batch normalization bias, weight, running mean, and running variance, followed by the convolution
+        weight.
 
-        def read(tensor: Tensor) -> int:
-            """Reads the contents of ``tensor`` from the current position of ``weight_file``.
-
-            Returns the number of elements read. If there's no more data in ``weight_file``, returns 0.
-            """
-            np_array = np.fromfile(weight_file, count=tensor.numel(), dtype=np.float32)
-            num_elements = np_array.size
-            if num_elements > 0:
-                source = torch.from_numpy(np_array).view_as(tensor)
-                with torch.no_grad():
-                    tensor.copy_(source)
-            return num_elements
+        Returns:
+            A list of `(layer index, tensor name, offset, number of elements)` tuples. The tensor names are relative
+            to the layer, and the offsets are in 32-bit floats from the end of the file header.
 
-        for layer in self.layers:
+        """
+        offsets = []
+        offset = 0
+        for layer_idx, layer in enumerate(self.layers):
             # Weights are loaded only to convolutional layers
             if not isinstance(layer, Conv):
                 continue
@@ -163,21 +198,22 @@ class DarknetNetwork(nn.Module):
             # read the convolution bias.
             if isinstance(layer.norm, nn.Identity):
                 assert layer.conv.bias is not None
-                read(layer.conv.bias)
+                names = ["conv.bias"]
             else:
                 assert isinstance(layer.norm, nn.BatchNorm2d)
-                assert layer.norm.running_mean is not None
-                assert layer.norm.running_var is not None
-                read(layer.norm.bias)
-                read(layer.norm.weight)
-                read(layer.norm.running_mean)
-                read(layer.norm.running_var)
-
-            read_count = read(layer.conv.weight)
-            if read_count == 0:
-                return
-
-    def _read_config(self, config_file: Iterable[str]) -> List[Dict[str, Any]]:
+                names = ["norm.bias", "norm.weight", "norm.running_mean", "norm.running_var"]
+            names.append("conv.weight")
+
+            tensors = {**dict(layer.named_parameters()), **dict(layer.named_buffers())}
+            for name in names:
+                count = tensors[name].numel()
+                offsets.append((layer_idx, name, offset, count))
+                offset += count
+
+        return offsets
+
+    @staticmethod
+    def _read_config(config_file: Iterable[str]) -> List[Dict[str, Any]]:
         """Reads a Darnet network configuration file and returns a list of configuration sections.
 
         Args:
@@ -274,6 +310,44 @@ class DarknetNetwork(nn.Module):
         return sections
 
 
+def _read_config_file(config_path: Union[str, "os.PathLike[str]"]) -> List[Dict[str, Any]]:
+    """Reads a Darknet network configuration file, reusing the result if the same file has been read before.
+
+    The parsed sections are cached by the path, modification time, and size of the file. The caller receives a copy
+    that it can modify.
+    """
+    stat = os.stat(config_path)
+    return deepcopy(_parse_config_file(os.path.realpath(config_path), stat.st_mtime_ns, stat.st_size))
+
+
+@lru_cache(maxsize=16)
+def _parse_config_file(path: str, mtime_ns: int, size: int) -> List[Dict[str, Any]]:
+    with open(path) as config_file:
+        return DarknetNetwork._read_config(config_file)
+
+
+def _read_weights_header(data: np.ndarray) -> Tuple[Tuple[int, int, int], int, int]:
+    """Parses the header of a Darknet weight file.
+
+    Returns:
+        The version number, the number of images that the model has been trained on, and the size of the header in
+        bytes. Files written by Darknet version 0.2 or newer store the number of images in 64 bits.
+    """
+    if len(data) < 16:
+        raise ValueError("The Darknet weight file is too short to contain a header.")
+    major, minor, revision = (int(x) for x in data[:12].view(np.int32))
+    if (major * 10 + minor >= 2) and (major < 1000) and (minor < 1000):
+        return (major, minor, revision), int(data[12:20].view(np.int64)[0]), 20
+    return (major, minor, revision), int(data[12:16].view(np.int32)[0]), 16
+
+
+def _group_by_layer(offsets: List[WEIGHT_OFFSET]) -> List[Tuple[int, List[WEIGHT_OFFSET]]]:
+    groups: Dict[int, List[WEIGHT_OFFSET]] = {}
+    for entry in offsets:
+        groups.setdefault(entry[0], []).append(entry)
+    return list(groups.items())
+
+
 def _create_layer(config: CONFIG, num_inputs: List[int], **kwargs: Any) -> CREATE_LAYER_OUTPUT:
     """Calls one of the ``_create_<layertype>(config, num_inputs)`` functions to create a PyTorch module from the
     layer config.
@@ -2,19 +2,14 @@ from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
 
 import torch
 from torch import Tensor, nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
-from pl_bolts.utils.warnings import warn_missing_pkg
 
 from .loss import YOLOLoss
 from .target_matching import HighestIoUMatching, IoUThresholdMatching, ShapeMatching, SimOTAMatching, SizeRatioMatching
-from .types import PRED, PREDS, TARGET, TARGETS
-from .utils import global_xy
-
-if _TORCHVISION_AVAILABLE:
-    from torchvision.ops import box_convert
-else:  # pragma: no cover
-    warn_missing_pkg("torchvision")
+from .types import PRED, TARGET, TARGETS
+from .utils import global_xy, grid_cache
 
 
 def _get_padding(kernel_size: int, stride: int) -> Tuple[int, nn.Module]:
@@ -46,6 +41,31 @@ def _get_padding(kernel_size: int, stride: int) -> Tuple[int, nn.Module]:
     return padding, pad_op
 
 
+def pack_targets(targets: Union[TARGET, TARGETS], device: torch.device) -> TARGET:
+    """Concatenates the targets of a batch into flat tensors and adds the index of the image of every target.
+
+    Images without targets are skipped, since their empty label tensors may have a different shape or data type. Targets
+    that are already packed, i.e. a dictionary with "boxes", "labels", and "image_index", are returned as they are.
+    """
+    if isinstance(targets, dict):
+        return targets
+
+    nonempty = [image_targets for image_targets in targets if image_targets["boxes"].shape[0] > 0]
+    counts = torch.tensor([image_targets["boxes"].shape[0] for image_targets in targets], device=device)
+    image_index = torch.repeat_interleave(torch.arange(len(targets), device=device), counts)
+    if not nonempty:
+        return {
+            "boxes": torch.empty((0, 4), device=device),
+            "labels": torch.empty(0, dtype=torch.int64, device=device),
+            "image_index": image_index,
+        }
+    return {
+        "boxes": torch.cat([image_targets["boxes"] for image_targets in nonempty]),
+        "labels": torch.cat([image_targets["labels"] for image_targets in nonempty]),
+        "image_index": image_index,
+    }
+
+
 class DetectionLayer(nn.Module):
     """A YOLO detection layer.
 
@@ -82,12 +102,14 @@ class DetectionLayer(nn.Module):
 
         self.num_classes = num_classes
         self.prior_shapes = prior_shapes
+        # The prior shapes follow the device and data type of the model, without being saved in the state dict.
+        self.register_buffer("prior_shape_tensor", torch.tensor(prior_shapes, dtype=torch.float32), persistent=False)
         self.matching_func = matching_func
         self.loss_func = loss_func
         self.xy_scale = xy_scale
         self.input_is_normalized = input_is_normalized
 
-    def forward(self, x: Tensor, image_size: Tensor) -> Tuple[Tensor, PREDS]:
+    def forward(self, x: Tensor, image_size: Tensor) -> Tuple[Tensor, PRED]:
         """Runs a forward pass through this YOLO detection layer.
 
         Maps cell-local coordinates to global coordinates in the image space, scales the bounding boxes with the
@@ -106,8 +128,9 @@ class DetectionLayer(nn.Module):
 
         Returns:
             The layer output, with normalized probabilities, in a tensor sized
-            ``[batch_size, anchors_per_cell * height * width, num_classes + 5]`` and a list of dictionaries, containing
-            the same predictions, but with unnormalized probabilities (for loss calculation).
+            ``[batch_size, anchors_per_cell * height * width, num_classes + 5]`` and a dictionary, containing the same
+            predictions for the whole batch, but with unnormalized probabilities (for loss calculation). The tensors of
+            the dictionary are sized ``[batch_size, height, width, anchors_per_cell, ...]``.
 
         """
         batch_size, num_features, height, width = x.shape
@@ -138,48 +161,95 @@ class DetectionLayer(nn.Module):
         # x/y coordinates close to one. YOLOv4 solves this by scaling the x/y coordinates.
         xy = xy * self.xy_scale - 0.5 * (self.xy_scale - 1)
 
-        image_xy = global_xy(xy, image_size)
-        prior_shapes = torch.tensor(self.prior_shapes, dtype=wh.dtype, device=wh.device)
+        if torch.jit.is_scripting() or torch.jit.is_tracing():
+            image_xy = global_xy(xy, image_size)
+        else:
+            image_xy = self._cached_global_xy(xy, image_size)
+        prior_shapes = self.prior_shape_tensor.to(dtype=wh.dtype, device=wh.device)
         image_wh = 4 * torch.square(wh) * prior_shapes if self.input_is_normalized else torch.exp(wh) * prior_shapes
-        box = torch.cat((image_xy, image_wh), -1)
-        box = box_convert(box, in_fmt="cxcywh", out_fmt="xyxy")
+        # Convert the center coordinates and the dimensions directly to corner coordinates.
+        half_wh = 0.5 * image_wh
+        box = torch.cat((image_xy - half_wh, image_xy + half_wh), -1)
         output = torch.cat((box, norm_confidence.unsqueeze(-1), norm_classprob), -1)
         output = output.reshape(batch_size, height * width * anchors_per_cell, num_attrs)
 
         # It's better to use binary_cross_entropy_with_logits() for loss computation, so we'll provide the unnormalized
         # confidence and classprob, when available.
-        preds = [{"boxes": b, "confidences": c, "classprobs": p} for b, c, p in zip(box, confidence, classprob)]
+        preds = {"boxes": box, "confidences": confidence, "classprobs": classprob}
 
         return output, preds
 
+    @torch.jit.unused
+    def _cached_global_xy(self, xy: Tensor, image_size: Tensor) -> Tensor:
+        """Does the same as ``global_xy()``, but takes the grid offsets from a cache instead of creating them."""
+        height, width = xy.shape[1:3]
+        grid_size = grid_cache.size(width, height, xy.device)
+        offset = grid_cache.offsets(width, height, xy.device, xy.dtype).unsqueeze(2)  # [height, width, 1, 2]
+        scale = torch.true_divide(image_size, grid_size)
+        return (xy + offset) * scale
+
     def match_targets(
         self,
-        preds: PREDS,
-        return_preds: PREDS,
-        targets: TARGETS,
+        preds: PRED,
+        return_preds: PRED,
+        targets: TARGET,
         image_size: Tensor,
     ) -> Tuple[PRED, TARGET]:
         """Matches the predictions to targets.
 
         Args:
-            preds: List of predictions for each image, as returned by the ``forward()`` method of this layer. These will
-                be matched to the training targets.
-            return_preds: List of predictions for each image. The matched predictions will be returned from this list.
-                When calculating the auxiliary loss for deep supervision, predictions from a different layer are used
-                for loss computation.
-            targets: List of training targets for each image.
+            preds: Predictions for the whole batch, as returned by the ``forward()`` method of this layer. These will be
+                matched to the training targets.
+            return_preds: Predictions for the whole batch. The matched predictions will be returned from these. When
+                calculating the auxiliary loss for deep supervision, predictions from a different layer are used for
+                loss computation.
+            targets: The training targets of all the images concatenated, as returned by ``pack_targets()``.
+                ``targets["image_index"]`` contains the index of the image of every target.
             image_size: Width and height in a vector that defines the scale of the target coordinates.
 
         Returns:
             Two dictionaries, the matched predictions and targets.
 
         """
-        batch_size = len(preds)
-        if (len(targets) != batch_size) or (len(return_preds) != batch_size):
+        if return_preds["boxes"].shape[0] != preds["boxes"].shape[0]:
             raise ValueError("Different batch size for predictions and targets.")
 
+        if len(targets["boxes"]) == 0:
+            return self._empty_matches(return_preds["confidences"].flatten(), targets)
+
+        if not hasattr(self.matching_func, "match_batch"):
+            return self._match_targets_per_image(preds, return_preds, targets, image_size)
+
+        # The predictions are batched and the targets are packed with the image index of every target, so the matched
+        # predictions and targets are selected with one gather.
+        pred_selector, background_selector, target_selector = self.matching_func.match_batch(preds, targets, image_size)
+        matched_preds = {
+            "boxes": return_preds["boxes"][pred_selector],
+            "confidences": return_preds["confidences"][pred_selector],
+            "bg_confidences": return_preds["confidences"][background_selector],
+            "classprobs": return_preds["classprobs"][pred_selector],
+        }
+        matched_targets = {
+            "boxes": targets["boxes"][target_selector],
+            "labels": targets["labels"][target_selector],
+        }
+        return matched_preds, matched_targets
+
+    def _match_targets_per_image(
+        self,
+        preds: PRED,
+        return_preds: PRED,
+        targets: TARGET,
+        image_size: Tensor,
+    ) -> Tuple[PRED, TARGET]:
+        """Matches the predictions to targets one image at a time, for matching functions that only implement
+        ``__call__()``."""
         matches = []
-        for image_preds, image_return_preds, image_targets in zip(preds, return_preds, targets):
+        for image_idx in range(preds["boxes"].shape[0]):
+            image_preds = {key: value[image_idx] for key, value in preds.items()}
+            image_return_preds = {key: value[image_idx] for key, value in return_preds.items()}
+            in_image = targets["image_index"] == image_idx
+            image_targets = {"boxes": targets["boxes"][in_image], "labels": targets["labels"][in_image]}
             if image_targets["boxes"].shape[0] > 0:
                 pred_selector, background_selector, target_selector = self.matching_func(
                     image_preds, image_targets, image_size
@@ -195,16 +265,9 @@ class DetectionLayer(nn.Module):
                     "labels": image_targets["labels"][target_selector],
                 }
             else:
-                matched_preds = {
-                    "boxes": torch.empty((0, 4), device=image_return_preds["boxes"].device),
-                    "confidences": torch.empty(0, device=image_return_preds["confidences"].device),
-                    "bg_confidences": image_return_preds["confidences"].flatten(),
-                    "classprobs": torch.empty((0, self.num_classes), device=image_return_preds["classprobs"].device),
-                }
-                matched_targets = {
-                    "boxes": torch.empty((0, 4), device=image_targets["boxes"].device),
-                    "labels": torch.empty(0, dtype=torch.int64, device=image_targets["labels"].device),
-                }
+                matched_preds, matched_targets = self._empty_matches(
+                    image_return_preds["confidences"].flatten(), image_targets
+                )
             matches.append((matched_preds, matched_targets))
 
         matched_preds = {
@@ -219,23 +282,39 @@ class DetectionLayer(nn.Module):
         }
         return matched_preds, matched_targets
 
+    def _empty_matches(self, bg_confidences: Tensor, targets: TARGET) -> Tuple[PRED, TARGET]:
+        """Returns the matches of images without targets, where every prediction is background."""
+        device = bg_confidences.device
+        matched_preds = {
+            "boxes": torch.empty((0, 4), device=device),
+            "confidences": torch.empty(0, device=device),
+            "bg_confidences": bg_confidences,
+            "classprobs": torch.empty((0, self.num_classes), device=device),
+        }
+        matched_targets = {
+            "boxes": torch.empty((0, 4), device=targets["boxes"].device),
+            "labels": torch.empty(0, dtype=torch.int64, device=targets["labels"].device),
+        }
+        return matched_preds, matched_targets
+
     def calculate_losses(
         self,
-        preds: PREDS,
-        targets: TARGETS,
+        preds: PRED,
+        targets: Union[TARGET, TARGETS],
         image_size: Tensor,
-        loss_preds: Optional[PREDS] = None,
+        loss_preds: Optional[PRED] = None,
     ) -> Tuple[Tensor, int]:
         """Matches the predictions to targets and computes the losses.
 
         Args:
-            preds: List of predictions for each image, as returned by ``forward()``. These will be matched to the
-                training targets and used to compute the losses (unless another set of predictions for loss computation
-                is given in ``loss_preds``).
-            targets: List of training targets for each image.
+            preds: Predictions for the whole batch, as returned by ``forward()``. These will be matched to the training
+                targets and used to compute the losses (unless another set of predictions for loss computation is given
+                in ``loss_preds``).
+            targets: The training targets of the batch, packed by ``pack_targets()``, or a list of training targets for
+                each image, which will be packed first.
             image_size: Width and height in a vector that defines the scale of the target coordinates.
-            loss_preds: List of predictions for each image. If given, these will be used for loss computation, instead
-                of the same predictions that were used for matching. This is needed for deep supervision in YOLOv7.
+            loss_preds: Predictions for the whole batch. If given, these will be used for loss computation, instead of
+                the same predictions that were used for matching. This is needed for deep supervision in YOLOv7.
 
         Returns:
             A vector of the overlap, confidence, and classification loss, normalized by batch size, and the number of
@@ -245,10 +324,11 @@ class DetectionLayer(nn.Module):
         if loss_preds is None:
             loss_preds = preds
 
+        targets = pack_targets(targets, preds["boxes"].device)
         matched_preds, matched_targets = self.match_targets(preds, loss_preds, targets, image_size)
 
         losses = self.loss_func.elementwise_sums(matched_preds, matched_targets, self.input_is_normalized, image_size)
-        losses = torch.stack((losses.overlap, losses.confidence, losses.classification)) / len(preds)
+        losses = torch.stack((losses.overlap, losses.confidence, losses.classification)) / preds["boxes"].shape[0]
 
         hits = len(matched_targets["boxes"])
 
@@ -302,6 +382,19 @@ class Conv(nn.Module):
         x = self.norm(x)
         return self.act(x)
 
+    def fuse(self) -> None:
+        """Folds batch normalization into the convolution weights and bias, and replaces Mish with
+        :class:`InferenceMish`.
+
+        Batch normalization uses the running statistics, so the result is only valid in evaluation mode. Other
+        normalization layers are kept.
+        """
+        if isinstance(self.norm, nn.BatchNorm2d):
+            self.conv = fuse_conv_bn_eval(self.conv.eval(), self.norm.eval())
+            self.norm = nn.Identity()
+        if isinstance(self.act, Mish):
+            self.act = InferenceMish()
+
 
 class MaxPool(nn.Module):
     """A max pooling layer with padding.
@@ -339,6 +432,9 @@ class RouteLayer(nn.Module):
 
     def forward(self, outputs: List[Tensor]) -> Tensor:
         chunks = [torch.chunk(outputs[layer], self.num_chunks, dim=1)[self.chunk_idx] for layer in self.source_layers]
+        if len(chunks) == 1:
+            # Concatenating a single tensor would only copy it.
+            return chunks[0]
         return torch.cat(chunks, dim=1)
 
 
@@ -365,6 +461,20 @@ class Mish(nn.Module):
         return x * torch.tanh(nn.functional.softplus(x))
 
 
+class InferenceMish(nn.Module):
+    """Mish activation for inference, which :func:`fuse_for_inference` puts in place of :class:`Mish`.
+
+    On GPUs the PyTorch implementation computes the function in one kernel. On the CPU, where that kernel is not faster,
+    the intermediate results are updated in place, so that only one new tensor is allocated. The in-place operations
+    don't support backpropagation.
+    """
+
+    def forward(self, x: Tensor) -> Tensor:
+        if x.is_cuda:
+            return nn.functional.mish(x)
+        return nn.functional.softplus(x).tanh_().mul_(x)
+
+
 class ReOrg(nn.Module):
     """Re-organizes the tensor so that every square region of four cells is placed into four different channels.
 
@@ -380,6 +490,33 @@ class ReOrg(nn.Module):
         return torch.cat((tl, bl, tr, br), dim=1)
 
 
+def fuse_for_inference(module: nn.Module) -> nn.Module:
+    """Prepares a network for inference by fusing the operations of every :class:`Conv` block.
+
+    Batch normalization is folded into the preceding convolution, so that the convolution weights and bias produce the
+    normalized output directly, and the Mish activations are replaced with :class:`InferenceMish`. Routing layers that
+    take the output of a single layer return it without copying it, also when not fused. The module is switched to
+    evaluation mode, and it cannot be trained after fusing. The outputs stay the same up to floating point rounding.
+
+    Args:
+        module: A YOLO network, e.g. :class:`~.darknet_network.DarknetNetwork` or one of the networks in
+            ``torch_networks.py``, or any module that contains :class:`Conv` blocks.
+
+    Returns:
+        The same module, fused in place.
+
+    """
+    module.eval()
+    for submodule in list(module.modules()):
+        if isinstance(submodule, Conv):
+            submodule.fuse()
+        else:
+            for name, child in submodule.named_children():
+                if isinstance(child, Mish):
+                    setattr(submodule, name, InferenceMish())
+    return module
+
+
 def create_activation_module(name: Optional[str]) -> nn.Module:
     """Creates a layer activation module given its type as a string.
 
@@ -1,3 +1,4 @@
+import math
 from dataclasses import dataclass
 from typing import Callable, Dict, Optional, Tuple, Union
 
@@ -69,6 +70,90 @@ _iou_and_loss_functions = {
 }
 
 
+def _upcast(boxes: Tensor) -> Tensor:
+    return boxes if boxes.dtype in (torch.float32, torch.float64) else boxes.float()
+
+
+def _batched_box_iou_and_union(boxes1: Tensor, boxes2: Tensor) -> Tuple[Tensor, Tensor]:
+    """Calculates the pairwise IoU and union of the boxes of every image in a batch.
+
+    Args:
+        boxes1: A ``[..., N, 4]`` tensor of `(x1, y1, x2, y2)` coordinates.
+        boxes2: A ``[..., M, 4]`` tensor of `(x1, y1, x2, y2)` coordinates.
+
+    Returns:
+        Two ``[..., N, M]`` tensors, the IoUs and the areas of the unions.
+
+    """
+    area1 = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+    area2 = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+    lt = torch.max(boxes1[..., :, None, :2], boxes2[..., None, :, :2])
+    rb = torch.min(boxes1[..., :, None, 2:], boxes2[..., None, :, 2:])
+    wh = _upcast(rb - lt).clamp(min=0)
+    inter = wh[..., 0] * wh[..., 1]
+    union = area1[..., :, None] + area2[..., None, :] - inter
+    return inter / union, union
+
+
+def _batched_enclosing_wh(boxes1: Tensor, boxes2: Tensor) -> Tensor:
+    """Calculates the ``[..., N, M, 2]`` width and height of the smallest box enclosing each pair of boxes."""
+    lti = torch.min(boxes1[..., :, None, :2], boxes2[..., None, :, :2])
+    rbi = torch.max(boxes1[..., :, None, 2:], boxes2[..., None, :, 2:])
+    return _upcast(rbi - lti).clamp(min=0)
+
+
+def _batched_box_iou(boxes1: Tensor, boxes2: Tensor) -> Tensor:
+    return _batched_box_iou_and_union(boxes1, boxes2)[0]
+
+
+def _batched_generalized_box_iou(boxes1: Tensor, boxes2: Tensor) -> Tensor:
+    iou, union = _batched_box_iou_and_union(boxes1, boxes2)
+    whi = _batched_enclosing_wh(boxes1, boxes2)
+    areai = whi[..., 0] * whi[..., 1]
+    return iou - (areai - union) / areai
+
+
+def _batched_box_diou_iou(boxes1: Tensor, boxes2: Tensor, eps: float = 1e-7) -> Tuple[Tensor, Tensor]:
+    iou, _ = _batched_box_iou_and_union(boxes1, boxes2)
+    whi = _batched_enclosing_wh(boxes1, boxes2)
+    diagonal_distance_squared = (whi[..., 0] ** 2) + (whi[..., 1] ** 2) + eps
+    x_p = (boxes1[..., 0] + boxes1[..., 2]) / 2
+    y_p = (boxes1[..., 1] + boxes1[..., 3]) / 2
+    x_g = (boxes2[..., 0] + boxes2[..., 2]) / 2
+    y_g = (boxes2[..., 1] + boxes2[..., 3]) / 2
+    centers_distance_squared = (_upcast(x_p[..., :, None] - x_g[..., None, :]) ** 2) + (
+        _upcast(y_p[..., :, None] - y_g[..., None, :]) ** 2
+    )
+    return iou - (centers_distance_squared / diagonal_distance_squared), iou
+
+
+def _batched_distance_box_iou(boxes1: Tensor, boxes2: Tensor, eps: float = 1e-7) -> Tensor:
+    return _batched_box_diou_iou(_upcast(boxes1), _upcast(boxes2), eps)[0]
+
+
+def _batched_complete_box_iou(boxes1: Tensor, boxes2: Tensor, eps: float = 1e-7) -> Tensor:
+    boxes1 = _upcast(boxes1)
+    boxes2 = _upcast(boxes2)
+    diou, iou = _batched_box_diou_iou(boxes1, boxes2, eps)
+    w_pred = boxes1[..., :, None, 2] - boxes1[..., :, None, 0]
+    h_pred = boxes1[..., :, None, 3] - boxes1[..., :, None, 1]
+    w_gt = boxes2[..., None, :, 2] - boxes2[..., None, :, 0]
+    h_gt = boxes2[..., None, :, 3] - boxes2[..., None, :, 1]
+    v = (4 / (math.pi**2)) * torch.pow(torch.atan(w_pred / h_pred) - torch.atan(w_gt / h_gt), 2)
+    with torch.no_grad():
+        alpha = v / (1 - iou + v + eps)
+    return diou - alpha * v
+
+
+# The same overlap functions as in _iou_and_loss_functions, for boxes with leading batch dimensions.
+_batched_iou_functions = {
+    "iou": _batched_box_iou,
+    "giou": _batched_generalized_box_iou,
+    "diou": _batched_distance_box_iou,
+    "ciou": _batched_complete_box_iou,
+}
+
+
 def _get_iou_and_loss_functions(name: str) -> Tuple[Callable, Callable]:
     """Returns functions for calculating the IoU and the IoU loss, given the IoU variant name.
 
@@ -118,20 +203,22 @@ def _pairwise_confidence_loss(
     returns a vector of losses for each foreground anchor.
 
     Args:
-        preds: An ``[N]`` vector of predicted confidences.
-        overlap: An ``[N, M]`` matrix of overlaps between all predicted and target bounding boxes.
+        preds: An ``[N]`` vector of predicted confidences, or a ``[batch_size, N]`` matrix for a batch of images.
+        overlap: An ``[N, M]`` matrix of overlaps between all predicted and target bounding boxes, or a
+            ``[batch_size, N, M]`` tensor for a batch of images.
         bce_func: A function for calculating binary cross entropy.
         predict_overlap: Balance between binary confidence targets and predicting the overlap. 0.0 means that the target
             confidence is 1 if there's an object, and 1.0 means that the target confidence is the overlap.
 
     Returns:
-        An ``[N, M]`` matrix of confidence losses between all predictions and targets.
+        An ``[N, M]`` matrix (or a ``[batch_size, N, M]`` tensor) of confidence losses between all predictions and
+        targets.
 
     """
     if predict_overlap is not None:
         # When predicting overlap, target confidence is different for each pair of a prediction and a target. The
         # tensors have to be broadcasted to [N, M].
-        preds = preds.unsqueeze(1).expand(overlap.shape)
+        preds = preds.unsqueeze(-1).expand(overlap.shape)
         targets = torch.ones_like(preds) - predict_overlap
         # Distance-IoU may return negative "overlaps", so we have to make sure that the targets are not negative.
         targets += predict_overlap * overlap.detach().clamp(min=0)
@@ -140,7 +227,7 @@ def _pairwise_confidence_loss(
     # When not predicting overlap, target confidence is the same for every prediction,
     # but we should still return a matrix.
     targets = torch.ones_like(preds)
-    return bce_func(preds, targets, reduction="none").unsqueeze(1).expand(overlap.shape)
+    return bce_func(preds, targets, reduction="none").unsqueeze(-1).expand(overlap.shape)
 
 
 def _foreground_confidence_loss(
@@ -186,6 +273,49 @@ def _background_confidence_loss(preds: Tensor, bce_func: Callable) -> Tensor:
     return bce_func(preds, targets, reduction="sum")
 
 
+def _pairwise_class_loss(
+    preds: Tensor, targets: Tensor, bce_func: Callable, label_smoothing: Optional[float] = None
+) -> Tensor:
+    """Calculates the sum of the class losses over the classes for every pair of a prediction and a target.
+
+    Binary cross entropy is linear in the target probability:
+    ``bce(pred, target) = bce(pred, 0) + target * (bce(pred, 1) - bce(pred, 0))``. The sum over the classes is
+    therefore a per-prediction sum of the losses against zero targets, plus the sum of the loss differences weighted by
+    the target probabilities. With class labels, the target probabilities are one-hot
+    (or label-smoothed one-hot) vectors, and the weighted sum is a gather of the target class column. The ``[N, M, C]``
+    tensor of the element-wise losses is never created.
+
+    Args:
+        preds: An ``[N, C]`` matrix of predicted class probabilities or logits.
+        targets: An ``[M, C]`` matrix of target class probabilities or an ``[M]`` vector of class labels.
+        bce_func: A function for calculating binary cross entropy.
+        label_smoothing: The epsilon parameter (weight) for label smoothing. 0.0 means no smoothing (binary targets),
+            and 1.0 means that the target probabilities are always 0.5.
+
+    Returns:
+        An ``[N, M]`` matrix of class losses between all predictions and targets. All the tensors may have an additional
+        leading batch dimension.
+
+    """
+    num_classes = preds.shape[-1]
+    negative_losses = bce_func(preds, torch.zeros_like(preds), reduction="none")
+    loss_differences = bce_func(preds, torch.ones_like(preds), reduction="none") - negative_losses
+    if targets.ndim == preds.ndim - 1:
+        # Labels greater than the number of predicted classes are mapped to the last class, like in
+        # _target_labels_to_probs().
+        labels = torch.clamp(targets, max=num_classes - 1)
+        labels = labels.unsqueeze(-2).expand(*loss_differences.shape[:-1], labels.shape[-1])
+        target_losses = loss_differences.gather(-1, labels)
+        if label_smoothing is not None:
+            target_losses = (label_smoothing / 2) * loss_differences.sum(-1, keepdim=True) + target_losses * (
+                1.0 - label_smoothing
+            )
+    else:
+        target_probs = _target_labels_to_probs(targets, num_classes, preds.dtype, label_smoothing)
+        target_losses = loss_differences @ target_probs.transpose(-1, -2)
+    return negative_losses.sum(-1, keepdim=True) + target_losses
+
+
 def _target_labels_to_probs(
     targets: Tensor, num_classes: int, dtype: torch.dtype, label_smoothing: Optional[float] = None
 ) -> Tensor:
@@ -261,11 +391,13 @@ class YOLOLoss:
         confidence_multiplier: float = 1.0,
         class_multiplier: float = 1.0,
     ):
+        self._batched_pairwise_overlap: Optional[Callable] = None
         if callable(overlap_func):
             self._pairwise_overlap = overlap_func
             self._elementwise_overlap_loss = lambda boxes1, boxes2: 1.0 - overlap_func(boxes1, boxes2).diagonal()
         else:
             self._pairwise_overlap, self._elementwise_overlap_loss = _get_iou_and_loss_functions(overlap_func)
+            self._batched_pairwise_overlap = _batched_iou_functions[overlap_func]
 
         self.predict_overlap = predict_overlap
         self.label_smoothing = label_smoothing
@@ -281,7 +413,8 @@ class YOLOLoss:
     ) -> Tuple[YOLOLosses, Tensor]:
         """Calculates matrices containing the losses for all prediction/target pairs.
 
-        This method is called for obtaining costs for SimOTA matching.
+        This method is called for obtaining costs for SimOTA matching. A batch of images is processed at once, if the
+        tensors have an additional leading batch dimension.
 
         Args:
             preds: A dictionary of predictions, containing "boxes", "confidences", and "classprobs". Each tensor
@@ -290,16 +423,25 @@ class YOLOLoss:
             input_is_normalized: If ``False``, input is logits, if ``True``, input is normalized to `0..1`.
 
         Returns:
-            Loss matrices and an overlap matrix. Each matrix is shaped ``[N, M]``.
+            Loss matrices and an overlap matrix. Each matrix is shaped ``[N, M]``, or ``[batch_size, N, M]`` for a
+            batch.
 
         """
-        loss_shape = torch.Size([len(preds["boxes"]), len(targets["boxes"])])
+        loss_shape = torch.Size([*preds["boxes"].shape[:-1], targets["boxes"].shape[-2]])
 
         bce_func: Callable[..., Tensor] = (
             binary_cross_entropy if input_is_normalized else binary_cross_entropy_with_logits  # type: ignore
         )
 
-        overlap = self._pairwise_overlap(preds["boxes"], targets["boxes"])
+        if preds["boxes"].ndim == 2:
+            overlap = self._pairwise_overlap(preds["boxes"], targets["boxes"])
+        elif self._batched_pairwise_overlap is not None:
+            overlap = self._batched_pairwise_overlap(preds["boxes"], targets["boxes"])
+        else:
+            # A custom overlap function only takes two matrices of boxes.
+            overlap = torch.stack(
+                [self._pairwise_overlap(boxes1, boxes2) for boxes1, boxes2 in zip(preds["boxes"], targets["boxes"])]
+            )
         assert overlap.shape == loss_shape
 
         overlap_loss = 1.0 - overlap
@@ -308,13 +450,7 @@ class YOLOLoss:
         confidence_loss = _pairwise_confidence_loss(preds["confidences"], overlap, bce_func, self.predict_overlap)
         assert confidence_loss.shape == loss_shape
 
-        pred_probs = preds["classprobs"].unsqueeze(1)  # [N, 1, classes]
-        target_probs = _target_labels_to_probs(
-            targets["labels"], pred_probs.shape[-1], pred_probs.dtype, self.label_smoothing
-        )
-        target_probs = target_probs.unsqueeze(0)  # [1, M, classes]
-        pred_probs, target_probs = torch.broadcast_tensors(pred_probs, target_probs)
-        class_loss = bce_func(pred_probs, target_probs, reduction="none").sum(-1)
+        class_loss = _pairwise_class_loss(preds["classprobs"], targets["labels"], bce_func, self.label_smoothing)
         assert class_loss.shape == loss_shape
 
         losses = YOLOLosses(
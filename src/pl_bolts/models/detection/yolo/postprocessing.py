@@ -0,0 +1,173 @@
+from typing import List, NamedTuple, Optional
+
+import torch
+from torch import Tensor
+
+from pl_bolts.utils import _TORCHVISION_AVAILABLE
+from pl_bolts.utils.warnings import warn_missing_pkg
+
+from .types import PRED
+
+if _TORCHVISION_AVAILABLE:
+    from torchvision.ops import batched_nms, nms
+else:
+    warn_missing_pkg("torchvision")
+
+
+class BatchedDetections(NamedTuple):
+    """The detections of a batch of images in fixed-size tensors.
+
+    Every image has ``max_detections`` rows. The detections of an image are sorted by descending score and followed by
+    padding rows, whose boxes and scores are zero and whose labels are -1.
+
+    Attributes:
+        boxes: ``[batch_size, max_detections, 4]`` bounding box `(x1, y1, x2, y2)` coordinates
+        scores: ``[batch_size, max_detections]`` detection confidences
+        labels: ``[batch_size, max_detections]`` predicted class IDs
+        num_detections: ``[batch_size]`` number of valid detections in every image
+    """
+
+    boxes: Tensor
+    scores: Tensor
+    labels: Tensor
+    num_detections: Tensor
+
+    def unbatch(self) -> List[PRED]:
+        """Returns one prediction dictionary per image, without the padding, like ``YOLO.process_detections()``."""
+        return [
+            {"boxes": boxes[:count], "scores": scores[:count], "labels": labels[:count]}
+            for boxes, scores, labels, count in zip(self.boxes, self.scores, self.labels, self.num_detections.tolist())
+        ]
+
+
+def _rank_within_image(image_idxs: Tensor, batch_size: int) -> Tensor:
+    """Returns the position of every item among the items of the same image, when the items are sorted by image."""
+    counts = torch.bincount(image_idxs, minlength=batch_size)
+    starts = torch.cumsum(counts, 0) - counts
+    return torch.arange(len(image_idxs), device=image_idxs.device) - starts[image_idxs]
+
+
+def _grouped_nms(boxes: Tensor, scores: Tensor, groups: Tensor, threshold: float) -> Tensor:
+    """Runs NMS in one call, so that boxes suppress only boxes of the same group.
+
+    The boxes of every group are moved to a region of their own, like torchvision's ``batched_nms()`` does for small
+    inputs. The offsets are added in double precision, which represents the shifted coordinates exactly even with
+    thousands of groups.
+    """
+    if len(boxes) == 0:
+        return torch.empty(0, dtype=torch.int64, device=boxes.device)
+    boxes = boxes.double()
+    offsets = groups.double() * (boxes.max() + 1)
+    return nms(boxes + offsets[:, None], scores.double(), threshold)
+
+
+# Above this number of boxes, a single NMS call over the whole batch would take too much memory and time, like in
+# torchvision's batched_nms(), which switches to one call per class above 20000 coordinates on GPUs.
+_MAX_GROUPED_NMS_BOXES = 5000
+
+
+def _batch_nms(
+    boxes: Tensor, scores: Tensor, image_idxs: Tensor, labels: Tensor, num_classes: int, threshold: float
+) -> Tensor:
+    """Runs NMS over the candidates of every image and class of a batch and returns the indices of the kept
+    candidates, sorted by image and then by descending score."""
+    groups = image_idxs * num_classes + labels
+    if len(boxes) > _MAX_GROUPED_NMS_BOXES:
+        keep = batched_nms(boxes, scores, groups, threshold)
+    else:
+        keep = _grouped_nms(boxes, scores, groups, threshold)
+    return keep[torch.sort(image_idxs[keep], stable=True).indices]
+
+
+def batched_detections(
+    preds: Tensor,
+    confidence_threshold: float,
+    nms_threshold: float,
+    detections_per_image: int,
+    pre_nms_top_k: Optional[int] = None,
+) -> BatchedDetections:
+    """Filters the detections of a whole batch with one thresholding pass and one non-maximum suppression call.
+
+    The score of every class is the class probability times the confidence. The (prediction, class) pairs whose score
+    is above ``confidence_threshold`` become candidates, so a prediction with a high score for more than one class is
+    duplicated. If ``pre_nms_top_k`` is given, only that many highest-scoring candidates of every image are kept, which
+    bounds the size of the NMS input regardless of how many predictions pass the threshold.
+
+    On GPUs, NMS is run once for all the images. The class labels are offset by the image index times the number of
+    classes, so that boxes of different images never suppress each other. Above 5000 candidates, e.g. with an untrained
+    model whose predictions nearly all pass the threshold, NMS runs once per image and class instead. On the CPU, where
+    the cost of NMS grows quadratically with the number of boxes, it's run once per image. The result is the same as
+    filtering every image separately, except that ``pre_nms_top_k`` may drop low-scoring candidates.
+
+    Args:
+        preds: The output of ``YOLO.forward()``, a ``[batch_size, anchors, classes + 5]`` tensor.
+        confidence_threshold: Remove the candidates whose score is not higher than this threshold.
+        nms_threshold: NMS will remove candidates whose IoU with a higher scoring candidate of the same image and class
+            is higher than this threshold.
+        detections_per_image: Keep at most this number of highest-scoring detections per image. This is also the
+            size of the second dimension of the output tensors.
+        pre_nms_top_k: If given, keep at most this number of highest-scoring candidates per image before NMS.
+
+    Returns:
+        The detections of every image, padded to ``detections_per_image`` rows.
+
+    """
+    batch_size, _, num_attrs = preds.shape
+    num_classes = num_attrs - 5
+    device = preds.device
+
+    # The class probabilities are at most one, so a score can be above the threshold only if the confidence is. The
+    # scores are calculated only for those predictions, instead of all the predictions of the batch.
+    image_idxs, anchor_idxs = (preds[..., 4] > confidence_threshold).nonzero().T
+    confident_preds = preds[image_idxs, anchor_idxs]
+    scores = confident_preds[:, 5:] * confident_preds[:, 4:5]  # [predictions, classes]
+    pred_idxs, labels = (scores > confidence_threshold).nonzero().T
+    image_idxs, anchor_idxs = image_idxs[pred_idxs], anchor_idxs[pred_idxs]
+    candidate_scores = scores[pred_idxs, labels]
+
+    if pre_nms_top_k is not None:
+        # Sort the candidates by descending score within every image and keep the first ones of every image.
+        order = torch.sort(candidate_scores, descending=True, stable=True).indices
+        order = order[torch.sort(image_idxs[order], stable=True).indices]
+        order = order[_rank_within_image(image_idxs[order], batch_size) < pre_nms_top_k]
+        image_idxs, anchor_idxs, labels, candidate_scores = (
+            image_idxs[order],
+            anchor_idxs[order],
+            labels[order],
+            candidate_scores[order],
+        )
+
+    boxes = preds[image_idxs, anchor_idxs, :4]
+
+    # The candidates are in image order. nms() returns the indices in descending order of score, so the kept
+    # candidates are sorted by image and then by score.
+    if device.type == "cpu":
+        # The CPU implementation of NMS compares every box with every other box, so the cost of a single call would grow
+        # quadratically with the batch size. batched_nms() also switches to one call per class for large inputs.
+        counts = torch.bincount(image_idxs, minlength=batch_size).tolist()
+        keep = torch.cat(
+            [
+                batched_nms(image_boxes, image_scores, image_labels, nms_threshold) + start
+                for image_boxes, image_scores, image_labels, start in zip(
+                    boxes.split(counts),
+                    candidate_scores.split(counts),
+                    labels.split(counts),
+                    [0] + torch.tensor(counts).cumsum(0).tolist()[:-1],
+                )
+            ]
+        )
+    else:
+        keep = _batch_nms(boxes, candidate_scores, image_idxs, labels, num_classes, nms_threshold)
+    kept_images = image_idxs[keep]
+    ranks = _rank_within_image(kept_images, batch_size)
+    selected = ranks < detections_per_image
+    keep, kept_images, ranks = keep[selected], kept_images[selected], ranks[selected]
+
+    out_boxes = preds.new_zeros((batch_size, detections_per_image, 4))
+    out_scores = preds.new_zeros((batch_size, detections_per_image))
+    out_labels = torch.full((batch_size, detections_per_image), -1, dtype=torch.int64, device=device)
+    out_boxes[kept_images, ranks] = boxes[keep]
+    out_scores[kept_images, ranks] = candidate_scores[keep]
+    out_labels[kept_images, ranks] = labels[keep]
+    num_detections = torch.bincount(kept_images, minlength=batch_size).clamp(max=detections_per_image)
+    return BatchedDetections(out_boxes, out_scores, out_labels, num_detections)
@@ -0,0 +1,323 @@
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import torch
+import torch.nn.functional as F  # noqa: N812
+from torch import Tensor
+
+from pl_bolts.utils import _PIL_AVAILABLE, _TORCHVISION_AVAILABLE
+from pl_bolts.utils.warnings import warn_missing_pkg
+
+from .types import PRED
+from .yolo_module import YOLO
+
+if _TORCHVISION_AVAILABLE:
+    from torchvision.transforms import functional as T  # noqa: N812
+else:
+    warn_missing_pkg("torchvision")
+
+if _PIL_AVAILABLE:
+    from PIL import Image
+else:
+    warn_missing_pkg("PIL", pypi_name="Pillow")
+
+_STAGES = ("preprocess", "forward", "nms")
+
+
+class Letterbox(NamedTuple):
+    """How an image was placed in its bucket: ``bucket_xy = original_xy * scale + (pad_x, pad_y)``."""
+
+    scale: float
+    pad_x: int
+    pad_y: int
+    width: int
+    height: int
+
+    def unletterbox(self, boxes: Tensor) -> Tensor:
+        """Maps `(x1, y1, x2, y2)` boxes from the bucket back to the original image and clips them to the image."""
+        offset = boxes.new_tensor([self.pad_x, self.pad_y, self.pad_x, self.pad_y])
+        boxes = (boxes - offset) / self.scale
+        limits = boxes.new_tensor([self.width, self.height, self.width, self.height])
+        return torch.minimum(boxes.clamp(min=0), limits)
+
+
+class _Request(NamedTuple):
+    image: Tensor
+    bucket: Tuple[int, int]
+    arrival: float
+    future: Future
+
+
+class YOLOPredictor:
+    """Runs a trained YOLO model on a stream of images of arbitrary sizes, in dynamically formed batches.
+
+    Every image is resized, keeping the aspect ratio, and centered ("letterboxed") in a bucket, i.e. one of a few fixed
+    input sizes. The smallest bucket that the image fits in without downscaling is selected, or the largest bucket if
+    there is none. Images of the same bucket are stacked into one batch, so the network sees only a few input shapes
+    and every call processes several images. The detected boxes are mapped back to the coordinates of the original
+    images.
+
+    :meth:`predict` processes a list of images right away. :meth:`submit` queues a single image and returns a
+    ``Future``. A background thread collects the queued images into micro-batches, and runs a bucket as soon as it
+    holds ``max_batch_size`` images or its oldest image has waited for ``max_latency`` seconds. Under load, the batches
+    fill up and the throughput grows with the batch size. Under light load, no image waits much longer than
+    ``max_latency``.
+
+    The model is switched to evaluation mode once, and the network runs under ``torch.inference_mode()``. The time
+    spent in every stage (preprocess, forward, nms) is recorded per batch and summarized by :meth:`metrics`.
+
+    Args:
+        model: A YOLO model. Its confidence threshold, NMS threshold, and detections per image are used.
+        bucket_sizes: Network input sizes. Either integers for square inputs, or `(height, width)` tuples. The sizes
+            have to be divisible by the ratio in which the network downsamples the input.
+        max_batch_size: Maximum number of images in one forward pass.
+        max_latency: Maximum time in seconds that a submitted image waits for other images of the same bucket.
+        pad_value: Value of the padding pixels around the letterboxed images.
+        device: Where to run the model. Defaults to the device of the model parameters.
+
+    Example::
+
+        with YOLOPredictor(model, bucket_sizes=[320, 416, 608], max_batch_size=16, max_latency=0.01) as predictor:
+            futures = [predictor.submit(image) for image in images]
+            detections = [future.result() for future in futures]
+            print(predictor.metrics())
+
+    """
+
+    def __init__(
+        self,
+        model: YOLO,
+        bucket_sizes: Sequence[Union[int, Tuple[int, int]]] = (320, 416, 608),
+        max_batch_size: int = 16,
+        max_latency: float = 0.01,
+        pad_value: float = 0.5,
+        device: Optional[Union[str, torch.device]] = None,
+    ) -> None:
+        if not bucket_sizes:
+            raise ValueError("At least one bucket size is required.")
+        if max_batch_size < 1:
+            raise ValueError(f"Expected max_batch_size to be a positive integer, got {max_batch_size}.")
+
+        sizes = [(size, size) if isinstance(size, int) else (int(size[0]), int(size[1])) for size in bucket_sizes]
+        self.bucket_sizes = sorted(set(sizes), key=lambda size: (size[0] * size[1], size))
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.pad_value = pad_value
+
+        if device is None:
+            parameter = next(model.parameters(), None)
+            device = parameter.device if parameter is not None else torch.device("cpu")
+        self.device = torch.device(device)
+        self.model = model.to(self.device).eval()
+
+        self.latencies: Dict[str, List[float]] = {stage: [] for stage in _STAGES}
+        self.batch_sizes: List[int] = []
+        self._metrics_lock = Lock()
+        self._queue: Queue = Queue()
+        self._stop = Event()
+        self._worker: Optional[Thread] = None
+        self._worker_lock = Lock()
+
+    def select_bucket(self, height: int, width: int) -> Tuple[int, int]:
+        """Returns the smallest bucket that an image of the given size fits in, or the largest bucket."""
+        for bucket_height, bucket_width in self.bucket_sizes:
+            if height <= bucket_height and width <= bucket_width:
+                return bucket_height, bucket_width
+        return self.bucket_sizes[-1]
+
+    def predict(self, images: Sequence[Any]) -> List[PRED]:
+        """Detects objects in a list of images, grouping them by bucket into batches of at most ``max_batch_size``.
+
+        Args:
+            images: Image tensors sized ``[channels, height, width]``, either uint8 or floating point values in the
+                range [0, 1], or PIL images. The sizes may differ.
+
+        Returns:
+            One prediction dictionary per image, in the same order as ``images``. The boxes are in the coordinates of
+            the original images.
+
+        """
+        tensors = [self._to_tensor(image) for image in images]
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for image_idx, image in enumerate(tensors):
+            buckets.setdefault(self.select_bucket(*image.shape[-2:]), []).append(image_idx)
+
+        results: List[Optional[PRED]] = [None] * len(tensors)
+        for bucket, image_idxs in buckets.items():
+            for start in range(0, len(image_idxs), self.max_batch_size):
+                batch_idxs = image_idxs[start : start + self.max_batch_size]
+                detections = self._run_batch([tensors[idx] for idx in batch_idxs], bucket)
+                for image_idx, image_detections in zip(batch_idxs, detections):
+                    results[image_idx] = image_detections
+        return results  # type: ignore[return-value]
+
+    def submit(self, image: Any) -> Future:
+        """Queues an image for detection and returns a ``Future`` of its prediction dictionary.
+
+        The background thread is started on the first call. See :meth:`predict` for the image format.
+        """
+        tensor = self._to_tensor(image)
+        future: Future = Future()
+        request = _Request(tensor, self.select_bucket(*tensor.shape[-2:]), time.perf_counter(), future)
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = Thread(target=self._worker_loop, daemon=True)
+                self._worker.start()
+            self._queue.put(request)
+        return future
+
+    def close(self) -> None:
+        """Runs the images that are still queued and stops the background thread."""
+        with self._worker_lock:
+            if self._worker is None:
+                return
+            self._stop.set()
+            self._worker.join()
+            self._worker = None
+            self._stop.clear()
+
+    def __enter__(self) -> "YOLOPredictor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def metrics(self) -> Dict[str, float]:
+        """Summarizes the recorded batches: the mean batch size and the mean time per batch of every stage in
+        milliseconds."""
+        with self._metrics_lock:
+            num_batches = len(self.batch_sizes)
+            result = {
+                "batches": float(num_batches),
+                "mean_batch_size": sum(self.batch_sizes) / num_batches if num_batches else 0.0,
+            }
+            for stage, latencies in self.latencies.items():
+                result[f"{stage}_ms"] = 1000 * sum(latencies) / num_batches if num_batches else 0.0
+        return result
+
+    def reset_metrics(self) -> None:
+        with self._metrics_lock:
+            self.latencies = {stage: [] for stage in _STAGES}
+            self.batch_sizes = []
+
+    def letterbox(self, image: Tensor, bucket: Tuple[int, int]) -> Tuple[Tensor, Letterbox]:
+        """Resizes an image, keeping the aspect ratio, to fit in the bucket and pads it to the size of the bucket.
+
+        Args:
+            image: A floating point image tensor sized ``[channels, height, width]``.
+            bucket: The `(height, width)` of the output.
+
+        Returns:
+            The letterboxed image and the transformation that was applied.
+
+        """
+        height, width = image.shape[-2:]
+        bucket_height, bucket_width = bucket
+        scale = min(bucket_height / height, bucket_width / width)
+        new_height = min(bucket_height, max(1, round(height * scale)))
+        new_width = min(bucket_width, max(1, round(width * scale)))
+        pad_y = (bucket_height - new_height) // 2
+        pad_x = (bucket_width - new_width) // 2
+
+        result = image.new_full((image.shape[0], bucket_height, bucket_width), self.pad_value)
+        if (new_height, new_width) != (height, width):
+            image = F.interpolate(image[None], size=(new_height, new_width), mode="bilinear", align_corners=False)[0]
+        result[:, pad_y : pad_y + new_height, pad_x : pad_x + new_width] = image
+        return result, Letterbox(scale, pad_x, pad_y, width, height)
+
+    def _to_tensor(self, image: Any) -> Tensor:
+        if _PIL_AVAILABLE and isinstance(image, Image.Image):
+            return T.pil_to_tensor(image)
+        if not isinstance(image, Tensor):
+            raise TypeError(f"Expected an image tensor or a PIL image, got {type(image).__name__}.")
+        if image.ndim != 3:
+            raise ValueError(f"Expected an image sized [channels, height, width], got shape {tuple(image.shape)}.")
+        return image
+
+    def _synchronize(self) -> None:
+        if self.device.type == "cuda":
+            torch.cuda.synchronize(self.device)
+
+    def _run_batch(self, images: List[Tensor], bucket: Tuple[int, int]) -> List[PRED]:
+        with torch.inference_mode():
+            start = time.perf_counter()
+            batch = []
+            letterboxes = []
+            for image in images:
+                image = image.to(self.device, non_blocking=True)
+                image = image.float() / 255 if not image.is_floating_point() else image.float()
+                image, letterbox = self.letterbox(image, bucket)
+                batch.append(image)
+                letterboxes.append(letterbox)
+            batch_tensor = torch.stack(batch)
+            self._synchronize()
+            preprocessed = time.perf_counter()
+
+            preds = self.model(batch_tensor)
+            self._synchronize()
+            forwarded = time.perf_counter()
+
+            detections = self.model.process_detections(preds)
+            for image_detections, letterbox in zip(detections, letterboxes):
+                image_detections["boxes"] = letterbox.unletterbox(image_detections["boxes"])
+            self._synchronize()
+            finished = time.perf_counter()
+
+        with self._metrics_lock:
+            self.latencies["preprocess"].append(preprocessed - start)
+            self.latencies["forward"].append(forwarded - preprocessed)
+            self.latencies["nms"].append(finished - forwarded)
+            self.batch_sizes.append(len(images))
+        return detections
+
+    def _flush(self, requests: List[_Request]) -> None:
+        # futures that the callers have cancelled are dropped, and the others can't be cancelled anymore
+        requests = [request for request in requests if request.future.set_running_or_notify_cancel()]
+        if not requests:
+            return
+        try:
+            detections = self._run_batch([request.image for request in requests], requests[0].bucket)
+        except BaseException as err:  # delivered to the callers through the futures
+            for request in requests:
+                request.future.set_exception(err)
+        else:
+            for request, image_detections in zip(requests, detections):
+                request.future.set_result(image_detections)
+
+    def _worker_loop(self) -> None:
+        pending: Dict[Tuple[int, int], List[_Request]] = {}
+        while True:
+            stopping = self._stop.is_set()
+            timeout = 0.05
+            if pending:
+                deadline = min(requests[0].arrival for requests in pending.values()) + self.max_latency
+                timeout = min(timeout, max(0.0, deadline - time.perf_counter()))
+
+            # Wait for one request and then take all the requests that have already arrived, so that the requests that
+            # were queued during a forward pass end up in the same batches.
+            received = []
+            try:
+                if not stopping:
+                    received.append(self._queue.get(timeout=timeout))
+                while True:
+                    received.append(self._queue.get_nowait())
+            except Empty:
+                pass
+            if stopping and not received:
+                break
+
+            for request in received:
+                requests = pending.setdefault(request.bucket, [])
+                requests.append(request)
+                if len(requests) >= self.max_batch_size:
+                    self._flush(pending.pop(request.bucket))
+
+            expired = time.perf_counter() - self.max_latency
+            for bucket in [bucket for bucket, requests in pending.items() if requests[0].arrival <= expired]:
+                self._flush(pending.pop(bucket))
+
+        for requests in pending.values():
+            self._flush(requests)
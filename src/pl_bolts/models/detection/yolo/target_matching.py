@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List, Sequence, Tuple, Union
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 
 import torch
 from torch import Tensor
@@ -8,7 +8,7 @@ from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.warnings import warn_missing_pkg
 
 from .loss import YOLOLoss
-from .utils import aligned_iou, box_size_ratio, grid_centers, iou_below, is_inside_box
+from .utils import aligned_iou, box_size_ratio, grid_cache, iou_below_batch, is_inside_box
 
 if _TORCHVISION_AVAILABLE:
     from torchvision.ops import box_convert
@@ -16,7 +16,53 @@ else:
     warn_missing_pkg("torchvision")
 
 
-class ShapeMatching(ABC):
+def _pad_targets(
+    targets: Dict[str, Tensor], batch_size: int, keys: Sequence[str] = ("boxes",)
+) -> Tuple[Dict[str, Tensor], Tensor]:
+    """Scatters the packed targets of a batch into ``[batch_size, max_targets, ...]`` tensors, padded with zeros.
+
+    Args:
+        targets: The training targets of all the images concatenated. ``targets["image_index"]`` contains the index of
+            the image of every target.
+        batch_size: Number of images in the batch.
+        keys: The target tensors to pad.
+
+    Returns:
+        A dictionary of the padded tensors and the number of targets in each image.
+
+    """
+    image_index = targets["image_index"]
+    counts = torch.bincount(image_index, minlength=batch_size)
+    first_index = torch.cumsum(counts, 0) - counts
+    position = torch.arange(len(image_index), device=image_index.device) - first_index[image_index]
+    max_targets = int(counts.max()) if len(image_index) > 0 else 0
+    padded = {}
+    for key in keys:
+        values = targets[key]
+        padded[key] = values.new_zeros((batch_size, max_targets, *values.shape[1:]))
+        padded[key][image_index, position] = values
+    return padded, counts
+
+
+class _CachedTensors:
+    """Creates the constant tensors of a matching rule, e.g. the prior shapes, only once per device and data type."""
+
+    def _cached_tensor(
+        self, name: str, data: Sequence, device: torch.device, dtype: Optional[torch.dtype] = None
+    ) -> Tensor:
+        """Returns ``data`` as a tensor, which is created only once for every device and data type."""
+        cache: Dict[Tuple[str, torch.device, Optional[torch.dtype]], Tensor] = self.__dict__.setdefault(
+            "_tensor_cache", {}
+        )
+        key = (name, device, dtype)
+        tensor = cache.get(key)
+        if tensor is None:
+            tensor = torch.tensor(data, dtype=dtype, device=device)
+            cache[key] = tensor
+        return tensor
+
+
+class ShapeMatching(_CachedTensors, ABC):
     """Selects which anchors are used to predict each target, by comparing the shape of the target box to a set of prior
     shapes.
 
@@ -26,6 +72,9 @@ class ShapeMatching(ABC):
     detection layers, different shapes are defined for each layer. Usually there are three detection layers and three
     prior shapes per layer.
 
+    The targets of all the images in a batch are matched at once by :meth:`match_batch`. The prior shape tensors are
+    created once per device and data type.
+
     Args:
         ignore_bg_threshold: If a predictor is not responsible for predicting any target, but the prior shape has IoU
             with some target greater than this threshold, the predictor will not be taken into account when calculating
@@ -56,7 +105,36 @@ class ShapeMatching(ABC):
             The indices of the matched predictions, background mask, and a mask for selecting the matched targets.
 
         """
-        height, width = preds["boxes"].shape[:2]
+        batch_preds = {"boxes": preds["boxes"][None]}
+        packed_targets = {
+            "boxes": targets["boxes"],
+            "image_index": torch.zeros(len(targets["boxes"]), dtype=torch.int64, device=targets["boxes"].device),
+        }
+        pred_selector, background_mask, target_selector = self.match_batch(batch_preds, packed_targets, image_size)
+        return pred_selector[1:], background_mask[0], target_selector
+
+    def match_batch(
+        self,
+        preds: Dict[str, Tensor],
+        targets: Dict[str, Tensor],
+        image_size: Tensor,
+    ) -> Tuple[List[Tensor], Tensor, Tensor]:
+        """For each target of a batch, selects predictions from the same grid cell, where the center of the target box
+        is.
+
+        Args:
+            preds: Predictions for the whole batch. ``preds["boxes"]`` is sized
+                ``[batch_size, height, width, boxes_per_cell, 4]``.
+            targets: The training targets of all the images concatenated. ``targets["boxes"]`` contains the boxes and
+                ``targets["image_index"]`` the index of the image of every box.
+            image_size: Input image width and height.
+
+        Returns:
+            The indices of the matched predictions (image, row, column, and anchor), background mask sized
+            ``[batch_size, height, width, boxes_per_cell]``, and a mask or indices for selecting the matched targets.
+
+        """
+        batch_size, height, width = preds["boxes"].shape[:3]
         device = preds["boxes"].device
 
         # A multiplier for scaling image coordinates to feature map coordinates
@@ -71,16 +149,18 @@ class ShapeMatching(ABC):
         cell_j = grid_xy[:, 1].to(torch.int64).clamp(0, height - 1)
 
         target_selector, anchor_selector = self.match(xywh[:, 2:])
+        image_idx = targets["image_index"][target_selector]
         cell_i = cell_i[target_selector]
         cell_j = cell_j[target_selector]
 
         # Background mask is used to select anchors that are not responsible for predicting any object, for
         # calculating the part of the confidence loss with zero as the target confidence. It is set to False, if a
         # predicted box overlaps any target significantly, or if a prediction is matched to a target.
-        background_mask = iou_below(preds["boxes"], targets["boxes"], self.ignore_bg_threshold)
-        background_mask[cell_j, cell_i, anchor_selector] = False
+        padded_targets, _ = _pad_targets(targets, batch_size)
+        background_mask = iou_below_batch(preds["boxes"], padded_targets["boxes"], self.ignore_bg_threshold)
+        background_mask[image_idx, cell_j, cell_i, anchor_selector] = False
 
-        pred_selector = [cell_j, cell_i, anchor_selector]
+        pred_selector = [image_idx, cell_j, cell_i, anchor_selector]
 
         return pred_selector, background_mask, target_selector
 
@@ -127,8 +207,8 @@ class HighestIoUMatching(ShapeMatching):
         ]
 
     def match(self, wh: Tensor) -> Union[Tuple[Tensor, Tensor], Tensor]:
-        prior_wh = torch.tensor(self.prior_shapes, dtype=wh.dtype, device=wh.device)
-        anchor_map = torch.tensor(self.anchor_map, dtype=torch.int64, device=wh.device)
+        prior_wh = self._cached_tensor("prior_shapes", self.prior_shapes, wh.device, wh.dtype)
+        anchor_map = self._cached_tensor("anchor_map", self.anchor_map, wh.device, torch.int64)
 
         ious = aligned_iou(wh, prior_wh)
         highest_iou_anchors = ious.max(1).indices
@@ -165,7 +245,7 @@ class IoUThresholdMatching(ShapeMatching):
         self.threshold = threshold
 
     def match(self, wh: Tensor) -> Union[Tuple[Tensor, Tensor], Tensor]:
-        prior_wh = torch.tensor(self.prior_shapes, dtype=wh.dtype, device=wh.device)
+        prior_wh = self._cached_tensor("prior_shapes", self.prior_shapes, wh.device, wh.dtype)
 
         ious = aligned_iou(wh, prior_wh)
         above_threshold = (ious > self.threshold).nonzero()
@@ -201,17 +281,76 @@ class SizeRatioMatching(ShapeMatching):
         self.threshold = threshold
 
     def match(self, wh: Tensor) -> Union[Tuple[Tensor, Tensor], Tensor]:
-        prior_wh = torch.tensor(self.prior_shapes, dtype=wh.dtype, device=wh.device)
+        prior_wh = self._cached_tensor("prior_shapes", self.prior_shapes, wh.device, wh.dtype)
         return (box_size_ratio(wh, prior_wh) < self.threshold).nonzero().T
 
 
-def _sim_ota_match(costs: Tensor, ious: Tensor) -> Tuple[Tensor, Tensor]:
-    """Implements the SimOTA matching rule.
+def _sim_ota_match_batch(costs: Tensor, ious: Tensor, num_preds: Tensor, num_targets: Tensor) -> Tuple[Tensor, Tensor]:
+    """Implements the SimOTA matching rule for a padded batch of images.
 
     The number of units supplied by each supplier (training target) needs to be decided in the Optimal Transport
     problem. "Dynamic k Estimation" uses the sum of the top 10 IoU values (casted to int) between the target and the
     predicted boxes.
 
+    The images are matched at once: the costs of every target are sorted once, a rank mask selects the ``k`` predictions
+    with the lowest cost, and the predictions that were selected for more than one target are assigned to the target
+    with the lowest cost using ``argmin``. The predictions and targets after ``num_preds`` and ``num_targets`` are
+    padding and are never matched, as long as the padding costs are infinite and the padding IoUs are zero.
+
+    Args:
+        costs: A ``[batch_size, predictions, targets]`` tensor of losses, padded with ``inf``.
+        ious: A ``[batch_size, predictions, targets]`` tensor of IoUs, padded with zeros.
+        num_preds: The number of valid predictions in each image.
+        num_targets: The number of valid targets in each image.
+
+    Returns:
+        A ``[batch_size, predictions]`` mask of predictions that were matched, and a ``[batch_size, predictions]``
+        tensor of the indices of the matched targets, which is only meaningful where the mask is ``True``.
+
+    """
+    batch_size, max_preds, max_targets = costs.shape
+    device = costs.device
+    if costs.numel() == 0:
+        empty = torch.zeros((batch_size, max_preds), dtype=torch.bool, device=device)
+        return empty, torch.zeros((batch_size, max_preds), dtype=torch.int64, device=device)
+
+    # For each target, define k as the sum of the 10 highest IoUs.
+    valid_targets = torch.arange(max_targets, device=device) < num_targets[:, None]
+    top10_iou = torch.topk(ious, min(10, max_preds), dim=1).values.sum(1)
+    ks = torch.clip(top10_iou.int(), min=1)
+    ks = ks.masked_fill(~valid_targets | (num_preds[:, None] == 0), 0)
+
+    # For each target, select k predictions with the lowest cost. The columns are sorted once up to the largest k, and
+    # a rank mask keeps the first k predictions of each column. The predictions that were not selected are redirected
+    # to an extra column that is dropped at the end.
+    max_k = min(int(ks.max()), max_preds)
+    pred_idx = torch.topk(costs, max_k, dim=1, largest=False).indices
+    selected = torch.arange(max_k, device=device)[None, :, None] < ks[:, None, :]
+    pred_idx = pred_idx.masked_fill(~selected, max_preds).flatten(1)
+    target_idx = torch.arange(max_targets, device=device).expand(batch_size, max_k, max_targets).flatten(1)
+
+    num_matches = torch.zeros((batch_size, max_preds + 1), dtype=torch.int64, device=device)
+    num_matches.scatter_add_(1, pred_idx, torch.ones_like(pred_idx))
+    matched_target = torch.zeros((batch_size, max_preds + 1), dtype=torch.int64, device=device)
+    matched_target.scatter_(1, pred_idx, target_idx)
+    num_matches = num_matches[:, :max_preds]
+    matched_target = matched_target[:, :max_preds]
+
+    # If there's more than one match for some prediction, match it with the best target. Now we consider all targets,
+    # regardless of whether they were originally matched with the prediction or not.
+    more_than_one_match = num_matches > 1
+    best_targets = costs.argmin(2)
+
+    pred_mask = num_matches > 0
+    target_selector = torch.where(more_than_one_match, best_targets, matched_target)
+    return pred_mask, target_selector
+
+
+def _sim_ota_match(costs: Tensor, ious: Tensor) -> Tuple[Tensor, Tensor]:
+    """Implements the SimOTA matching rule for a single image.
+
+    See :func:`_sim_ota_match_batch` for the details.
+
     Args:
         costs: A ``[predictions, targets]`` matrix of losses.
         ious: A ``[predictions, targets]`` matrix of IoUs.
@@ -222,34 +361,12 @@ def _sim_ota_match(costs: Tensor, ious: Tensor) -> Tuple[Tensor, Tensor]:
 
     """
     num_preds, num_targets = ious.shape
-
-    matching_matrix = torch.zeros_like(costs, dtype=torch.bool)
-
-    if ious.numel() > 0:
-        # For each target, define k as the sum of the 10 highest IoUs.
-        top10_iou = torch.topk(ious, min(10, num_preds), dim=0).values.sum(0)
-        ks = torch.clip(top10_iou.int(), min=1)
-        assert len(ks) == num_targets
-
-        # For each target, select k predictions with the lowest cost.
-        for target_idx, (target_costs, k) in enumerate(zip(costs.T, ks)):
-            pred_idx = torch.topk(target_costs, k, largest=False).indices
-            matching_matrix[pred_idx, target_idx] = True
-
-        # If there's more than one match for some prediction, match it with the best target. Now we consider all
-        # targets, regardless of whether they were originally matched with the prediction or not.
-        more_than_one_match = matching_matrix.sum(1) > 1
-        best_targets = costs[more_than_one_match, :].argmin(1)
-        matching_matrix[more_than_one_match, :] = False
-        matching_matrix[more_than_one_match, best_targets] = True
-
-    # For those predictions that were matched, get the index of the target.
-    pred_mask = matching_matrix.sum(1) > 0
-    target_selector = matching_matrix[pred_mask, :].int().argmax(1)
-    return pred_mask, target_selector
+    counts = torch.tensor([[num_preds, num_targets]], device=costs.device)
+    pred_mask, target_selector = _sim_ota_match_batch(costs[None], ious[None], counts[:, 0], counts[:, 1])
+    return pred_mask[0], target_selector[0][pred_mask[0]]
 
 
-class SimOTAMatching:
+class SimOTAMatching(_CachedTensors):
     """Selects which anchors are used to predict each target using the SimOTA matching rule.
 
     This is the matching rule used by YOLOX.
@@ -298,29 +415,96 @@ class SimOTAMatching:
             matched targets. The last tensor contains as many elements as there are ``True`` values in the first mask.
 
         """
-        height, width, boxes_per_cell, _ = preds["boxes"].shape
-        prior_mask, anchor_inside_target = self._get_prior_mask(targets, image_size, width, height, boxes_per_cell)
-        prior_preds = {
-            "boxes": preds["boxes"][prior_mask],
-            "confidences": preds["confidences"][prior_mask],
-            "classprobs": preds["classprobs"][prior_mask],
+        batch_preds = {key: value[None] for key, value in preds.items()}
+        packed_targets = {
+            "boxes": targets["boxes"],
+            "labels": targets["labels"],
+            "image_index": torch.zeros(len(targets["boxes"]), dtype=torch.int64, device=targets["boxes"].device),
         }
+        pred_mask, background_mask, target_selector = self.match_batch(batch_preds, packed_targets, image_size)
+        return pred_mask[0], background_mask[0], target_selector
 
-        losses, ious = self.loss_func.pairwise(prior_preds, targets, input_is_normalized=False)
-        costs = losses.overlap + losses.confidence + losses.classification
-        costs += 100000.0 * ~anchor_inside_target
-        pred_mask, target_selector = _sim_ota_match(costs, ious)
+    def match_batch(
+        self,
+        preds: Dict[str, Tensor],
+        targets: Dict[str, Tensor],
+        image_size: Tensor,
+    ) -> Tuple[Tensor, Tensor, Tensor]:
+        """Selects predictions for the targets of a batch, running the SimOTA assignment for all the images at once.
 
-        # Add the anchor dimension to the mask and replace True values with the results of the actual SimOTA matching.
-        prior_mask[prior_mask.nonzero().T.tolist()] = pred_mask
+        The targets are padded to ``[batch_size, max_targets]`` and the "center prior" candidates of every image are
+        gathered into ``[batch_size, max_preds]``, so that the prior mask, the IoUs, and the costs of the whole batch
+        are calculated by the same few kernels, regardless of the number of images and targets. The result is the same
+        as calling this object for each image.
 
-        background_mask = torch.logical_not(prior_mask)
+        Args:
+            preds: Predictions for the whole batch. The tensors are sized ``[batch_size, height, width, boxes_per_cell,
+                ...]``.
+            targets: The training targets of all the images concatenated. ``targets["image_index"]`` contains the index
+                of the image of every target.
+            image_size: Input image width and height.
+
+        Returns:
+            A ``[batch_size, height, width, boxes_per_cell]`` mask of predictions that were matched, background mask
+            (inverse of the first mask), and the indices of the matched targets. The last tensor contains as many
+            elements as there are ``True`` values in the first mask.
+
+        """
+        batch_size, height, width, boxes_per_cell = preds["boxes"].shape[:4]
+        num_anchors = height * width * boxes_per_cell
+        device = preds["boxes"].device
 
-        return prior_mask, background_mask, target_selector
+        padded_targets, num_targets = _pad_targets(targets, batch_size, ("boxes", "labels"))
+        max_targets = padded_targets["boxes"].shape[1]
+        valid_targets = torch.arange(max_targets, device=device) < num_targets[:, None]
+        prior_mask, anchor_inside_target = self._get_prior_mask(
+            padded_targets["boxes"], valid_targets, image_size, width, height, boxes_per_cell
+        )
+
+        # Move the "center prior" anchors of every image to the front, in their original order, and pad the anchor
+        # dimension to the largest number of candidates in the batch. The number is only read for the tensor shape.
+        num_preds = prior_mask.sum(1)
+        max_preds = int(num_preds.max())
+        candidate_idx = torch.sort(prior_mask.to(torch.uint8), dim=1, descending=True, stable=True).indices
+        candidate_idx = candidate_idx[:, :max_preds]
+        valid_preds = torch.arange(max_preds, device=device) < num_preds[:, None]
+
+        def gather(values: Tensor) -> Tensor:
+            values = values.reshape(batch_size, num_anchors, *values.shape[4:])
+            index = candidate_idx.view(batch_size, max_preds, *([1] * (values.ndim - 2)))
+            return values.gather(1, index.expand(batch_size, max_preds, *values.shape[2:]))
+
+        candidate_preds = {key: gather(preds[key]) for key in ("boxes", "confidences", "classprobs")}
+        losses, ious = self.loss_func.pairwise(candidate_preds, padded_targets, input_is_normalized=False)
+        costs = losses.overlap + losses.confidence + losses.classification
+        index = candidate_idx[:, :, None].expand(batch_size, max_preds, max_targets)
+        costs += 100000.0 * ~anchor_inside_target.gather(1, index)
+
+        # The padding is never matched, as long as its costs are infinite and its IoUs are zero. This also discards the
+        # NaN values that some overlap functions produce for the empty padding boxes.
+        valid_pairs = torch.logical_and(valid_preds[:, :, None], valid_targets[:, None, :])
+        costs = costs.masked_fill(~valid_pairs, float("inf"))
+        ious = ious.masked_fill(~valid_pairs, 0.0)
+        pred_masks, target_selectors = _sim_ota_match_batch(costs, ious, num_preds, num_targets)
+
+        # Scatter the results back to the anchors. The target indices are converted from the padded targets of each
+        # image to the packed targets of the batch.
+        first_index = torch.cumsum(num_targets, 0) - num_targets
+        pred_mask = torch.zeros((batch_size, num_anchors), dtype=torch.bool, device=device)
+        pred_mask.scatter_(1, candidate_idx, torch.logical_and(pred_masks, valid_preds))
+        target_index = torch.zeros((batch_size, num_anchors), dtype=torch.int64, device=device)
+        target_index.scatter_(1, candidate_idx, target_selectors + first_index[:, None])
+        target_selector = target_index[pred_mask]
+
+        pred_mask = pred_mask.view(batch_size, height, width, boxes_per_cell)
+        background_mask = torch.logical_not(pred_mask)
+
+        return pred_mask, background_mask, target_selector
 
     def _get_prior_mask(
         self,
-        targets: Dict[str, Tensor],
+        boxes: Tensor,
+        valid_targets: Tensor,
         image_size: Tensor,
         grid_width: int,
         grid_height: int,
@@ -332,40 +516,48 @@ class SimOTAMatching:
         targets.
 
         Args:
-            targets: Training targets for a single image.
+            boxes: A ``[batch_size, max_targets, 4]`` tensor of the target boxes of each image, padded with zeros.
+            valid_targets: A ``[batch_size, max_targets]`` mask of the targets that are not padding.
             image_size: Input image width and height.
             grid_width: Width of the feature grid.
             grid_height: Height of the feature grid.
             boxes_per_cell: Number of boxes that will be predicted per feature grid cell.
 
         Returns:
-            Two masks, a ``[grid_height, grid_width, boxes_per_cell]`` mask for selecting anchors that are close and
-            similar in shape to a target, and an ``[anchors, targets]`` matrix that indicates which targets are inside
-            those anchors.
+            A ``[batch_size, anchors]`` mask for selecting anchors that are close and similar in shape to a target, and
+            a ``[batch_size, anchors, max_targets]`` tensor that indicates which targets are inside the anchors. The
+            anchors are in the order of the flattened ``[grid_height, grid_width, boxes_per_cell]`` grid.
 
         """
+        batch_size, max_targets = valid_targets.shape
+        num_cells = grid_height * grid_width
+        flat_boxes = boxes.view(-1, 4)
+
         # A multiplier for scaling feature map coordinates to image coordinates
-        grid_size = torch.tensor([grid_width, grid_height], device=targets["boxes"].device)
+        grid_size = grid_cache.size(grid_width, grid_height, boxes.device)
         grid_to_image = torch.true_divide(image_size, grid_size)
 
         # Get target center coordinates and dimensions.
-        xywh = box_convert(targets["boxes"], in_fmt="xyxy", out_fmt="cxcywh")
+        xywh = box_convert(flat_boxes, in_fmt="xyxy", out_fmt="cxcywh")
         xy = xywh[:, :2]
         wh = xywh[:, 2:]
 
-        # Create a [boxes_per_cell, targets] tensor for selecting prior shapes that are close enough to the target
-        # dimensions.
-        prior_wh = torch.tensor(self.prior_shapes, device=targets["boxes"].device)
+        # Create a [batch_size, boxes_per_cell, targets] tensor for selecting prior shapes that are close enough to the
+        # target dimensions. The padding targets are never selected.
+        prior_wh = self._cached_tensor("prior_shapes", self.prior_shapes, boxes.device)
         shape_selector = box_size_ratio(prior_wh, wh) < self.size_range
+        shape_selector = shape_selector.view(boxes_per_cell, batch_size, max_targets).transpose(0, 1)
+        shape_selector = torch.logical_and(shape_selector, valid_targets[:, None, :])
 
-        # Create a [grid_cells, targets] tensor for selecting spatial locations that are inside target bounding boxes.
-        centers = grid_centers(grid_size).view(-1, 2) * grid_to_image
-        inside_selector = is_inside_box(centers, targets["boxes"])
+        # Create a [batch_size, grid_cells, targets] tensor for selecting spatial locations that are inside target
+        # bounding boxes.
+        centers = grid_cache.centers(grid_width, grid_height, grid_size.device, torch.get_default_dtype())
+        centers = centers.view(-1, 2) * grid_to_image
+        inside_selector = is_inside_box(centers, flat_boxes).view(num_cells, batch_size, max_targets).transpose(0, 1)
 
-        # Combine the above selectors into a [grid_cells, boxes_per_cell, targets] tensor for selecting anchors that are
-        # inside target bounding boxes and close enough shape.
-        inside_selector = inside_selector[:, None, :].repeat(1, boxes_per_cell, 1)
-        inside_selector = torch.logical_and(inside_selector, shape_selector)
+        # Combine the above selectors into a [batch_size, grid_cells, boxes_per_cell, targets] tensor for selecting
+        # anchors that are inside target bounding boxes and close enough shape.
+        inside_selector = torch.logical_and(inside_selector[:, :, None, :], shape_selector[:, None, :, :])
 
         # Set the width and height of all target bounding boxes to self.range grid cells and create a selector for
         # anchors that are now inside the boxes. If a small target has no anchors inside its bounding box, it will be
@@ -373,15 +565,13 @@ class SimOTAMatching:
         # will be preferred.
         wh = self.spatial_range * grid_to_image * torch.ones_like(xy)
         xywh = torch.cat((xy, wh), -1)
-        boxes = box_convert(xywh, in_fmt="cxcywh", out_fmt="xyxy")
-        close_selector = is_inside_box(centers, boxes)
-
-        # Create a [grid_cells, boxes_per_cell, targets] tensor for selecting anchors that are spatially close to a
-        # target and whose shape is close enough to the target.
-        close_selector = close_selector[:, None, :].repeat(1, boxes_per_cell, 1)
-        close_selector = torch.logical_and(close_selector, shape_selector)
-
-        mask = torch.logical_or(inside_selector, close_selector).sum(-1) > 0
-        mask = mask.view(grid_height, grid_width, boxes_per_cell)
-        inside_selector = inside_selector.view(grid_height, grid_width, boxes_per_cell, -1)
-        return mask, inside_selector[mask]
+        close_boxes = box_convert(xywh, in_fmt="cxcywh", out_fmt="xyxy")
+        close_selector = is_inside_box(centers, close_boxes).view(num_cells, batch_size, max_targets).transpose(0, 1)
+
+        # Create a [batch_size, grid_cells, boxes_per_cell, targets] tensor for selecting anchors that are spatially
+        # close to a target and whose shape is close enough to the target.
+        close_selector = torch.logical_and(close_selector[:, :, None, :], shape_selector[:, None, :, :])
+
+        mask = torch.logical_or(inside_selector, close_selector).any(-1)
+        num_anchors = num_cells * boxes_per_cell
+        return mask.view(batch_size, num_anchors), inside_selector.view(batch_size, num_anchors, max_targets)
@@ -1,19 +1,19 @@
 from collections import OrderedDict
-from typing import Any, List, Optional, Sequence, Tuple
+from typing import Any, List, Optional, Sequence, Tuple, Union
 
 import torch
 import torch.nn as nn
 from torch import Tensor
 
 from .layers import Conv, DetectionLayer, MaxPool, ReOrg, create_detection_layer
-from .types import NETWORK_OUTPUT, TARGETS
+from .types import NETWORK_OUTPUT, TARGET, TARGETS
 from .utils import get_image_size
 
 
 def run_detection(
     detection_layer: DetectionLayer,
     layer_input: Tensor,
-    targets: Optional[TARGETS],
+    targets: Optional[Union[TARGET, TARGETS]],
     image_size: Tensor,
     detections: List[Tensor],
     losses: List[Tensor],
@@ -26,7 +26,7 @@ def run_detection(
     Args:
         detection_layer: The detection layer.
         layer_input: Input to the detection layer.
-        targets: List of training targets for each image.
+        targets: Training targets of the batch, packed by ``pack_targets()``, or a list of targets for each image.
         image_size: Width and height in a vector that defines the scale of the target coordinates.
         detections: A list where a tensor containing the detections will be appended to.
         losses: A list where a tensor containing the losses will be appended to, if ``targets`` is given.
@@ -46,7 +46,7 @@ def run_detection_with_aux_head(
     aux_detection_layer: DetectionLayer,
     layer_input: Tensor,
     aux_input: Tensor,
-    targets: Optional[TARGETS],
+    targets: Optional[Union[TARGET, TARGETS]],
     image_size: Tensor,
     aux_weight: float,
     detections: List[Tensor],
@@ -63,7 +63,7 @@ def run_detection_with_aux_head(
         aux_detection_layer: The auxiliary detection layer.
         layer_input: Input to the lead detection layer.
         aux_input: Input to the auxiliary detection layer.
-        targets: List of training targets for each image.
+        targets: Training targets of the batch, packed by ``pack_targets()``, or a list of targets for each image.
         image_size: Width and height in a vector that defines the scale of the target coordinates.
         aux_weight: Weight of the auxiliary loss.
         detections: A list where a tensor containing the detections will be appended to.
@@ -750,7 +750,7 @@ class YOLOV4TinyNetwork(nn.Module):
         self.detect4 = detect([3, 4, 5])
         self.detect5 = detect([6, 7, 8])
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
         hits: List[int] = []  # Number of targets each detection layer was responsible for
@@ -914,7 +914,7 @@ class YOLOV4Network(nn.Module):
         self.detect4 = detect(range(anchors_per_cell, anchors_per_cell * 2))
         self.detect5 = detect(range(anchors_per_cell * 2, anchors_per_cell * 3))
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
         hits: List[int] = []  # Number of targets each detection layer was responsible for
@@ -1101,7 +1101,7 @@ class YOLOV4P6Network(nn.Module):
         self.detect5 = detect(range(anchors_per_cell * 2, anchors_per_cell * 3))
         self.detect6 = detect(range(anchors_per_cell * 3, anchors_per_cell * 4))
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
         hits: List[int] = []  # Number of targets each detection layer was responsible for
@@ -1273,7 +1273,7 @@ class YOLOV5Network(nn.Module):
         self.detect4 = detect(range(anchors_per_cell, anchors_per_cell * 2))
         self.detect5 = detect(range(anchors_per_cell * 2, anchors_per_cell * 3))
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
         hits: List[int] = []  # Number of targets each detection layer was responsible for
@@ -1480,7 +1480,7 @@ class YOLOV7Network(nn.Module):
         self.detect6 = detect(range(anchors_per_cell * 3, anchors_per_cell * 4), 5.0)
         self.aux_detect6 = detect(range(anchors_per_cell * 3, anchors_per_cell * 4), 3.0)
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
         hits: List[int] = []  # Number of targets each detection layer was responsible for
@@ -1749,7 +1749,7 @@ class YOLOXNetwork(nn.Module):
         self.detect4 = detect(range(anchors_per_cell, anchors_per_cell * 2))
         self.detect5 = detect(range(anchors_per_cell * 2, anchors_per_cell * 3))
 
-    def forward(self, x: Tensor, targets: Optional[TARGETS] = None) -> NETWORK_OUTPUT:
+    def forward(self, x: Tensor, targets: Optional[Union[TARGET, TARGETS]] = None) -> NETWORK_OUTPUT:
         detections: List[Tensor] = []  # Outputs from detection layers
         losses: List[Tensor] = []  # Losses from detection layers
         hits: List[int] = []  # Number of targets each detection layer was responsible for
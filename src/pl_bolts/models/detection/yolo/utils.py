@@ -1,4 +1,6 @@
-from typing import List
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, List, Tuple
 
 import torch
 from torch import Tensor
@@ -79,6 +81,83 @@ def global_xy(xy: Tensor, image_size: Tensor) -> Tensor:
     return (xy + offset) * scale
 
 
+class GridCache:
+    """A bounded cache of the grid tensors that the detection layers and the target matching use.
+
+    The tensors are keyed by the grid width and height, device, and data type, so that every layer creates them only
+    once per feature map size, and multi-scale training reuses the grids of the sizes that it has seen. When more than
+    ``max_size`` tensors are cached, the least recently used one is dropped.
+
+    The cache cannot be used while tracing or scripting a model, since the tensors would be recorded as constants and
+    the exported model would only accept one input size. The callers check ``torch.jit.is_tracing()`` and
+    ``torch.jit.is_scripting()`` and use :func:`global_xy` and :func:`grid_centers` then.
+
+    Args:
+        max_size: Maximum number of cached tensors.
+
+    """
+
+    def __init__(self, max_size: int = 32) -> None:
+        self.max_size = max_size
+        self._tensors: "OrderedDict[Tuple[str, int, int, torch.device, torch.dtype], Tensor]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._tensors)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tensors.clear()
+
+    def size(self, width: int, height: int, device: torch.device) -> Tensor:
+        """Returns the grid width and height in a tensor, like the tensors that ``grid_offsets()`` takes."""
+        return self._get(
+            "size", width, height, device, torch.int64, lambda: torch.tensor([width, height], device=device)
+        )
+
+    def offsets(self, width: int, height: int, device: torch.device, dtype: torch.dtype) -> Tensor:
+        """Returns the ``[height, width, 2]`` grid cell offsets that ``grid_offsets()`` returns, in ``dtype``."""
+        return self._get(
+            "offsets",
+            width,
+            height,
+            device,
+            dtype,
+            lambda: grid_offsets(self.size(width, height, device)).to(dtype),
+        )
+
+    def centers(self, width: int, height: int, device: torch.device, dtype: torch.dtype) -> Tensor:
+        """Returns the ``[height, width, 2]`` grid cell centers that ``grid_centers()`` returns, in ``dtype``."""
+        return self._get(
+            "centers",
+            width,
+            height,
+            device,
+            dtype,
+            lambda: grid_centers(self.size(width, height, device)).to(dtype),
+        )
+
+    def _get(
+        self, kind: str, width: int, height: int, device: torch.device, dtype: torch.dtype, create: Callable[[], Tensor]
+    ) -> Tensor:
+        key = (kind, width, height, torch.device(device), dtype)
+        with self._lock:
+            tensor = self._tensors.get(key)
+            if tensor is not None:
+                self._tensors.move_to_end(key)
+                return tensor
+
+        tensor = create()
+        with self._lock:
+            self._tensors[key] = tensor
+            while len(self._tensors) > self.max_size:
+                self._tensors.popitem(last=False)
+        return tensor
+
+
+grid_cache = GridCache()
+
+
 def aligned_iou(wh1: Tensor, wh2: Tensor) -> Tensor:
     """Calculates a matrix of intersections over union from box dimensions, assuming that the boxes are located at the
     same coordinates.
@@ -121,6 +200,37 @@ def iou_below(pred_boxes: Tensor, target_boxes: Tensor, threshold: float) -> Ten
     return below_threshold.view(shape)
 
 
+def iou_below_batch(pred_boxes: Tensor, target_boxes: Tensor, threshold: float) -> Tensor:
+    """Creates a binary mask for a batch of images whose value will be ``True``, unless the predicted box overlaps any
+    target of the same image significantly (IoU greater than ``threshold``).
+
+    Args:
+        pred_boxes: The predicted corner coordinates. Tensor of size ``[batch_size, height, width, boxes_per_cell, 4]``.
+        target_boxes: Corner coordinates of the target boxes, padded to the same number of boxes in every image with
+            empty boxes. Tensor of size ``[batch_size, targets, 4]``.
+
+    Returns:
+        A boolean tensor sized ``[batch_size, height, width, boxes_per_cell]``, with ``False`` where the predicted box
+        overlaps a target significantly and ``True`` elsewhere.
+    """
+    shape = pred_boxes.shape[:-1]
+    if target_boxes.shape[1] == 0:
+        return torch.ones(shape, dtype=torch.bool, device=pred_boxes.device)
+
+    pred_boxes = pred_boxes.reshape(shape[0], -1, 1, 4)
+    target_boxes = target_boxes[:, None, :, :]
+    pred_area = (pred_boxes[..., 2] - pred_boxes[..., 0]) * (pred_boxes[..., 3] - pred_boxes[..., 1])
+    target_area = (target_boxes[..., 2] - target_boxes[..., 0]) * (target_boxes[..., 3] - target_boxes[..., 1])
+    lt = torch.max(pred_boxes[..., :2], target_boxes[..., :2])
+    rb = torch.min(pred_boxes[..., 2:], target_boxes[..., 2:])
+    inter_wh = (rb - lt).clamp(min=0)
+    inter = inter_wh[..., 0] * inter_wh[..., 1]
+    ious = inter / (pred_area + target_area - inter)
+    best_iou = ious.max(-1).values
+    below_threshold = best_iou <= threshold
+    return below_threshold.view(shape)
+
+
 def is_inside_box(points: Tensor, boxes: Tensor) -> Tensor:
     """Get pairwise truth values of whether the point is inside the box.
 
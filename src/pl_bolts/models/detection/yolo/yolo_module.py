@@ -15,12 +15,16 @@ except AttributeError:
     LRScheduler = getattr(optim.lr_scheduler, "_LRScheduler")
 
 from pl_bolts.datamodules import VOCDetectionDataModule
+from pl_bolts.datamodules.detection_collate import PackedDetectionTargets
 from pl_bolts.datamodules.vocdetection_datamodule import Compose
 from pl_bolts.optimizers.lr_scheduler import LinearWarmupCosineAnnealingLR
+from pl_bolts.transforms.detection_batch_transforms import DetectionMixUp, DetectionMosaic, DetectionMultiScale
 from pl_bolts.utils import _TORCHMETRICS_DETECTION_AVAILABLE, _TORCHVISION_AVAILABLE
 from pl_bolts.utils.warnings import warn_missing_pkg
 
 from .darknet_network import DarknetNetwork
+from .layers import fuse_for_inference, pack_targets
+from .postprocessing import BatchedDetections, batched_detections
 from .torch_networks import YOLOV4Network
 from .types import BATCH, IMAGES, PRED, TARGET, TARGETS
 
@@ -35,7 +39,6 @@ else:
     _MEAN_AVERAGE_PRECISION_AVAILABLE = False
 
 if _TORCHVISION_AVAILABLE:
-    from torchvision.ops import batched_nms
     from torchvision.transforms import functional as T  # noqa: N812
 else:
     warn_missing_pkg("torchvision")
@@ -77,6 +80,10 @@ class YOLO(LightningModule):
     - labels (``Int64Tensor[N]`` or ``BoolTensor[N, classes]``): the class label or a boolean class mask for each
       ground-truth box
 
+    Alternatively, the images can be padded into one tensor and the targets packed into flat tensors by
+    :class:`~pl_bolts.datamodules.detection_collate.DetectionCollate`, which avoids collating and validating every
+    target in Python.
+
     :func:`~.yolo_module.YOLO.forward` method returns all predictions from all detection layers in one tensor with shape
     ``[N, anchors, classes + 5]``, where ``anchors`` is the total number of anchors in all detection layers. The
     coordinates are scaled to the input image size. During training it also returns a dictionary containing the
@@ -103,6 +110,8 @@ class YOLO(LightningModule):
         nms_threshold: Non-maximum suppression will remove bounding boxes whose IoU with a higher confidence box is
             higher than this threshold, if the predicted categories are equal.
         detections_per_image: Keep at most this number of highest-confidence detections per image.
+        pre_nms_top_k: If given, keep at most this number of highest-scoring candidates per image before non-maximum
+            suppression, which bounds the cost of NMS when many predictions pass the confidence threshold.
 
     """
 
@@ -116,6 +125,7 @@ class YOLO(LightningModule):
         confidence_threshold: float = 0.2,
         nms_threshold: float = 0.45,
         detections_per_image: int = 300,
+        pre_nms_top_k: Optional[int] = None,
     ) -> None:
         super().__init__()
 
@@ -136,13 +146,14 @@ class YOLO(LightningModule):
         self.confidence_threshold = confidence_threshold
         self.nms_threshold = nms_threshold
         self.detections_per_image = detections_per_image
+        self.pre_nms_top_k = pre_nms_top_k
 
         if _MEAN_AVERAGE_PRECISION_AVAILABLE:
             self._val_map = MeanAveragePrecision()
             self._test_map = MeanAveragePrecision()
 
     def forward(
-        self, images: Union[Tensor, IMAGES], targets: Optional[TARGETS] = None
+        self, images: Union[Tensor, IMAGES], targets: Optional[Union[TARGETS, PackedDetectionTargets]] = None
     ) -> Union[Tensor, Tuple[Tensor, Tensor]]:
         """Runs a forward pass through the network (all layers listed in ``self.network``), and if training targets
         are provided, computes the losses from the detection layers.
@@ -154,7 +165,7 @@ class YOLO(LightningModule):
             images: A tensor of size ``[batch_size, channels, height, width]`` containing a batch of images or a list of
                 image tensors.
             targets: If given, computes losses from detection layers against these targets. A list of target
-                dictionaries, one for each image.
+                dictionaries, one for each image, or the packed targets of the batch.
 
         Returns:
             detections (:class:`~torch.Tensor`), losses (:class:`~torch.Tensor`): Detections, and if targets were
@@ -164,10 +175,16 @@ class YOLO(LightningModule):
         """
         self.validate_batch(images, targets)
         images_tensor = images if isinstance(images, Tensor) else torch.stack(images)
-        detections, losses, hits = self.network(images_tensor, targets)
+        # The detection layers match the targets of the whole batch at once, so they are passed in the packed format.
+        packed_targets: Optional[TARGET] = None
+        if isinstance(targets, PackedDetectionTargets):
+            packed_targets = {"boxes": targets.boxes, "labels": targets.labels, "image_index": targets.image_index}
+        elif targets is not None:
+            packed_targets = pack_targets(targets, images_tensor.device)
+        detections, losses, hits = self.network(images_tensor, packed_targets)
 
         detections = torch.cat(detections, 1)
-        if targets is None:
+        if packed_targets is None:
             return detections
 
         total_hits = sum(hits)
@@ -323,7 +340,8 @@ class YOLO(LightningModule):
     def infer(self, image: Tensor) -> PRED:
         """Feeds an image to the network and returns the detected bounding boxes, confidence scores, and class labels.
 
-        If a prediction has a high score for more than one class, it will be duplicated.
+        If a prediction has a high score for more than one class, it will be duplicated. To process many images, use
+        :class:`~.predictor.YOLOPredictor`, which runs them in batches.
 
         Args:
             image: An input image, a tensor of uint8 values sized ``[channels, height, width]``.
@@ -340,14 +358,28 @@ class YOLO(LightningModule):
         was_training = self.training
         self.eval()
 
-        detections = self([image])
-        detections = self.process_detections(detections)
-        detections = detections[0]
+        with torch.inference_mode():
+            detections = self([image])
+            detections = self.process_detections(detections)
+            detections = detections[0]
 
         if was_training:
             self.train()
         return detections
 
+    def fuse_for_inference(self) -> "YOLO":
+        """Folds batch normalization into the convolutions and fuses the Mish activations of the network.
+
+        The model is switched to evaluation mode and can only be used for inference afterwards. See
+        :func:`~.layers.fuse_for_inference`.
+
+        Returns:
+            The model itself.
+
+        """
+        fuse_for_inference(self.network)
+        return self.eval()
+
     def process_detections(self, preds: Tensor) -> List[PRED]:
         """Splits the detection tensor returned by a forward pass into a list of prediction dictionaries, and filters
         them based on confidence threshold, non-maximum suppression (NMS), and maximum number of predictions.
@@ -370,22 +402,32 @@ class YOLO(LightningModule):
 
         """
 
-        def process(boxes: Tensor, confidences: Tensor, classprobs: Tensor) -> Dict[str, Any]:
-            scores = classprobs * confidences[:, None]
+        return self.process_detections_batched(preds).unbatch()
 
-            # Select predictions with high scores. If a prediction has a high score for more than one class, it will be
-            # duplicated.
-            idxs, labels = (scores > self.confidence_threshold).nonzero().T
-            boxes = boxes[idxs]
-            scores = scores[idxs, labels]
+    def process_detections_batched(self, preds: Tensor) -> BatchedDetections:
+        """Filters the detections like :meth:`process_detections`, but returns them in fixed-size tensors.
 
-            keep = batched_nms(boxes, scores, labels, self.nms_threshold)
-            keep = keep[: self.detections_per_image]
-            return {"boxes": boxes[keep], "scores": scores[keep], "labels": labels[keep]}
+        Candidate filtering runs over the whole batch at once and NMS is called once for all the images, see
+        :func:`~.postprocessing.batched_detections`. Every image gets ``detections_per_image`` rows, followed by
+        padding when there are fewer detections, and ``num_detections`` tells how many rows are valid.
 
-        return [process(p[..., :4], p[..., 4], p[..., 5:]) for p in preds]
+        Args:
+            preds: A tensor of detected bounding boxes and their attributes.
 
-    def process_targets(self, targets: TARGETS) -> List[TARGET]:
+        Returns:
+            Filtered detections in tensors "boxes" (``[batch_size, detections_per_image, 4]``), "scores", "labels"
+            (``[batch_size, detections_per_image]``, -1 in padding rows), and "num_detections" (``[batch_size]``).
+
+        """
+        return batched_detections(
+            preds,
+            confidence_threshold=self.confidence_threshold,
+            nms_threshold=self.nms_threshold,
+            detections_per_image=self.detections_per_image,
+            pre_nms_top_k=self.pre_nms_top_k,
+        )
+
+    def process_targets(self, targets: Union[TARGETS, PackedDetectionTargets]) -> List[TARGET]:
         """Duplicates multi-label targets to create one target for each label.
 
         Args:
@@ -403,15 +445,19 @@ class YOLO(LightningModule):
                 boxes = boxes[idxs]
             return {"boxes": boxes, "labels": labels, **other}
 
+        if isinstance(targets, PackedDetectionTargets):
+            targets = targets.split()
         return [process(**t) for t in targets]
 
-    def validate_batch(self, images: Union[Tensor, IMAGES], targets: Optional[TARGETS]) -> None:
+    def validate_batch(
+        self, images: Union[Tensor, IMAGES], targets: Optional[Union[TARGETS, PackedDetectionTargets]]
+    ) -> None:
         """Validates the format of a batch of data.
 
         Args:
             images: A tensor containing a batch of images or a list of image tensors.
-            targets: A list of target dictionaries or ``None``. If a list is provided, there should be as many target
-                dictionaries as there are images.
+            targets: A list of target dictionaries, packed targets, or ``None``. If a list is provided, there should be
+                as many target dictionaries as there are images.
 
         """
         if not isinstance(images, Tensor):
@@ -431,6 +477,10 @@ class YOLO(LightningModule):
                 raise ValueError("Targets should be given in training mode.")
             return
 
+        if isinstance(targets, PackedDetectionTargets):
+            self._validate_packed_targets(images, targets)
+            return
+
         if not isinstance(targets, (tuple, list)):
             raise TypeError(f"Expected targets to be a tuple or a list, got {type(images).__name__}.")
         if len(images) != len(targets):
@@ -454,6 +504,17 @@ class YOLO(LightningModule):
                     f"Expected target labels to be tensors of shape [N] or [N, num_classes], got {list(labels.shape)}."
                 )
 
+    def _validate_packed_targets(self, images: Union[Tensor, IMAGES], targets: PackedDetectionTargets) -> None:
+        if targets.num_images != len(images):
+            raise ValueError(f"Got {len(images)} images, but targets for {targets.num_images} images.")
+        boxes, labels = targets.boxes, targets.labels
+        if (boxes.ndim != 2) or (boxes.shape[-1] != 4):
+            raise ValueError(f"Expected target boxes to be tensors of shape [N, 4], got {list(boxes.shape)}.")
+        if (labels.ndim < 1) or (labels.ndim > 2) or (len(labels) != len(boxes)):
+            raise ValueError(
+                f"Expected target labels to be tensors of shape [N] or [N, num_classes], got {list(labels.shape)}."
+            )
+
 
 class CLIYOLO(YOLO):
     """A subclass of YOLO that can be easily configured using LightningCLI.
@@ -577,15 +638,46 @@ class ResizedVOCDetectionDataModule(VOCDetectionDataModule):
     """A subclass of ``VOCDetectionDataModule`` that resizes the images to a specific size. YOLO expectes the image
     size to be divisible by the ratio in which the network downsamples the image.
 
+    The training batches can be augmented after they have been moved to the device: mosaic and mixup compose images of
+    the same batch, and multi-scale training resizes every batch to one of ``multiscale_sizes``. The sizes follow a
+    seeded schedule, so all the processes of a distributed training run use the same size at the same step. These
+    augmentations require ``packed=True``.
+
     Args:
         width: Resize images to this width.
         height: Resize images to this height.
+        multiscale_sizes: If given, resize the training batches to a size chosen randomly from these sizes, e.g.
+            ``range(320, 608 + 1, 32)``.
+        multiscale_every: Choose a new training size after this many batches.
+        mosaic_prob: Probability of replacing a training image with a mosaic of four images.
+        mixup_prob: Probability of blending a training image with another image.
     """
 
-    def __init__(self, width: int = 608, height: int = 608, **kwargs: Any):
+    def __init__(
+        self,
+        width: int = 608,
+        height: int = 608,
+        multiscale_sizes: Optional[List[int]] = None,
+        multiscale_every: int = 10,
+        mosaic_prob: float = 0.0,
+        mixup_prob: float = 0.0,
+        **kwargs: Any,
+    ):
         super().__init__(**kwargs)
         self.image_size = (height, width)
 
+        batch_transforms: List[nn.Module] = []
+        if mosaic_prob > 0.0:
+            batch_transforms.append(DetectionMosaic(mosaic_prob))
+        if mixup_prob > 0.0:
+            batch_transforms.append(DetectionMixUp(mixup_prob))
+        if multiscale_sizes:
+            batch_transforms.append(DetectionMultiScale(multiscale_sizes, change_every=multiscale_every))
+        if batch_transforms:
+            if not self.packed:
+                raise ValueError("Mosaic, mixup and multi-scale training require packed=True.")
+            self.train_batch_transforms = nn.Sequential(*batch_transforms)
+
     def default_transforms(self) -> Callable:
         transforms = [
             lambda image, target: (T.to_tensor(image), target),
@@ -12,6 +12,7 @@ from pl_bolts.callbacks import SRImageLoggerCallback
 from pl_bolts.datamodules import TVTDataModule
 from pl_bolts.datasets.utils import prepare_sr_datasets
 from pl_bolts.models.gans.srgan.components import SRGANDiscriminator, SRGANGenerator, VGG19FeatureExtractor
+from pl_bolts.transforms.sr_transforms import SRBatchDownsample
 from pl_bolts.utils.stability import under_review
 
 
@@ -188,6 +189,7 @@ def cli_main(args=None):
     parser.add_argument("--log_interval", default=1000, type=int)
     parser.add_argument("--scale_factor", default=4, type=int)
     parser.add_argument("--save_model_checkpoint", dest="save_model_checkpoint", action="store_true")
+    parser.add_argument("--batched_lr", action="store_true", help="create the low resolution images per batch")
 
     parser = TVTDataModule.add_argparse_args(parser)
     parser = SRGAN.add_model_specific_args(parser)
@@ -195,8 +197,12 @@ def cli_main(args=None):
 
     args = parser.parse_args(args)
 
-    datasets = prepare_sr_datasets(args.dataset, args.scale_factor, args.data_dir)
+    datasets = prepare_sr_datasets(args.dataset, args.scale_factor, args.data_dir, hr_only=args.batched_lr)
     dm = TVTDataModule(*datasets, **vars(args))
+    if args.batched_lr:
+        dm.train_batch_transforms = dm.val_batch_transforms = dm.test_batch_transforms = SRBatchDownsample(
+            args.scale_factor
+        )
 
     generator_checkpoint = Path(f"model_checkpoints/srresnet-{args.dataset}-scale_factor={args.scale_factor}.pt")
     if not generator_checkpoint.exists():
@@ -10,6 +10,7 @@ from pl_bolts.callbacks import SRImageLoggerCallback
 from pl_bolts.datamodules import TVTDataModule
 from pl_bolts.datasets.utils import prepare_sr_datasets
 from pl_bolts.models.gans.srgan.components import SRGANGenerator
+from pl_bolts.transforms.sr_transforms import SRBatchDownsample
 from pl_bolts.utils.stability import under_review
 
 
@@ -120,14 +121,19 @@ def cli_main(args=None):
     parser.add_argument("--log_interval", default=1000, type=int)
     parser.add_argument("--scale_factor", default=4, type=int)
     parser.add_argument("--save_model_checkpoint", dest="save_model_checkpoint", action="store_true")
+    parser.add_argument("--batched_lr", action="store_true", help="create the low resolution images per batch")
 
     parser = TVTDataModule.add_argparse_args(parser)
     parser = SRResNet.add_model_specific_args(parser)
     parser = pl.Trainer.add_argparse_args(parser)
     args = parser.parse_args(args)
 
-    datasets = prepare_sr_datasets(args.dataset, args.scale_factor, args.data_dir)
+    datasets = prepare_sr_datasets(args.dataset, args.scale_factor, args.data_dir, hr_only=args.batched_lr)
     dm = TVTDataModule(*datasets, **vars(args))
+    if args.batched_lr:
+        dm.train_batch_transforms = dm.val_batch_transforms = dm.test_batch_transforms = SRBatchDownsample(
+            args.scale_factor
+        )
 
     model = SRResNet(**vars(args), image_channels=dm.dataset_train.dataset.image_channels)
 
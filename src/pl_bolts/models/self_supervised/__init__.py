@@ -20,6 +20,7 @@ Here's an example for using these as pretrained models.
 from pl_bolts.models.self_supervised.amdim.amdim_module import AMDIM
 from pl_bolts.models.self_supervised.byol.byol_module import BYOL
 from pl_bolts.models.self_supervised.cpc.cpc_module import CPC_v2
+from pl_bolts.models.self_supervised.embeddings import EmbeddingShards, export_embeddings
 from pl_bolts.models.self_supervised.evaluator import SSLEvaluator
 from pl_bolts.models.self_supervised.moco.moco_module import MoCo
 from pl_bolts.models.self_supervised.simclr.simclr_module import SimCLR
@@ -31,6 +32,8 @@ __all__ = [
     "AMDIM",
     "BYOL",
     "CPC_v2",
+    "EmbeddingShards",
+    "export_embeddings",
     "SSLEvaluator",
     "MoCo",
     "SimCLR",
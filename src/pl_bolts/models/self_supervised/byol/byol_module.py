@@ -1,6 +1,6 @@
 from argparse import ArgumentParser
 from copy import deepcopy
-from typing import Any, Union
+from typing import Any, Optional, Sequence, Union
 
 import torch
 from pytorch_lightning import LightningModule, Trainer, seed_everything
@@ -10,10 +10,13 @@ from torch.optim import Adam
 
 from pl_bolts.callbacks.byol_updates import BYOLMAWeightUpdate
 from pl_bolts.models.self_supervised.byol.models import MLP, SiameseArm
+from pl_bolts.models.self_supervised.resnets import checkpoint_resnet_stages
 from pl_bolts.optimizers.lr_scheduler import LinearWarmupCosineAnnealingLR
+from pl_bolts.utils.fast_path import ChannelsLastMixin, float32_region
+from pl_bolts.utils.self_supervised import multi_crop_forward
 
 
-class BYOL(LightningModule):
+class BYOL(ChannelsLastMixin, LightningModule):
     """PyTorch Lightning implementation of Bootstrap Your Own Latent (BYOL_)_
 
     Paper authors: Jean-Bastien Grill, Florian Strub, Florent Altché, Corentin Tallec, Pierre H. Richemond, \
@@ -30,6 +33,21 @@ class BYOL(LightningModule):
         projector_hidden_dim (int, optional): projector MLP hidden dimension. Defaults to 4096.
         projector_out_dim (int, optional): projector MLP output dimension. Defaults to 256.
         initial_tau (float, optional): initial value of target decay rate used. Defaults to 0.996.
+        num_views (int, optional): number of views of every image used for training. All the views are passed through
+            the online network and the first two also through the target network, so further views, e.g. the small
+            crops of a multi-crop transform, are only predicted. Defaults to 2.
+        micro_batch_pixels (int, optional): if set, the views are passed through the encoders in micro-batches of at
+            most this many input pixels (samples x height x width). Batch norm statistics are then computed per
+            micro-batch. Defaults to None.
+        group_views (bool, optional): if ``True``, all the views of a resolution are passed through every network in
+            one call, so batch norm statistics are computed over those views together instead of per view as in the
+            paper. Defaults to False.
+        checkpoint_stages (Sequence[int], optional): ResNet stages (1-4) of the encoder whose activations are
+            recomputed during the backward pass instead of being stored, which reduces the activation memory at the
+            cost of extra computation. Defaults to ().
+        channels_last (bool, optional): if ``True``, the networks and the views are converted to the channels-last
+            memory format, which speeds up the convolutions, especially together with ``precision="bf16"`` or
+            ``precision=16``. The losses are computed in float32 in any case. Defaults to False.
 
     Model implemented by:
         - `Annika Brundyn <https://github.com/annikabrundyn>`_
@@ -73,17 +91,25 @@ class BYOL(LightningModule):
         projector_hidden_dim: int = 4096,
         projector_out_dim: int = 256,
         initial_tau: float = 0.996,
+        num_views: int = 2,
+        micro_batch_pixels: Optional[int] = None,
+        group_views: bool = False,
+        checkpoint_stages: Sequence[int] = (),
+        channels_last: bool = False,
         **kwargs: Any,
     ) -> None:
         super().__init__()
         self.save_hyperparameters(ignore="base_encoder")
 
         self.online_network = SiameseArm(base_encoder, encoder_out_dim, projector_hidden_dim, projector_out_dim)
+        checkpoint_resnet_stages(self.online_network.encoder, checkpoint_stages)
         self.target_network = deepcopy(self.online_network)
         self.predictor = MLP(projector_out_dim, projector_hidden_dim, projector_out_dim)
 
         self.weight_callback = BYOLMAWeightUpdate(initial_tau=initial_tau)
 
+        self.use_channels_last(channels_last)
+
     def on_train_batch_end(self, outputs: Any, batch: Any, batch_idx: int) -> None:
         """Add callback to perform exponential moving average weight update on target network."""
         self.weight_callback.on_train_batch_end(self.trainer, self, outputs, batch, batch_idx)
@@ -108,14 +134,44 @@ class BYOL(LightningModule):
     def _shared_step(self, batch: Any, batch_idx: int, step: str) -> Tensor:
         """Shared evaluation step for training and validation loop."""
         imgs, _ = batch
-        img1, img2 = imgs[:2]
-
-        # Calculate similarity loss in each direction
-        loss_12 = self.calculate_loss(img1, img2)
-        loss_21 = self.calculate_loss(img2, img1)
+        views = imgs[: self.hparams.num_views]
+        sizes = [len(view) for view in views]
+
+        max_pixels = self.hparams.micro_batch_pixels
+        if self.hparams.group_views:
+            # One encoder call per view resolution in each network
+            online = multi_crop_forward(self.online_network.encode, views, max_pixels=max_pixels)
+            online = self.predictor(self.online_network.projector(online)).split(sizes)
+            with torch.no_grad():
+                target = multi_crop_forward(self.target_network.encode, views[:2], max_pixels=max_pixels)
+                target = self.target_network.projector(target).split(sizes[:2])
+        else:
+            # Every view is normalized separately, as in the paper
+            online = [
+                self.predictor(
+                    self.online_network.projector(multi_crop_forward(self.online_network.encode, view, max_pixels))
+                )
+                for view in views
+            ]
+            with torch.no_grad():
+                target = [
+                    self.target_network.projector(multi_crop_forward(self.target_network.encode, view, max_pixels))
+                    for view in views[:2]
+                ]
+
+        # Calculate similarity loss of every view with each of the other two first views, in float32
+        with float32_region(online[0]):
+            losses = {
+                (i, j): -2 * F.cosine_similarity(online[i].float(), target[j].float()).mean()
+                for j in range(2)
+                for i in range(len(views))
+                if i != j
+            }
+        loss_12 = losses[0, 1]
+        loss_21 = losses[1, 0]
 
         # Calculate total loss
-        total_loss = loss_12 + loss_21
+        total_loss = sum(losses.values())
 
         # Log losses
         if step == "train":
@@ -139,7 +195,8 @@ class BYOL(LightningModule):
         h1 = self.predictor(z1)
         with torch.no_grad():
             _, z2 = self.target_network(v_target)
-        return -2 * F.cosine_similarity(h1, z2).mean()
+        with float32_region(h1):
+            return -2 * F.cosine_similarity(h1.float(), z2.float()).mean()
 
     def configure_optimizers(self):
         optimizer = Adam(self.parameters(), lr=self.hparams.learning_rate, weight_decay=self.hparams.weight_decay)
@@ -161,6 +218,19 @@ class BYOL(LightningModule):
         parser.add_argument("--learning_rate", type=float, default=0.2)
         parser.add_argument("--weight_decay", type=float, default=1.5e-6)
         parser.add_argument("--warmup_epochs", type=int, default=10)
+        parser.add_argument("--num_views", type=int, default=2)
+        parser.add_argument("--micro_batch_pixels", type=int, default=None)
+        parser.add_argument("--group_views", action="store_true")
+        parser.add_argument(
+            "--checkpoint_stages",
+            type=int,
+            nargs="*",
+            default=[],
+            help="ResNet stages (1-4) whose activations are recomputed in the backward pass to save memory",
+        )
+        parser.add_argument(
+            "--channels_last", action="store_true", help="use the channels-last memory format for the networks"
+        )
         parser.add_argument("--meta_dir", default=".", type=str, help="path to meta.bin for imagenet")
 
         return parser
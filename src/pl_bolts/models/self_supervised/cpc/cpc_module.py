@@ -11,6 +11,7 @@ from torch import optim
 from pl_bolts.datamodules.stl10_datamodule import STL10DataModule
 from pl_bolts.losses.self_supervised_learning import CPCTask
 from pl_bolts.models.self_supervised.cpc.networks import cpc_resnet101
+from pl_bolts.transforms.self_supervised.batch_transforms import patchify_batch
 from pl_bolts.transforms.self_supervised.cpc_transforms import (
     CPCEvalTransformsCIFAR10,
     CPCEvalTransformsImageNet128,
@@ -19,6 +20,7 @@ from pl_bolts.transforms.self_supervised.cpc_transforms import (
     CPCTrainTransformsImageNet128,
     CPCTrainTransformsSTL10,
 )
+from pl_bolts.utils.fast_path import ChannelsLastMixin
 from pl_bolts.utils.pretrained_weights import load_pretrained
 from pl_bolts.utils.self_supervised import torchvision_ssl_encoder
 from pl_bolts.utils.stability import under_review
@@ -27,7 +29,7 @@ __all__ = ["CPC_v2"]
 
 
 @under_review()
-class CPC_v2(LightningModule):  # noqa: N801
+class CPC_v2(ChannelsLastMixin, LightningModule):  # noqa: N801
     def __init__(
         self,
         encoder_name: str = "cpc_encoder",
@@ -39,6 +41,7 @@ class CPC_v2(LightningModule):  # noqa: N801
         num_classes: int = 10,
         learning_rate: float = 1e-4,
         pretrained: Optional[str] = None,
+        channels_last: bool = False,
         **kwargs,
     ) -> None:
         """
@@ -46,13 +49,16 @@ class CPC_v2(LightningModule):  # noqa: N801
             encoder_name: A string for any of the resnets in torchvision, or the original CPC encoder,
                 or a custon nn.Module encoder
             patch_size: How big to make the image patches
-            patch_overlap: How much overlap each patch should have
+            patch_overlap: How much overlap each patch should have. When the transforms return whole images instead of
+                patches (``patchify=False``), the model cuts every batch into patches with this size and overlap.
             online_ft: If True, enables a 1024-unit MLP to fine-tune online
             task: Which self-supervised task to use ('cpc', 'amdim', etc...)
             num_workers: number of dataloader workers
             num_classes: number of classes
             learning_rate: learning rate
             pretrained: If true, will use the weights pretrained (using CPC) on Imagenet
+            channels_last: If true, the encoder and the patches are converted to the channels-last memory format, which
+                speeds up the convolutions, especially together with ``precision="bf16"`` or ``precision=16``
         """
 
         super().__init__()
@@ -76,6 +82,8 @@ class CPC_v2(LightningModule):  # noqa: N801
         if pretrained:
             self.load_pretrained(encoder_name)
 
+        self.use_channels_last(channels_last)
+
     def load_pretrained(self, encoder_name):
         available_weights = {"resnet18"}
 
@@ -113,9 +121,15 @@ class CPC_v2(LightningModule):  # noqa: N801
         return z.view(b, -1, num_patches, num_patches)
 
     def forward(self, img):
+        # whole images are cut into patches here, once per batch, instead of per sample in the dataloader workers
+        if img.dim() == 4:
+            img = patchify_batch(img, self.hparams.patch_size, self.hparams.patch_overlap)
+
         # put all patches on the batch dim for simultaneous processing
         b, _, c, w, h = img.size()
         img = img.view(-1, c, w, h)
+        if self.channels_last:
+            img = img.contiguous(memory_format=torch.channels_last)
 
         # Z are the latent vars
         z = self.encoder(img)
@@ -192,6 +206,9 @@ class CPC_v2(LightningModule):  # noqa: N801
         parser.add_argument("--encoder", default="cpc_encoder", type=str, choices=possible_resnets)
         # cifar10: 1e-5, stl10: 3e-5, imagenet: 4e-4
         parser.add_argument("--learning_rate", type=float, default=1e-5)
+        parser.add_argument(
+            "--channels_last", action="store_true", help="use the channels-last memory format for the encoder"
+        )
 
         return parser
 
@@ -212,29 +229,38 @@ def cli_main():
     parser.add_argument("--num_workers", default=8, type=int)
     parser.add_argument("--hidden_mlp", default=2048, type=int, help="hidden layer dimension in projection head")
     parser.add_argument("--batch_size", type=int, default=128)
+    parser.add_argument(
+        "--patchify_in_model",
+        action="store_true",
+        help="load whole images and cut them into patches in the model, which makes the batches about 4x smaller",
+    )
 
     args = parser.parse_args()
+    patchify = not args.patchify_in_model
 
     datamodule = None
     if args.dataset == "cifar10":
         datamodule = CIFAR10DataModule.from_argparse_args(args)
-        datamodule.train_transforms = CPCTrainTransformsCIFAR10()
-        datamodule.val_transforms = CPCEvalTransformsCIFAR10()
+        datamodule.train_transforms = CPCTrainTransformsCIFAR10(patchify=patchify)
+        datamodule.val_transforms = CPCEvalTransformsCIFAR10(patchify=patchify)
         args.patch_size = 8
+        args.patch_overlap = 4
 
     elif args.dataset == "stl10":
         datamodule = STL10DataModule.from_argparse_args(args)
         datamodule.train_dataloader = datamodule.train_dataloader_mixed
         datamodule.val_dataloader = datamodule.val_dataloader_mixed
-        datamodule.train_transforms = CPCTrainTransformsSTL10()
-        datamodule.val_transforms = CPCEvalTransformsSTL10()
+        datamodule.train_transforms = CPCTrainTransformsSTL10(patchify=patchify)
+        datamodule.val_transforms = CPCEvalTransformsSTL10(patchify=patchify)
         args.patch_size = 16
+        args.patch_overlap = 8
 
     elif args.dataset == "imagenet2012":
         datamodule = SSLImagenetDataModule.from_argparse_args(args)
-        datamodule.train_transforms = CPCTrainTransformsImageNet128()
-        datamodule.val_transforms = CPCEvalTransformsImageNet128()
+        datamodule.train_transforms = CPCTrainTransformsImageNet128(patchify=patchify)
+        datamodule.val_transforms = CPCEvalTransformsImageNet128(patchify=patchify)
         args.patch_size = 32
+        args.patch_overlap = 16
 
     online_evaluator = SSLOnlineEvaluator(
         drop_p=0.0,
@@ -0,0 +1,376 @@
+"""Export of the embeddings of a pretrained self-supervised encoder to memory-mapped shards.
+
+:func:`export_embeddings` streams a dataset through an encoder in inference mode and writes the embeddings, in
+``float16`` or quantized to ``int8``, to ``.npy`` shards that can be memory-mapped with
+``np.load(path, mmap_mode="r")``.
+Row ``i`` of the export is the embedding of sample ``i`` of the dataset. An ``embeddings.json`` file records the
+settings, a fingerprint of the model weights, the shards and the number of rows that have been written so far. It is
+updated atomically after the shards have been flushed, so an interrupted export of the same model continues from the
+last recorded row when it is started again.
+:class:`EmbeddingShards` reads the embeddings back, and :class:`CachedFeatures` reads labeled features for training,
+e.g. the linear evaluation of :meth:`~pl_bolts.models.self_supervised.SSLFineTuner.cache_features`.
+
+The ``int8`` embeddings are quantized symmetrically per row, ``embedding ≈ int8_row * scale``, and the ``float32``
+scales are stored in separate shards.
+
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from pytorch_lightning.utilities import rank_zero_info
+from torch import Tensor, nn
+from torch.utils.data import DataLoader, Dataset, Subset
+
+from pl_bolts.models.self_supervised.amdim.amdim_module import AMDIM
+from pl_bolts.models.self_supervised.moco.moco_module import MoCo
+from pl_bolts.utils.fast_path import to_channels_last
+
+INDEX_FILE = "embeddings.json"
+SHARD_NAME = "embeddings-{:06d}.npy"
+SCALES_NAME = "scales-{:06d}.npy"
+LABELS_NAME = "labels-{:06d}.npy"
+_DTYPES = ("float16", "int8")
+
+
+def quantize_int8(embeddings: Tensor) -> Tuple[Tensor, Tensor]:
+    """Quantizes ``[N, D]`` embeddings symmetrically per row.
+
+    Returns:
+        the ``int8`` embeddings and the ``float32`` scale of every row, so that
+        ``embeddings ≈ quantized * scales[:, None]``
+
+    """
+    embeddings = embeddings.float()
+    scales = embeddings.abs().amax(dim=1) / 127
+    scales = scales.clamp(min=torch.finfo(torch.float32).tiny)
+    quantized = torch.round(embeddings / scales[:, None]).clamp(-127, 127).to(torch.int8)
+    return quantized, scales
+
+
+def _model_fingerprint(model: nn.Module) -> str:
+    """Hashes the names, shapes, dtypes and values of the parameters and buffers of a model."""
+    digest = hashlib.sha1()
+    for name, tensor in model.state_dict().items():
+        if not isinstance(tensor, Tensor):
+            continue
+        digest.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype}".encode())
+        digest.update(tensor.detach().cpu().reshape(-1).contiguous().view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+
+def _default_encoder(model: nn.Module) -> Callable[[Tensor], Tensor]:
+    """The function that maps a batch of images to the representations of a self-supervised model."""
+    if isinstance(model, MoCo):
+        return model.encoder_q
+    if isinstance(model, AMDIM):
+        # the last feature map, with spatial size 1x1
+        return lambda images: model.encoder(images)[-3]
+    return model
+
+
+def _write_index(root: str, index: Dict[str, Any]) -> None:
+    path = os.path.join(root, INDEX_FILE)
+    with open(path + ".tmp", "w") as fp:
+        json.dump(index, fp)
+    os.replace(path + ".tmp", path)
+
+
+def _read_index(root: str) -> Dict[str, Any]:
+    with open(os.path.join(root, INDEX_FILE)) as fp:
+        return json.load(fp)
+
+
+class _ShardWriter:
+    """Writes rows to the memory-mapped shards of an export, opening every shard when the first row is written."""
+
+    def __init__(self, root: str, index: Dict[str, Any]) -> None:
+        self.root = root
+        self.index = index
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def _array(self, name: str, dtype: str, shape: Tuple[int, ...]) -> np.ndarray:
+        if name not in self._arrays:
+            path = os.path.join(self.root, name)
+            mode = "r+" if os.path.exists(path) else "w+"
+            self._arrays[name] = np.lib.format.open_memmap(path, mode=mode, dtype=dtype, shape=shape)
+        return self._arrays[name]
+
+    def write(self, start: int, fields: Dict[str, np.ndarray]) -> None:
+        """Writes rows ``start:start + n`` of the shards named by the keys of ``fields``, e.g. ``SHARD_NAME``."""
+        shard_size = self.index["samples_per_shard"]
+        num_samples = self.index["num_samples"]
+        length = len(next(iter(fields.values())))
+        offset = 0
+        while offset < length:
+            shard, row = divmod(start + offset, shard_size)
+            rows = min(length - offset, shard_size - row)
+            shard_rows = min(shard_size, num_samples - shard * shard_size)
+            for name, values in fields.items():
+                array = self._array(name.format(shard), values.dtype, (shard_rows, *values.shape[1:]))
+                array[row : row + rows] = values[offset : offset + rows]
+            offset += rows
+
+    def commit(self, num_written: int) -> None:
+        """Flushes the shards and records that the first ``num_written`` rows have been written."""
+        for array in self._arrays.values():
+            array.flush()
+        num_shards = -(-num_written // self.index["samples_per_shard"])
+        self.index["shards"] = [SHARD_NAME.format(shard) for shard in range(num_shards)]
+        self.index["num_written"] = num_written
+        _write_index(self.root, self.index)
+
+    def close(self) -> None:
+        self._arrays.clear()
+
+
+def export_embeddings(
+    model: nn.Module,
+    dataset: Dataset,
+    root: str,
+    dtype: str = "float16",
+    samples_per_shard: int = 1000000,
+    batch_size: int = 256,
+    num_workers: int = 0,
+    encoder: Optional[Callable[[Tensor], Tensor]] = None,
+    device: Optional[Union[str, torch.device]] = None,
+    save_labels: bool = False,
+    commit_every: int = 100,
+    log_every: Optional[int] = None,
+) -> Dict[str, float]:
+    """Computes the embeddings of all the samples of a dataset and writes them to memory-mapped shards.
+
+    The samples are read in order, in batches, and encoded in inference mode. Samples that are tuples, e.g. ``(image,
+    label)`` pairs, are encoded by their first element. If ``root`` already contains an export of the same model
+    weights with the same settings, the export continues after the last committed row.
+
+    Args:
+        model: a pretrained model, e.g. any of the LightningModules in :mod:`pl_bolts.models.self_supervised`. The
+            model is put in evaluation mode for the export and its mode is restored afterwards.
+        dataset: a map-style dataset with deterministic evaluation transforms
+        root: output folder
+        dtype: ``"float16"`` or ``"int8"``
+        samples_per_shard: number of embeddings in every shard
+        batch_size: number of samples per encoder call
+        num_workers: number of DataLoader workers
+        encoder: maps a batch of images to the embeddings. By default the model itself, the query encoder of
+            :class:`~pl_bolts.models.self_supervised.MoCo` and the last feature map of the encoder of
+            :class:`~pl_bolts.models.self_supervised.AMDIM`. The outputs are flattened to ``[N, D]``.
+        device: where to run the encoder. By default the device of the model parameters.
+        save_labels: if ``True``, the second elements of the samples, i.e. the class labels, are stored as well
+        commit_every: number of batches after which the written rows are flushed and recorded in the index
+        log_every: if set, the progress and the throughput are logged after every this many batches
+
+    Returns:
+        the total number of samples, the number of samples encoded by this call, the time it took in seconds, and the
+        throughput in images per second
+
+    Example::
+
+        model = SimCLR.load_from_checkpoint(PATH, strict=False)
+        stats = export_embeddings(model, dataset, "embeddings/", dtype="int8")
+        embeddings = EmbeddingShards("embeddings/")
+
+    """
+    if dtype not in _DTYPES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}. Expected one of {_DTYPES}.")
+    if device is None:
+        parameter = next(model.parameters(), None)
+        device = parameter.device if parameter is not None else torch.device("cpu")
+    device = torch.device(device)
+    if encoder is None:
+        encoder = _default_encoder(model)
+
+    num_samples = len(dataset)
+    settings = {"num_samples": num_samples, "dtype": dtype, "samples_per_shard": samples_per_shard}
+    settings["labels"] = save_labels
+    settings["model"] = _model_fingerprint(model)
+    os.makedirs(root, exist_ok=True)
+    if os.path.exists(os.path.join(root, INDEX_FILE)):
+        index = _read_index(root)
+        if index.get("model") != settings["model"]:
+            raise ValueError(f"{root} contains an export of a different model. Use another folder for this model.")
+        if {key: index.get(key) for key in settings} != settings:
+            raise ValueError(
+                f"{root} contains an export with different settings: {index}. Use another folder to change them."
+            )
+    else:
+        index = {**settings, "dim": None, "shards": [], "num_written": 0}
+    start = index["num_written"]
+
+    loader = DataLoader(
+        Subset(dataset, range(start, num_samples)),
+        batch_size=batch_size,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",
+    )
+    writer = _ShardWriter(root, index)
+    was_training = model.training
+    model.eval()
+    num_written = start
+    start_time = time.perf_counter()
+    try:
+        with torch.inference_mode():
+            for batch_idx, batch in enumerate(loader, 1):
+                images = batch[0] if isinstance(batch, (tuple, list)) else batch
+                images = images.to(device, non_blocking=True)
+                if getattr(model, "channels_last", False):
+                    images = to_channels_last(images)
+                embeddings = encoder(images).flatten(1)
+
+                if index["dim"] is None:
+                    index["dim"] = embeddings.size(1)
+                elif embeddings.size(1) != index["dim"]:
+                    raise ValueError(
+                        f"The encoder returns embeddings of size {embeddings.size(1)}, but the export in {root} has"
+                        f" size {index['dim']}."
+                    )
+                if dtype == "int8":
+                    embeddings, scales = quantize_int8(embeddings)
+                    fields = {SHARD_NAME: embeddings.cpu().numpy(), SCALES_NAME: scales.cpu().numpy()}
+                else:
+                    fields = {SHARD_NAME: embeddings.to(torch.float16).cpu().numpy()}
+                if save_labels:
+                    fields[LABELS_NAME] = torch.as_tensor(batch[1]).cpu().numpy().astype(np.int64)
+                writer.write(num_written, fields)
+                num_written += len(embeddings)
+
+                if batch_idx % commit_every == 0:
+                    writer.commit(num_written)
+                if log_every is not None and batch_idx % log_every == 0:
+                    rate = (num_written - start) / (time.perf_counter() - start_time)
+                    rank_zero_info(f"Exported {num_written}/{num_samples} embeddings, {rate:.1f} images/s")
+        writer.commit(num_written)
+    finally:
+        writer.close()
+        model.train(was_training)
+
+    seconds = time.perf_counter() - start_time
+    exported = num_written - start
+    return {
+        "num_samples": num_samples,
+        "exported": exported,
+        "seconds": seconds,
+        "images_per_second": exported / seconds if seconds > 0 else 0.0,
+    }
+
+
+class EmbeddingShards(Dataset):
+    """The embeddings written by :func:`export_embeddings`, as ``float32`` tensors.
+
+    Item ``i`` is the embedding of sample ``i`` of the exported dataset. The shards are memory-mapped when they are
+    first read, also in every DataLoader worker, so the dataset can be pickled cheaply. A partial export contains the
+    rows that have been committed.
+
+    Args:
+        root: the folder of the export
+
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        index = _read_index(root)
+        self.dtype = index["dtype"]
+        self.dim = index["dim"]
+        self.samples_per_shard = index["samples_per_shard"]
+        self.num_rows = index["num_written"]
+        self.has_labels = index["labels"]
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {**self.__dict__, "_arrays": {}}
+
+    def _array(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.root, name), mmap_mode="r")
+        return self._arrays[name]
+
+    def _gather(self, name: str, indices: np.ndarray) -> np.ndarray:
+        """Reads the given rows of the shards named ``name``, one read per shard."""
+        shards, rows = np.divmod(indices, self.samples_per_shard)
+        if len(indices) and (shards == shards[0]).all():
+            return self._array(name.format(shards[0]))[rows]
+        values = None
+        for shard in np.unique(shards):
+            selected = shards == shard
+            shard_values = self._array(name.format(shard))[rows[selected]]
+            if values is None:
+                values = np.empty((len(indices), *shard_values.shape[1:]), dtype=shard_values.dtype)
+            values[selected] = shard_values
+        return values
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __getitem__(self, index: int) -> Tensor:
+        if index < 0:
+            index += self.num_rows
+        if not 0 <= index < self.num_rows:
+            raise IndexError(f"Embedding index {index} is out of range for {self.num_rows} embeddings.")
+        return self.gather([index])[0]
+
+    def gather(self, indices: Sequence[int]) -> Tensor:
+        """Returns the ``[len(indices), dim]`` embeddings of the given rows."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return torch.empty(0, self.dim)
+        embeddings = torch.from_numpy(self._gather(SHARD_NAME, indices)).float()
+        if self.dtype == "int8":
+            embeddings *= torch.from_numpy(self._gather(SCALES_NAME, indices))[:, None]
+        return embeddings
+
+    def gather_labels(self, indices: Sequence[int]) -> Tensor:
+        """Returns the labels of the given rows, if they were exported with ``save_labels=True``."""
+        if not self.has_labels:
+            raise ValueError(f"The export in {self.root} doesn't contain labels.")
+        indices = np.asarray(indices, dtype=np.int64)
+        if len(indices) == 0:
+            return torch.empty(0, dtype=torch.long)
+        return torch.from_numpy(self._gather(LABELS_NAME, indices))
+
+    def read(self, start: int, end: int) -> Tensor:
+        """Returns the ``[end - start, dim]`` embeddings of rows ``start:end``."""
+        return self.gather(range(start, min(end, self.num_rows)))
+
+
+class CachedFeatures(Dataset):
+    """``(features, label)`` pairs read from one or more exports of the same labeled dataset.
+
+    The exports are made with ``save_labels=True`` and can contain different draws of random augmentations. Every
+    time a sample is read, the features of a randomly chosen draw are returned, so a model that is trained on the cache
+    sees a new augmentation of a sample in every epoch, as long as there are enough draws. A batch of samples is read
+    with one memory-mapped read per export and shard.
+
+    Args:
+        roots: the folders of the exports
+
+    """
+
+    def __init__(self, roots: Sequence[str]) -> None:
+        self.draws = [EmbeddingShards(root) for root in roots]
+        if not self.draws:
+            raise ValueError("No exports given.")
+        if any(len(draw) != len(self.draws[0]) for draw in self.draws):
+            raise ValueError(f"The exports contain different numbers of samples: {[len(d) for d in self.draws]}")
+        if not self.draws[0].has_labels:
+            raise ValueError(f"The export in {roots[0]} doesn't contain labels.")
+
+    def __len__(self) -> int:
+        return len(self.draws[0])
+
+    def __getitem__(self, index: int) -> Tuple[Tensor, Tensor]:
+        return self.__getitems__([index])[0]
+
+    def __getitems__(self, indices: Sequence[int]) -> List[Tuple[Tensor, Tensor]]:
+        indices = np.asarray(indices, dtype=np.int64)
+        draws = torch.randint(len(self.draws), (len(indices),)).numpy()
+        features = torch.empty(len(indices), self.draws[0].dim)
+        for draw in np.unique(draws):
+            selected = draws == draw
+            features[selected] = self.draws[draw].gather(indices[selected])
+        labels = self.draws[0].gather_labels(indices)
+        return list(zip(features.unbind(), labels.unbind()))
@@ -9,7 +9,7 @@ compliance with the License.
 You may obtain a copy of the License from the LICENSE file present in this folder.
 """
 from copy import copy, deepcopy
-from typing import Any, Dict, List, Optional, Tuple, Type, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, Union
 
 import torch
 from pytorch_lightning import LightningModule
@@ -29,11 +29,13 @@ except AttributeError:
 from pl_bolts.datamodules import CIFAR10DataModule
 from pl_bolts.metrics import precision_at_k
 from pl_bolts.models.self_supervised.moco.utils import concatenate_all, shuffle_batch, sort_batch, validate_batch
+from pl_bolts.models.self_supervised.resnets import checkpoint_resnet_stages
 from pl_bolts.transforms.self_supervised.moco_transforms import (
     MoCo2EvalCIFAR10Transforms,
     MoCo2TrainCIFAR10Transforms,
 )
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
+from pl_bolts.utils.fast_path import ChannelsLastMixin, float32_region, to_channels_last
 from pl_bolts.utils.warnings import warn_missing_pkg
 
 if _TORCHVISION_AVAILABLE:
@@ -80,7 +82,7 @@ class RepresentationQueue(nn.Module):
         self.pointer = end % queue_size
 
 
-class MoCo(LightningModule):
+class MoCo(ChannelsLastMixin, LightningModule):
     def __init__(
         self,
         encoder: Union[str, nn.Module] = "resnet18",
@@ -94,6 +96,8 @@ class MoCo(LightningModule):
         optimizer_params: Optional[Dict[str, Any]] = None,
         lr_scheduler: Type[LRScheduler] = optim.lr_scheduler.CosineAnnealingLR,
         lr_scheduler_params: Optional[Dict[str, Any]] = None,
+        checkpoint_stages: Sequence[int] = (),
+        channels_last: bool = False,
     ) -> None:
         """A module that trains an encoder using Momentum Contrast.
 
@@ -134,6 +138,12 @@ class MoCo(LightningModule):
             optimizer_params: Parameters to pass to the optimizer constructor.
             lr_scheduler: Which learning rate scheduler class to use for training.
             lr_scheduler_params: Parameters to pass to the learning rate scheduler constructor.
+            checkpoint_stages: ResNet stages (1-4) of the query encoder whose activations are recomputed during the
+                backward pass instead of being stored, which reduces the activation memory at the cost of extra
+                computation.
+            channels_last: If ``True``, the encoders and the images are converted to the channels-last memory format,
+                which speeds up the convolutions, especially together with ``precision="bf16"`` or ``precision=16``.
+                The loss is computed in float32 in any case.
 
         """
         super().__init__()
@@ -158,6 +168,7 @@ class MoCo(LightningModule):
             self.encoder_q = template_model(num_classes=representation_size)
         else:
             self.encoder_q = encoder
+        checkpoint_resnet_stages(self.encoder_q, checkpoint_stages)
         self.encoder_k = deepcopy(self.encoder_q)
         for param in self.encoder_k.parameters():
             param.requires_grad = False
@@ -175,6 +186,8 @@ class MoCo(LightningModule):
         self.queue = RepresentationQueue(representation_size, num_negatives)
         self.val_queue = RepresentationQueue(representation_size, num_negatives)
 
+        self.use_channels_last(channels_last)
+
     def forward(self, query_images: Tensor, key_images: Tensor) -> Tuple[Tensor, Tensor]:
         """Computes the forward passes of both encoders and projection heads.
 
@@ -280,17 +293,25 @@ class MoCo(LightningModule):
 
         query_images = images[:, 0]
         key_images = images[:, 1]
+        if self.channels_last:
+            # The views are stacked in a 5D tensor, so they're converted here instead of in on_after_batch_transfer.
+            query_images, key_images = to_channels_last((query_images, key_images))
         q, k = self(query_images, key_images)
 
-        # Concatenate logits from the positive pairs (batch_size x 1) and the negative pairs (batch_size x queue_size).
-        pos_logits = torch.einsum("nc,nc->n", [q, k]).unsqueeze(-1)
-        neg_logits = torch.einsum("nc,ck->nk", [q, queue.representations.clone().detach()])
-        logits = torch.cat([pos_logits, neg_logits], dim=1)
-        logits /= self.temperature
+        # The logits and the loss are computed in float32, also under autocast.
+        with float32_region(q):
+            q, k = q.float(), k.float()
+
+            # Concatenate logits from the positive pairs (batch_size x 1) and the negative pairs (batch_size x
+            # queue_size).
+            pos_logits = torch.einsum("nc,nc->n", [q, k]).unsqueeze(-1)
+            neg_logits = torch.einsum("nc,ck->nk", [q, queue.representations.clone().detach().float()])
+            logits = torch.cat([pos_logits, neg_logits], dim=1)
+            logits /= self.temperature
 
-        # The correct label for every query is 0. Calculate the cross entropy of classifying each query correctly.
-        target_idxs = torch.zeros(logits.shape[0], dtype=torch.long).type_as(logits)
-        loss = F.cross_entropy(logits, target_idxs.long())
+            # The correct label for every query is 0. Calculate the cross entropy of classifying each query correctly.
+            target_idxs = torch.zeros(logits.shape[0], dtype=torch.long).type_as(logits)
+            loss = F.cross_entropy(logits, target_idxs.long())
         acc1, acc5 = precision_at_k(logits, target_idxs, top_k=(1, 5))
 
         queue.dequeue_and_enqueue(k)
@@ -1,10 +1,16 @@
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
 import torch
-from torch import nn
+from torch import Tensor, nn
+from torch.utils.checkpoint import checkpoint
 from torch.utils.model_zoo import load_url as load_state_dict_from_url
 
 from pl_bolts.utils.stability import under_review
 
 __all__ = [
+    "CheckpointedStage",
+    "checkpoint_resnet_stages",
     "ResNet",
     "resnet18",
     "resnet34",
@@ -134,6 +140,89 @@ class Bottleneck(nn.Module):
         return self.relu(out)
 
 
+@contextmanager
+def _frozen_running_stats(module: nn.Module) -> Iterator[None]:
+    """Keeps the batch norm layers of a module from updating their running statistics."""
+    layers = [m for m in module.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm) and m.track_running_stats]
+    saved = [(layer.momentum, layer.num_batches_tracked.clone()) for layer in layers]
+    for layer in layers:
+        layer.momentum = 0.0
+    try:
+        yield
+    finally:
+        for layer, (momentum, num_batches_tracked) in zip(layers, saved):
+            layer.momentum = momentum
+            layer.num_batches_tracked.copy_(num_batches_tracked)
+
+
+class _CheckpointedBlock:
+    """Runs a block once under checkpointing, and again when it's recomputed during the backward pass.
+
+    A new instance is created for every forward pass, so the blocks of an encoder that runs several times per step,
+    e.g. once per view resolution, are recomputed with the running statistics of the right call frozen.
+
+    """
+
+    def __init__(self, block: nn.Module) -> None:
+        self.block = block
+        self.recomputing = False
+
+    def __call__(self, x: Tensor) -> Tensor:
+        if self.recomputing:
+            # The batch statistics are the same, but the running statistics must not be updated twice.
+            with _frozen_running_stats(self.block):
+                return self.block(x)
+        self.recomputing = True
+        return self.block(x)
+
+
+class CheckpointedStage(nn.Sequential):
+    """A ResNet stage that stores only the input of every block for the backward pass.
+
+    The activations inside a block are recomputed when the gradients are calculated, which trades roughly one extra
+    forward pass of the stage for the activation memory of all but the block inputs. The outputs, the gradients and
+    the running statistics of the batch norm layers are the same as without checkpointing. In evaluation mode and under
+    ``torch.no_grad()``, the stage runs like a regular ``nn.Sequential``.
+
+    The checkpointing is non-reentrant, so the stage also works when the encoder runs several times per step under
+    DDP, without ``static_graph=True``.
+
+    The blocks keep their indices, so the state dict is the same as the one of the original stage.
+
+    """
+
+    def forward(self, x: Tensor) -> Tensor:
+        if not (self.training and torch.is_grad_enabled()):
+            return super().forward(x)
+        for block in self:
+            x = checkpoint(_CheckpointedBlock(block), x, use_reentrant=False)
+        return x
+
+
+def checkpoint_resnet_stages(model: nn.Module, stages: Sequence[int]) -> nn.Module:
+    """Enables activation checkpointing in stages ``layer1`` to ``layer4`` of a ResNet.
+
+    Works with the ResNets of this module, of SwAV and of torchvision, and with any model whose stages are
+    ``nn.Sequential`` attributes called ``layer1``, ``layer2``, and so on. The earliest stages have the largest
+    activations, so checkpointing them saves the most memory.
+
+    Args:
+        model: the ResNet, which is modified in place
+        stages: numbers of the stages to checkpoint, e.g. ``(1, 2)``
+
+    Returns:
+        The same model.
+
+    """
+    for stage in stages:
+        layer = getattr(model, f"layer{stage}", None)
+        if not isinstance(layer, nn.Sequential):
+            raise ValueError(f"The model has no stage `layer{stage}` that could be checkpointed.")
+        if not isinstance(layer, CheckpointedStage):
+            setattr(model, f"layer{stage}", CheckpointedStage(layer._modules))
+    return model
+
+
 @under_review()
 class ResNet(nn.Module):
     def __init__(
@@ -149,6 +238,7 @@ class ResNet(nn.Module):
         return_all_feature_maps=False,
         first_conv=True,
         maxpool1=True,
+        checkpoint_stages=(),
     ) -> None:
         super().__init__()
         if norm_layer is None:
@@ -207,6 +297,8 @@ class ResNet(nn.Module):
                 elif isinstance(m, BasicBlock):
                     nn.init.constant_(m.bn2.weight, 0)
 
+        checkpoint_resnet_stages(self, checkpoint_stages)
+
     def _make_layer(self, block, planes, blocks, stride=1, dilate=False):
         norm_layer = self._norm_layer
         downsample = None
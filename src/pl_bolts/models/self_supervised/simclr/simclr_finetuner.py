@@ -40,6 +40,11 @@ def cli_main():  # pragma: no cover
     parser.add_argument("--gamma", type=float, default=0.1)
     parser.add_argument("--final_lr", type=float, default=0.0)
 
+    # feature cache params
+    parser.add_argument("--feature_cache", type=str, default=None, help="folder of the cached backbone features")
+    parser.add_argument("--cache_draws", type=int, default=1, help="number of augmentation draws of the train set")
+    parser.add_argument("--cache_batch_size", type=int, default=1024, help="batch size when training from the cache")
+
     args = parser.parse_args()
 
     if args.dataset == "cifar10":
@@ -121,6 +126,21 @@ def cli_main():  # pragma: no cover
         final_lr=args.final_lr,
     )
 
+    if args.feature_cache is not None:
+        # the backbone runs once per draw, then the linear layer trains from the cache on one device
+        dm.prepare_data()
+        dm.setup()
+        datasets = [dm.train_dataloader().dataset, dm.val_dataloader().dataset, dm.test_dataloader().dataset]
+        dm = tuner.cache_features(
+            args.feature_cache,
+            *datasets,
+            num_draws=args.cache_draws,
+            batch_size=args.cache_batch_size,
+            num_workers=args.num_workers,
+            device="cuda" if args.gpus > 0 else "cpu",
+        )
+        args.gpus = min(args.gpus, 1)
+
     trainer = Trainer(
         gpus=args.gpus,
         num_nodes=1,
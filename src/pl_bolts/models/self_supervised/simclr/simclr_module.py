@@ -1,10 +1,10 @@
-import math
 from argparse import ArgumentParser
+from typing import Optional, Sequence
 
 import torch
 from pytorch_lightning import LightningModule, Trainer
 from pytorch_lightning.callbacks import LearningRateMonitor, ModelCheckpoint
-from torch import Tensor, nn
+from torch import nn
 from torch.nn import functional as F  # noqa: N812
 
 from pl_bolts.models.self_supervised.resnets import resnet18, resnet50
@@ -15,6 +15,8 @@ from pl_bolts.transforms.dataset_normalizations import (
     imagenet_normalization,
     stl10_normalization,
 )
+from pl_bolts.utils.fast_path import ChannelsLastMixin, float32_region
+from pl_bolts.utils.self_supervised import multi_crop_forward
 from pl_bolts.utils.stability import under_review
 
 
@@ -60,7 +62,7 @@ class Projection(nn.Module):
 
 
 @under_review()
-class SimCLR(LightningModule):
+class SimCLR(ChannelsLastMixin, LightningModule):
     def __init__(
         self,
         gpus: int,
@@ -82,6 +84,10 @@ class SimCLR(LightningModule):
         learning_rate: float = 1e-3,
         final_lr: float = 0.0,
         weight_decay: float = 1e-6,
+        micro_batch_pixels: Optional[int] = None,
+        group_views: bool = False,
+        checkpoint_stages: Sequence[int] = (),
+        channels_last: bool = False,
         **kwargs
     ) -> None:
         """
@@ -92,6 +98,14 @@ class SimCLR(LightningModule):
             lr: the optimizer learning rate
             opt_weight_decay: the optimizer weight decay
             loss_temperature: the loss temperature
+            micro_batch_pixels: if set, the views are passed through the encoder in micro-batches of at most this
+                many input pixels (samples x height x width). Batch norm statistics are then computed per micro-batch.
+            group_views: if ``True``, all the views of a resolution are passed through the encoder and the projection
+                head in one call, so batch norm statistics are computed over those views together instead of per view
+            checkpoint_stages: ResNet stages (1-4) whose activations are recomputed during the backward pass instead
+                of being stored, which reduces the activation memory at the cost of extra computation
+            channels_last: if ``True``, the encoder and the views are converted to the channels-last memory format,
+                which speeds up the convolutions, especially together with ``precision="bf16"`` or ``precision=16``
         """
         super().__init__()
         self.save_hyperparameters()
@@ -112,6 +126,9 @@ class SimCLR(LightningModule):
         self.exclude_bn_bias = exclude_bn_bias
         self.weight_decay = weight_decay
         self.temperature = temperature
+        self.micro_batch_pixels = micro_batch_pixels
+        self.group_views = group_views
+        self.checkpoint_stages = checkpoint_stages
 
         self.start_lr = start_lr
         self.final_lr = final_lr
@@ -127,13 +144,20 @@ class SimCLR(LightningModule):
         global_batch_size = self.num_nodes * self.gpus * self.batch_size if self.gpus > 0 else self.batch_size
         self.train_iters_per_epoch = self.num_samples // global_batch_size
 
+        self.use_channels_last(channels_last)
+
     def init_model(self):
         if self.arch == "resnet18":
             backbone = resnet18
         elif self.arch == "resnet50":
             backbone = resnet50
 
-        return backbone(first_conv=self.first_conv, maxpool1=self.maxpool1, return_all_feature_maps=False)
+        return backbone(
+            first_conv=self.first_conv,
+            maxpool1=self.maxpool1,
+            return_all_feature_maps=False,
+            checkpoint_stages=self.checkpoint_stages,
+        )
 
     def forward(self, x):
         # bolts resnet returns a list
@@ -144,18 +168,20 @@ class SimCLR(LightningModule):
             unlabeled_batch = batch[0]
             batch = unlabeled_batch
 
-        # final image in tuple is for online eval
-        (img1, img2, _), y = batch
-
-        # get h representations, bolts resnet returns a list
-        h1 = self(img1)
-        h2 = self(img2)
+        # final image in tuple is for online eval, the views before it may have different sizes (multi-crop)
+        (*views, _), y = batch
 
-        # get z representations
-        z1 = self.projection(h1)
-        z2 = self.projection(h2)
+        # get h and z representations, bolts resnet returns a list
+        if self.group_views:
+            # one encoder call per view resolution
+            h = multi_crop_forward(self, views, max_pixels=self.micro_batch_pixels)
+            z = self.projection(h).split([len(view) for view in views])
+        else:
+            z = [self.projection(multi_crop_forward(self, view, max_pixels=self.micro_batch_pixels)) for view in views]
 
-        return self.nt_xent_loss(z1, z2, self.temperature)
+        # contrast the first two views with each other and with every further view
+        pairs = [(i, j) for i in range(min(2, len(z))) for j in range(i + 1, len(z))]
+        return sum(self.nt_xent_loss(z[i], z[j], self.temperature) for i, j in pairs) / len(pairs)
 
     def training_step(self, batch, batch_idx):
         loss = self.shared_step(batch)
@@ -225,37 +251,42 @@ class SimCLR(LightningModule):
         assume out_1 and out_2 are normalized
         out_1: [batch_size, dim]
         out_2: [batch_size, dim]
+        the similarities and their exponentials are computed in float32, also under autocast
         """
-        # gather representations in case of distributed training
-        # out_1_dist: [batch_size * world_size, dim]
-        # out_2_dist: [batch_size * world_size, dim]
-        if torch.distributed.is_available() and torch.distributed.is_initialized():
-            out_1_dist = SyncFunction.apply(out_1)
-            out_2_dist = SyncFunction.apply(out_2)
-        else:
-            out_1_dist = out_1
-            out_2_dist = out_2
+        with float32_region(out_1):
+            out_1, out_2 = out_1.float(), out_2.float()
+
+            # gather representations in case of distributed training
+            # out_1_dist: [batch_size * world_size, dim]
+            # out_2_dist: [batch_size * world_size, dim]
+            if torch.distributed.is_available() and torch.distributed.is_initialized():
+                out_1_dist = SyncFunction.apply(out_1)
+                out_2_dist = SyncFunction.apply(out_2)
+            else:
+                out_1_dist = out_1
+                out_2_dist = out_2
 
-        # out: [2 * batch_size, dim]
-        # out_dist: [2 * batch_size * world_size, dim]
-        out = torch.cat([out_1, out_2], dim=0)
-        out_dist = torch.cat([out_1_dist, out_2_dist], dim=0)
+            # out: [2 * batch_size, dim]
+            # out_dist: [2 * batch_size * world_size, dim]
+            out = torch.cat([out_1, out_2], dim=0)
+            out_dist = torch.cat([out_1_dist, out_2_dist], dim=0)
 
-        # cov and sim: [2 * batch_size, 2 * batch_size * world_size]
-        # neg: [2 * batch_size]
-        cov = torch.mm(out, out_dist.t().contiguous())
-        sim = torch.exp(cov / temperature)
-        neg = sim.sum(dim=-1)
+            # cov and sim: [2 * batch_size, 2 * batch_size * world_size]
+            # neg: [2 * batch_size]
+            cov = torch.mm(out, out_dist.t().contiguous())
+            sim = torch.exp(cov / temperature)
+            neg = sim.sum(dim=-1)
 
-        # from each row, subtract e^(1/temp) to remove similarity measure for x1.x1
-        row_sub = Tensor(neg.shape).fill_(math.e ** (1 / temperature)).to(neg.device)
-        neg = torch.clamp(neg - row_sub, min=eps)  # clamp for numerical stability
+            # from each row, subtract the similarity measure for x1.x1, which is e^(1/temp) for unit vectors. The exact
+            # value is subtracted, because half precision projections are normalized only up to rounding errors.
+            row_sub = torch.exp(torch.sum(out * out, dim=-1) / temperature)
+            neg = torch.clamp(neg - row_sub, min=eps)  # clamp for numerical stability
 
-        # Positive similarity, pos becomes [2 * batch_size]
-        pos = torch.exp(torch.sum(out_1 * out_2, dim=-1) / temperature)
-        pos = torch.cat([pos, pos], dim=0)
+            # Positive similarity, pos becomes [2 * batch_size]
+            pos = torch.exp(torch.sum(out_1 * out_2, dim=-1) / temperature)
+            pos = torch.cat([pos, pos], dim=0)
 
-        return -torch.log(pos / (neg + eps)).mean()
+            return -torch.log(pos / (neg + eps)).mean()
 
     @staticmethod
     def add_model_specific_args(parent_parser):
@@ -294,6 +325,25 @@ class SimCLR(LightningModule):
         parser.add_argument("--learning_rate", default=1e-3, type=float, help="base learning rate")
         parser.add_argument("--start_lr", default=0, type=float, help="initial warmup learning rate")
         parser.add_argument("--final_lr", type=float, default=1e-6, help="final learning rate")
+        parser.add_argument(
+            "--micro_batch_pixels",
+            type=int,
+            default=None,
+            help="maximum number of input pixels per encoder call; larger groups of views are split into micro-batches",
+        )
+        parser.add_argument(
+            "--group_views", action="store_true", help="encode all the views of a resolution in one encoder call"
+        )
+        parser.add_argument(
+            "--checkpoint_stages",
+            type=int,
+            nargs="*",
+            default=[],
+            help="ResNet stages (1-4) whose activations are recomputed in the backward pass to save memory",
+        )
+        parser.add_argument(
+            "--channels_last", action="store_true", help="use the channels-last memory format for the encoder"
+        )
 
         return parser
 
@@ -1,6 +1,6 @@
 from argparse import ArgumentParser
 from copy import deepcopy
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Sequence, Union
 
 import torch
 import torch.nn as nn
@@ -9,10 +9,12 @@ from pytorch_lightning import LightningModule, Trainer, seed_everything
 from torch import Tensor
 
 from pl_bolts.models.self_supervised.byol.models import MLP, SiameseArm
+from pl_bolts.models.self_supervised.resnets import checkpoint_resnet_stages
 from pl_bolts.optimizers.lr_scheduler import LinearWarmupCosineAnnealingLR
+from pl_bolts.utils.fast_path import ChannelsLastMixin, float32_region
 
 
-class SimSiam(LightningModule):
+class SimSiam(ChannelsLastMixin, LightningModule):
     """PyTorch Lightning implementation of Exploring Simple Siamese Representation Learning (SimSiam_)_
 
     Paper authors: Xinlei Chen, Kaiming He.
@@ -30,6 +32,12 @@ class SimSiam(LightningModule):
         predictor_hidden_dim (int, optional): predictor MLP hidden dimension. Defaults to 512.
         exclude_bn_bias (bool, optional): option to exclude batchnorm and bias terms from weight decay.
             Defaults to False.
+        checkpoint_stages (Sequence[int], optional): ResNet stages (1-4) of the encoder whose activations are
+            recomputed during the backward pass instead of being stored, which reduces the activation memory at the
+            cost of extra computation. Defaults to ().
+        channels_last (bool, optional): if ``True``, the networks and the views are converted to the channels-last
+            memory format, which speeds up the convolutions, especially together with ``precision="bf16"`` or
+            ``precision=16``. The losses are computed in float32 in any case. Defaults to False.
 
     Model implemented by:
         - `Zvi Lapp <https://github.com/zlapp>`_
@@ -74,15 +82,20 @@ class SimSiam(LightningModule):
         projector_out_dim: int = 2048,
         predictor_hidden_dim: int = 512,
         exclude_bn_bias: bool = False,
+        checkpoint_stages: Sequence[int] = (),
+        channels_last: bool = False,
         **kwargs,
     ) -> None:
         super().__init__()
         self.save_hyperparameters(ignore="base_encoder")
 
         self.online_network = SiameseArm(base_encoder, encoder_out_dim, projector_hidden_dim, projector_out_dim)
+        checkpoint_resnet_stages(self.online_network.encoder, checkpoint_stages)
         self.target_network = deepcopy(self.online_network)
         self.predictor = MLP(projector_out_dim, predictor_hidden_dim, projector_out_dim)
 
+        self.use_channels_last(channels_last)
+
     def forward(self, x: Tensor) -> Tensor:
         """Returns encoded representation of a view."""
         return self.online_network.encode(x)
@@ -129,7 +142,8 @@ class SimSiam(LightningModule):
         h1 = self.predictor(z1)
         with torch.no_grad():
             _, z2 = self.target_network(v_target)
-        return -0.5 * F.cosine_similarity(h1, z2).mean()
+        with float32_region(h1):
+            return -0.5 * F.cosine_similarity(h1.float(), z2.float()).mean()
 
     def configure_optimizers(self):
         """Configure optimizer and learning rate scheduler."""
@@ -184,6 +198,16 @@ class SimSiam(LightningModule):
         parser.add_argument("--momentum", default=0.9, type=float, help="momentum")
         parser.add_argument("--base_encoder", default="resnet50", type=str, help="encoder backbone")
         parser.add_argument("--warmup_epochs", default=10, type=int, help="number of warmup epochs")
+        parser.add_argument(
+            "--checkpoint_stages",
+            type=int,
+            nargs="*",
+            default=[],
+            help="ResNet stages (1-4) whose activations are recomputed in the backward pass to save memory",
+        )
+        parser.add_argument(
+            "--channels_last", action="store_true", help="use the channels-last memory format for the networks"
+        )
 
         return parser
 
@@ -1,11 +1,14 @@
-from typing import Optional, Tuple
+import os
+from typing import Optional, Tuple, Union
 
 import torch
-from pytorch_lightning import LightningModule
+from pytorch_lightning import LightningDataModule, LightningModule
 from torch.nn import functional as F  # noqa: N812
+from torch.utils.data import Dataset
 from torchmetrics import Accuracy
 
 from pl_bolts.models.self_supervised import SSLEvaluator
+from pl_bolts.models.self_supervised.embeddings import CachedFeatures, export_embeddings
 
 
 class SSLFineTuner(LightningModule):
@@ -38,6 +41,16 @@ class SSLFineTuner(LightningModule):
         # test
         trainer.test(datamodule=dm)
 
+    Since the backbone is frozen, its features can also be computed once, or for a few draws of the random training
+    augmentations, and the linear layer trained from the cache with large batches::
+
+        dm.setup()
+        cached_dm = finetuner.cache_features(
+            "features/", dm.dataset_train, dm.dataset_val, dm.dataset_test, num_draws=4, batch_size=4096
+        )
+        trainer.fit(finetuner, cached_dm)
+        trainer.test(datamodule=cached_dm)
+
     """
 
     def __init__(
@@ -76,6 +89,8 @@ class SSLFineTuner(LightningModule):
         self.final_lr = final_lr
 
         self.backbone = backbone
+        # set by cache_features, the batches then contain the features of the backbone instead of images
+        self.cached_features = False
         self.linear_layer = SSLEvaluator(n_input=in_features, n_classes=num_classes, p=dropout, n_hidden=hidden_dim)
 
         # metrics
@@ -117,8 +132,11 @@ class SSLFineTuner(LightningModule):
     def shared_step(self, batch):
         x, y = batch
 
-        with torch.no_grad():
-            feats = self.backbone(x)
+        if self.cached_features:
+            feats = x
+        else:
+            with torch.no_grad():
+                feats = self.backbone(x)
 
         feats = feats.view(feats.size(0), -1)
         logits = self.linear_layer(feats)
@@ -126,6 +144,70 @@ class SSLFineTuner(LightningModule):
 
         return loss, logits, y
 
+    def cache_features(
+        self,
+        root: str,
+        train_dataset: Dataset,
+        val_dataset: Optional[Dataset] = None,
+        test_dataset: Optional[Dataset] = None,
+        num_draws: int = 1,
+        batch_size: int = 1024,
+        num_workers: int = 0,
+        export_batch_size: int = 256,
+        dtype: str = "float16",
+        device: Optional[Union[str, torch.device]] = None,
+    ) -> LightningDataModule:
+        """Computes the features of the frozen backbone once and switches the finetuner to train from them.
+
+        The features of the training set are exported ``num_draws`` times, so with random training transforms every
+        export holds a different draw of the augmentations, and every epoch reads a random draw of each sample. With
+        deterministic transforms, one draw gives the same features as running the backbone in every epoch, up to the
+        ``float16`` rounding. The exports are resumable, and existing complete exports in ``root`` are reused if they
+        were made with the same backbone weights. A ``root`` with the features of another backbone raises an error.
+
+        Args:
+            root: folder of the feature cache
+            train_dataset: the labeled training set, with the training transforms
+            val_dataset: the labeled validation set
+            test_dataset: the labeled test set
+            num_draws: number of exports of the training set
+            batch_size: batch size of the returned datamodule. Batches of features are cheap, so the batch size can be
+                much larger than with images, together with a larger learning rate.
+            num_workers: number of DataLoader workers, for the export and the returned datamodule
+            export_batch_size: number of images per backbone call during the export
+            dtype: ``"float16"`` or ``"int8"``
+            device: where to run the backbone. By default the device of the backbone parameters.
+
+        Returns:
+            a datamodule with the cached ``(features, label)`` pairs of the given datasets
+
+        """
+        datasets = {}
+        for name, dataset, draws in (
+            ("train", train_dataset, num_draws),
+            ("val", val_dataset, 1),
+            ("test", test_dataset, 1),
+        ):
+            if dataset is None:
+                continue
+            roots = [os.path.join(root, f"{name}-{draw}") for draw in range(draws)]
+            for draw_root in roots:
+                export_embeddings(
+                    self.backbone,
+                    dataset,
+                    draw_root,
+                    dtype=dtype,
+                    batch_size=export_batch_size,
+                    num_workers=num_workers,
+                    encoder=self.backbone,
+                    device=device,
+                    save_labels=True,
+                )
+            datasets[f"{name}_dataset"] = CachedFeatures(roots)
+
+        self.cached_features = True
+        return LightningDataModule.from_datasets(**datasets, batch_size=batch_size, num_workers=num_workers)
+
     def configure_optimizers(self):
         optimizer = torch.optim.SGD(
             self.linear_layer.parameters(),
@@ -4,6 +4,9 @@ import numpy as np
 import torch
 import torch.nn as nn
 from torch import distributed as dist
+from torch.nn import functional as F  # noqa: N812
+
+from pl_bolts.utils.fast_path import float32_region
 
 
 class SWAVLoss(nn.Module):
@@ -33,7 +36,6 @@ class SWAVLoss(nn.Module):
         super().__init__()
         self.temperature = temperature
         self.crops_for_assign = crops_for_assign
-        self.softmax = nn.Softmax(dim=1)
         self.sinkhorn_iterations = sinkhorn_iterations
         self.epsilon = epsilon
         self.num_crops = num_crops
@@ -53,30 +55,33 @@ class SWAVLoss(nn.Module):
         queue: Optional[torch.Tensor] = None,
         use_queue: bool = False,
     ) -> Tuple[int, Optional[torch.Tensor], bool]:
-        loss = 0
-        for i, crop_id in enumerate(self.crops_for_assign):
-            with torch.no_grad():
-                out = output[batch_size * crop_id : batch_size * (crop_id + 1)]
-
-                # Time to use the queue
-                if queue is not None:
-                    if use_queue or not torch.all(queue[i, -1, :] == 0):
-                        use_queue = True
-                        out = torch.cat((torch.mm(queue[i], prototype_weights.t()), out))
-                    # fill the queue
-                    queue[i, batch_size:] = self.queue[i, :-batch_size].clone()  # type: ignore[index]
-                    queue[i, :batch_size] = embedding[crop_id * batch_size : (crop_id + 1) * batch_size]
-                # get assignments
-                q = torch.exp(out / self.epsilon).t()
-                q = self.assignment_fn(q, self.sinkhorn_iterations)[-batch_size:]
-
-            # cluster assignment prediction
-            subloss = 0
-            for v in np.delete(np.arange(np.sum(self.num_crops)), crop_id):
-                p = self.softmax(output[batch_size * v : batch_size * (v + 1)] / self.temperature)
-                subloss -= torch.mean(torch.sum(q * torch.log(p), dim=1))
-            loss += subloss / (np.sum(self.num_crops) - 1)
-        loss /= len(self.crops_for_assign)  # type: ignore
+        # The assignments and the log-probabilities are computed in float32, also under autocast.
+        with float32_region(output):
+            output, embedding, prototype_weights = output.float(), embedding.float(), prototype_weights.float()
+            loss = 0
+            for i, crop_id in enumerate(self.crops_for_assign):
+                with torch.no_grad():
+                    out = output[batch_size * crop_id : batch_size * (crop_id + 1)]
+
+                    # Time to use the queue
+                    if queue is not None:
+                        if use_queue or not torch.all(queue[i, -1, :] == 0):
+                            use_queue = True
+                            out = torch.cat((torch.mm(queue[i], prototype_weights.t()), out))
+                        # fill the queue
+                        queue[i, batch_size:] = self.queue[i, :-batch_size].clone()  # type: ignore[index]
+                        queue[i, :batch_size] = embedding[crop_id * batch_size : (crop_id + 1) * batch_size]
+                    # get assignments
+                    q = torch.exp(out / self.epsilon).t()
+                    q = self.assignment_fn(q, self.sinkhorn_iterations)[-batch_size:]
+
+                # cluster assignment prediction
+                subloss = 0
+                for v in np.delete(np.arange(np.sum(self.num_crops)), crop_id):
+                    log_p = F.log_softmax(output[batch_size * v : batch_size * (v + 1)] / self.temperature, dim=1)
+                    subloss -= torch.mean(torch.sum(q * log_p, dim=1))
+                loss += subloss / (np.sum(self.num_crops) - 1)
+            loss /= len(self.crops_for_assign)  # type: ignore
         return loss, queue, use_queue
 
     def sinkhorn(self, q: torch.Tensor, num_iters: int) -> torch.Tensor:
@@ -1,6 +1,7 @@
 """Adapted from official swav implementation: https://github.com/facebookresearch/swav."""
 import os
 from argparse import ArgumentParser
+from typing import Optional, Sequence
 
 import torch
 from pytorch_lightning import LightningModule, Trainer
@@ -16,9 +17,10 @@ from pl_bolts.transforms.dataset_normalizations import (
     imagenet_normalization,
     stl10_normalization,
 )
+from pl_bolts.utils.fast_path import ChannelsLastMixin
 
 
-class SwAV(LightningModule):
+class SwAV(ChannelsLastMixin, LightningModule):
     def __init__(
         self,
         gpus: int,
@@ -49,6 +51,9 @@ class SwAV(LightningModule):
         final_lr: float = 0.0,
         weight_decay: float = 1e-6,
         epsilon: float = 0.05,
+        micro_batch_pixels: Optional[int] = None,
+        checkpoint_stages: Sequence[int] = (),
+        channels_last: bool = False,
         **kwargs
     ) -> None:
         """
@@ -88,6 +93,13 @@ class SwAV(LightningModule):
             final_lr: float = final learning rate for cosine weight decay
             weight_decay: weight decay for optimizer
             epsilon: epsilon val for swav assignments
+            micro_batch_pixels: if set, the crops of every resolution are passed through the backbone in micro-batches
+                of at most this many input pixels (samples x height x width), which bounds the activation memory of
+                multi-crop training. Batch norm statistics are then computed per micro-batch.
+            checkpoint_stages: ResNet stages (1-4) whose activations are recomputed during the backward pass instead
+                of being stored, which reduces the activation memory at the cost of extra computation
+            channels_last: if ``True``, the backbone and the crops are converted to the channels-last memory format,
+                which speeds up the convolutions, especially together with ``precision="bf16"`` or ``precision=16``
         """
         super().__init__()
         self.save_hyperparameters()
@@ -119,6 +131,8 @@ class SwAV(LightningModule):
         self.weight_decay = weight_decay
         self.epsilon = epsilon
         self.temperature = temperature
+        self.micro_batch_pixels = micro_batch_pixels
+        self.checkpoint_stages = checkpoint_stages
 
         self.start_lr = start_lr
         self.final_lr = final_lr
@@ -142,6 +156,8 @@ class SwAV(LightningModule):
         self.train_iters_per_epoch = self.num_samples // global_batch_size
         self.queue = None
 
+        self.use_channels_last(channels_last)
+
     def setup(self, stage):
         if self.queue_length > 0:
             queue_folder = os.path.join(self.logger.log_dir, self.queue_path)
@@ -166,6 +182,7 @@ class SwAV(LightningModule):
             num_prototypes=self.num_prototypes,
             first_conv=self.first_conv,
             maxpool1=self.maxpool1,
+            checkpoint_stages=self.checkpoint_stages,
         )
 
     def forward(self, x):
@@ -210,8 +227,8 @@ class SwAV(LightningModule):
             w = nn.functional.normalize(w, dim=1, p=2)
             self.model.prototypes.weight.copy_(w)
 
-        # 2. multi-res forward passes
-        embedding, output = self.model(inputs)
+        # 2. multi-res forward passes, one backbone call per resolution (or per micro-batch)
+        embedding, output = self.model(inputs, max_pixels=self.micro_batch_pixels)
         embedding = embedding.detach()
         bs = inputs[0].size(0)
 
@@ -375,6 +392,22 @@ class SwAV(LightningModule):
             type=int,
             help="freeze the prototypes during this many epochs from the start",
         )
+        parser.add_argument(
+            "--micro_batch_pixels",
+            type=int,
+            default=None,
+            help="maximum number of input pixels per backbone call, larger groups of crops are split up",
+        )
+        parser.add_argument(
+            "--checkpoint_stages",
+            type=int,
+            nargs="*",
+            default=[],
+            help="ResNet stages (1-4) whose activations are recomputed in the backward pass to save memory",
+        )
+        parser.add_argument(
+            "--channels_last", action="store_true", help="use the channels-last memory format for the backbone"
+        )
 
         return parser
 
@@ -2,6 +2,9 @@
 import torch
 from torch import nn
 
+from pl_bolts.models.self_supervised.resnets import checkpoint_resnet_stages
+from pl_bolts.utils.self_supervised import multi_crop_forward
+
 
 def conv3x3(in_planes, out_planes, stride=1, groups=1, dilation=1):
     """3x3 convolution with padding."""
@@ -139,6 +142,7 @@ class ResNet(nn.Module):
         eval_mode=False,
         first_conv=True,
         maxpool1=True,
+        checkpoint_stages=(),
     ) -> None:
         super().__init__()
         if norm_layer is None:
@@ -233,6 +237,8 @@ class ResNet(nn.Module):
                 elif isinstance(m, BasicBlock):
                     nn.init.constant_(m.bn2.weight, 0)
 
+        checkpoint_resnet_stages(self, checkpoint_stages)
+
     def _make_layer(self, block, planes, blocks, stride=1, dilate=False):
         norm_layer = self._norm_layer
         downsample = None
@@ -303,27 +309,12 @@ class ResNet(nn.Module):
             return x, self.prototypes(x)
         return x
 
-    def forward(self, inputs):
-        if not isinstance(inputs, list):
+    def forward(self, inputs, max_pixels=None):
+        if not isinstance(inputs, (list, tuple)):
             inputs = [inputs]
-        idx_crops = torch.cumsum(
-            torch.unique_consecutive(
-                torch.tensor([inp.shape[-1] for inp in inputs]),
-                return_counts=True,
-            )[1],
-            0,
-        )
-        start_idx, output = 0, None
-        for end_idx in idx_crops:
-            _out = torch.cat(inputs[start_idx:end_idx])
-
-            if "cuda" in str(self.conv1.weight.device):
-                _out = self.forward_backbone(_out.cuda(non_blocking=True))
-            else:
-                _out = self.forward_backbone(_out)
-
-            output = _out if start_idx == 0 else torch.cat((output, _out))
-            start_idx = end_idx
+        device = self.conv1.weight.device
+        inputs = [inp.to(device, non_blocking=True) for inp in inputs]
+        output = multi_crop_forward(self.forward_backbone, inputs, max_pixels=max_pixels)
         return self.forward_head(output)
 
 
@@ -1,9 +1,56 @@
+import math
+from typing import List, Optional, Tuple
+
 import torch
 from pytorch_lightning import LightningModule
-from torch import nn
+from torch import Tensor, nn
+from torch.nn import functional as F  # noqa: N812
 
 from pl_bolts.utils.stability import under_review
 
+_SDPA_AVAILABLE = hasattr(F, "scaled_dot_product_attention")
+
+
+class KeyValueCache:
+    """The keys and values of the previous positions of one attention layer, for decoding one position at a time.
+
+    The tensors are allocated for ``max_length`` positions up front, so appending a position doesn't copy the previous
+    ones.
+
+    Args:
+        batch_size: number of sequences
+        heads: number of attention heads
+        max_length: maximum number of positions
+        head_dim: size of the keys and values of one head
+        device: device of the tensors
+        dtype: data type of the tensors
+
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        heads: int,
+        max_length: int,
+        head_dim: int,
+        device: Optional[torch.device] = None,
+        dtype: Optional[torch.dtype] = None,
+    ) -> None:
+        self.keys = torch.empty((batch_size, heads, max_length, head_dim), device=device, dtype=dtype)
+        self.values = torch.empty_like(self.keys)
+        self.length = 0
+
+    def append(self, keys: Tensor, values: Tensor) -> Tuple[Tensor, Tensor]:
+        """Stores the ``[batch, heads, positions, head_dim]`` keys and values of new positions and returns the keys
+        and values of all the positions so far."""
+        end = self.length + keys.shape[2]
+        if end > self.keys.shape[2]:
+            raise ValueError(f"The cache has room for {self.keys.shape[2]} positions, {end} were requested.")
+        self.keys[:, :, self.length : end] = keys
+        self.values[:, :, self.length : end] = values
+        self.length = end
+        return self.keys[:, :, :end], self.values[:, :, :end]
+
 
 @under_review()
 class Block(nn.Module):
@@ -17,13 +64,66 @@ class Block(nn.Module):
             nn.GELU(),
             nn.Linear(embed_dim * 4, embed_dim),
         )
+        self._causal_masks = {}
+
+    def _causal_mask(self, length: int, device: torch.device, dtype: torch.dtype) -> Tensor:
+        """Returns the additive ``[length, length]`` causal mask, created once per length, device and data type."""
+        key = (length, device, dtype)
+        if key not in self._causal_masks:
+            attn_mask = torch.full((length, length), -float("Inf"), device=device, dtype=dtype)
+            self._causal_masks[key] = torch.triu(attn_mask, diagonal=1)
+        return self._causal_masks[key]
 
-    def forward(self, x):
-        attn_mask = torch.full((len(x), len(x)), -float("Inf"), device=x.device, dtype=x.dtype)
-        attn_mask = torch.triu(attn_mask, diagonal=1)
+    def _attention(self, q: Tensor, k: Tensor, v: Tensor, past_length: int) -> Tensor:
+        """Causal attention of ``[batch, heads, length, head_dim]`` queries, which follow ``past_length`` cached
+        positions, over the keys and values of all the positions."""
+        dropout_p = self.attn.dropout if self.training else 0.0
+        length = q.shape[2]
+        if past_length == 0:
+            attn_mask, is_causal = None, True
+        elif length == 1:
+            # a single new position attends to all the positions
+            attn_mask, is_causal = None, False
+        else:
+            attn_mask = torch.ones((length, k.shape[2]), dtype=torch.bool, device=q.device).tril(diagonal=past_length)
+            is_causal = False
+
+        if _SDPA_AVAILABLE:
+            return F.scaled_dot_product_attention(
+                q, k, v, attn_mask=attn_mask, dropout_p=dropout_p, is_causal=is_causal
+            )
+
+        scores = torch.matmul(q, k.transpose(-2, -1)) / math.sqrt(q.shape[-1])
+        if is_causal:
+            scores = scores + self._causal_mask(length, q.device, scores.dtype)
+        elif attn_mask is not None:
+            scores = scores.masked_fill(~attn_mask, -float("Inf"))
+        weights = F.dropout(torch.softmax(scores, dim=-1), p=dropout_p)
+        return torch.matmul(weights, v)
+
+    def forward(self, x, kv_cache: Optional[KeyValueCache] = None):
+        """Expects input of shape [sequence len, batch, embed dim].
+
+        With ``kv_cache``, ``x`` contains the positions that follow the positions in the cache, and their keys and
+        values are appended to the cache.
+
+        """
+        length, batch, embed_dim = x.shape
+        heads = self.attn.num_heads
 
         x = self.ln_1(x)
-        a, _ = self.attn(x, x, x, attn_mask=attn_mask, need_weights=False)
+        # the projections of nn.MultiheadAttention, with the heads split into [3, batch, heads, length, head_dim]
+        qkv = F.linear(x, self.attn.in_proj_weight, self.attn.in_proj_bias)
+        q, k, v = qkv.view(length, batch, 3, heads, embed_dim // heads).permute(2, 1, 3, 0, 4)
+        past_length = 0
+        if kv_cache is not None:
+            past_length = kv_cache.length
+            k, v = kv_cache.append(k, v)
+        a = self._attention(q, k, v, past_length)
+        a = F.linear(
+            a.permute(2, 0, 1, 3).reshape(length, batch, embed_dim), self.attn.out_proj.weight, self.attn.out_proj.bias
+        )
+
         x = x + a
         m = self.mlp(self.ln_2(x))
         return x + m
@@ -109,3 +209,50 @@ class GPT2(LightningModule):
 
         h = torch.mean(h, dim=0)  # average pool over sequence
         return self.clf_head(h)  # return classification logits
+
+    @torch.no_grad()
+    def generate(
+        self,
+        num_samples: int,
+        length: Optional[int] = None,
+        temperature: float = 1.0,
+        top_k: Optional[int] = None,
+        generator: Optional[torch.Generator] = None,
+    ) -> Tensor:
+        """Samples sequences one position at a time.
+
+        Every layer keeps the keys and values of the previous positions in a :class:`KeyValueCache`, so sampling a
+        position runs the network only on that position.
+
+        Args:
+            num_samples: number of sequences
+            length: length of the sequences, by default ``num_positions``
+            temperature: the logits are divided by this value before sampling
+            top_k: if given, sample only from this many most likely tokens
+            generator: random number generator for sampling
+
+        Returns:
+            The sampled tokens, shaped [sequence len, batch] like the input of ``forward``.
+
+        """
+        length = self.hparams.num_positions if length is None else length
+        embed_dim, heads = self.hparams.embed_dim, self.hparams.heads
+        caches: List[KeyValueCache] = [
+            KeyValueCache(num_samples, heads, length, embed_dim // heads, self.sos.device, self.sos.dtype)
+            for _ in self.layers
+        ]
+        tokens = torch.empty((length, num_samples), dtype=torch.long, device=self.sos.device)
+
+        # the first input is the sos token and the following ones are the embeddings of the sampled tokens
+        h = self.sos.expand(1, num_samples, embed_dim)
+        for position in range(length):
+            h = h + self.position_embeddings.weight[position]
+            for layer, cache in zip(self.layers, caches):
+                h = layer(h, cache)
+            logits = self.head(h[0]) / temperature
+            if top_k is not None:
+                kth_largest = torch.topk(logits, top_k, dim=-1).values[:, -1:]
+                logits = logits.masked_fill(logits < kth_largest, -float("Inf"))
+            tokens[position] = torch.multinomial(torch.softmax(logits, dim=-1), 1, generator=generator).squeeze(1)
+            h = self.token_embeddings(tokens[position]).unsqueeze(0)
+        return tokens
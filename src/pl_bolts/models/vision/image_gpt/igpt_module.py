@@ -1,9 +1,10 @@
 import os
 from argparse import ArgumentParser
+from typing import Optional
 
 import torch
 from pytorch_lightning import LightningModule, Trainer
-from torch import nn
+from torch import Tensor, nn
 
 from pl_bolts.models.vision.image_gpt.gpt2 import GPT2
 from pl_bolts.utils.stability import under_review
@@ -171,6 +172,30 @@ class ImageGPT(LightningModule):
 
         return self.gpt(x, classify)
 
+    @torch.no_grad()
+    def sample(
+        self,
+        num_samples: int,
+        temperature: float = 1.0,
+        top_k: Optional[int] = None,
+        generator: Optional[torch.Generator] = None,
+    ) -> Tensor:
+        """Generates images one pixel at a time, caching the keys and values of the previous pixels in every layer.
+
+        Args:
+            num_samples: number of images
+            temperature: the logits are divided by this value before sampling
+            top_k: if given, sample only from this many most likely pixel values
+            generator: random number generator for sampling
+
+        Returns:
+            A ``[num_samples, 1, pixels, pixels]`` tensor of images in the range `[0, 1]`.
+
+        """
+        tokens = self.gpt.generate(num_samples, temperature=temperature, top_k=top_k, generator=generator)
+        images = tokens.transpose(0, 1).float() / (self.hparams.vocab_size - 1)
+        return images.view(num_samples, 1, self.hparams.pixels, self.hparams.pixels)
+
     def training_step(self, batch, batch_idx):
         x, y = batch
 
@@ -0,0 +1,336 @@
+"""Augmentations for object detection that operate on a whole collated batch at once.
+
+The modules take and return an ``(images, targets)`` batch, where ``images`` is a padded ``[B, C, H, W]`` tensor and
+``targets`` is :class:`~pl_bolts.datamodules.detection_collate.PackedDetectionTargets`. They are meant to be used as
+``train_batch_transforms`` of a datamodule, so that they run after the batch has been moved to the device. The images
+are composed with one ``grid_sample()`` call for the whole batch and the boxes are moved with gathers over the
+packed boxes, without a Python loop over the images or the boxes.
+
+"""
+from typing import Optional, Sequence, Tuple, Union
+
+import torch
+from torch import Tensor, nn
+from torch.nn import functional as F  # noqa: N812
+
+from pl_bolts.datamodules.detection_collate import PackedDetectionTargets
+
+DETECTION_BATCH = Tuple[Tensor, PackedDetectionTargets]
+
+
+def _place_boxes(
+    targets: PackedDetectionTargets,
+    out_images: Tensor,
+    src_images: Tensor,
+    scales: Tensor,
+    offsets: Tensor,
+    clip_regions: Tensor,
+    image_sizes: Tensor,
+    min_size: Union[float, Tensor] = 0.0,
+    min_visibility: Union[float, Tensor] = 0.0,
+) -> PackedDetectionTargets:
+    """Copies the boxes of source images into output images.
+
+    Every row of the placement table copies all the boxes of image ``src_images[i]`` into image ``out_images[i]``,
+    scaling them by ``scales[i]``, translating them by ``offsets[i]`` and clipping them to ``clip_regions[i]``.
+
+    Args:
+        targets: the packed targets of the source images
+        out_images: ``[placements]`` index of the output image, in ascending order
+        src_images: ``[placements]`` index of the source image
+        scales: ``[placements, 2]`` horizontal and vertical scale factors
+        offsets: ``[placements, 2]`` horizontal and vertical translations, applied after scaling
+        clip_regions: ``[placements, 4]`` `(x1, y1, x2, y2)` region where the boxes are visible
+        image_sizes: ``[batch_size, 2]`` `(height, width)` of the output images
+        min_size: drop the boxes whose width or height after clipping is smaller than this, either one value or a
+            ``[placements]`` tensor
+        min_visibility: drop the boxes whose area after clipping is less than this fraction of their area before
+            clipping, either one value or a ``[placements]`` tensor
+
+    Returns:
+        The packed targets of the output images.
+
+    """
+    device = targets.boxes.device
+    counts = targets.offsets.diff()[src_images]
+    placement_idxs = torch.repeat_interleave(torch.arange(len(src_images), device=device), counts)
+    placement_starts = torch.cumsum(counts, 0) - counts
+    box_idxs = (
+        targets.offsets[src_images][placement_idxs]
+        + torch.arange(len(placement_idxs), device=device)
+        - placement_starts[placement_idxs]
+    )
+
+    boxes = targets.boxes[box_idxs] * scales.repeat(1, 2)[placement_idxs] + offsets.repeat(1, 2)[placement_idxs]
+    regions = clip_regions[placement_idxs]
+    clipped = torch.maximum(torch.minimum(boxes, regions[:, [2, 3, 2, 3]]), regions[:, [0, 1, 0, 1]])
+
+    if isinstance(min_size, Tensor):
+        min_size = min_size[placement_idxs, None]
+    if isinstance(min_visibility, Tensor):
+        min_visibility = min_visibility[placement_idxs]
+    size = boxes[:, 2:] - boxes[:, :2]
+    clipped_size = clipped[:, 2:] - clipped[:, :2]
+    keep = (clipped_size >= min_size).all(1) & (clipped_size.prod(1) >= min_visibility * size.prod(1))
+
+    image_index = out_images[placement_idxs][keep]
+    counts = torch.bincount(image_index, minlength=len(image_sizes))
+    return PackedDetectionTargets(
+        boxes=clipped[keep],
+        labels=targets.labels[box_idxs][keep],
+        offsets=torch.cat((counts.new_zeros(1), torch.cumsum(counts, 0))),
+        image_index=image_index,
+        image_sizes=image_sizes,
+    )
+
+
+def _mosaic_images(
+    images: Tensor, sources: Tensor, scales: Tensor, offsets: Tensor, centers: Tensor, pad_value: float
+) -> Tensor:
+    """Composes mosaics of four scaled and translated images with one ``grid_sample()`` call.
+
+    The batch is viewed as one volume, with the images stacked along the depth axis. Every output pixel samples the
+    source image of its quadrant by selecting the center of its depth slice, so the source images are not copied and
+    only one sample is taken per output pixel.
+    A pixel at `(x, y)` in quadrant ``q`` comes from `((x - offset_x) / scale, (y - offset_y) / scale)` in the source
+    image ``q``, and the area outside of the source image is filled with ``pad_value``.
+
+    Args:
+        images: ``[batch_size, channels, height, width]`` source images
+        sources: ``[mosaics, 4]`` source image of the top left, top right, bottom left and bottom right quadrant
+        scales: ``[mosaics, 4]`` scale factor of every source image
+        offsets: ``[mosaics, 4, 2]`` position of the top left corner of every source image in the mosaic
+        centers: ``[mosaics, 2]`` `(x, y)` point where the quadrants meet
+        pad_value: value of the pixels that are not covered by any image
+
+    """
+    num_mosaics = len(sources)
+    batch_size, _, height, width = images.shape
+    xs = torch.arange(width, device=images.device, dtype=images.dtype) + 0.5
+    ys = torch.arange(height, device=images.device, dtype=images.dtype) + 0.5
+    right = xs[None, None, :] >= centers[:, None, None, 0]
+    below = ys[None, :, None] >= centers[:, None, None, 1]
+    quadrants = (right.long() + 2 * below.long()).view(num_mosaics, -1)  # [mosaics, height * width]
+
+    def per_pixel(values: Tensor) -> Tensor:
+        return values.gather(1, quadrants).view(num_mosaics, height, width)
+
+    scale = per_pixel(scales)
+    grid_x = 2.0 * (xs - per_pixel(offsets[..., 0])) / (scale * width) - 1.0
+    grid_y = 2.0 * (ys[:, None] - per_pixel(offsets[..., 1])) / (scale * height) - 1.0
+    grid_z = (2.0 * per_pixel(sources.to(images.dtype)) + 1.0) / batch_size - 1.0
+    grid = torch.stack((grid_x, grid_y, grid_z), -1).unsqueeze(0)  # [1, mosaics, height, width, 3]
+
+    volume = (images - pad_value).transpose(0, 1).unsqueeze(0)  # [1, channels, batch_size, height, width]
+    mosaics = F.grid_sample(volume, grid, mode="bilinear", align_corners=False)[0].transpose(0, 1)
+    return mosaics.add_(pad_value)
+
+
+class DetectionMosaic(nn.Module):
+    """Replaces random images of a batch with a mosaic of four images of the same batch.
+
+    A mosaic is split into four quadrants by a random center point. The image itself and three other random images of
+    the batch are resized by a random factor and placed so that one of their corners touches the center, one in every
+    quadrant. The parts of the images that extend outside of their quadrant are cut off, and so are the boxes.
+
+    Args:
+        prob: probability of replacing an image with a mosaic
+        scale: range of the factor by which the images are resized
+        center_range: range of the center point, relative to the image size
+        min_box_size: drop the boxes whose width or height in the mosaic is smaller than this many pixels
+        min_visibility: drop the boxes whose area in the mosaic is less than this fraction of their resized area
+        pad_value: value of the pixels that are not covered by any image
+
+    """
+
+    def __init__(
+        self,
+        prob: float = 1.0,
+        scale: Tuple[float, float] = (0.5, 1.0),
+        center_range: Tuple[float, float] = (0.25, 0.75),
+        min_box_size: float = 2.0,
+        min_visibility: float = 0.2,
+        pad_value: float = 0.5,
+    ) -> None:
+        super().__init__()
+        self.prob = prob
+        self.scale = scale
+        self.center_range = center_range
+        self.min_box_size = min_box_size
+        self.min_visibility = min_visibility
+        self.pad_value = pad_value
+
+    def forward(self, batch: DETECTION_BATCH) -> DETECTION_BATCH:
+        images, targets = batch
+        batch_size, _, height, width = images.shape
+        device = images.device
+        selected = (torch.rand(batch_size, device=device) < self.prob).nonzero().squeeze(1)
+        if (batch_size < 2) or (len(selected) == 0):
+            return images, targets
+
+        num_mosaics = len(selected)
+        # Source images of the quadrants (top left, top right, bottom left, bottom right). The first one is the image
+        # itself and the others are drawn from the rest of the batch.
+        others = torch.randint(1, batch_size, (num_mosaics, 3), device=device)
+        sources = torch.cat((selected[:, None], (selected[:, None] + others) % batch_size), 1)
+        scales = torch.empty((num_mosaics, 4), device=device).uniform_(*self.scale)
+        size = torch.tensor([width, height], dtype=images.dtype, device=device)
+        centers = torch.empty((num_mosaics, 2), device=device).uniform_(*self.center_range) * size
+
+        # The source image is placed to the left of (above) the center in the left (top) quadrants and to the right of
+        # (below) the center in the right (bottom) quadrants.
+        before = torch.tensor([[1, 1], [0, 1], [1, 0], [0, 0]], dtype=images.dtype, device=device)
+        src_sizes = targets.image_sizes.flip(1).to(images.dtype)[sources] * scales[..., None]  # [mosaics, 4, 2]
+        offsets = centers[:, None, :] - before * src_sizes
+        zeros = torch.zeros_like(centers)
+        clip_lows = torch.where(before.bool(), zeros[:, None, :], centers[:, None, :])
+        clip_highs = torch.where(before.bool(), centers[:, None, :], size.expand_as(centers)[:, None, :])
+
+        mosaics = _mosaic_images(images, sources, scales, offsets, centers, self.pad_value)
+
+        output = images.clone()
+        output[selected] = mosaics
+        image_sizes = targets.image_sizes.clone()
+        image_sizes[selected] = torch.tensor([height, width], device=image_sizes.device)
+
+        # Placement table: the unselected images keep their boxes, the mosaics collect the boxes of their sources.
+        is_mosaic = torch.zeros(batch_size, dtype=torch.bool, device=device)
+        is_mosaic[selected] = True
+        kept = (~is_mosaic).nonzero().squeeze(1)
+        num_kept = len(kept)
+        out_images = torch.cat((kept, selected.repeat_interleave(4)))
+        src_images = torch.cat((kept, sources.flatten()))
+        all_scales = torch.cat((images.new_ones((num_kept, 2)), scales.reshape(-1, 1).expand(-1, 2)))
+        all_offsets = torch.cat((images.new_zeros((num_kept, 2)), offsets.reshape(-1, 2)))
+        clip_regions = torch.cat(
+            (
+                torch.cat((images.new_zeros((num_kept, 2)), size.expand(num_kept, 2)), 1),
+                torch.cat((clip_lows, clip_highs), 2).reshape(-1, 4),
+            )
+        )
+        # Keep the placements sorted by the output image, so that the boxes stay packed in image order.
+        order = torch.sort(out_images, stable=True).indices
+        thresholds = torch.tensor([[0.0, 0.0], [self.min_box_size, self.min_visibility]], device=device)
+        min_size, min_visibility = thresholds[is_mosaic[out_images[order]].long()].T
+        targets = _place_boxes(
+            targets._replace(boxes=targets.boxes.to(images.dtype)),
+            out_images[order],
+            src_images[order],
+            all_scales[order],
+            all_offsets[order],
+            clip_regions[order],
+            image_sizes,
+            min_size=min_size,
+            min_visibility=min_visibility,
+        )
+        return output, targets
+
+
+class DetectionMixUp(nn.Module):
+    """Blends random images of a batch with another image of the same batch.
+
+    The blended image is ``lam * image + (1 - lam) * other``, with ``lam`` drawn from a `Beta(alpha, alpha)`
+    distribution for every blended image, and it contains the boxes of both images.
+
+    Args:
+        prob: probability of blending an image with another one
+        alpha: parameter of the Beta distribution. The default concentrates ``lam`` around 0.5.
+
+    """
+
+    def __init__(self, prob: float = 1.0, alpha: float = 32.0) -> None:
+        super().__init__()
+        self.prob = prob
+        self.alpha = alpha
+
+    def forward(self, batch: DETECTION_BATCH) -> DETECTION_BATCH:
+        images, targets = batch
+        batch_size, _, height, width = images.shape
+        device = images.device
+        selected = (torch.rand(batch_size, device=device) < self.prob).nonzero().squeeze(1)
+        if (batch_size < 2) or (len(selected) == 0):
+            return images, targets
+
+        partners = (selected + torch.randint(1, batch_size, selected.shape, device=device)) % batch_size
+        concentration = torch.tensor(self.alpha, dtype=images.dtype, device=device)
+        lam = torch.distributions.Beta(concentration, concentration).sample(selected.shape).view(-1, 1, 1, 1)
+        output = images.clone()
+        output[selected] = lam * images[selected] + (1.0 - lam) * images[partners]
+        image_sizes = targets.image_sizes.clone()
+        image_sizes[selected] = torch.maximum(image_sizes[selected], image_sizes[partners])
+
+        # Placement table: every image keeps its boxes and the blended images also get the boxes of their partners.
+        all_images = torch.arange(batch_size, device=device)
+        out_images = torch.cat((all_images, selected))
+        src_images = torch.cat((all_images, partners))
+        order = torch.sort(out_images, stable=True).indices
+        num_placements = len(out_images)
+        size = images.new_tensor([0.0, 0.0, width, height])
+        targets = _place_boxes(
+            targets,
+            out_images[order],
+            src_images[order],
+            images.new_ones((num_placements, 2)),
+            images.new_zeros((num_placements, 2)),
+            size.expand(num_placements, 4),
+            image_sizes,
+        )
+        return output, targets
+
+
+class DetectionMultiScale(nn.Module):
+    """Resizes every batch to a random size, which changes every ``change_every`` batches.
+
+    The size is drawn from ``sizes`` by a random number generator that is seeded with ``seed`` plus the number of
+    size changes so far. As long as every process calls the module once per batch, all the processes of a distributed
+    training run use the same size for the same step, without any communication.
+
+    Args:
+        sizes: the input sizes to choose from, either integers for square images or `(height, width)` tuples. With
+            YOLO, the sizes should be divisible by the ratio in which the network downsamples the image, e.g. 32.
+        change_every: number of batches after which a new size is drawn
+        seed: seed of the random size schedule
+        mode: interpolation mode passed to ``torch.nn.functional.interpolate()``
+
+    Example::
+
+        dm.train_batch_transforms = DetectionMultiScale(range(320, 608 + 1, 32))
+
+    """
+
+    def __init__(
+        self,
+        sizes: Sequence[Union[int, Tuple[int, int]]],
+        change_every: int = 10,
+        seed: int = 0,
+        mode: str = "bilinear",
+    ) -> None:
+        super().__init__()
+        self.sizes = [(size, size) if isinstance(size, int) else tuple(size) for size in sizes]
+        if not self.sizes:
+            raise ValueError("At least one size is required.")
+        self.change_every = change_every
+        self.seed = seed
+        self.mode = mode
+        self.step = 0
+
+    def current_size(self) -> Tuple[int, int]:
+        """Returns the `(height, width)` that the next batch will be resized to."""
+        generator = torch.Generator().manual_seed(self.seed + self.step // self.change_every)
+        return self.sizes[int(torch.randint(len(self.sizes), (1,), generator=generator))]
+
+    def forward(self, batch: DETECTION_BATCH) -> DETECTION_BATCH:
+        images, targets = batch
+        height, width = self.current_size()
+        self.step += 1
+        old_height, old_width = images.shape[-2:]
+        if (height, width) == (old_height, old_width):
+            return images, targets
+
+        align_corners: Optional[bool] = False if self.mode in ("linear", "bilinear", "bicubic") else None
+        images = F.interpolate(images, size=(height, width), mode=self.mode, align_corners=align_corners)
+        scale_x, scale_y = width / old_width, height / old_height
+        boxes = targets.boxes * targets.boxes.new_tensor([scale_x, scale_y, scale_x, scale_y])
+        scale = torch.tensor([scale_y, scale_x], device=targets.image_sizes.device)
+        image_sizes = (targets.image_sizes * scale).round().to(targets.image_sizes.dtype)
+        return images, targets._replace(boxes=boxes, image_sizes=image_sizes)
@@ -4,6 +4,7 @@ from torch import Tensor
 from torchvision.transforms import InterpolationMode
 
 from pl_bolts.transforms.self_supervised import RandomTranslateWithReflect
+from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation, MultiViewBatchTransform
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
 from pl_bolts.utils.warnings import warn_missing_pkg
@@ -275,3 +276,64 @@ class AMDIMEvalTransformsImageNet128:
 
     def __call__(self, inp: Tensor) -> Tensor:
         return self.transforms(self.flip_lr(inp))
+
+
+class AMDIMTrainBatchTransformsCIFAR10(MultiViewBatchTransform):
+    """Batched counterpart of :class:`AMDIMTrainTransformsCIFAR10`; both views share the same horizontal flip.
+
+    Example::
+
+        transform = AMDIMTrainBatchTransformsCIFAR10()
+        (view1, view2), y = transform((x, y))
+
+    """
+
+    def __init__(self) -> None:
+        normalize = transforms.Normalize(
+            mean=[x / 255.0 for x in [125.3, 123.0, 113.9]],
+            std=[x / 255.0 for x in [63.0, 62.1, 66.7]],
+        )
+        view = BatchAugmentation(
+            max_translation=4,
+            translate_p=0.8,
+            jitter=(0.4, 0.4, 0.4, 0.2),
+            jitter_p=0.8,
+            grayscale_p=0.25,
+            normalize=normalize,
+        )
+        super().__init__([view, view], shared=BatchAugmentation(flip_p=0.5))
+
+
+class AMDIMTrainBatchTransformsSTL10(MultiViewBatchTransform):
+    """Batched counterpart of :class:`AMDIMTrainTransformsSTL10`; both views share the same horizontal flip."""
+
+    def __init__(self, height: int = 64) -> None:
+        view = BatchAugmentation(
+            size=height,
+            scale=(0.3, 1.0),
+            ratio=(0.7, 1.4),
+            interpolation="bicubic",
+            jitter=(0.4, 0.4, 0.4, 0.2),
+            jitter_p=0.8,
+            grayscale_p=0.25,
+            normalize=transforms.Normalize(mean=(0.43, 0.42, 0.39), std=(0.27, 0.26, 0.27)),
+        )
+        super().__init__([view, view], shared=BatchAugmentation(flip_p=0.5))
+
+
+class AMDIMTrainBatchTransformsImageNet128(MultiViewBatchTransform):
+    """Batched counterpart of :class:`AMDIMTrainTransformsImageNet128`; both views share the same horizontal
+    flip."""
+
+    def __init__(self, height: int = 128) -> None:
+        view = BatchAugmentation(
+            size=height,
+            scale=(0.3, 1.0),
+            ratio=(0.7, 1.4),
+            interpolation="bicubic",
+            jitter=(0.4, 0.4, 0.4, 0.1),
+            jitter_p=0.8,
+            grayscale_p=0.25,
+            normalize=transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        )
+        super().__init__([view, view], shared=BatchAugmentation(flip_p=0.5))
@@ -0,0 +1,382 @@
+"""Augmentations that operate on a whole collated batch at once.
+
+The per-sample transforms in this package run a torchvision pipeline per image and per view inside the DataLoader
+workers. The modules below apply the same family of augmentations (random resized crop, horizontal flip, translation,
+color jitter, grayscale and gaussian blur) to a ``[B, C, H, W]`` batch with independent random parameters per sample,
+so they can run after collation, either on the CPU or on the accelerator after the batch has been transferred.
+
+"""
+import math
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Union
+
+import torch
+from torch import Tensor, nn
+from torch.nn import functional as F  # noqa: N812
+
+_GRAYSCALE_WEIGHTS = (0.2989, 0.587, 0.114)
+
+
+def _to_float(x: Tensor) -> Tensor:
+    if x.is_floating_point():
+        return x
+    return x.float().div_(255.0)
+
+
+def _uniform(low: float, high: float, size: Sequence[int], device: torch.device) -> Tensor:
+    return torch.empty(size, device=device).uniform_(low, high)
+
+
+def _grayscale(x: Tensor) -> Tensor:
+    r, g, b = x.unbind(dim=-3)
+    return (_GRAYSCALE_WEIGHTS[0] * r + _GRAYSCALE_WEIGHTS[1] * g + _GRAYSCALE_WEIGHTS[2] * b).unsqueeze(-3)
+
+
+def _blend(x: Tensor, other: Tensor, factor: Tensor) -> Tensor:
+    factor = factor.view(-1, 1, 1, 1)
+    return (factor * x + (1.0 - factor) * other).clamp_(0.0, 1.0)
+
+
+def _rgb_to_hsv(x: Tensor) -> Tensor:
+    r, g, b = x.unbind(dim=-3)
+    maxc = x.max(dim=-3).values
+    minc = x.min(dim=-3).values
+    eqc = maxc == minc
+    cr = maxc - minc
+    ones = torch.ones_like(maxc)
+    s = cr / torch.where(eqc, ones, maxc)
+    cr_divisor = torch.where(eqc, ones, cr)
+    rc = (maxc - r) / cr_divisor
+    gc = (maxc - g) / cr_divisor
+    bc = (maxc - b) / cr_divisor
+    hr = (maxc == r) * (bc - gc)
+    hg = ((maxc == g) & (maxc != r)) * (2.0 + rc - bc)
+    hb = ((maxc != g) & (maxc != r)) * (4.0 + gc - rc)
+    h = torch.fmod((hr + hg + hb) / 6.0 + 1.0, 1.0)
+    return torch.stack((h, s, maxc), dim=-3)
+
+
+def _hsv_to_rgb(x: Tensor) -> Tensor:
+    h, s, v = x.unbind(dim=-3)
+    i = torch.floor(h * 6.0)
+    f = h * 6.0 - i
+    i = i.to(torch.int64) % 6
+    p = (v * (1.0 - s)).clamp(0.0, 1.0)
+    q = (v * (1.0 - s * f)).clamp(0.0, 1.0)
+    t = (v * (1.0 - s * (1.0 - f))).clamp(0.0, 1.0)
+    mask = (i.unsqueeze(-3) == torch.arange(6, device=i.device).view(-1, 1, 1)).to(x.dtype)
+    a1 = torch.stack((v, q, p, p, t, v), dim=-3)
+    a2 = torch.stack((t, v, v, q, p, p), dim=-3)
+    a3 = torch.stack((p, p, t, v, v, q), dim=-3)
+    return torch.einsum("...ijk, ...xijk -> ...xjk", mask, torch.stack((a1, a2, a3), dim=-4))
+
+
+def _adjust_hue(x: Tensor, factor: Tensor) -> Tensor:
+    hsv = _rgb_to_hsv(x)
+    h, s, v = hsv.unbind(dim=-3)
+    h = torch.remainder(h + factor.view(-1, 1, 1), 1.0)
+    return _hsv_to_rgb(torch.stack((h, s, v), dim=-3))
+
+
+def _gaussian_kernels(kernel_size: int, sigma: Tensor) -> Tensor:
+    """Returns a ``[B, kernel_size]`` tensor of normalized 1D gaussian kernels, one per sigma."""
+    half = (kernel_size - 1) * 0.5
+    grid = torch.linspace(-half, half, kernel_size, device=sigma.device)
+    kernels = torch.exp(-0.5 * (grid.unsqueeze(0) / sigma.unsqueeze(1)).pow(2))
+    return kernels / kernels.sum(dim=1, keepdim=True)
+
+
+def patchify_batch(x: Tensor, patch_size: int, overlap: int) -> Tensor:
+    """Cuts every image of a ``[B, C, H, W]`` batch into overlapping square patches.
+
+    This is the batched counterpart of :class:`~pl_bolts.transforms.self_supervised.Patchify` and produces the same
+    patch order, collated to ``[B, num_patches, C, patch_size, patch_size]``.
+
+    The patches are strided views of the images, which are copied only once, into the output tensor. ``F.unfold``
+    would first copy them into a ``[B, C * patch_size**2, num_patches]`` tensor and then transpose that.
+
+    """
+    b, c = x.shape[:2]
+    stride = patch_size - overlap
+    # [B, C, rows, cols, patch_size, patch_size] view -> [B, rows, cols, C, patch_size, patch_size]
+    patches = x.unfold(2, patch_size, stride).unfold(3, patch_size, stride).permute(0, 2, 3, 1, 4, 5)
+    return patches.reshape(b, -1, c, patch_size, patch_size)
+
+
+class BatchAugmentation(nn.Module):
+    """Applies a torchvision-style augmentation pipeline to a whole batch with per-sample random parameters.
+
+    The pipeline is, in order: random resized crop (or center crop), horizontal flip, translation with reflection,
+    color jitter, random grayscale and gaussian blur, followed by the optional ``normalize`` transform. Each stage
+    samples its parameters independently for every image of the batch from the same distributions as the matching
+    torchvision transform, so a view produced here is statistically equivalent to the per-sample pipeline. All the
+    geometric stages are folded into a single affine ``grid_sample`` call.
+
+    Resampling is done without antialiasing, which differs slightly from PIL when a crop is heavily downscaled.
+
+    Args:
+        size: output size of the view, or ``None`` to keep the input resolution without cropping.
+        scale: range of the crop area relative to the image area, as in ``RandomResizedCrop``.
+        ratio: range of the crop aspect ratio, as in ``RandomResizedCrop``.
+        center_crop_fraction: if set, takes a deterministic square center crop covering this fraction of the
+            shorter side instead of a random resized crop, i.e. ``Resize(int(size / fraction))`` + ``CenterCrop(size)``.
+        interpolation: ``"bilinear"``, ``"bicubic"`` or ``"nearest"``.
+        flip_p: probability of a horizontal flip.
+        max_translation: maximum translation in pixels, as in ``RandomTranslateWithReflect``.
+        translate_p: probability of applying the translation.
+        jitter: brightness, contrast, saturation and hue strengths, as in ``ColorJitter``.
+        jitter_p: probability of applying the color jitter.
+        grayscale_p: probability of converting the image to grayscale.
+        blur_kernel_size: size of the gaussian blur kernel, or ``None`` to disable blurring.
+        blur_sigma: range of the blur standard deviation.
+        blur_p: probability of applying the gaussian blur.
+        normalize: optional transform applied to the final float batch, e.g. ``transforms.Normalize``.
+
+    Example::
+
+        from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation
+
+        augment = BatchAugmentation(size=32, jitter=(0.4, 0.4, 0.4, 0.1))
+        x = torch.randint(0, 256, (128, 3, 32, 32), dtype=torch.uint8)
+        view = augment(x)  # float tensor of shape [128, 3, 32, 32]
+
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        scale: Tuple[float, float] = (0.08, 1.0),
+        ratio: Tuple[float, float] = (3.0 / 4.0, 4.0 / 3.0),
+        center_crop_fraction: Optional[float] = None,
+        interpolation: str = "bilinear",
+        flip_p: float = 0.0,
+        max_translation: int = 0,
+        translate_p: float = 0.0,
+        jitter: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0),
+        jitter_p: float = 0.0,
+        grayscale_p: float = 0.0,
+        blur_kernel_size: Optional[int] = None,
+        blur_sigma: Tuple[float, float] = (0.1, 2.0),
+        blur_p: float = 0.0,
+        normalize: Optional[Callable] = None,
+    ) -> None:
+        super().__init__()
+        if blur_kernel_size is not None and blur_kernel_size % 2 == 0:
+            raise ValueError(f"`blur_kernel_size` should be odd, got {blur_kernel_size}.")
+
+        self.size = size
+        self.scale = scale
+        self.ratio = ratio
+        self.center_crop_fraction = center_crop_fraction
+        self.interpolation = interpolation
+        self.flip_p = flip_p
+        self.max_translation = max_translation
+        self.translate_p = translate_p
+        self.jitter = jitter
+        self.jitter_p = jitter_p
+        self.grayscale_p = grayscale_p
+        self.blur_kernel_size = blur_kernel_size
+        self.blur_sigma = blur_sigma
+        self.blur_p = blur_p
+        self.normalize = normalize
+
+    def forward(self, x: Tensor) -> Tensor:
+        """
+        Args:
+            x: a uint8 batch in ``[0, 255]`` or a float batch in ``[0, 1]`` of shape ``[B, C, H, W]``.
+
+        Returns:
+            the augmented float batch.
+        """
+        x = _to_float(x)
+        x = self._geometric(x)
+        if self.jitter_p > 0 and any(self.jitter):
+            x = self._color_jitter(x)
+        if self.grayscale_p > 0:
+            apply = torch.rand(x.size(0), device=x.device) < self.grayscale_p
+            x = torch.where(apply.view(-1, 1, 1, 1), _grayscale(x).expand_as(x), x)
+        if self.blur_kernel_size is not None and self.blur_p > 0:
+            x = self._gaussian_blur(x)
+        if self.normalize is not None:
+            x = self.normalize(x)
+        return x
+
+    def _crop_boxes(self, batch_size: int, height: int, width: int, device: torch.device) -> Tensor:
+        """Samples ``(top, left, crop_height, crop_width)`` per sample like ``RandomResizedCrop.get_params``."""
+        if self.size is None:
+            box = torch.tensor([0.0, 0.0, height, width], device=device)
+            return box.expand(batch_size, 4)
+
+        if self.center_crop_fraction is not None:
+            side = min(height, width) * self.center_crop_fraction
+            box = torch.tensor([(height - side) / 2, (width - side) / 2, side, side], device=device)
+            return box.expand(batch_size, 4)
+
+        # vectorized version of the 10 rejection-sampling attempts of torchvision
+        num_attempts = 10
+        area = height * width
+        log_ratio = (math.log(self.ratio[0]), math.log(self.ratio[1]))
+        target_area = area * _uniform(self.scale[0], self.scale[1], (batch_size, num_attempts), device)
+        aspect_ratio = torch.exp(_uniform(log_ratio[0], log_ratio[1], (batch_size, num_attempts), device))
+        w = torch.round(torch.sqrt(target_area * aspect_ratio))
+        h = torch.round(torch.sqrt(target_area / aspect_ratio))
+        valid = (w > 0) & (w <= width) & (h > 0) & (h <= height)
+        first_valid = valid.to(torch.uint8).argmax(dim=1, keepdim=True)
+        w = w.gather(1, first_valid).squeeze(1)
+        h = h.gather(1, first_valid).squeeze(1)
+
+        # fallback to a center crop when none of the attempts succeeded
+        in_ratio = width / height
+        if in_ratio < min(self.ratio):
+            fallback_w, fallback_h = width, round(width / min(self.ratio))
+        elif in_ratio > max(self.ratio):
+            fallback_w, fallback_h = round(height * max(self.ratio)), height
+        else:
+            fallback_w, fallback_h = width, height
+        found = valid.any(dim=1)
+        w = torch.where(found, w, torch.full_like(w, fallback_w))
+        h = torch.where(found, h, torch.full_like(h, fallback_h))
+
+        top = torch.floor(torch.rand(batch_size, device=device) * (height - h + 1))
+        left = torch.floor(torch.rand(batch_size, device=device) * (width - w + 1))
+        top = torch.where(found, top, torch.div(height - h, 2, rounding_mode="floor"))
+        left = torch.where(found, left, torch.div(width - w, 2, rounding_mode="floor"))
+        return torch.stack((top, left, h, w), dim=1)
+
+    def _geometric(self, x: Tensor) -> Tensor:
+        batch_size, _, height, width = x.shape
+        device = x.device
+        out_h, out_w = (height, width) if self.size is None else (self.size, self.size)
+        needs_resample = self.size is not None or self.flip_p > 0 or (self.max_translation > 0 and self.translate_p > 0)
+        if not needs_resample:
+            return x
+
+        top, left, crop_h, crop_w = self._crop_boxes(batch_size, height, width, device).unbind(dim=1)
+
+        # affine mapping from normalized output coordinates to normalized input coordinates
+        scale_x = crop_w / width
+        scale_y = crop_h / height
+        shift_x = (2 * left + crop_w) / width - 1
+        shift_y = (2 * top + crop_h) / height - 1
+
+        if self.flip_p > 0:
+            flip = torch.rand(batch_size, device=device) < self.flip_p
+            scale_x = torch.where(flip, -scale_x, scale_x)
+
+        if self.max_translation > 0 and self.translate_p > 0:
+            translation = torch.randint(
+                -self.max_translation, self.max_translation + 1, (batch_size, 2), device=device
+            ).to(x.dtype)
+            translation *= (torch.rand(batch_size, 1, device=device) < self.translate_p).to(x.dtype)
+            shift_x = shift_x - scale_x * 2 * translation[:, 0] / out_w
+            shift_y = shift_y - scale_y * 2 * translation[:, 1] / out_h
+
+        zeros = torch.zeros_like(scale_x)
+        theta = torch.stack(
+            (torch.stack((scale_x, zeros, shift_x), dim=1), torch.stack((zeros, scale_y, shift_y), dim=1)), dim=1
+        ).to(x.dtype)
+        grid = F.affine_grid(theta, [batch_size, x.size(1), out_h, out_w], align_corners=False)
+        x = F.grid_sample(x, grid, mode=self.interpolation, padding_mode="reflection", align_corners=False)
+        return x.clamp_(0.0, 1.0) if self.interpolation == "bicubic" else x
+
+    def _color_jitter(self, x: Tensor) -> Tensor:
+        """Vectorized ``RandomApply([ColorJitter(...)], p)`` with a random order of the four adjustments per
+        sample."""
+        batch_size = x.size(0)
+        device = x.device
+        brightness, contrast, saturation, hue = self.jitter
+        apply = torch.rand(batch_size, device=device) < self.jitter_p
+
+        def _factor(strength: float) -> Tensor:
+            return _uniform(max(0.0, 1.0 - strength), 1.0 + strength, (batch_size,), device)
+
+        factors = {
+            0: _factor(brightness) if brightness > 0 else None,
+            1: _factor(contrast) if contrast > 0 else None,
+            2: _factor(saturation) if saturation > 0 else None,
+            3: _uniform(-hue, hue, (batch_size,), device) if hue > 0 else None,
+        }
+        order = torch.rand(batch_size, 4, device=device).argsort(dim=1)
+
+        for step in range(4):
+            for fn_idx, factor in factors.items():
+                if factor is None:
+                    continue
+                selected = apply & (order[:, step] == fn_idx)
+                if fn_idx == 3:
+                    # hue is expensive, so only the selected samples go through the HSV round trip. The update is out
+                    # of place, since x can still be the caller's float batch, e.g. the source of the other views.
+                    idx = selected.nonzero(as_tuple=True)[0]
+                    if idx.numel() > 0:
+                        x = x.index_put((idx,), _adjust_hue(x[idx], factor[idx]))
+                    continue
+
+                # an identity factor leaves the non-selected samples untouched
+                factor = torch.where(selected, factor, torch.ones_like(factor))
+                if fn_idx == 0:
+                    x = (x * factor.view(-1, 1, 1, 1)).clamp_(0.0, 1.0)
+                elif fn_idx == 1:
+                    mean = _grayscale(x).mean(dim=(-3, -2, -1), keepdim=True)
+                    x = _blend(x, mean, factor)
+                else:
+                    x = _blend(x, _grayscale(x), factor)
+        return x
+
+    def _gaussian_blur(self, x: Tensor) -> Tensor:
+        batch_size, channels, height, width = x.shape
+        kernel_size = self.blur_kernel_size
+        sigma = _uniform(self.blur_sigma[0], self.blur_sigma[1], (batch_size,), x.device)
+        kernels = _gaussian_kernels(kernel_size, sigma).to(x.dtype)
+
+        # a delta kernel is an exact identity for the samples that are not blurred
+        apply = torch.rand(batch_size, device=x.device) < self.blur_p
+        identity = torch.zeros_like(kernels)
+        identity[:, kernel_size // 2] = 1.0
+        kernels = torch.where(apply.unsqueeze(1), kernels, identity)
+
+        # separable depthwise convolution, one group per (sample, channel)
+        kernels = kernels.repeat_interleave(channels, dim=0)
+        pad = kernel_size // 2
+        x = x.reshape(1, batch_size * channels, height, width)
+        x = F.pad(x, [pad, pad, pad, pad], mode="reflect")
+        x = F.conv2d(x, kernels.view(-1, 1, 1, kernel_size), groups=batch_size * channels)
+        x = F.conv2d(x, kernels.view(-1, 1, kernel_size, 1), groups=batch_size * channels)
+        return x.view(batch_size, channels, height, width)
+
+
+class MultiViewBatchTransform(nn.Module):
+    """Turns a collated ``(images, labels)`` batch into ``(views, labels)`` using one augmentation per view.
+
+    The output has the same structure as the default collation of the per-sample SSL transforms, which return a tuple
+    of views per image, so the self-supervised ``LightningModule`` classes consume it unchanged. Use it as the
+    ``train_batch_transforms`` / ``val_batch_transforms`` of a datamodule, in which case the dataset should only
+    convert the images to fixed-size uint8 tensors, e.g. with ``transforms.PILToTensor()``.
+
+    Args:
+        views: one augmentation module per output view.
+        shared: optional augmentation applied once to the images before the views are generated.
+
+    Example::
+
+        from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation, MultiViewBatchTransform
+
+        transform = MultiViewBatchTransform([BatchAugmentation(size=32, flip_p=0.5)] * 2)
+        (view1, view2), y = transform((images, y))
+
+    """
+
+    def __init__(self, views: Sequence[nn.Module], shared: Optional[nn.Module] = None) -> None:
+        super().__init__()
+        self.views = nn.ModuleList(views)
+        self.shared = shared
+
+    def forward(self, batch: Union[Tensor, Tuple[Tensor, Any], List[Any]]) -> Any:
+        if isinstance(batch, Tensor):
+            return self._generate_views(batch)
+        x, *rest = batch
+        return [self._generate_views(x), *rest]
+
+    def _generate_views(self, x: Tensor) -> List[Tensor]:
+        x = _to_float(x)
+        if self.shared is not None:
+            x = self.shared(x)
+        return [view(x) for view in self.views]
@@ -1,7 +1,10 @@
-from torch import Tensor
+from typing import Any, Callable, List, Tuple
+
+from torch import Tensor, nn
 from torchvision.transforms import InterpolationMode
 
 from pl_bolts.transforms.self_supervised import Patchify, RandomTranslateWithReflect
+from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation, patchify_batch
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
 from pl_bolts.utils.warnings import warn_missing_pkg
@@ -12,6 +15,10 @@ else:  # pragma: no cover
     warn_missing_pkg("torchvision")
 
 
+def _patchify(patch_size: int, overlap: int, patchify: bool) -> List[Callable]:
+    return [Patchify(patch_size=patch_size, overlap_size=overlap)] if patchify else []
+
+
 @under_review()
 class CPCTrainTransformsCIFAR10:
     """Transforms used for CPC:
@@ -36,11 +43,13 @@ class CPCTrainTransformsCIFAR10:
         train_loader = module.train_dataloader(batch_size=32, transforms=CPCTrainTransformsCIFAR10())
     """
 
-    def __init__(self, patch_size: int = 8, overlap: int = 4) -> None:
+    def __init__(self, patch_size: int = 8, overlap: int = 4, patchify: bool = True) -> None:
         """
         Args:
             patch_size: size of patches when cutting up the image into overlapping patches
             overlap: how much to overlap patches
+            patchify: if ``False``, returns the whole image and leaves cutting it into patches to ``CPC_v2``, which
+                does it once per batch on the device
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError("You want to use `transforms` from `torchvision` which is not installed yet.")
@@ -64,7 +73,7 @@ class CPCTrainTransformsCIFAR10:
                 rnd_gray,
                 transforms.ToTensor(),
                 normalize,
-                Patchify(patch_size=patch_size, overlap_size=overlap),
+                *_patchify(patch_size, overlap, patchify),
             ]
         )
 
@@ -94,11 +103,13 @@ class CPCEvalTransformsCIFAR10:
         train_loader = module.train_dataloader(batch_size=32, transforms=CPCEvalTransformsCIFAR10())
     """
 
-    def __init__(self, patch_size: int = 8, overlap: int = 4) -> None:
+    def __init__(self, patch_size: int = 8, overlap: int = 4, patchify: bool = True) -> None:
         """
         Args:
             patch_size: size of patches when cutting up the image into overlapping patches
             overlap: how much to overlap patches
+            patchify: if ``False``, returns the whole image and leaves cutting it into patches to ``CPC_v2``, which
+                does it once per batch on the device
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError("You want to use `transforms` from `torchvision` which is not installed yet.")
@@ -117,7 +128,7 @@ class CPCEvalTransformsCIFAR10:
             [
                 transforms.ToTensor(),
                 normalize,
-                Patchify(patch_size=patch_size, overlap_size=overlap),
+                *_patchify(patch_size, overlap, patchify),
             ]
         )
 
@@ -149,11 +160,13 @@ class CPCTrainTransformsSTL10:
         train_loader = module.train_dataloader(batch_size=32, transforms=CPCTrainTransformsSTL10())
     """
 
-    def __init__(self, patch_size: int = 16, overlap: int = 8) -> None:
+    def __init__(self, patch_size: int = 16, overlap: int = 8, patchify: bool = True) -> None:
         """
         Args:
             patch_size: size of patches when cutting up the image into overlapping patches
             overlap: how much to overlap patches
+            patchify: if ``False``, returns the whole image and leaves cutting it into patches to ``CPC_v2``, which
+                does it once per batch on the device
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError("You want to use `transforms` from `torchvision` which is not installed yet.")
@@ -178,7 +191,7 @@ class CPCTrainTransformsSTL10:
                 rnd_gray,
                 transforms.ToTensor(),
                 normalize,
-                Patchify(patch_size=patch_size, overlap_size=overlap),
+                *_patchify(patch_size, overlap, patchify),
             ]
         )
 
@@ -208,11 +221,13 @@ class CPCEvalTransformsSTL10:
         train_loader = module.train_dataloader(batch_size=32, transforms=CPCEvalTransformsSTL10())
     """
 
-    def __init__(self, patch_size: int = 16, overlap: int = 8) -> None:
+    def __init__(self, patch_size: int = 16, overlap: int = 8, patchify: bool = True) -> None:
         """
         Args:
             patch_size: size of patches when cutting up the image into overlapping patches
             overlap: how much to overlap patches
+            patchify: if ``False``, returns the whole image and leaves cutting it into patches to ``CPC_v2``, which
+                does it once per batch on the device
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError("You want to use `transforms` from `torchvision` which is not installed yet.")
@@ -229,7 +244,7 @@ class CPCEvalTransformsSTL10:
                 transforms.CenterCrop(64),
                 transforms.ToTensor(),
                 normalize,
-                Patchify(patch_size=patch_size, overlap_size=overlap),
+                *_patchify(patch_size, overlap, patchify),
             ]
         )
 
@@ -258,11 +273,13 @@ class CPCTrainTransformsImageNet128:
         train_loader = module.train_dataloader(batch_size=32, transforms=CPCTrainTransformsImageNet128())
     """
 
-    def __init__(self, patch_size: int = 32, overlap: int = 16) -> None:
+    def __init__(self, patch_size: int = 32, overlap: int = 16, patchify: bool = True) -> None:
         """
         Args:
             patch_size: size of patches when cutting up the image into overlapping patches
             overlap: how much to overlap patches
+            patchify: if ``False``, returns the whole image and leaves cutting it into patches to ``CPC_v2``, which
+                does it once per batch on the device
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError("You want to use `transforms` from `torchvision` which is not installed yet.")
@@ -281,7 +298,7 @@ class CPCTrainTransformsImageNet128:
             [
                 transforms.ToTensor(),
                 transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-                Patchify(patch_size=patch_size, overlap_size=overlap),
+                *_patchify(patch_size, overlap, patchify),
             ]
         )
 
@@ -313,11 +330,13 @@ class CPCEvalTransformsImageNet128:
         train_loader = module.train_dataloader(batch_size=32, transforms=CPCEvalTransformsImageNet128())
     """
 
-    def __init__(self, patch_size: int = 32, overlap: int = 16) -> None:
+    def __init__(self, patch_size: int = 32, overlap: int = 16, patchify: bool = True) -> None:
         """
         Args:
             patch_size: size of patches when cutting up the image into overlapping patches
             overlap: how much to overlap patches
+            patchify: if ``False``, returns the whole image and leaves cutting it into patches to ``CPC_v2``, which
+                does it once per batch on the device
         """
         if not _TORCHVISION_AVAILABLE:  # pragma: no cover
             raise ModuleNotFoundError("You want to use `transforms` from `torchvision` which is not installed yet.")
@@ -330,7 +349,7 @@ class CPCEvalTransformsImageNet128:
             [
                 transforms.ToTensor(),
                 transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
-                Patchify(patch_size=patch_size, overlap_size=overlap),
+                *_patchify(patch_size, overlap, patchify),
             ]
         )
         self.transforms = transforms.Compose(
@@ -344,3 +363,79 @@ class CPCEvalTransformsImageNet128:
     def __call__(self, inp: Tensor) -> Tensor:
         inp = self.flip_lr(inp)
         return self.transforms(inp)
+
+
+class CPCTrainBatchTransformsCIFAR10(nn.Module):
+    """Batched counterpart of :class:`CPCTrainTransformsCIFAR10`, applied to a collated ``(images, labels)`` batch.
+
+    Returns the patches collated as ``[B, num_patches, C, patch_size, patch_size]``, like the per-sample transform. With
+    ``patchify=False`` it returns the augmented ``[B, C, H, W]`` images, which ``CPC_v2`` cuts into patches itself.
+
+    Example::
+
+        dm.train_transforms = transforms.PILToTensor()
+        dm.train_batch_transforms = CPCTrainBatchTransformsCIFAR10()
+
+    """
+
+    def __init__(self, patch_size: int = 8, overlap: int = 4, patchify: bool = True) -> None:
+        super().__init__()
+        self.patch_size = patch_size
+        self.overlap = overlap
+        self.patchify = patchify
+        normalize = transforms.Normalize(
+            mean=[x / 255.0 for x in [125.3, 123.0, 113.9]],
+            std=[x / 255.0 for x in [63.0, 62.1, 66.7]],
+        )
+        self.augmentation = BatchAugmentation(
+            flip_p=0.5,
+            max_translation=4,
+            translate_p=0.8,
+            jitter=(0.4, 0.4, 0.4, 0.2),
+            jitter_p=0.8,
+            grayscale_p=0.25,
+            normalize=normalize,
+        )
+
+    def forward(self, batch: Tuple[Tensor, Any]) -> Tuple[Tensor, Any]:
+        x, y = batch
+        x = self.augmentation(x)
+        if not self.patchify:
+            return x, y
+        return patchify_batch(x, self.patch_size, self.overlap), y
+
+
+class CPCTrainBatchTransformsSTL10(CPCTrainBatchTransformsCIFAR10):
+    """Batched counterpart of :class:`CPCTrainTransformsSTL10`."""
+
+    def __init__(self, patch_size: int = 16, overlap: int = 8, patchify: bool = True) -> None:
+        super().__init__(patch_size=patch_size, overlap=overlap, patchify=patchify)
+        self.augmentation = BatchAugmentation(
+            size=64,
+            scale=(0.3, 1.0),
+            ratio=(0.7, 1.4),
+            interpolation="bicubic",
+            flip_p=0.5,
+            jitter=(0.4, 0.4, 0.4, 0.2),
+            jitter_p=0.8,
+            grayscale_p=0.25,
+            normalize=transforms.Normalize(mean=(0.43, 0.42, 0.39), std=(0.27, 0.26, 0.27)),
+        )
+
+
+class CPCTrainBatchTransformsImageNet128(CPCTrainBatchTransformsCIFAR10):
+    """Batched counterpart of :class:`CPCTrainTransformsImageNet128`."""
+
+    def __init__(self, patch_size: int = 32, overlap: int = 16, patchify: bool = True) -> None:
+        super().__init__(patch_size=patch_size, overlap=overlap, patchify=patchify)
+        self.augmentation = BatchAugmentation(
+            size=128,
+            scale=(0.3, 1.0),
+            ratio=(0.7, 1.4),
+            interpolation="bicubic",
+            flip_p=0.5,
+            jitter=(0.4, 0.4, 0.4, 0.1),
+            jitter_p=0.8,
+            grayscale_p=0.25,
+            normalize=transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        )
@@ -1,5 +1,6 @@
+import math
 import random
-from typing import Callable, List, Tuple, Union
+from typing import Callable, List, Optional, Tuple, Union
 
 from torch import Tensor
 
@@ -8,6 +9,7 @@ from pl_bolts.transforms.dataset_normalizations import (
     imagenet_normalization,
     stl10_normalization,
 )
+from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation, MultiViewBatchTransform
 from pl_bolts.utils import _PIL_AVAILABLE, _TORCHVISION_AVAILABLE
 from pl_bolts.utils.stability import under_review
 from pl_bolts.utils.warnings import warn_missing_pkg
@@ -259,3 +261,39 @@ class GaussianBlur:
     def __call__(self, x):
         sigma = random.uniform(self.sigma[0], self.sigma[1])  # noqa: S311
         return x.filter(ImageFilter.GaussianBlur(radius=sigma))
+
+
+class MoCo2TrainBatchTransform(MultiViewBatchTransform):
+    """Batched counterpart of the ``MoCo2Train*Transforms``, producing the query and key views of a collated batch.
+
+    The PIL ``GaussianBlur(radius=sigma)`` is replaced by a gaussian kernel wide enough to cover three standard
+    deviations of the largest sigma.
+
+    Args:
+        size: output size of the views.
+        normalize: transform to normalize the views, e.g. ``cifar10_normalization()``.
+
+    Example::
+
+        from pl_bolts.transforms.self_supervised.moco_transforms import MoCo2TrainBatchTransform
+
+        dm.train_transforms = transforms.PILToTensor()
+        dm.train_batch_transforms = MoCo2TrainBatchTransform(size=32, normalize=cifar10_normalization())
+
+    """
+
+    def __init__(self, size: int = 32, normalize: Optional[Callable] = None) -> None:
+        sigma = (0.1, 2.0)
+        view = BatchAugmentation(
+            size=size,
+            scale=(0.2, 1.0),
+            jitter=(0.4, 0.4, 0.4, 0.1),
+            jitter_p=0.8,
+            grayscale_p=0.2,
+            blur_kernel_size=2 * math.ceil(3 * sigma[1]) + 1,
+            blur_sigma=sigma,
+            blur_p=0.5,
+            flip_p=0.5,
+            normalize=normalize,
+        )
+        super().__init__([view, view])
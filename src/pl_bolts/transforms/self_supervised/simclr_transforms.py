@@ -2,6 +2,7 @@ from typing import Callable, Tuple, Union
 
 from torch import Tensor
 
+from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation, MultiViewBatchTransform
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.warnings import warn_missing_pkg
 
@@ -188,3 +189,75 @@ class SimCLRFinetuneTransform(SimCLRTrainDataTransform):
 
     def __call__(self, sample: Tensor) -> Tensor:
         return self.transform(sample)
+
+
+class SimCLRTrainBatchTransform(MultiViewBatchTransform):
+    """Batched counterpart of :class:`SimCLRTrainDataTransform`, applied to a collated batch of images.
+
+    Args:
+        input_height (int, optional): expected output size of image. Defaults to 224.
+        gaussian_blur (bool, optional): applies Gaussian blur if True. Defaults to True.
+        jitter_strength (float, optional): color jitter multiplier. Defaults to 1.0.
+        normalize (Callable, optional): optional transform to normalize. Defaults to None.
+
+    Example::
+
+        from pl_bolts.transforms.self_supervised.simclr_transforms import SimCLRTrainBatchTransform
+
+        dm.train_transforms = transforms.PILToTensor()
+        dm.train_batch_transforms = SimCLRTrainBatchTransform(input_height=32)
+        (xi, xj, xk), y = dm.train_batch_transforms((x, y))  # xk is only for the online evaluator if used
+
+    """
+
+    def __init__(
+        self,
+        input_height: int = 224,
+        gaussian_blur: bool = True,
+        jitter_strength: float = 1.0,
+        normalize: Union[None, Callable] = None,
+    ) -> None:
+        blur_kernel_size = None
+        if gaussian_blur:
+            blur_kernel_size = int(0.1 * input_height)
+            if blur_kernel_size % 2 == 0:
+                blur_kernel_size += 1
+
+        train_view = BatchAugmentation(
+            size=input_height,
+            flip_p=0.5,
+            jitter=(0.8 * jitter_strength, 0.8 * jitter_strength, 0.8 * jitter_strength, 0.2 * jitter_strength),
+            jitter_p=0.8,
+            grayscale_p=0.2,
+            blur_kernel_size=blur_kernel_size,
+            blur_p=0.5,
+            normalize=normalize,
+        )
+        online_view = BatchAugmentation(size=input_height, flip_p=0.5, normalize=normalize)
+        super().__init__([train_view, train_view, online_view])
+
+
+class SimCLREvalBatchTransform(SimCLRTrainBatchTransform):
+    """Batched counterpart of :class:`SimCLREvalDataTransform`, applied to a collated batch of images.
+
+    Args:
+        input_height (int, optional): expected output size of image. Defaults to 224.
+        gaussian_blur (bool, optional): applies Gaussian blur if True. Defaults to True.
+        jitter_strength (float, optional): color jitter multiplier. Defaults to 1.0.
+        normalize (Callable, optional): optional transform to normalize. Defaults to None.
+
+    """
+
+    def __init__(
+        self,
+        input_height: int = 224,
+        gaussian_blur: bool = True,
+        jitter_strength: float = 1.0,
+        normalize: Union[None, Callable] = None,
+    ) -> None:
+        super().__init__(
+            input_height=input_height, gaussian_blur=gaussian_blur, jitter_strength=jitter_strength, normalize=normalize
+        )
+
+        # replace online view with the eval time Resize(1.1 * input_height) + CenterCrop(input_height)
+        self.views[-1] = BatchAugmentation(size=input_height, center_crop_fraction=1 / 1.1, normalize=normalize)
@@ -2,6 +2,7 @@ from typing import List, Tuple
 
 from torch import Tensor
 
+from pl_bolts.transforms.self_supervised.batch_transforms import BatchAugmentation, MultiViewBatchTransform
 from pl_bolts.utils import _TORCHVISION_AVAILABLE
 from pl_bolts.utils.warnings import warn_missing_pkg
 
@@ -167,3 +168,92 @@ class SwAVFinetuneTransform:
 
     def __call__(self, sample: Tensor) -> Tensor:
         return self.transform(sample)
+
+
+class SwAVTrainBatchTransform(MultiViewBatchTransform):
+    """Batched counterpart of :class:`SwAVTrainDataTransform`.
+
+    Every crop of the multi-crop transform is produced for the whole batch in one call, instead of running
+    ``sum(num_crops) + 1`` PIL pipelines per image in the DataLoader workers. The last view is the online evaluation
+    view.
+
+    Example::
+
+        from pl_bolts.transforms.self_supervised.swav_transforms import SwAVTrainBatchTransform
+
+        dm.train_transforms = transforms.PILToTensor()
+        dm.train_batch_transforms = SwAVTrainBatchTransform(size_crops=(96, 36))
+
+    """
+
+    def __init__(
+        self,
+        normalize=None,
+        size_crops: Tuple[int] = (96, 36),
+        num_crops: Tuple[int] = (2, 4),
+        min_scale_crops: Tuple[float] = (0.33, 0.10),
+        max_scale_crops: Tuple[float] = (1, 0.33),
+        gaussian_blur: bool = True,
+        jitter_strength: float = 1.0,
+    ) -> None:
+        if len(size_crops) != len(num_crops):
+            raise AssertionError("len(size_crops) should equal len(num_crops).")
+        if len(min_scale_crops) != len(num_crops):
+            raise AssertionError("len(min_scale_crops) should equal len(num_crops).")
+        if len(max_scale_crops) != len(num_crops):
+            raise AssertionError("len(max_scale_crops) should equal len(num_crops).")
+
+        self.size_crops = size_crops
+        self.num_crops = num_crops
+
+        blur_kernel_size = None
+        if gaussian_blur:
+            blur_kernel_size = int(0.1 * size_crops[0])
+            if blur_kernel_size % 2 == 0:
+                blur_kernel_size += 1
+
+        views = []
+        for size, num, min_scale, max_scale in zip(size_crops, num_crops, min_scale_crops, max_scale_crops):
+            crop_view = BatchAugmentation(
+                size=size,
+                scale=(min_scale, max_scale),
+                flip_p=0.5,
+                jitter=(0.8 * jitter_strength, 0.8 * jitter_strength, 0.8 * jitter_strength, 0.2 * jitter_strength),
+                jitter_p=0.8,
+                grayscale_p=0.2,
+                blur_kernel_size=blur_kernel_size,
+                blur_p=0.5,
+                normalize=normalize,
+            )
+            views.extend([crop_view] * num)
+
+        # add online train view of the size of global view
+        views.append(BatchAugmentation(size=size_crops[0], flip_p=0.5, normalize=normalize))
+        super().__init__(views)
+
+
+class SwAVEvalBatchTransform(SwAVTrainBatchTransform):
+    """Batched counterpart of :class:`SwAVEvalDataTransform`."""
+
+    def __init__(
+        self,
+        normalize=None,
+        size_crops: Tuple[int] = (96, 36),
+        num_crops: Tuple[int] = (2, 4),
+        min_scale_crops: Tuple[float] = (0.33, 0.10),
+        max_scale_crops: Tuple[float] = (1, 0.33),
+        gaussian_blur: bool = True,
+        jitter_strength: float = 1.0,
+    ) -> None:
+        super().__init__(
+            normalize=normalize,
+            size_crops=size_crops,
+            num_crops=num_crops,
+            min_scale_crops=min_scale_crops,
+            max_scale_crops=max_scale_crops,
+            gaussian_blur=gaussian_blur,
+            jitter_strength=jitter_strength,
+        )
+
+        # replace last view with the eval view
+        self.views[-1] = BatchAugmentation(size=size_crops[0], center_crop_fraction=1 / 1.1, normalize=normalize)
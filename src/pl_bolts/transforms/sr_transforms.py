@@ -0,0 +1,72 @@
+from typing import Any, List, Sequence, Tuple, Union
+
+import torch
+import torch.nn.functional as F  # noqa: N812
+from torch import Tensor, nn
+from torch.utils.data.dataloader import default_collate
+
+
+class SRBatchDownsample(nn.Module):
+    """Creates the low resolution images of a super resolution batch from the high resolution ones.
+
+    The datasets of :mod:`pl_bolts.datasets` return ``(hr_image, lr_image)`` pairs where ``lr_image`` is made by a
+    PIL round trip per sample. With ``hr_only=True`` they return the high resolution crops only and this module makes
+    all the low resolution images of the batch at once with an antialiased bicubic downsample, either in the
+    ``collate_fn`` (see :class:`SRCollate`) or on the device as a batch transform of the datamodule.
+
+    The high resolution images are expected in ``[-1, 1]`` and the low resolution images are returned in ``[0, 1]``
+    like the datasets do, so the models and :class:`~pl_bolts.callbacks.SRImageLoggerCallback` are unchanged. The
+    result matches the PIL resize up to the 8-bit quantization PIL applies.
+
+    Args:
+        scale_factor: ratio between the high and low resolution image sizes
+
+    Example::
+
+        from pl_bolts.datamodules import TVTDataModule
+        from pl_bolts.datasets.sr_mnist_dataset import SRMNIST
+        from pl_bolts.transforms.sr_transforms import SRBatchDownsample
+
+        dataset = SRMNIST(scale_factor=4, root=".", hr_only=True)
+        dm = TVTDataModule(dataset, dataset, dataset)
+        dm.train_batch_transforms = dm.val_batch_transforms = dm.test_batch_transforms = SRBatchDownsample(4)
+
+    """
+
+    def __init__(self, scale_factor: int) -> None:
+        super().__init__()
+        self.scale_factor = scale_factor
+
+    def forward(self, batch: Union[Tensor, Sequence[Tensor]]) -> Tuple[Tensor, Tensor]:
+        hr_image = batch if isinstance(batch, Tensor) else batch[0]
+        height, width = hr_image.shape[-2:]
+        lr_image = F.interpolate(
+            hr_image * 0.5 + 0.5,
+            size=(height // self.scale_factor, width // self.scale_factor),
+            mode="bicubic",
+            align_corners=False,
+            antialias=True,
+        )
+        return hr_image, lr_image.clamp_(0.0, 1.0)
+
+
+class SRCollate:
+    """``collate_fn`` stacking the high resolution images of a batch and creating the low resolution images with
+    :class:`SRBatchDownsample` in the DataLoader workers.
+
+    Args:
+        scale_factor: ratio between the high and low resolution image sizes
+
+    Example::
+
+        dataset = SRMNIST(scale_factor=4, root=".", hr_only=True)
+        loader = DataLoader(dataset, batch_size=16, collate_fn=SRCollate(4))
+
+    """
+
+    def __init__(self, scale_factor: int) -> None:
+        self.downsample = SRBatchDownsample(scale_factor)
+
+    def __call__(self, samples: List[Any]) -> Tuple[Tensor, Tensor]:
+        with torch.no_grad():
+            return self.downsample(default_collate(samples))
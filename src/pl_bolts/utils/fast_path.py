@@ -0,0 +1,84 @@
+"""Channels-last and mixed precision fast path of the self-supervised models.
+
+Convolutions are faster with the channels-last memory format on GPUs with tensor cores and on CPUs with oneDNN, and
+autocast runs them in ``bfloat16`` or ``float16``. The contrastive and clustering losses, on the other hand, take
+exponentials and logarithms of similarities divided by small temperatures, which overflow or lose too many digits in
+half precision. They compute in ``float32`` inside :func:`float32_region`, whatever the precision of the encoders.
+
+"""
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import torch
+from lightning_utilities.core.apply_func import apply_to_collection
+from torch import Tensor
+
+_AUTOCAST_DEVICE_TYPES = ("cpu", "cuda")
+
+
+@contextmanager
+def float32_region(tensor: Tensor) -> Iterator[None]:
+    """Disables autocast on the device of ``tensor``, so that the operations in the block run in the dtype of their
+    inputs.
+
+    Cast the inputs of the block to ``float32``, e.g. ``out = out.float()``, which is a no-op when they already are.
+    Gradients flow back through the casts in the dtype of the original tensors.
+
+    Example::
+
+        with float32_region(logits):
+            loss = F.cross_entropy(logits.float() / temperature, targets)
+
+    """
+    if tensor.device.type in _AUTOCAST_DEVICE_TYPES:
+        with torch.autocast(tensor.device.type, enabled=False):
+            yield
+    else:
+        yield
+
+
+def _channels_last(tensor: Tensor) -> Tensor:
+    if tensor.dim() == 4 and tensor.is_floating_point():
+        return tensor.contiguous(memory_format=torch.channels_last)
+    return tensor
+
+
+def to_channels_last(data: Any) -> Any:
+    """Converts the 4D floating point tensors of a collection, e.g. a batch of views and labels, to the channels-last
+    memory format.
+
+    The other tensors and the values that aren't tensors are returned as they are.
+
+    """
+    return apply_to_collection(data, Tensor, _channels_last)
+
+
+class ChannelsLastMixin:
+    """Mixin for LightningModules that adds an optional channels-last fast path.
+
+    :meth:`use_channels_last` converts the 4D parameters and buffers of the module, i.e. the convolution weights, to
+    the channels-last memory format, and from then on the images of every batch are converted in
+    ``on_after_batch_transfer``, after the batch has been moved to the device. The outputs of the convolutions are
+    channels-last as well, so the encoder runs without layout conversions. Combine it with ``precision="bf16"`` or
+    ``precision=16`` in the trainer for the mixed precision part of the fast path.
+
+    Example::
+
+        class MyModel(ChannelsLastMixin, LightningModule):
+            def __init__(self, channels_last: bool = False):
+                super().__init__()
+                self.encoder = resnet50()
+                self.use_channels_last(channels_last)
+
+    """
+
+    channels_last: bool = False
+
+    def use_channels_last(self, enabled: bool = True) -> None:
+        self.channels_last = enabled
+        if enabled:
+            self.to(memory_format=torch.channels_last)  # type: ignore[attr-defined]
+
+    def on_after_batch_transfer(self, batch: Any, dataloader_idx: int) -> Any:
+        batch = super().on_after_batch_transfer(batch, dataloader_idx)  # type: ignore[misc]
+        return to_channels_last(batch) if self.channels_last else batch
@@ -1,3 +1,7 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import torch
+from torch import Tensor
 from torch.nn import Module
 
 from pl_bolts.models.self_supervised import resnets
@@ -14,3 +18,74 @@ def torchvision_ssl_encoder(
     pretrained_model = getattr(resnets, name)(pretrained=pretrained, return_all_feature_maps=return_all_feature_maps)
     pretrained_model.fc = Identity()
     return pretrained_model
+
+
+def _spans(lengths: Sequence[int], start: int, end: int) -> List[Tuple[int, int, int]]:
+    """Returns the ``(index, start, end)`` ranges of the sequences that rows ``start:end`` of their concatenation
+    cover."""
+    spans = []
+    offset = 0
+    for index, length in enumerate(lengths):
+        if offset < end and start < offset + length:
+            spans.append((index, max(start - offset, 0), min(end - offset, length)))
+        offset += length
+    return spans
+
+
+def multi_crop_forward(
+    encoder: Callable[[Tensor], Tensor], crops: Union[Tensor, Sequence[Tensor]], max_pixels: Optional[int] = None
+) -> Tensor:
+    """Encodes the crops of a multi-crop batch with one encoder call per resolution.
+
+    The crops that have the same height and width are encoded together, so two large and six small views take two
+    encoder calls instead of eight. If ``max_pixels`` is given, the crops of a resolution are encoded in micro-batches
+    whose number of input pixels doesn't exceed it, which bounds the activation memory regardless of the batch size and
+    the number of crops. The inputs of a micro-batch that lies within one crop tensor are not copied, and the
+    embeddings are concatenated once, in the order of ``crops``.
+
+    Batch normalization layers compute their statistics over the samples of one encoder call, i.e. over all the crops
+    of a resolution, or over a micro-batch, so when training the micro-batches should contain more than one sample.
+
+    Args:
+        encoder: maps a ``[N, C, H, W]`` batch to ``[N, ...]`` embeddings
+        crops: a ``[B, C, H, W]`` batch or a list of such batches with possibly different sizes
+        max_pixels: maximum number of input pixels (samples times height times width) per encoder call. A micro-batch
+            contains at least one sample.
+
+    Returns:
+        The embeddings of all the crops, in the same order as ``encoder(torch.cat(crops))`` would return them.
+
+    Example::
+
+        crops = [torch.rand(4, 3, 96, 96)] * 2 + [torch.rand(4, 3, 36, 36)] * 6
+        embeddings = multi_crop_forward(encoder, crops, max_pixels=4 * 96 * 96)
+
+    """
+    if isinstance(crops, Tensor):
+        crops = [crops]
+
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for index, crop in enumerate(crops):
+        groups.setdefault(tuple(crop.shape[-2:]), []).append(index)
+
+    pieces: List[Tuple[int, int, Tensor]] = []
+    calls = 0
+    for (height, width), indices in groups.items():
+        lengths = [len(crops[index]) for index in indices]
+        total = sum(lengths)
+        step = total if max_pixels is None else max(max_pixels // (height * width), 1)
+        for start in range(0, total, step):
+            spans = _spans(lengths, start, min(start + step, total))
+            inputs = [crops[indices[k]][lo:hi] for k, lo, hi in spans]
+            embeddings = encoder(inputs[0] if len(inputs) == 1 else torch.cat(inputs))
+            calls += 1
+            offset = 0
+            for k, lo, hi in spans:
+                pieces.append((indices[k], lo, embeddings[offset : offset + hi - lo]))
+                offset += hi - lo
+
+    if calls == 1:
+        # all the crops have the same size and the embeddings are already in order
+        return embeddings
+    pieces.sort(key=lambda piece: piece[:2])
+    return torch.cat([embeddings for _, _, embeddings in pieces])
@@ -0,0 +1,36 @@
+from pl_bolts.callbacks import DatasetEpochCallback
+from pl_bolts.datasets.sharded_dataset import ShardedTarDataset, write_tar_shards
+from pytorch_lightning import Trainer
+from torch.utils.data import DataLoader
+
+from tests.helpers.boring_model import BoringModel, RandomDataset
+
+
+def test_dataset_epoch_callback(tmpdir):
+    write_tar_shards(RandomDataset(32, 16), str(tmpdir / "shards"), samples_per_shard=4)
+    dataset = ShardedTarDataset(str(tmpdir / "shards"), shuffle_buffer=4)
+    epochs, first_batches = [], []
+
+    class TestModel(BoringModel):
+        def training_step(self, batch, batch_idx):
+            if batch_idx == 0:
+                epochs.append(dataset.epoch)
+                first_batches.append(batch.clone())
+            return super().training_step(batch, batch_idx)
+
+        def train_dataloader(self):
+            return DataLoader(dataset, batch_size=4)
+
+    trainer = Trainer(
+        default_root_dir=tmpdir,
+        max_epochs=3,
+        logger=False,
+        limit_val_batches=0,
+        enable_progress_bar=False,
+        enable_model_summary=False,
+        callbacks=[DatasetEpochCallback()],
+    )
+    trainer.fit(TestModel())
+
+    assert epochs == [0, 1, 2]
+    assert not first_batches[0].equal(first_batches[1])
@@ -1,7 +1,9 @@
+import pytest
 import torch
 from pl_bolts.datamodules.async_dataloader import AsynchronousLoader
+from pl_bolts.datamodules.detection_collate import DetectionCollate, unpack_detection_batch
 from pl_bolts.datasets.cifar10_dataset import CIFAR10
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, TensorDataset
 
 
 def test_async_dataloader(datadir):
@@ -17,3 +19,61 @@ def test_async_dataloader(datadir):
         dataloader = AsynchronousLoader(DataLoader(ds, batch_size=16), device=device)
         for b in dataloader:
             pass
+
+        # the pinned buffers are reused between batches and epochs
+        allocations = dataloader.pinned_allocations
+        for b in dataloader:
+            pass
+        assert dataloader.pinned_allocations == allocations
+
+
+@pytest.mark.parametrize("num_transfer_threads", [1, 3])
+def test_async_dataloader_cpu(num_transfer_threads):
+    x, y = torch.randn(100, 3), torch.arange(100)
+    loader = DataLoader(TensorDataset(x, y), batch_size=8)
+    dataloader = AsynchronousLoader(loader, device="cpu", q_size=2, num_transfer_threads=num_transfer_threads)
+
+    for _ in range(2):
+        batches = list(dataloader)
+        assert len(batches) == len(loader)
+        assert torch.equal(torch.cat([b[0] for b in batches]), x)
+        assert torch.equal(torch.cat([b[1] for b in batches]), y)
+
+    metrics = dataloader.metrics()
+    assert metrics["batches"] == len(loader)
+    assert metrics["transfer_ms"] >= 0
+
+    # abandoning an epoch early and limiting the number of batches
+    next(iter(dataloader))
+    dataloader = AsynchronousLoader(loader, device="cpu", num_batches=3)
+    assert len(list(dataloader)) == 3
+
+
+def test_async_dataloader_error():
+    def collate(batch):
+        raise ValueError("broken batch")
+
+    dataloader = AsynchronousLoader(DataLoader(list(range(10)), collate_fn=collate), device="cpu")
+    with pytest.raises(ValueError, match="broken batch"):
+        list(dataloader)
+
+
+def test_detection_collate():
+    samples = [
+        (torch.rand(3, 20, 30), {"boxes": torch.rand(2, 4), "labels": torch.tensor([1, 2])}),
+        (torch.rand(3, 25, 10), {"boxes": torch.zeros(0, 4), "labels": torch.zeros(0, dtype=torch.int64)}),
+        (torch.rand(3, 5, 5), {"boxes": torch.rand(3, 4), "labels": torch.tensor([0, 1, 0])}),
+    ]
+    images, targets = DetectionCollate(size_divisible=8)(samples)
+
+    assert images.shape == (3, 3, 32, 32)
+    assert targets.offsets.tolist() == [0, 2, 2, 5]
+    assert targets.image_index.tolist() == [0, 0, 2, 2, 2]
+    assert targets.num_images == 3
+
+    image_list, target_list = unpack_detection_batch(images, targets)
+    for (image, target), unpacked_image, unpacked_target in zip(samples, image_list, target_list):
+        assert torch.equal(unpacked_image, image)
+        assert torch.equal(unpacked_target["boxes"], target["boxes"])
+        assert torch.equal(unpacked_target["labels"], target["labels"])
+    assert images[1, :, :, 10:].abs().sum() == 0
@@ -1,3 +1,4 @@
+import os
 import uuid
 from pathlib import Path
 
@@ -16,6 +17,7 @@ from pl_bolts.datamodules import (
 from pl_bolts.datamodules.sr_datamodule import TVTDataModule
 from pl_bolts.datasets.cifar10_dataset import CIFAR10
 from pl_bolts.datasets.sr_mnist_dataset import SRMNIST
+from pl_bolts.transforms.sr_transforms import SRCollate
 from pl_bolts.utils import _IS_WINDOWS
 
 
@@ -25,12 +27,13 @@ def test_dev_datasets(datadir):
         pass
 
 
-def _create_synth_cityscapes_dataset(path_dir):
+def _create_synth_cityscapes_dataset(path_dir, quality_mode="fine"):
     """Create synthetic dataset with random images, just to simulate that the dataset have been already downloaded."""
     non_existing_citites = ["dummy_city_1", "dummy_city_2"]
-    fine_labels_dir = Path(path_dir) / "gtFine"
+    annotations = "gtFine" if quality_mode == "fine" else "gtCoarse"
+    fine_labels_dir = Path(path_dir) / annotations
     images_dir = Path(path_dir) / "leftImg8bit"
-    dataset_splits = ["train", "val", "test"]
+    dataset_splits = ["train", "val", "test"] if quality_mode == "fine" else ["train", "val"]
 
     for split in dataset_splits:
         for city in non_existing_citites:
@@ -38,8 +41,8 @@ def _create_synth_cityscapes_dataset(path_dir):
             (fine_labels_dir / split / city).mkdir(parents=True, exist_ok=True)
             base_name = str(uuid.uuid4())
             image_name = f"{base_name}_leftImg8bit.png"
-            instance_target_name = f"{base_name}_gtFine_instanceIds.png"
-            semantic_target_name = f"{base_name}_gtFine_labelIds.png"
+            instance_target_name = f"{base_name}_{annotations}_instanceIds.png"
+            semantic_target_name = f"{base_name}_{annotations}_labelIds.png"
             Image.new("RGB", (2048, 1024)).save(images_dir / split / city / image_name)
             Image.new("L", (2048, 1024)).save(fine_labels_dir / split / city / instance_target_name)
             Image.new("L", (2048, 1024)).save(fine_labels_dir / split / city / semantic_target_name)
@@ -68,6 +71,40 @@ def test_cityscapes_datamodule(datadir):
     assert mask.size() == torch.Size([batch_size, 1024, 2048])
 
 
+def test_cityscapes_datamodule_cache(datadir, tmp_path):
+    _create_synth_cityscapes_dataset(datadir)
+
+    dm = CityscapesDataModule(datadir, batch_size=1, target_type="semantic", cache_dir=str(tmp_path), img_size=(64, 32))
+    dm.prepare_data()
+    for loader in (dm.train_dataloader(), dm.val_dataloader(), dm.test_dataloader()):
+        img, mask = next(iter(loader))
+        assert img.size() == torch.Size([1, 3, 32, 64])
+        assert mask.size() == torch.Size([1, 32, 64])
+
+    # the cache written with other settings is rebuilt
+    dm = CityscapesDataModule(datadir, batch_size=1, target_type="semantic", cache_dir=str(tmp_path), img_size=(32, 16))
+    dm.prepare_data()
+    img, mask = next(iter(dm.train_dataloader()))
+    assert img.size() == torch.Size([1, 3, 16, 32])
+    assert mask.size() == torch.Size([1, 16, 32])
+
+    with pytest.raises(ValueError, match="requires a `cache_dir`"):
+        CityscapesDataModule(datadir, img_size=(64, 32))
+
+
+def test_cityscapes_datamodule_cache_coarse(tmp_path):
+    data_dir, cache_dir = str(tmp_path / "cityscapes"), str(tmp_path / "cache")
+    _create_synth_cityscapes_dataset(data_dir, quality_mode="coarse")
+
+    dm = CityscapesDataModule(data_dir, quality_mode="coarse", batch_size=1, cache_dir=cache_dir, img_size=(64, 32))
+    dm.prepare_data()
+    assert sorted(os.listdir(cache_dir)) == ["train", "val"]
+    for loader in (dm.train_dataloader(), dm.val_dataloader()):
+        img, mask = next(iter(loader))
+        assert img.size() == torch.Size([1, 3, 32, 64])
+        assert mask.size() == torch.Size([1, 32, 64])
+
+
 @pytest.mark.parametrize(("val_split", "train_len"), [(0.2, 48_000), (5_000, 55_000)])
 def test_vision_data_module(datadir, val_split, catch_warnings, train_len):
     dm = _create_dm(MNISTDataModule, datadir, val_split=val_split)
@@ -107,6 +144,15 @@ def test_sr_datamodule(datadir):
     next(iter(dm.test_dataloader()))
 
 
+def test_sr_datamodule_batched_lr(datadir):
+    dataset = SRMNIST(scale_factor=4, root=datadir, download=True, hr_only=True)
+    dm = TVTDataModule(dataset, dataset, dataset, batch_size=2, num_workers=0, collate_fn=SRCollate(scale_factor=4))
+
+    hr_image, lr_image = next(iter(dm.train_dataloader()))
+    assert hr_image.shape == torch.Size([2, 1, 28, 28])
+    assert lr_image.shape == torch.Size([2, 1, 7, 7])
+
+
 @pytest.mark.parametrize("split", ["byclass", "bymerge", "balanced", "letters", "digits", "mnist"])
 @pytest.mark.parametrize(
     "dm_cls",
@@ -1,23 +1,35 @@
 import os
+import shutil
 
 import numpy as np
 import pytest
 import torch
+from pl_bolts.datamodules import ImagenetDataModule
 from pl_bolts.datasets import (
     BinaryEMNIST,
     BinaryMNIST,
     DummyDataset,
     KittiDataset,
+    PackedImageDataset,
     RandomDataset,
     RandomDictDataset,
     RandomDictStringDataset,
+    ShardedTarDataset,
+    UnlabeledImagenet,
+    write_packed_images,
+    write_tar_shards,
 )
 from pl_bolts.datasets.dummy_dataset import DummyDetectionDataset
+from pl_bolts.datasets.packed_dataset import BlockShuffleSampler
+from pl_bolts.datasets.segmentation_cache import CachedSegmentationDataset, write_segmentation_cache
+from pl_bolts.datasets.shared_image_cache import SharedImageCache
 from pl_bolts.datasets.sr_mnist_dataset import SRMNIST
+from pl_bolts.transforms.sr_transforms import SRCollate
 from pl_bolts.utils import _PIL_AVAILABLE
 from pl_bolts.utils.warnings import warn_missing_pkg
 from torch.utils.data import DataLoader, Dataset
 from torchvision import transforms as transform_lib
+from torchvision.datasets import ImageFolder
 
 if _PIL_AVAILABLE:
     from PIL import Image
@@ -145,6 +157,22 @@ def test_sr_datasets(datadir, scale_factor):
     assert torch.allclose(lr_image.max(), torch.tensor(1.0), atol=atol)
 
 
+@pytest.mark.parametrize("scale_factor", [2, 4])
+def test_sr_datasets_hr_only(datadir, scale_factor):
+    dataset = SRMNIST(scale_factor, root=datadir, download=True)
+    hr_only = SRMNIST(scale_factor, root=datadir, download=True, hr_only=True)
+    hr_only.hr_transforms = dataset.hr_transforms = transform_lib.Compose(dataset.hr_transforms.transforms[1:])
+
+    hr_image, lr_image = next(iter(DataLoader(dataset, batch_size=8)))
+    loader = DataLoader(hr_only, batch_size=8, collate_fn=SRCollate(scale_factor))
+    batched_hr_image, batched_lr_image = next(iter(loader))
+
+    assert torch.equal(batched_hr_image, hr_image)
+    assert batched_lr_image.shape == lr_image.shape
+    # PIL truncates the low resolution images to 8 bits
+    assert torch.allclose(batched_lr_image, lr_image, atol=4 / 255)
+
+
 def test_binary_mnist_dataset(datadir):
     """Check BinaryMNIST image and target dimensions and value range."""
     dl = DataLoader(BinaryMNIST(root=datadir, download=True, transform=transform_lib.ToTensor()))
@@ -203,3 +231,248 @@ def test_kitti_dataset(datadir, catch_warnings):
     assert torch.allclose(img.min(), torch.tensor(0.0), atol=0.01)
     assert torch.allclose(img.max(), torch.tensor(1.0), atol=0.01)
     assert torch.equal(torch.unique(target), torch.tensor(target_idx).to(dtype=torch.uint8))
+
+    cache_dir = os.path.join(datadir, "kitti_cache")
+    write_segmentation_cache(KittiDataset(data_dir=kitti_dir), cache_dir)
+    cached = DataLoader(CachedSegmentationDataset(cache_dir, transform=transform_lib.ToTensor()))
+    cached_img, cached_target = next(iter(cached))
+    assert torch.equal(cached_img, img)
+    assert torch.equal(cached_target, target)
+
+
+def test_kitti_encode_segmap(tmpdir):
+    training_dirs = [os.path.join(tmpdir, "training", name) for name in ("image_2", "semantic")]
+    for path in training_dirs:
+        os.makedirs(path)
+    dataset = KittiDataset(data_dir=str(tmpdir))
+
+    mask = np.random.randint(0, 256, size=(37, 124), dtype=np.uint8)
+    expected = mask.copy()
+    for voidc in dataset.void_labels:
+        expected[expected == voidc] = dataset.ignore_index
+    for validc in dataset.valid_labels:
+        expected[expected == validc] = dataset.class_map[validc]
+    expected[expected > 33] = dataset.ignore_index
+
+    encoded = dataset.encode_segmap(mask)
+    assert encoded.dtype == np.uint8
+    assert np.array_equal(encoded, expected)
+    assert np.array_equal(dataset.encode_segmap(mask.astype(np.int32)), expected)
+
+
+@pytest.fixture()
+def fake_imagenet(tmp_path):
+    wnids = [f"n{i:08d}" for i in range(3)]
+    for split, num_images in [("train", 7), ("val", 2)]:
+        for wnid in wnids:
+            os.makedirs(tmp_path / split / wnid)
+            for i in range(num_images):
+                img = np.random.randint(0, 255, size=(12 + i, 10, 3), dtype=np.uint8)
+                Image.fromarray(img).save(tmp_path / split / wnid / f"{wnid}_{i}.JPEG")
+        torch.save(({wnid: (f"class {wnid}",) for wnid in wnids}, []), tmp_path / split / "meta.bin")
+    return tmp_path
+
+
+def _legacy_split(imgs, original_split, num_classes, num_imgs_per_class, num_val):
+    """The list based split selection that `UnlabeledImagenet` used before it was vectorized."""
+    imgs = list(imgs)
+    np.random.seed(1234)
+    np.random.shuffle(imgs)
+    if original_split in ["train", "val"]:
+        cts, train, val = {}, [], []
+        for img in imgs:
+            cts[img[1]] = cts.get(img[1], 0) + 1
+            (val if cts[img[1]] <= num_val else train).append(img)
+        imgs = train if original_split == "train" else val
+        if num_imgs_per_class != -1:
+            cts, clean = {}, []
+            for img in imgs:
+                cts[img[1]] = cts.get(img[1], 0) + 1
+                if cts[img[1]] <= num_imgs_per_class:
+                    clean.append(img)
+            imgs = clean
+    if num_classes != -1:
+        imgs = [img for img in imgs if img[1] < num_classes]
+    np.random.seed(1234)
+    np.random.shuffle(imgs)
+    return imgs
+
+
+@pytest.mark.parametrize("split", ["train", "val", "test"])
+@pytest.mark.parametrize(("num_classes", "num_imgs_per_class"), [(-1, -1), (2, 3)])
+def test_unlabeled_imagenet_split(fake_imagenet, tmp_path, split, num_classes, num_imgs_per_class):
+    kwargs = {"num_classes": num_classes, "num_imgs_per_class": num_imgs_per_class, "num_imgs_per_class_val_split": 2}
+    dataset = UnlabeledImagenet(str(fake_imagenet), split=split, **kwargs)
+
+    folder = ImageFolder(os.path.join(fake_imagenet, "val" if split == "test" else "train"))
+    expected = _legacy_split(folder.imgs, split, num_classes, num_imgs_per_class, 2)
+    assert dataset.imgs == expected
+
+    # the second instance restores the split from the cache instead of scanning the folders
+    cache_dir = str(tmp_path / "cache")
+    UnlabeledImagenet(str(fake_imagenet), split=split, cache_dir=cache_dir, **kwargs)
+    cached = UnlabeledImagenet(str(fake_imagenet), split=split, cache_dir=cache_dir, **kwargs)
+    assert cached.imgs == expected
+    assert cached.wnids == dataset.wnids
+    assert cached[0][1] == dataset[0][1]
+
+
+def test_unlabeled_imagenet_split_cache_per_folder(fake_imagenet, tmp_path):
+    other = tmp_path / "other"
+    shutil.copytree(fake_imagenet / "train", other / "train")
+    shutil.rmtree(other / "train" / "n00000002")
+    cache_dir = str(tmp_path / "cache")
+
+    # two datasets that share a cache folder don't reuse each other's split
+    kwargs = {"meta_dir": str(fake_imagenet / "train"), "cache_dir": cache_dir, "num_imgs_per_class_val_split": 0}
+    dataset = UnlabeledImagenet(str(fake_imagenet), **kwargs)
+    cached = UnlabeledImagenet(str(other), **kwargs)
+    assert len(dataset.imgs) == 21
+    assert len(cached.imgs) == 14
+
+    # a split is recomputed when the images of its folder have changed
+    Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(other / "train" / "n00000001" / "new.JPEG")
+    os.utime(other / "train" / "n00000001", ns=(0, 0))
+    cached = UnlabeledImagenet(str(other), **kwargs)
+    assert len(cached.imgs) == 15
+
+
+def test_packed_image_dataset(fake_imagenet, tmp_path):
+    source = ImageFolder(os.path.join(fake_imagenet, "train"))
+    write_packed_images(source, str(tmp_path / "packed"), max_shard_bytes=1000)
+    packed = PackedImageDataset(str(tmp_path / "packed"))
+
+    assert len(packed) == len(source)
+    assert len(list((tmp_path / "packed").glob("shard-*.bin"))) > 1
+    for (image, label), (expected_image, expected_label) in zip(packed, source):
+        assert label == expected_label
+        assert np.array_equal(np.asarray(image), np.asarray(expected_image))
+
+    resized = str(tmp_path / "resized")
+    write_packed_images(source, resized, image_size=8)
+    image, _ = PackedImageDataset(resized, as_tensor=True)[0]
+    assert image.dtype == torch.uint8
+    assert min(image.shape[1:]) == 8
+
+    sampler = BlockShuffleSampler(packed, block_size=4)
+    assert sorted(sampler) == list(range(len(packed)))
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_sharded_tar_dataset(fake_imagenet, tmp_path, num_workers):
+    source = ImageFolder(os.path.join(fake_imagenet, "train"))
+    shards = write_tar_shards(source, str(tmp_path), samples_per_shard=3)
+    assert len(shards) == (len(source) + 2) // 3
+
+    dataset = ShardedTarDataset(str(tmp_path), shuffle=False, transform=transform_lib.PILToTensor())
+    assert len(dataset) == len(source)
+    samples = list(DataLoader(dataset, batch_size=None, num_workers=num_workers))
+    expected = {label_image[0].tobytes(): label_image[1] for label_image in ((np.asarray(i), t) for i, t in source)}
+    assert len(samples) == len(source)
+    for image, label in samples:
+        assert expected[image.permute(1, 2, 0).numpy().tobytes()] == label
+
+    # every rank reads a disjoint part of the samples, the remainder of the division is dropped
+    images = []
+    for rank in range(2):
+        rank_dataset = ShardedTarDataset(str(tmp_path), seed=1, rank=rank, world_size=2)
+        rank_images = [np.asarray(image).tobytes() for image, _ in rank_dataset]
+        assert len(rank_images) == len(rank_dataset) == len(source) // 2
+        images += rank_images
+    assert len(set(images)) == len(images)
+    assert set(images) <= set(expected)
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_sharded_tar_dataset_equal_ranks(tmp_path, num_workers):
+    write_tar_shards(RandomDataset(1, 100), str(tmp_path), samples_per_shard=10)
+    samples = []
+    for rank in range(4):
+        dataset = ShardedTarDataset(str(tmp_path), seed=2, rank=rank, world_size=4)
+        dataset.set_epoch(1)
+        rank_samples = list(DataLoader(dataset, batch_size=None, num_workers=num_workers))
+        assert len(rank_samples) == len(dataset) == 25
+        samples += [sample.item() for sample in rank_samples]
+    assert len(set(samples)) == 100
+
+
+def test_sharded_tar_dataset_resume(tmp_path):
+    write_tar_shards(RandomDataset(32, 20), str(tmp_path), samples_per_shard=4)
+    dataset = ShardedTarDataset(str(tmp_path), shuffle_buffer=5, seed=3)
+    dataset.set_epoch(2)
+    loader = DataLoader(dataset, batch_size=4, num_workers=2)
+    batches = list(loader)
+    assert sum(len(batch) for batch in batches) == 20
+
+    resumed = ShardedTarDataset(str(tmp_path), shuffle_buffer=5, seed=3)
+    resumed.load_state_dict(dataset.state_dict(num_batches=3, batch_size=4))
+    resumed_loader = DataLoader(resumed, batch_size=4, num_workers=2)
+    resumed_batches = list(resumed_loader)
+    assert len(resumed_batches) == len(batches) - 3
+    for batch, expected in zip(resumed_batches, batches[3:]):
+        assert torch.equal(batch, expected)
+
+    # the next epoch reads every shard again, with the workers in their original order
+    dataset.set_epoch(3)
+    resumed.set_epoch(3)
+    next_batches = list(resumed_loader)
+    assert sum(len(batch) for batch in next_batches) == 20
+    for batch, expected in zip(next_batches, loader):
+        assert torch.equal(batch, expected)
+
+
+def test_imagenet_datamodule_sharded(fake_imagenet, tmp_path):
+    dm = ImagenetDataModule(
+        str(fake_imagenet), num_imgs_per_val_class=2, cache_dir=str(tmp_path / "cache"), sharded=True, batch_size=4
+    )
+    dm.train_transforms = transform_lib.Compose([transform_lib.Resize((8, 8)), transform_lib.ToTensor()])
+    dm.prepare_data()
+    assert os.path.isfile(tmp_path / "cache" / "shards" / "train" / "shards.json")
+
+    loader = dm.train_dataloader()
+    assert isinstance(loader.dataset, ShardedTarDataset)
+    assert sum(len(labels) for _, labels in loader) == 3 * 5
+
+
+class _CachedImages(Dataset):
+    """Returns whether every image was decoded or read from the cache."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __len__(self):
+        return self.cache.num_images
+
+    def __getitem__(self, index):
+        pixels = self.cache.get(index)
+        cached = pixels is not None
+        if not cached:
+            pixels = np.full((4 + index, 5, 3), index, dtype=np.uint8)
+            self.cache.put(index, pixels)
+        return cached, torch.from_numpy(pixels.copy())
+
+
+@pytest.mark.parametrize("multiprocessing_context", [None, "spawn"])
+def test_shared_image_cache(multiprocessing_context):
+    cache = SharedImageCache(8, capacity=1000, multiprocessing_context=multiprocessing_context)
+    loader = DataLoader(
+        _CachedImages(cache), batch_size=None, num_workers=2, multiprocessing_context=multiprocessing_context
+    )
+
+    first_epoch = list(loader)
+    assert not any(cached for cached, _ in first_epoch)
+    assert len(cache) == 8
+    second_epoch = list(loader)
+    assert all(cached for cached, _ in second_epoch)
+    for index, (_, pixels) in enumerate(second_epoch):
+        assert pixels.shape == (4 + index, 5, 3)
+        assert (pixels == index).all()
+
+    assert not cache.get(3).flags.writeable
+    assert not cache.put(3, np.zeros((1, 1, 3)))
+
+    small_cache = SharedImageCache(2, capacity=10)
+    assert not small_cache.put(0, np.zeros((2, 2, 3)))
+    assert small_cache.put(1, np.zeros((3, 3)))
+    assert small_cache.get(0) is None
+    assert small_cache.get(1).shape == (3, 3, 1)
@@ -0,0 +1,116 @@
+import pytest
+import torch
+from pl_bolts.losses.self_supervised_learning import (
+    AmdimNCELoss,
+    CPCTask,
+    FeatureMapContrastiveTask,
+    nt_xent_loss,
+    tanh_clip,
+)
+
+
+def _loop_cpc_loss(task, z):
+    """The double loop over the rows to skip and the offsets that ``CPCTask.forward`` replaced."""
+    b, _, h, w = z.shape
+    targets = task.target_cnn(z).permute(0, 2, 3, 1).reshape([-1, task.target_dim])
+    preds = task.pred_cnn(task.context_cnn(z))
+    losses = []
+    for steps_to_ignore in range(h - 1):
+        for i in range(steps_to_ignore + 1, h):
+            preds_i = preds[:, :, : -(i + 1), :] * task.embed_scale
+            preds_i = preds_i.permute(0, 2, 3, 1).reshape([-1, task.target_dim])
+            n = b * (h - i - 1) * w
+            labels = torch.arange(n) // ((h - i - 1) * w) * h * w + (i + 1) * w + torch.arange(n) % ((h - i - 1) * w)
+            loss = torch.nn.functional.cross_entropy(preds_i @ targets.t(), labels)
+            if not torch.isnan(loss):
+                losses.append(loss)
+    return torch.stack(losses).sum()
+
+
+@pytest.mark.parametrize("shape", [(4, 16, 7, 7), (3, 16, 5, 4)])
+def test_cpc_task(catch_warnings, shape):
+    torch.manual_seed(0)
+    task = CPCTask(num_input_channels=16)
+    z = torch.randn(shape, requires_grad=True)
+
+    expected = _loop_cpc_loss(task, z)
+    expected_grad = torch.autograd.grad(expected, z)[0]
+    loss = task(z)
+    grad = torch.autograd.grad(loss, z)[0]
+
+    torch.testing.assert_close(loss, expected)
+    torch.testing.assert_close(grad, expected_grad)
+
+
+def test_cpc_task_compute_loss_h(catch_warnings):
+    torch.manual_seed(0)
+    task = CPCTask(num_input_channels=16)
+    targets, preds = torch.randn(2, 4, 64, 6, 5).unbind()
+
+    # the predictions of the first three rows score the targets three rows below them
+    preds_i = (preds[:, :, :-3] * task.embed_scale).permute(0, 2, 3, 1).reshape(-1, 64)
+    logits = preds_i @ targets.permute(0, 2, 3, 1).reshape(-1, 64).t()
+    labels = torch.arange(4)[:, None, None] * 30 + torch.arange(3, 6)[None, :, None] * 5 + torch.arange(5)
+    expected = torch.nn.functional.cross_entropy(logits, labels.flatten())
+    torch.testing.assert_close(task.compute_loss_h(targets, preds, 2), expected)
+
+
+@pytest.mark.parametrize("batch_size", [1, 6])
+def test_amdim_nce_loss_diagonal(catch_warnings, batch_size):
+    torch.manual_seed(0)
+    src = torch.randn(batch_size, 32, requires_grad=True)
+    tgt = torch.randn(32, batch_size * 9, requires_grad=True)
+    nce_loss = AmdimNCELoss(tclip=10.0)
+
+    expected = nce_loss(src, tgt, torch.eye(batch_size))
+    expected_grads = torch.autograd.grad(expected[0] + expected[1], (src, tgt))
+    actual = nce_loss(src, tgt)
+    grads = torch.autograd.grad(actual[0] + actual[1], (src, tgt))
+
+    torch.testing.assert_close(actual, expected)
+    torch.testing.assert_close(grads, expected_grads)
+
+
+def test_amdim_sample_src_ftr(catch_warnings):
+    task = FeatureMapContrastiveTask("00")
+    feature_map = torch.randn(5, 8, 4, 4)
+    masks = task.feat_size_w_mask(4, feature_map)
+    assert masks.shape == (16, 1, 4, 4)
+    assert masks.flatten(1).nonzero()[:, 1].tolist() == list(range(16))
+
+    torch.manual_seed(0)
+    sampled = task._sample_src_ftr(feature_map, masks)
+    torch.manual_seed(0)
+    mask_idx = torch.randint(0, 16, (5,))
+    expected = torch.masked_select(feature_map, masks[mask_idx]).reshape(5, 8)
+    assert torch.equal(sampled, expected)
+
+
+def test_losses_in_float32_under_autocast(catch_warnings):
+    """Under bf16 autocast, the losses compute in float32 from their bf16 inputs."""
+    torch.manual_seed(0)
+    out_1, out_2 = torch.nn.functional.normalize(torch.randn(2, 8, 16), dim=-1).bfloat16().unbind()
+    src = torch.randn(6, 32).bfloat16()
+    tgt = torch.randn(32, 6 * 9).bfloat16()
+    targets, preds = torch.randn(2, 4, 64, 5, 5).bfloat16().unbind()
+    task = CPCTask(num_input_channels=16)
+    nce_loss = AmdimNCELoss(tclip=10.0)
+
+    def losses(*tensors):
+        out_1, out_2, src, tgt, targets, preds = tensors
+        return [nt_xent_loss(out_1, out_2, 0.1), *nce_loss(src, tgt), task._info_nce_loss(targets, preds)]
+
+    inputs = (out_1, out_2, src, tgt, targets, preds)
+    expected = losses(*(tensor.float() for tensor in inputs))
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        actual = losses(*inputs)
+
+    assert all(loss.dtype == torch.float32 for loss in actual)
+    torch.testing.assert_close(actual, expected)
+
+
+def test_tanh_clip_half_precision(catch_warnings):
+    x = torch.linspace(-100, 100, 101).bfloat16()
+    clipped = tanh_clip(x, clip_val=10.0)
+    assert clipped.dtype == torch.bfloat16
+    torch.testing.assert_close(clipped, tanh_clip(x.float(), clip_val=10.0).bfloat16())
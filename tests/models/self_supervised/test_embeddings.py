@@ -0,0 +1,174 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+from pl_bolts.models.self_supervised import EmbeddingShards, MoCo, SimCLR, SSLFineTuner, export_embeddings
+from pl_bolts.models.self_supervised.embeddings import CachedFeatures, quantize_int8
+from pytorch_lightning import Trainer
+from torch import nn
+from torch.utils.data import Dataset, TensorDataset
+
+
+def _encoder():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Conv2d(3, 4, 3), nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(4, 6))
+
+
+class _FailingDataset(Dataset):
+    """Raises when sample ``fail_at`` is read, like an export that is interrupted."""
+
+    def __init__(self, dataset, fail_at):
+        self.dataset = dataset
+        self.fail_at = fail_at
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        if index == self.fail_at:
+            raise KeyboardInterrupt
+        return self.dataset[index]
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_export_embeddings(tmpdir, dtype):
+    encoder = _encoder()
+    images = torch.rand(20, 3, 8, 8)
+    dataset = TensorDataset(images, torch.zeros(20, dtype=torch.long))
+
+    stats = export_embeddings(encoder, dataset, tmpdir, dtype=dtype, samples_per_shard=7, batch_size=4)
+
+    assert stats["num_samples"] == stats["exported"] == 20
+    assert stats["images_per_second"] > 0
+    assert sorted(name for name in os.listdir(tmpdir) if name.startswith("embeddings-")) == [
+        "embeddings-000000.npy",
+        "embeddings-000001.npy",
+        "embeddings-000002.npy",
+    ]
+    assert np.load(os.path.join(tmpdir, "embeddings-000002.npy"), mmap_mode="r").shape == (6, 6)
+
+    with torch.no_grad():
+        expected = encoder(images)
+    embeddings = EmbeddingShards(tmpdir)
+    assert len(embeddings) == 20
+    tolerance = 1e-2 if dtype == "float16" else expected.abs().max().item() / 127
+    torch.testing.assert_close(embeddings.read(0, 20), expected, rtol=0, atol=tolerance)
+    torch.testing.assert_close(embeddings.read(5, 16), embeddings.read(0, 20)[5:16])
+    torch.testing.assert_close(embeddings[-1], embeddings.read(19, 20)[0])
+    with pytest.raises(IndexError):
+        embeddings[20]
+
+
+def test_export_embeddings_resumes(tmpdir):
+    encoder = _encoder()
+    dataset = TensorDataset(torch.rand(20, 3, 8, 8))
+    export_embeddings(encoder, dataset, os.path.join(tmpdir, "full"), samples_per_shard=7, batch_size=4)
+
+    with pytest.raises(KeyboardInterrupt):
+        export_embeddings(
+            encoder, _FailingDataset(dataset, 10), tmpdir, samples_per_shard=7, batch_size=4, commit_every=1
+        )
+    # the batches before the one of sample 10 have been committed
+    assert len(EmbeddingShards(tmpdir)) == 8
+
+    stats = export_embeddings(encoder, dataset, tmpdir, samples_per_shard=7, batch_size=4)
+    assert stats["exported"] == 12
+    torch.testing.assert_close(
+        EmbeddingShards(tmpdir).read(0, 20), EmbeddingShards(os.path.join(tmpdir, "full")).read(0, 20)
+    )
+
+    with pytest.raises(ValueError, match="different settings"):
+        export_embeddings(encoder, dataset, tmpdir, dtype="int8", samples_per_shard=7)
+
+    # the export of other weights, e.g. of another checkpoint, isn't reused
+    with torch.no_grad():
+        encoder[-1].bias.add_(1.0)
+    with pytest.raises(ValueError, match="different model"):
+        export_embeddings(encoder, dataset, tmpdir, samples_per_shard=7)
+
+
+def test_export_embeddings_resume_checks_dim(tmpdir):
+    encoder = _encoder()
+    dataset = TensorDataset(torch.rand(20, 3, 8, 8))
+    with pytest.raises(KeyboardInterrupt):
+        export_embeddings(encoder, _FailingDataset(dataset, 10), tmpdir, batch_size=4, commit_every=1)
+
+    with pytest.raises(ValueError, match="size 3"):
+        export_embeddings(encoder, dataset, tmpdir, batch_size=4, encoder=lambda images: encoder(images)[:, :3])
+
+
+def test_quantize_int8():
+    embeddings = torch.tensor([[1.0, -0.5, 0.25], [0.0, 0.0, 0.0]])
+    quantized, scales = quantize_int8(embeddings)
+    assert quantized.dtype == torch.int8
+    assert quantized[0].tolist() == [127, -64, 32]
+    assert quantized[1].tolist() == [0, 0, 0]
+    torch.testing.assert_close(quantized * scales[:, None], embeddings, rtol=0, atol=0.5 / 127)
+
+
+def test_export_ssl_embeddings(tmpdir, catch_warnings):
+    dataset = TensorDataset(torch.rand(6, 3, 32, 32))
+    model = SimCLR(gpus=0, num_samples=6, batch_size=4, dataset="cifar10", arch="resnet18", channels_last=True)
+    export_embeddings(model, dataset, os.path.join(tmpdir, "simclr"), batch_size=4)
+    assert model.training
+    assert EmbeddingShards(os.path.join(tmpdir, "simclr")).read(0, 6).shape == (6, 512)
+
+    model = MoCo(num_negatives=8)
+    export_embeddings(model, dataset, os.path.join(tmpdir, "moco"), dtype="int8", batch_size=4)
+    assert EmbeddingShards(os.path.join(tmpdir, "moco")).read(0, 6).shape == (6, 128)
+
+
+def test_cached_features(tmpdir):
+    images = torch.rand(10, 3, 8, 8)
+    labels = torch.arange(10)
+    dataset = TensorDataset(images, labels)
+    # two exports with different encoders stand for two draws of random augmentations
+    encoders = [_encoder(), nn.Sequential(nn.Flatten(), nn.Linear(3 * 8 * 8, 6))]
+    for draw, encoder in enumerate(encoders):
+        export_embeddings(encoder, dataset, os.path.join(tmpdir, str(draw)), samples_per_shard=4, save_labels=True)
+    with torch.no_grad():
+        draws = [encoder(images) for encoder in encoders]
+
+    shards = EmbeddingShards(os.path.join(tmpdir, "0"))
+    assert shards.gather_labels([7, 1, 4]).tolist() == [7, 1, 4]
+    assert shards.gather_labels([]).shape == (0,)
+    assert shards.gather([]).shape == (0, 6)
+
+    cached = CachedFeatures([os.path.join(tmpdir, "0"), os.path.join(tmpdir, "1")])
+    assert len(cached) == 10
+    torch.manual_seed(0)
+    samples = cached.__getitems__([9, 2, 5, 2, 7, 0, 3, 8] * 4)
+    chosen = set()
+    for index, (features, label) in zip([9, 2, 5, 2, 7, 0, 3, 8] * 4, samples):
+        assert label == index
+        errors = [(features - draw[index]).abs().max() for draw in draws]
+        assert min(errors) < 1e-2
+        chosen.add(int(errors[1] < errors[0]))
+    assert chosen == {0, 1}
+
+    export_embeddings(encoders[0], dataset, os.path.join(tmpdir, "unlabeled"))
+    with pytest.raises(ValueError, match="labels"):
+        CachedFeatures([os.path.join(tmpdir, "unlabeled")])
+
+
+def test_ssl_finetuner_cached_features(tmpdir, catch_warnings):
+    torch.manual_seed(0)
+    dataset = TensorDataset(torch.rand(16, 3, 8, 8), torch.randint(3, (16,)))
+    finetuner = SSLFineTuner(_encoder(), in_features=6, num_classes=3, epochs=1)
+    batch = next(iter(torch.utils.data.DataLoader(dataset, batch_size=16)))
+    expected_loss, expected_logits, _ = finetuner.shared_step(batch)
+
+    dm = finetuner.cache_features(tmpdir, dataset, dataset, dataset, num_draws=2, batch_size=16)
+    assert sorted(os.listdir(tmpdir)) == ["test-0", "train-0", "train-1", "val-0"]
+    loss, logits, y = finetuner.shared_step(next(iter(dm.test_dataloader())))
+    torch.testing.assert_close(y, batch[1])
+    torch.testing.assert_close(logits, expected_logits, rtol=0, atol=1e-2)
+
+    trainer = Trainer(fast_dev_run=True, default_root_dir=tmpdir, log_every_n_steps=1)
+    trainer.fit(finetuner, datamodule=dm)
+
+    # the features of another backbone are not reused
+    other = SSLFineTuner(nn.Sequential(nn.Flatten(), nn.Linear(3 * 8 * 8, 6)), in_features=6, num_classes=3)
+    with pytest.raises(ValueError, match="different model"):
+        other.cache_features(tmpdir, dataset, dataset, dataset, num_draws=2, batch_size=16)
@@ -7,6 +7,7 @@ from pl_bolts.models.self_supervised import AMDIM, BYOL, CPC_v2, MoCo, SimCLR, S
 from pl_bolts.models.self_supervised.cpc import CPCEvalTransformsCIFAR10, CPCTrainTransformsCIFAR10
 from pl_bolts.models.self_supervised.moco.callbacks import MoCoLRScheduler
 from pl_bolts.transforms.dataset_normalizations import cifar10_normalization
+from pl_bolts.transforms.self_supervised import Patchify
 from pl_bolts.transforms.self_supervised.moco_transforms import MoCo2EvalCIFAR10Transforms, MoCo2TrainCIFAR10Transforms
 from pl_bolts.transforms.self_supervised.simclr_transforms import SimCLREvalDataTransform, SimCLRTrainDataTransform
 from pl_bolts.transforms.self_supervised.swav_transforms import SwAVEvalDataTransform, SwAVTrainDataTransform
@@ -166,3 +167,82 @@ def test_simsiam(tmpdir, datadir, catch_warnings):
         log_every_n_steps=1,
     )
     trainer.fit(model, datamodule=dm)
+
+
+def test_cpcv2_patches_whole_images(catch_warnings):
+    model = CPC_v2(encoder_name="resnet18", patch_size=8, patch_overlap=4, online_ft=False).eval()
+    images = torch.rand(2, 3, 32, 32)
+    patches = torch.stack([Patchify(patch_size=8, overlap_size=4)(image) for image in images])
+
+    with torch.no_grad():
+        torch.testing.assert_close(model(images), model(patches))
+
+
+@pytest.mark.parametrize("micro_batch_pixels", [None, 2 * 32 * 32])
+@pytest.mark.parametrize("group_views", [False, True])
+def test_multi_crop_shared_steps(catch_warnings, micro_batch_pixels, group_views):
+    """SwAV, SimCLR and BYOL train on views with different sizes, with and without micro-batches, with checkpointed
+    encoder stages."""
+    views = [torch.rand(4, 3, 32, 32)] * 2 + [torch.rand(4, 3, 16, 16)] * 3 + [torch.rand(4, 3, 32, 32)]
+    batch = (views, torch.zeros(4, dtype=torch.long))
+    kwargs = {"gpus": 0, "num_samples": 4, "batch_size": 4, "dataset": "cifar10", "arch": "resnet18"}
+    kwargs.update(micro_batch_pixels=micro_batch_pixels, checkpoint_stages=(1, 2))
+    models = [
+        SwAV(**kwargs, num_crops=(2, 3), num_prototypes=8),
+        SimCLR(**kwargs, hidden_mlp=512, group_views=group_views),
+    ]
+    for model in models:
+        loss = model.shared_step(batch)
+        loss.backward()
+        assert torch.isfinite(loss)
+
+    byol = BYOL(base_encoder="resnet18", encoder_out_dim=512, num_views=5, group_views=group_views, **kwargs)
+    byol.log_dict = lambda *args, **kwargs: None
+    loss = byol.training_step(batch, 0)
+    loss.backward()
+    assert torch.isfinite(loss)
+
+
+def test_two_view_shared_steps_per_view(catch_warnings):
+    """By default, SimCLR and BYOL pass every view through the networks separately, so batch norm statistics are
+    computed per view."""
+    img1, img2 = torch.rand(4, 3, 32, 32), torch.rand(4, 3, 32, 32)
+    batch = ([img1, img2, torch.rand(4, 3, 32, 32)], torch.zeros(4, dtype=torch.long))
+
+    simclr = SimCLR(gpus=0, num_samples=4, batch_size=4, dataset="cifar10", arch="resnet18", hidden_mlp=512)
+    expected = simclr.nt_xent_loss(simclr.projection(simclr(img1)), simclr.projection(simclr(img2)), simclr.temperature)
+    torch.testing.assert_close(simclr.shared_step(batch), expected)
+
+    byol = BYOL(base_encoder="resnet18", encoder_out_dim=512)
+    byol.log_dict = lambda *args, **kwargs: None
+    expected = byol.calculate_loss(img1, img2) + byol.calculate_loss(img2, img1)
+    torch.testing.assert_close(byol.training_step(batch, 0), expected)
+
+
+@pytest.mark.parametrize(
+    ("model_class", "model_kwargs"),
+    [(SwAV, {"num_crops": (2, 1), "num_prototypes": 8}), (SimCLR, {"hidden_mlp": 512})],
+)
+def test_channels_last_bf16_shared_steps(catch_warnings, model_class, model_kwargs):
+    """The channels-last model under bf16 autocast computes a float32 loss close to the one of the float32 model."""
+    torch.manual_seed(0)
+    views = [torch.rand(4, 3, 32, 32)] * 2 + [torch.rand(4, 3, 16, 16), torch.rand(4, 3, 32, 32)]
+    batch = (views, torch.zeros(4, dtype=torch.long))
+    kwargs = {"gpus": 0, "num_samples": 4, "batch_size": 4, "dataset": "cifar10", "arch": "resnet18"}
+    model = model_class(**kwargs, **model_kwargs)
+    fast_model = model_class(**kwargs, **model_kwargs, channels_last=True)
+    fast_model.load_state_dict(model.state_dict())
+    weights = [param for param in fast_model.parameters() if param.dim() == 4]
+    assert weights
+    assert all(weight.is_contiguous(memory_format=torch.channels_last) for weight in weights)
+
+    fast_batch = fast_model.on_after_batch_transfer(batch, 0)
+    assert all(view.is_contiguous(memory_format=torch.channels_last) for view in fast_batch[0])
+    expected = model.shared_step(batch)
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        loss = fast_model.shared_step(fast_batch)
+
+    assert loss.dtype == torch.float32
+    # bf16 rounds the embeddings of the untrained encoder, which are all similar, and the temperature of 0.1 amplifies
+    # the differences
+    torch.testing.assert_close(loss, expected, rtol=0.1, atol=0.1)
@@ -3,6 +3,8 @@ import torch
 from pl_bolts.models.self_supervised.amdim import AMDIMEncoder
 from pl_bolts.models.self_supervised.cpc import cpc_resnet50
 from pl_bolts.models.self_supervised.resnets import (
+    CheckpointedStage,
+    checkpoint_resnet_stages,
     resnet18,
     resnet34,
     resnet50,
@@ -13,7 +15,10 @@ from pl_bolts.models.self_supervised.resnets import (
     wide_resnet50_2,
     wide_resnet101_2,
 )
+from pl_bolts.models.self_supervised.swav.swav_resnet import resnet18 as swav_resnet18
 from pl_bolts.utils import _IS_WINDOWS
+from torch.nn.parallel import DistributedDataParallel
+from torchvision.models import resnet18 as torchvision_resnet18
 
 
 @pytest.mark.skipif(_IS_WINDOWS, reason="strange MemoryError")  # todo
@@ -59,3 +64,48 @@ def test_amdim_encoder(size):
     model = AMDIMEncoder(dummy_batch, encoder_size=size)
     model.init_weights()
     model(dummy_batch)
+
+
+def _last(output):
+    return output[-1] if isinstance(output, list) else output
+
+
+@pytest.mark.parametrize("model_class", [resnet18, swav_resnet18, torchvision_resnet18])
+def test_checkpointed_resnet_stages(catch_warnings, model_class):
+    torch.manual_seed(0)
+    model = model_class()
+    checkpointed = checkpoint_resnet_stages(model_class(), (1, 2, 3, 4))
+    checkpointed.load_state_dict(model.state_dict())
+    assert all(isinstance(getattr(checkpointed, f"layer{stage}"), CheckpointedStage) for stage in (1, 2, 3, 4))
+
+    # the encoders run twice per step, like with views of two resolutions
+    inputs = [torch.rand(4, 3, 32, 32), torch.rand(4, 3, 16, 16)]
+    outputs = [torch.cat([_last(net(x)) for x in inputs]) for net in (model, checkpointed)]
+    for output in outputs:
+        output.square().sum().backward()
+
+    # the loss, the gradients and the batch norm statistics are the same
+    torch.testing.assert_close(outputs[0], outputs[1])
+    for param, checkpointed_param in zip(model.parameters(), checkpointed.parameters()):
+        assert (param.grad is None) == (checkpointed_param.grad is None)
+        if param.grad is not None:
+            torch.testing.assert_close(param.grad, checkpointed_param.grad)
+    for buffer, checkpointed_buffer in zip(model.buffers(), checkpointed.buffers()):
+        assert torch.equal(buffer, checkpointed_buffer)
+
+
+def test_checkpointed_resnet_stages_ddp(tmp_path, catch_warnings):
+    """DDP accepts an encoder with checkpointed stages that runs more than once per step."""
+    torch.distributed.init_process_group("gloo", init_method=f"file://{tmp_path / 'store'}", rank=0, world_size=1)
+    try:
+        model = DistributedDataParallel(resnet18(checkpoint_stages=(1, 2)), broadcast_buffers=False)
+        loss = sum(model(torch.rand(2, 3, size, size))[-1].sum() for size in (32, 16))
+        loss.backward()
+        assert all(param.grad is not None for param in model.module.layer1.parameters())
+    finally:
+        torch.distributed.destroy_process_group()
+
+
+def test_checkpointed_resnet_stages_validation():
+    with pytest.raises(ValueError, match="layer5"):
+        resnet18(checkpoint_stages=(5,))
@@ -3,6 +3,7 @@ from pathlib import Path
 
 import pytest
 import torch
+from pl_bolts.datamodules.detection_collate import DetectionCollate
 from pl_bolts.datasets import DummyDetectionDataset
 from pl_bolts.models.detection import (
     YOLO,
@@ -59,6 +60,15 @@ def test_fasterrcnn_bbone_train(tmpdir):
     trainer.fit(model, train_dl, valid_dl)
 
 
+def test_fasterrcnn_packed_train(tmpdir):
+    model = FasterRCNN(pretrained=False, pretrained_backbone=False)
+    train_dl = DataLoader(DummyDetectionDataset(), batch_size=2, collate_fn=DetectionCollate())
+    valid_dl = DataLoader(DummyDetectionDataset(), batch_size=2, collate_fn=DetectionCollate())
+
+    trainer = Trainer(fast_dev_run=True, logger=False, enable_checkpointing=False, default_root_dir=tmpdir)
+    trainer.fit(model, train_dl, valid_dl)
+
+
 @torch.no_grad()
 def test_retinanet():
     model = RetinaNet(pretrained=False)
@@ -156,6 +166,24 @@ def test_yolov4_tiny_train(tmpdir):
     trainer.fit(model, train_dataloaders=train_dl, val_dataloaders=valid_dl)
 
 
+def test_yolov4_tiny_packed_batches(tmpdir, catch_warnings):
+    network = YOLOV4TinyNetwork(num_classes=2, width=4, overlap_func="giou")
+    model = YOLO(network, confidence_threshold=0.5)
+
+    dataset = DummyDetectionDataset(num_classes=2, num_samples=4)
+    images, targets = DetectionCollate()([dataset[i] for i in range(len(dataset))])
+    model.train()
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message=".*`self.trainer` reference is not registered.*")
+        _, packed_losses = model(images, targets)
+        _, losses = model(images, targets.split())
+    assert torch.allclose(packed_losses, losses)
+
+    train_dl = DataLoader(dataset, batch_size=2, collate_fn=DetectionCollate())
+    trainer = Trainer(fast_dev_run=True, default_root_dir=tmpdir, logger=False, accelerator="auto")
+    trainer.fit(model, train_dataloaders=train_dl, val_dataloaders=train_dl)
+
+
 def test_yolov4(catch_warnings):
     # Using giou allows the tests to pass also with older versions of Torchvision.
     network = YOLOV4Network(num_classes=2, widths=(4, 8, 16, 32, 64, 128), overlap_func="giou")
@@ -76,6 +76,48 @@ def test_gpt2():
     model(x)
 
 
+@pytest.mark.parametrize("sdpa", [True, False])
+def test_gpt2_block_matches_multihead_attention(catch_warnings, monkeypatch, sdpa):
+    from pl_bolts.models.vision.image_gpt import gpt2
+
+    monkeypatch.setattr(gpt2, "_SDPA_AVAILABLE", sdpa and gpt2._SDPA_AVAILABLE)
+    torch.manual_seed(0)
+    block = gpt2.Block(embed_dim=16, heads=2)
+    x = torch.randn(9, 4, 16)
+
+    # the block attends with the projections of nn.MultiheadAttention and a causal mask
+    attn_mask = torch.triu(torch.full((9, 9), -float("Inf")), diagonal=1)
+    h = block.ln_1(x)
+    h = h + block.attn(h, h, h, attn_mask=attn_mask, need_weights=False)[0]
+    expected = h + block.mlp(block.ln_2(h))
+    torch.testing.assert_close(block(x), expected)
+
+    # the same positions computed with a key/value cache, first a prefix and then one position at a time
+    cache = gpt2.KeyValueCache(4, 2, 9, 8)
+    outputs = [block(x[:3], cache)] + [block(x[i : i + 1], cache) for i in range(3, 9)]
+    torch.testing.assert_close(torch.cat(outputs), expected)
+
+
+@torch.no_grad()
+def test_gpt2_generate(catch_warnings):
+    seed_everything(0)
+    model = GPT2(embed_dim=16, heads=2, layers=2, num_positions=12, vocab_size=16, num_classes=10)
+
+    # with top_k=1, every sampled token is the most likely token given the previous ones
+    tokens = model.generate(num_samples=5, top_k=1)
+    assert tokens.shape == (12, 5)
+    assert torch.equal(tokens, model(tokens).argmax(-1))
+
+    model = ImageGPT(embed_dim=16, heads=2, layers=2, pixels=4, vocab_size=4)
+    images = model.sample(3, generator=torch.Generator().manual_seed(0))
+    assert images.shape == (3, 1, 4, 4)
+    # the pixel values are the vocab_size quantization levels in [0, 1]
+    levels = images * 3
+    torch.testing.assert_close(levels, levels.round())
+    assert images.min() >= 0.0
+    assert images.max() <= 1.0
+
+
 def test_unet_component(catch_warnings):
     x1 = torch.rand(1, 3, 28, 28)
     x2 = torch.rand(1, 64, 28, 33)
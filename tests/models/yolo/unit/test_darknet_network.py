@@ -1,8 +1,12 @@
 import warnings
+from pathlib import Path
 
+import numpy as np
 import pytest
+import torch
 import torch.nn as nn
 from pl_bolts.models.detection.yolo.darknet_network import (
+    DarknetNetwork,
     _create_convolutional,
     _create_maxpool,
     _create_shortcut,
@@ -10,6 +14,8 @@ from pl_bolts.models.detection.yolo.darknet_network import (
 )
 from pytorch_lightning.utilities.warnings import PossibleUserWarning
 
+from tests import TEST_ROOT
+
 
 @pytest.mark.parametrize(
     "config",
@@ -118,3 +124,58 @@ def test_create_upsample(config, catch_warnings):
     upsample, _ = _create_upsample(config, [3])
 
     assert upsample.scale_factor == float(config["stride"])
+
+
+def _write_weights(network, path, num_layers=None):
+    """Writes the weights of a network in the Darknet format, optionally only the first ``num_layers`` layers."""
+    tensors = {**dict(network.named_parameters()), **dict(network.named_buffers())}
+    with open(path, "wb") as weight_file:
+        np.array([0, 2, 5], dtype=np.int32).tofile(weight_file)
+        np.array([1000], dtype=np.int64).tofile(weight_file)
+        for layer_idx, name, _, _ in network.weight_offsets():
+            if (num_layers is None) or (layer_idx < num_layers):
+                tensors[f"layers.{layer_idx}.{name}"].detach().numpy().astype(np.float32).tofile(weight_file)
+
+
+def _conv_state(network, layer_idx):
+    return {name: tensor.clone() for name, tensor in network.layers[layer_idx].state_dict().items()}
+
+
+def _assert_layers_equal(network1, network2, layer_idxs, equal=True):
+    for layer_idx in layer_idxs:
+        state1, state2 = _conv_state(network1, layer_idx), _conv_state(network2, layer_idx)
+        assert all(torch.equal(state1[name], state2[name]) for name in state1) == equal
+
+
+def test_load_weights(tmp_path, catch_warnings):
+    config_path = Path(TEST_ROOT) / "_data_configs" / "yolo.cfg"
+    source = DarknetNetwork(config_path)
+    for tensor in source.state_dict().values():
+        if tensor.is_floating_point():
+            tensor.uniform_(0.5, 1.5)
+    weights_path = tmp_path / "yolo.weights"
+    _write_weights(source, weights_path)
+    conv_idxs = sorted({layer_idx for layer_idx, _, _, _ in source.weight_offsets()})
+    num_elements = sum(count for _, _, _, count in source.weight_offsets())
+    assert weights_path.stat().st_size == 20 + 4 * num_elements
+
+    network = DarknetNetwork(config_path, weights_path=str(weights_path))
+    _assert_layers_equal(source, network, conv_idxs)
+
+    network = DarknetNetwork(config_path)
+    with open(weights_path, "rb") as weight_file:
+        network.load_weights(weight_file)
+    _assert_layers_equal(source, network, conv_idxs)
+
+    # Only the selected layers are loaded.
+    network = DarknetNetwork(config_path)
+    network.load_weights(weights_path, layers=conv_idxs[:2])
+    _assert_layers_equal(source, network, conv_idxs[:2])
+    _assert_layers_equal(source, network, conv_idxs[2:], equal=False)
+
+    # A truncated file leaves the rest of the layers unchanged.
+    _write_weights(source, weights_path, num_layers=conv_idxs[2])
+    network = DarknetNetwork(config_path)
+    network.load_weights(weights_path)
+    _assert_layers_equal(source, network, conv_idxs[:2])
+    _assert_layers_equal(source, network, conv_idxs[2:], equal=False)
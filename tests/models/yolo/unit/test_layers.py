@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import pytest
+import torch
+from pl_bolts.models.detection.yolo.darknet_network import DarknetNetwork
+from pl_bolts.models.detection.yolo.layers import (
+    Conv,
+    Mish,
+    RouteLayer,
+    create_detection_layer,
+    fuse_for_inference,
+    pack_targets,
+)
+from pl_bolts.models.detection.yolo.torch_networks import YOLOV4Network, YOLOV4TinyNetwork, YOLOV7Network
+from torch import nn
+
+from tests import TEST_ROOT
+
+
+def _randomize_batch_norm(module):
+    for submodule in module.modules():
+        if isinstance(submodule, nn.BatchNorm2d):
+            submodule.running_mean.uniform_(-1.0, 1.0)
+            submodule.running_var.uniform_(0.5, 2.0)
+            submodule.weight.data.uniform_(0.5, 1.5)
+            submodule.bias.data.uniform_(-0.5, 0.5)
+
+
+@pytest.mark.parametrize("bias", [False, True])
+@pytest.mark.parametrize("activation", ["mish", "leaky", "silu"])
+def test_conv_fuse(bias, activation, catch_warnings):
+    conv = Conv(4, 8, kernel_size=3, stride=2, bias=bias, activation=activation).eval()
+    _randomize_batch_norm(conv)
+    x = torch.randn(2, 4, 15, 15)
+    expected = conv(x)
+    conv.fuse()
+    assert isinstance(conv.norm, nn.Identity)
+    assert not isinstance(conv.act, Mish)
+    assert torch.allclose(conv(x), expected, atol=1e-5)
+
+
+class _PerImageMatching:
+    """Hides ``match_batch()`` of a matching function, so that the detection layer matches one image at a time."""
+
+    def __init__(self, matching_func):
+        self.matching_func = matching_func
+
+    def __call__(self, preds, targets, image_size):
+        return self.matching_func(preds, targets, image_size)
+
+
+@pytest.mark.parametrize(
+    ("matching_algorithm", "matching_threshold"), [("simota", None), ("size", 4.0), ("iou", 0.25), ("maxiou", None)]
+)
+def test_detection_layer_packed_targets(matching_algorithm, matching_threshold, catch_warnings):
+    # Matching the packed targets of the whole batch gives the same losses as matching each image separately.
+    generator = torch.Generator().manual_seed(42)
+    prior_shapes = [(12, 16), (19, 36), (40, 28)]
+    layer = create_detection_layer(
+        prior_shapes,
+        [0, 1, 2],
+        matching_algorithm=matching_algorithm,
+        matching_threshold=matching_threshold,
+        num_classes=3,
+    )
+    image_size = torch.tensor([64, 64])
+    _, preds = layer(torch.randn((3, 3 * 8, 8, 8), generator=generator), image_size)
+    assert preds["boxes"].shape == (3, 8, 8, 3, 4)
+
+    targets = []
+    for num_targets in (4, 0, 7):
+        xy = torch.rand((num_targets, 2), generator=generator) * 40
+        wh = torch.rand((num_targets, 2), generator=generator) * 20 + 4
+        labels = torch.randint(3, (num_targets,), generator=generator)
+        targets.append({"boxes": torch.cat((xy, xy + wh), -1), "labels": labels})
+    packed_targets = pack_targets(targets, torch.device("cpu"))
+    assert torch.equal(packed_targets["image_index"], torch.tensor([0] * 4 + [2] * 7))
+
+    losses, hits = layer.calculate_losses(preds, packed_targets, image_size)
+    layer.matching_func = _PerImageMatching(layer.matching_func)
+    expected_losses, expected_hits = layer.calculate_losses(preds, targets, image_size)
+    assert hits == expected_hits > 0
+    assert torch.allclose(losses, expected_losses)
+
+
+def test_route_layer_single_source(catch_warnings):
+    outputs = [torch.randn(1, 4, 2, 2), torch.randn(1, 4, 2, 2)]
+    assert RouteLayer([1], 1, 0)(outputs).data_ptr() == outputs[1].data_ptr()
+    assert torch.equal(RouteLayer([0], 2, 1)(outputs), outputs[0][:, 2:])
+    assert torch.equal(RouteLayer([0, 1], 1, 0)(outputs), torch.cat(outputs, 1))
+
+
+@pytest.mark.parametrize(
+    "network_factory",
+    [
+        lambda: DarknetNetwork(Path(TEST_ROOT) / "_data_configs" / "yolo.cfg"),
+        lambda: YOLOV4TinyNetwork(num_classes=2, width=4),
+        lambda: YOLOV4Network(num_classes=2, widths=(8, 16, 16, 16, 16, 16), activation="mish"),
+        lambda: YOLOV7Network(num_classes=2, widths=(8, 16, 16, 16, 16, 16)),
+    ],
+)
+def test_fuse_for_inference(network_factory, catch_warnings):
+    torch.manual_seed(0)
+    network = network_factory().eval()
+    _randomize_batch_norm(network)
+    images = torch.rand(2, 3, 128, 128)
+    expected = network(images)[0]
+
+    fuse_for_inference(network)
+    assert not any(isinstance(module, (nn.BatchNorm2d, Mish)) for module in network.modules())
+    with torch.no_grad():
+        detections = network(images)[0]
+    for fused, original in zip(detections, expected):
+        assert torch.allclose(fused, original, rtol=1e-4, atol=1e-3)
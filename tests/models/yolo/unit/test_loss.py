@@ -0,0 +1,84 @@
+import pytest
+import torch
+from pl_bolts.models.detection.yolo.loss import YOLOLoss, _pairwise_class_loss, _target_labels_to_probs
+from torch.nn.functional import binary_cross_entropy, binary_cross_entropy_with_logits
+
+
+def _broadcast_class_loss(preds, targets, bce_func, label_smoothing):
+    """The pairwise class loss computed from the ``[N, M, C]`` tensor of element-wise losses."""
+    target_probs = _target_labels_to_probs(targets, preds.shape[-1], preds.dtype, label_smoothing)
+    preds, target_probs = torch.broadcast_tensors(preds.unsqueeze(1), target_probs.unsqueeze(0))
+    return bce_func(preds, target_probs, reduction="none").sum(-1)
+
+
+@pytest.mark.parametrize("label_smoothing", [None, 0.1])
+@pytest.mark.parametrize("input_is_normalized", [False, True])
+@pytest.mark.parametrize("label_format", ["labels", "probs"])
+def test_pairwise_class_loss(label_smoothing, input_is_normalized, label_format):
+    torch.manual_seed(0)
+    preds = torch.randn(50, 7, dtype=torch.float64) * 3
+    bce_func = binary_cross_entropy_with_logits
+    if input_is_normalized:
+        preds = preds.sigmoid()
+        preds[0, 0] = 0.0  # BCE clamps the logarithm
+        bce_func = binary_cross_entropy
+    # the last label is outside the predicted classes and maps to the last class
+    targets = torch.tensor([0, 3, 3, 6, 9])
+    if label_format == "probs":
+        targets = torch.rand(5, 7) > 0.5
+
+    expected = _broadcast_class_loss(preds, targets, bce_func, label_smoothing)
+    actual = _pairwise_class_loss(preds, targets, bce_func, label_smoothing)
+    assert actual.shape == (50, 5)
+    torch.testing.assert_close(actual, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_pairwise_losses():
+    torch.manual_seed(0)
+    xy = torch.rand(30, 2) * 50
+    preds = {
+        "boxes": torch.cat((xy, xy + torch.rand(30, 2) * 20 + 1), -1),
+        "confidences": torch.randn(30),
+        "classprobs": torch.randn(30, 20),
+    }
+    targets = {
+        "boxes": torch.tensor([[0.0, 0.0, 20.0, 20.0], [10.0, 30.0, 40.0, 50.0]]),
+        "labels": torch.tensor([1, 5]),
+    }
+
+    losses, overlap = YOLOLoss(label_smoothing=0.2).pairwise(preds, targets, input_is_normalized=False)
+    assert overlap.shape == (30, 2)
+    expected = _broadcast_class_loss(
+        preds["classprobs"], targets["labels"], binary_cross_entropy_with_logits, label_smoothing=0.2
+    )
+    torch.testing.assert_close(losses.classification, expected)
+
+
+@pytest.mark.parametrize("overlap_func", ["iou", "giou", "diou", "ciou"])
+@pytest.mark.parametrize("predict_overlap", [None, 0.5])
+def test_pairwise_losses_batch(overlap_func, predict_overlap):
+    # A batch of images gives the same losses as each image separately.
+    torch.manual_seed(0)
+    xy = torch.rand(3, 30, 2) * 50
+    preds = {
+        "boxes": torch.cat((xy, xy + torch.rand(3, 30, 2) * 20 + 1), -1),
+        "confidences": torch.randn(3, 30),
+        "classprobs": torch.randn(3, 30, 20),
+    }
+    xy = torch.rand(3, 4, 2) * 50
+    targets = {
+        "boxes": torch.cat((xy, xy + torch.rand(3, 4, 2) * 20 + 1), -1),
+        "labels": torch.randint(20, (3, 4)),
+    }
+
+    loss_func = YOLOLoss(overlap_func=overlap_func, predict_overlap=predict_overlap, label_smoothing=0.1)
+    losses, overlap = loss_func.pairwise(preds, targets, input_is_normalized=False)
+    assert overlap.shape == (3, 30, 4)
+    for image_idx in range(3):
+        image_preds = {key: value[image_idx] for key, value in preds.items()}
+        image_targets = {key: value[image_idx] for key, value in targets.items()}
+        image_losses, image_overlap = loss_func.pairwise(image_preds, image_targets, input_is_normalized=False)
+        torch.testing.assert_close(overlap[image_idx], image_overlap)
+        torch.testing.assert_close(losses.overlap[image_idx], image_losses.overlap)
+        torch.testing.assert_close(losses.confidence[image_idx], image_losses.confidence)
+        torch.testing.assert_close(losses.classification[image_idx], image_losses.classification)
@@ -0,0 +1,83 @@
+import pytest
+import torch
+from pl_bolts.models.detection.yolo import postprocessing
+from pl_bolts.models.detection.yolo.postprocessing import _batch_nms, batched_detections
+from torchvision.ops import batched_nms
+
+
+def _per_image_detections(preds, confidence_threshold, nms_threshold, detections_per_image):
+    results = []
+    for image_preds in preds:
+        boxes, confidences, classprobs = image_preds[..., :4], image_preds[..., 4], image_preds[..., 5:]
+        scores = classprobs * confidences[:, None]
+        idxs, labels = (scores > confidence_threshold).nonzero().T
+        boxes, scores = boxes[idxs], scores[idxs, labels]
+        keep = batched_nms(boxes, scores, labels, nms_threshold)[:detections_per_image]
+        results.append({"boxes": boxes[keep], "scores": scores[keep], "labels": labels[keep]})
+    return results
+
+
+def _random_preds(batch_size, num_anchors=500, num_classes=5):
+    generator = torch.Generator().manual_seed(batch_size)
+    xy = torch.rand((batch_size, num_anchors, 2), generator=generator) * 200
+    wh = torch.rand((batch_size, num_anchors, 2), generator=generator) * 50 + 5
+    confidences = torch.rand((batch_size, num_anchors, 1), generator=generator)
+    classprobs = torch.softmax(torch.randn((batch_size, num_anchors, num_classes), generator=generator) * 3, -1)
+    return torch.cat((xy, xy + wh, confidences, classprobs), -1)
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+@pytest.mark.parametrize("detections_per_image", [10, 300])
+@pytest.mark.parametrize("pre_nms_top_k", [None, 100000])
+def test_batched_detections(batch_size, detections_per_image, pre_nms_top_k, catch_warnings):
+    preds = _random_preds(batch_size)
+    expected = _per_image_detections(preds, 0.2, 0.45, detections_per_image)
+    detections = batched_detections(preds, 0.2, 0.45, detections_per_image, pre_nms_top_k=pre_nms_top_k)
+
+    assert detections.boxes.shape == (batch_size, detections_per_image, 4)
+    assert detections.scores.shape == (batch_size, detections_per_image)
+    assert detections.labels.shape == (batch_size, detections_per_image)
+    assert detections.num_detections.tolist() == [len(image["boxes"]) for image in expected]
+    for image_idx, count in enumerate(detections.num_detections.tolist()):
+        assert torch.all(detections.labels[image_idx, count:] == -1)
+        assert torch.all(detections.scores[image_idx, count:] == 0)
+
+    for actual_image, expected_image in zip(detections.unbatch(), expected):
+        for key in ("boxes", "scores", "labels"):
+            assert torch.equal(actual_image[key], expected_image[key])
+
+
+def test_batched_detections_top_k(catch_warnings):
+    preds = _random_preds(3)
+    detections = batched_detections(preds, 0.2, 1.0, 300, pre_nms_top_k=5)
+    assert detections.num_detections.tolist() == [5, 5, 5]
+    expected = _per_image_detections(preds, 0.2, 1.0, 5)
+    for actual_image, expected_image in zip(detections.unbatch(), expected):
+        assert torch.equal(actual_image["scores"], expected_image["scores"])
+
+
+def test_batched_detections_empty(catch_warnings):
+    preds = _random_preds(2)
+    detections = batched_detections(preds, 1.0, 0.45, 10)
+    assert detections.num_detections.tolist() == [0, 0]
+    assert torch.all(detections.labels == -1)
+    assert all(len(image["boxes"]) == 0 for image in detections.unbatch())
+
+
+@pytest.mark.parametrize("max_grouped_boxes", [5000, 0])
+def test_batch_nms(monkeypatch, max_grouped_boxes, catch_warnings):
+    # the single call and the per-group fallback for large inputs keep the same candidates
+    monkeypatch.setattr(postprocessing, "_MAX_GROUPED_NMS_BOXES", max_grouped_boxes)
+    preds = _random_preds(4)
+    expected = _per_image_detections(preds, 0.2, 0.45, 1000)
+
+    scores = preds[..., 5:] * preds[..., 4:5]
+    image_idxs, anchor_idxs, labels = (scores > 0.2).nonzero().T
+    boxes, scores = preds[image_idxs, anchor_idxs, :4], scores[image_idxs, anchor_idxs, labels]
+    keep = _batch_nms(boxes, scores, image_idxs, labels, 5, 0.45)
+
+    assert torch.equal(
+        image_idxs[keep], torch.arange(4).repeat_interleave(torch.tensor([len(e["boxes"]) for e in expected]))
+    )
+    assert torch.equal(scores[keep], torch.cat([image["scores"] for image in expected]))
+    assert torch.equal(boxes[keep], torch.cat([image["boxes"] for image in expected]))
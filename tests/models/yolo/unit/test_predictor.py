@@ -0,0 +1,86 @@
+import pytest
+import torch
+from pl_bolts.models.detection import YOLO, YOLOPredictor, YOLOV4TinyNetwork
+
+
+def _model():
+    torch.manual_seed(0)
+    network = YOLOV4TinyNetwork(num_classes=2, width=4, overlap_func="giou")
+    return YOLO(network, confidence_threshold=0.01)
+
+
+def test_select_bucket(catch_warnings):
+    predictor = YOLOPredictor(_model(), bucket_sizes=[320, (128, 256), 64])
+    assert predictor.bucket_sizes == [(64, 64), (128, 256), (320, 320)]
+    assert predictor.select_bucket(50, 60) == (64, 64)
+    assert predictor.select_bucket(100, 200) == (128, 256)
+    assert predictor.select_bucket(200, 100) == (320, 320)
+    assert predictor.select_bucket(1000, 100) == (320, 320)
+
+
+def test_letterbox(catch_warnings):
+    predictor = YOLOPredictor(_model(), bucket_sizes=[256], pad_value=0.5)
+    image = torch.rand(3, 100, 200)
+    letterboxed, letterbox = predictor.letterbox(image, (256, 256))
+    assert letterboxed.shape == (3, 256, 256)
+    assert letterbox.scale == pytest.approx(1.28)
+    assert (letterbox.pad_x, letterbox.pad_y) == (0, 64)
+    assert torch.all(letterboxed[:, :64] == 0.5)
+    assert torch.all(letterboxed[:, 192:] == 0.5)
+
+    boxes = torch.tensor([[10.0, 20.0, 50.0, 80.0], [150.0, 0.0, 250.0, 120.0]])
+    bucket_boxes = boxes * letterbox.scale + torch.tensor([0.0, 64.0, 0.0, 64.0])
+    expected = torch.tensor([[10.0, 20.0, 50.0, 80.0], [150.0, 0.0, 200.0, 100.0]])
+    assert torch.allclose(letterbox.unletterbox(bucket_boxes), expected)
+
+
+def test_predict_matches_infer(catch_warnings):
+    model = _model()
+    predictor = YOLOPredictor(model, bucket_sizes=[128, 256], max_batch_size=2)
+    images = [torch.rand(3, 256, 256), torch.rand(3, 128, 128), torch.rand(3, 256, 256), torch.rand(3, 256, 256)]
+    detections = predictor.predict(images)
+    assert len(detections) == len(images)
+    assert predictor.batch_sizes == [2, 1, 1]
+
+    for image, image_detections in zip(images, detections):
+        expected = model.infer(image)
+        limits = torch.tensor([image.shape[2], image.shape[1]] * 2, dtype=torch.float32)
+        expected_boxes = torch.minimum(expected["boxes"].clamp(min=0), limits)
+        assert torch.allclose(image_detections["boxes"], expected_boxes, atol=1e-4)
+        assert torch.allclose(image_detections["scores"], expected["scores"], atol=1e-5)
+        assert torch.equal(image_detections["labels"], expected["labels"])
+
+    metrics = predictor.metrics()
+    assert metrics["batches"] == 3
+    assert all(metrics[f"{stage}_ms"] > 0 for stage in ("preprocess", "forward", "nms"))
+
+
+def test_submit(catch_warnings):
+    images = [torch.randint(0, 256, (3, 90 + 10 * idx, 120), dtype=torch.uint8) for idx in range(5)]
+    predictor = YOLOPredictor(_model(), bucket_sizes=[128], max_batch_size=3, max_latency=0.05)
+    expected = predictor.predict(images)
+    predictor.reset_metrics()
+
+    with predictor:
+        futures = [predictor.submit(image) for image in images]
+        detections = [future.result(timeout=30) for future in futures]
+
+    assert sum(predictor.batch_sizes) == len(images)
+    assert max(predictor.batch_sizes) <= 3
+    for actual, expected_image in zip(detections, expected):
+        assert torch.allclose(actual["boxes"], expected_image["boxes"], atol=1e-4)
+        assert torch.equal(actual["labels"], expected_image["labels"])
+
+
+def test_submit_cancelled(catch_warnings):
+    images = [torch.randint(0, 256, (3, 100, 120), dtype=torch.uint8) for _ in range(3)]
+    predictor = YOLOPredictor(_model(), bucket_sizes=[128], max_batch_size=8, max_latency=0.5)
+
+    with predictor:
+        futures = [predictor.submit(image) for image in images]
+        assert futures[0].cancel()
+        assert all("boxes" in future.result(timeout=30) for future in futures[1:])
+        # the worker is still running
+        assert "boxes" in predictor.submit(images[0]).result(timeout=30)
+
+    assert sum(predictor.batch_sizes) == 3
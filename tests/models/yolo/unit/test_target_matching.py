@@ -1,5 +1,14 @@
+import pytest
 import torch
-from pl_bolts.models.detection.yolo.target_matching import _sim_ota_match
+from pl_bolts.models.detection.yolo.loss import YOLOLoss
+from pl_bolts.models.detection.yolo.target_matching import (
+    HighestIoUMatching,
+    IoUThresholdMatching,
+    SimOTAMatching,
+    SizeRatioMatching,
+    _sim_ota_match,
+    _sim_ota_match_batch,
+)
 
 
 def test_sim_ota_match(catch_warnings):
@@ -23,3 +32,121 @@ def test_sim_ota_match(catch_warnings):
     assert len(matched_targets) == 2
     assert matched_targets[0] == 1
     assert matched_targets[1] == 0
+
+
+def test_sim_ota_match_batch(catch_warnings):
+    # A padded batch of images with different numbers of predictions and targets gives the same matching as matching
+    # each image separately.
+    generator = torch.Generator().manual_seed(42)
+    shapes = [(50, 7), (120, 30), (3, 2), (80, 1)]
+    images = [(torch.rand(shape, generator=generator) * 5, torch.rand(shape, generator=generator)) for shape in shapes]
+
+    costs = torch.full((len(shapes), 120, 30), float("inf"))
+    ious = torch.zeros(len(shapes), 120, 30)
+    for image_idx, (image_costs, image_ious) in enumerate(images):
+        num_preds, num_targets = image_costs.shape
+        costs[image_idx, :num_preds, :num_targets] = image_costs
+        ious[image_idx, :num_preds, :num_targets] = image_ious
+    num_preds = torch.tensor([shape[0] for shape in shapes])
+    num_targets = torch.tensor([shape[1] for shape in shapes])
+    pred_masks, target_selectors = _sim_ota_match_batch(costs, ious, num_preds, num_targets)
+
+    for image_idx, (image_costs, image_ious) in enumerate(images):
+        expected_preds, expected_targets = _sim_ota_match(image_costs, image_ious)
+        pred_mask = pred_masks[image_idx, : len(image_costs)]
+        assert torch.equal(pred_mask, expected_preds)
+        assert not pred_masks[image_idx, len(image_costs) :].any()
+        assert torch.equal(target_selectors[image_idx, : len(image_costs)][pred_mask], expected_targets)
+
+
+@pytest.mark.parametrize(
+    ("matching_func", "boxes_per_cell"),
+    [
+        (HighestIoUMatching([(10, 10), (20, 30), (40, 20), (60, 60)], [1, 2]), 2),
+        (IoUThresholdMatching([(10, 10), (20, 30), (40, 20)], [0, 1, 2], threshold=0.2), 3),
+        (SizeRatioMatching([(10, 10), (20, 30), (40, 20)], [0, 1, 2], threshold=4.0), 3),
+    ],
+)
+def test_shape_matching_batch(matching_func, boxes_per_cell, catch_warnings):
+    # Matching the packed targets of a batch gives the same result as matching each image separately.
+    generator = torch.Generator().manual_seed(42)
+    tl = torch.rand((3, 8, 8, boxes_per_cell, 2), generator=generator) * 80
+    boxes = torch.cat((tl, tl + 20), -1)
+    image_size = torch.tensor([100, 100])
+    targets = []
+    for num_targets in (4, 0, 7):
+        xy = torch.rand((num_targets, 2), generator=generator) * 70
+        wh = torch.rand((num_targets, 2), generator=generator) * 50 + 5
+        targets.append({"boxes": torch.cat((xy, xy + wh), -1), "labels": torch.zeros(num_targets, dtype=torch.int64)})
+    packed_targets = {
+        "boxes": torch.cat([image_targets["boxes"] for image_targets in targets]),
+        "image_index": torch.tensor([0] * 4 + [2] * 7),
+    }
+
+    pred_selector, background_mask, target_selector = matching_func.match_batch(
+        {"boxes": boxes}, packed_targets, image_size
+    )
+    matched_boxes = packed_targets["boxes"][target_selector]
+    for image_idx, image_targets in enumerate(targets):
+        assert torch.equal(
+            background_mask[image_idx],
+            matching_func({"boxes": boxes[image_idx]}, image_targets, image_size)[1]
+            if len(image_targets["boxes"]) > 0
+            else torch.ones(boxes.shape[1:-1], dtype=torch.bool),
+        )
+        if len(image_targets["boxes"]) == 0:
+            assert not (pred_selector[0] == image_idx).any()
+            continue
+        image_pred_selector, _, image_target_selector = matching_func(
+            {"boxes": boxes[image_idx]}, image_targets, image_size
+        )
+        in_image = pred_selector[0] == image_idx
+        for index, image_index in zip(pred_selector[1:], image_pred_selector):
+            assert torch.equal(index[in_image], image_index)
+        assert torch.equal(matched_boxes[in_image], image_targets["boxes"][image_target_selector])
+
+
+@pytest.mark.parametrize("overlap_func", ["giou", "ciou"])
+def test_sim_ota_matching_batch(overlap_func, catch_warnings):
+    # Matching the packed targets of a batch gives the same result as matching each image separately.
+    generator = torch.Generator().manual_seed(42)
+    tl = torch.rand((3, 8, 8, 3, 2), generator=generator) * 80
+    preds = {
+        "boxes": torch.cat((tl, tl + 20), -1),
+        "confidences": torch.randn((3, 8, 8, 3), generator=generator),
+        "classprobs": torch.randn((3, 8, 8, 3, 5), generator=generator),
+    }
+    image_size = torch.tensor([100, 100])
+    targets = []
+    for num_targets in (4, 0, 7):
+        xy = torch.rand((num_targets, 2), generator=generator) * 70
+        wh = torch.rand((num_targets, 2), generator=generator) * 50 + 5
+        labels = torch.randint(5, (num_targets,), generator=generator)
+        targets.append({"boxes": torch.cat((xy, xy + wh), -1), "labels": labels})
+    packed_targets = {
+        "boxes": torch.cat([image_targets["boxes"] for image_targets in targets]),
+        "labels": torch.cat([image_targets["labels"] for image_targets in targets]),
+        "image_index": torch.tensor([0] * 4 + [2] * 7),
+    }
+
+    matching_func = SimOTAMatching(
+        [(10, 10), (20, 30), (40, 20)],
+        [0, 1, 2],
+        YOLOLoss(overlap_func=overlap_func),
+        spatial_range=5.0,
+        size_range=4.0,
+    )
+    pred_mask, background_mask, target_selector = matching_func.match_batch(preds, packed_targets, image_size)
+    assert torch.equal(background_mask, ~pred_mask)
+    assert not pred_mask[1].any()
+    assert pred_mask[0].any()
+    assert pred_mask[2].any()
+
+    matched_boxes = packed_targets["boxes"][target_selector]
+    image_index = pred_mask.nonzero()[:, 0]
+    for image_idx in (0, 2):
+        image_preds = {key: value[image_idx] for key, value in preds.items()}
+        image_pred_mask, _, image_target_selector = matching_func(image_preds, targets[image_idx], image_size)
+        assert torch.equal(pred_mask[image_idx], image_pred_mask)
+        expected_boxes = targets[image_idx]["boxes"][image_target_selector]
+        assert torch.equal(matched_boxes[image_index == image_idx], expected_boxes)
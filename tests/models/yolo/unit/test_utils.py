@@ -3,12 +3,14 @@ import warnings
 import pytest
 import torch
 from pl_bolts.models.detection.yolo.utils import (
+    GridCache,
     aligned_iou,
     box_size_ratio,
     global_xy,
     grid_centers,
     grid_offsets,
     iou_below,
+    iou_below_batch,
     is_inside_box,
 )
 from pytorch_lightning.utilities.warnings import PossibleUserWarning
@@ -71,6 +73,22 @@ def test_aligned_iou(dims1, dims2, expected_ious, catch_warnings):
     torch.testing.assert_close(aligned_iou(dims1, dims2), expected_ious)
 
 
+def test_grid_cache(catch_warnings):
+    cache = GridCache(max_size=3)
+    size = torch.tensor([10, 5])
+    offsets = cache.offsets(10, 5, torch.device("cpu"), torch.float32)
+    assert torch.equal(offsets, grid_offsets(size).float())
+    assert cache.offsets(10, 5, torch.device("cpu"), torch.float32) is offsets
+    assert torch.equal(cache.centers(10, 5, torch.device("cpu"), torch.float64), grid_centers(size).double())
+    assert torch.equal(cache.size(10, 5, torch.device("cpu")), size)
+
+    # The least recently used tensors are dropped.
+    cache.offsets(4, 4, torch.device("cpu"), torch.float32)
+    cache.offsets(8, 8, torch.device("cpu"), torch.float32)
+    assert len(cache) == 3
+    assert cache.offsets(10, 5, torch.device("cpu"), torch.float32) is not offsets
+
+
 def test_iou_below(catch_warnings):
     tl = torch.rand((10, 10, 3, 2)) * 100
     br = tl + 10
@@ -82,6 +100,21 @@ def test_iou_below(catch_warnings):
     assert not result[3, 5, 1]
 
 
+def test_iou_below_batch(catch_warnings):
+    tl = torch.rand((2, 10, 10, 3, 2)) * 100
+    br = tl + 10
+    pred_boxes = torch.cat((tl, br), -1)
+    # The second image has only one target, the other row is padding.
+    target_boxes = torch.zeros((2, 2, 4))
+    target_boxes[0] = torch.stack((pred_boxes[0, 1, 1, 0], pred_boxes[0, 3, 5, 1]))
+    target_boxes[1, 0] = pred_boxes[1, 2, 2, 2]
+    result = iou_below_batch(pred_boxes, target_boxes, 0.9)
+    assert result.shape == (2, 10, 10, 3)
+    assert torch.equal(result[0], iou_below(pred_boxes[0], target_boxes[0], 0.9))
+    assert torch.equal(result[1], iou_below(pred_boxes[1], target_boxes[1, :1], 0.9))
+    assert iou_below_batch(pred_boxes, torch.zeros((2, 0, 4)), 0.9).all()
+
+
 def test_is_inside_box(catch_warnings):
     """
     centers:
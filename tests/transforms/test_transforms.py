@@ -11,18 +11,30 @@ except ImportError:
         "You want to use `torchvision` which is not installed yet, install it with `pip install torchvision`."
     )
 
+from pl_bolts.datamodules.detection_collate import DetectionCollate
+from pl_bolts.transforms.detection_batch_transforms import DetectionMixUp, DetectionMosaic, DetectionMultiScale
 from pl_bolts.transforms.self_supervised.amdim_transforms import (
     AMDIMEvalTransformsCIFAR10,
     AMDIMEvalTransformsImageNet128,
     AMDIMEvalTransformsSTL10,
+    AMDIMTrainBatchTransformsCIFAR10,
     AMDIMTrainTransformsCIFAR10,
     AMDIMTrainTransformsImageNet128,
     AMDIMTrainTransformsSTL10,
 )
+from pl_bolts.transforms.self_supervised.batch_transforms import (
+    BatchAugmentation,
+    MultiViewBatchTransform,
+    _adjust_hue,
+    _blend,
+    _grayscale,
+    patchify_batch,
+)
 from pl_bolts.transforms.self_supervised.cpc_transforms import (
     CPCEvalTransformsCIFAR10,
     CPCEvalTransformsImageNet128,
     CPCEvalTransformsSTL10,
+    CPCTrainBatchTransformsCIFAR10,
     CPCTrainTransformsCIFAR10,
     CPCTrainTransformsImageNet128,
     CPCTrainTransformsSTL10,
@@ -31,11 +43,18 @@ from pl_bolts.transforms.self_supervised.moco_transforms import (
     MoCo2EvalCIFAR10Transforms,
     MoCo2EvalImagenetTransforms,
     MoCo2EvalSTL10Transforms,
+    MoCo2TrainBatchTransform,
     MoCo2TrainCIFAR10Transforms,
     MoCo2TrainImagenetTransforms,
     MoCo2TrainSTL10Transforms,
 )
-from pl_bolts.transforms.self_supervised.simclr_transforms import SimCLREvalDataTransform, SimCLRTrainDataTransform
+from pl_bolts.transforms.self_supervised.simclr_transforms import (
+    SimCLREvalBatchTransform,
+    SimCLREvalDataTransform,
+    SimCLRTrainBatchTransform,
+    SimCLRTrainDataTransform,
+)
+from pl_bolts.transforms.self_supervised.swav_transforms import SwAVTrainBatchTransform
 
 
 @pytest.mark.parametrize(
@@ -115,3 +134,161 @@ def test_imagenet_transforms(transform):
 
     transform = transform()
     transform(x)
+
+
+@pytest.mark.parametrize(
+    ("transform", "size", "patch_size", "overlap"),
+    [
+        (CPCEvalTransformsCIFAR10, 32, 8, 4),
+        (CPCEvalTransformsSTL10, 64, 16, 8),
+        (CPCEvalTransformsImageNet128, 128, 32, 16),
+    ],
+)
+def test_cpc_transforms_without_patches(transform, size, patch_size, overlap):
+    x = transforms.ToPILImage(mode="RGB")(torch.rand(3, size, size))
+    torch.manual_seed(0)
+    patches = transform(patch_size=patch_size, overlap=overlap)(x)
+    torch.manual_seed(0)
+    image = transform(patch_size=patch_size, overlap=overlap, patchify=False)(x)
+
+    assert image.shape == (3, size, size)
+    assert torch.equal(patchify_batch(image.unsqueeze(0), patch_size, overlap)[0], patches)
+
+
+@pytest.mark.parametrize(
+    ("transform", "expected_shapes"),
+    [
+        (SimCLRTrainBatchTransform(input_height=32), [(8, 3, 32, 32)] * 3),
+        (SimCLREvalBatchTransform(input_height=32), [(8, 3, 32, 32)] * 3),
+        (SwAVTrainBatchTransform(), [(8, 3, 96, 96)] * 2 + [(8, 3, 36, 36)] * 4 + [(8, 3, 96, 96)]),
+        (MoCo2TrainBatchTransform(size=32), [(8, 3, 32, 32)] * 2),
+        (AMDIMTrainBatchTransformsCIFAR10(), [(8, 3, 32, 32)] * 2),
+        (CPCTrainBatchTransformsCIFAR10(), (8, 49, 3, 8, 8)),
+        (CPCTrainBatchTransformsCIFAR10(patchify=False), (8, 3, 32, 32)),
+    ],
+)
+def test_batch_transforms(transform, expected_shapes):
+    x = torch.randint(0, 256, (8, 3, 32, 32), dtype=torch.uint8)
+    y = torch.arange(8)
+
+    views, labels = transform((x, y))
+
+    assert torch.equal(labels, y)
+    if isinstance(views, list):
+        assert [tuple(v.shape) for v in views] == expected_shapes
+    else:
+        assert tuple(views.shape) == expected_shapes
+
+
+def test_batch_augmentation_geometric():
+    x = torch.rand(4, 3, 20, 24)
+
+    assert torch.allclose(BatchAugmentation()(x), x)
+    assert torch.allclose(BatchAugmentation(flip_p=1.0)(x), x.flip(-1), atol=1e-6)
+
+    # a full-image crop resampled to the same size is an identity
+    square = x[..., :20]
+    assert torch.allclose(BatchAugmentation(size=20, center_crop_fraction=1.0)(square), square, atol=1e-6)
+
+    # integer translations move the pixels without interpolating them
+    translated = BatchAugmentation(max_translation=3, translate_p=1.0)(x)[0, :, 3:-3, 3:-3]
+    shifts = [(i, j) for i in range(-3, 4) for j in range(-3, 4)]
+    assert any(torch.allclose(translated, x[0, :, 3 - i : 17 - i, 3 - j : 21 - j], atol=1e-6) for i, j in shifts)
+
+
+def test_batch_augmentation_keeps_input():
+    x = torch.rand(4, 3, 16, 16)
+    source = x.clone()
+    transform = MultiViewBatchTransform([BatchAugmentation(jitter=(0.0, 0.0, 0.0, 0.3), jitter_p=1.0)] * 2)
+
+    view1, view2 = transform(x)
+    assert torch.equal(x, source)
+    assert not torch.allclose(view1, view2)
+
+
+def test_batch_augmentation_crop_params():
+    seed_everything(0)
+    top, left, h, w = BatchAugmentation(size=32)._crop_boxes(20000, 100, 150, torch.device("cpu")).unbind(dim=1)
+
+    assert (top >= 0).all()
+    assert (left >= 0).all()
+    assert (top + h <= 100).all()
+    assert (left + w <= 150).all()
+    area = h * w / (100 * 150)
+    assert area.min() >= 0.07
+    assert area.max() <= 1.0
+
+
+def test_batch_augmentation_color_matches_torchvision():
+    x = torch.rand(4, 3, 16, 16)
+    factors = torch.tensor([0.0, 0.5, 1.0, 1.7])
+    hues = torch.tensor([-0.4, -0.1, 0.0, 0.3])
+
+    expected = torch.stack([transforms.functional.adjust_saturation(img, float(f)) for img, f in zip(x, factors)])
+    assert torch.allclose(_blend(x, _grayscale(x), factors), expected, atol=1e-6)
+
+    expected = torch.stack([transforms.functional.adjust_hue(img, float(h)) for img, h in zip(x, hues)])
+    assert torch.allclose(_adjust_hue(x, hues), expected, atol=1e-6)
+
+
+def _constant_detection_batch(batch_size=6):
+    """Every image is filled with a different value and the boxes are labeled with the index of their image."""
+    samples = []
+    for idx in range(batch_size):
+        boxes = torch.tensor([[10.0, 10.0, 40.0, 30.0], [50.0, 20.0, 90.0, 60.0]])
+        samples.append((torch.full((3, 64, 96), (idx + 1) / 10), {"boxes": boxes, "labels": torch.tensor([idx, idx])}))
+    return DetectionCollate()(samples)
+
+
+def _assert_boxes_cover_their_image(images, targets):
+    assert torch.equal(targets.offsets[1:] - targets.offsets[:-1], torch.bincount(targets.image_index, minlength=6))
+    assert (targets.image_index[1:] >= targets.image_index[:-1]).all()
+    for box, label, image_idx in zip(targets.boxes, targets.labels, targets.image_index):
+        center_x, center_y = int((box[0] + box[2]) / 2), int((box[1] + box[3]) / 2)
+        assert images[image_idx, 0, center_y, center_x] == pytest.approx((label.item() + 1) / 10, abs=1e-4)
+
+
+@pytest.mark.parametrize("prob", [0.5, 1.0])
+def test_detection_mosaic(prob):
+    seed_everything(0)
+    images, targets = _constant_detection_batch()
+    mosaic_images, mosaic_targets = DetectionMosaic(prob=prob, pad_value=0.0, min_box_size=4.0)((images, targets))
+
+    assert mosaic_images.shape == images.shape
+    assert len(mosaic_targets.boxes) > 0
+    assert (mosaic_targets.boxes[:, 2:] > mosaic_targets.boxes[:, :2]).all()
+    # the pixels under every box come from the image that the box was copied from
+    _assert_boxes_cover_their_image(mosaic_images, mosaic_targets)
+
+
+def test_detection_mixup():
+    seed_everything(0)
+    images, targets = _constant_detection_batch()
+    mixed_images, mixed_targets = DetectionMixUp(prob=1.0)((images, targets))
+
+    assert mixed_images.shape == images.shape
+    # every image keeps its own boxes and gets the boxes of its partner
+    assert mixed_targets.offsets.tolist() == [0, 4, 8, 12, 16, 20, 24]
+    own_labels = mixed_targets.labels.view(6, 4)[:, :2]
+    assert torch.equal(own_labels, torch.arange(6)[:, None].expand(6, 2))
+    assert not torch.equal(mixed_images, images)
+
+
+def test_detection_multiscale():
+    images, targets = _constant_detection_batch()
+    transform = DetectionMultiScale([32, (64, 128)], change_every=2, seed=1)
+    same_schedule = DetectionMultiScale([32, (64, 128)], change_every=2, seed=1)
+
+    sizes = []
+    for _ in range(8):
+        expected_size = same_schedule.current_size()
+        same_schedule.step += 1
+        resized_images, resized_targets = transform((images, targets))
+        assert resized_images.shape[-2:] == expected_size
+        assert resized_targets.image_sizes[0].tolist() == list(expected_size)
+        scale = torch.tensor([expected_size[1] / 96, expected_size[0] / 64] * 2)
+        assert torch.allclose(resized_targets.boxes, targets.boxes * scale)
+        sizes.append(expected_size)
+
+    # the size changes only every second step
+    assert sizes[0::2] == sizes[1::2]
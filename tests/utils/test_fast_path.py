@@ -0,0 +1,45 @@
+import torch
+from pl_bolts.utils.fast_path import ChannelsLastMixin, float32_region, to_channels_last
+from pytorch_lightning import LightningModule
+from torch import nn
+
+
+def test_to_channels_last():
+    images = torch.rand(2, 3, 8, 8)
+    batch = ([images, torch.rand(2, 3, 4, 4)], torch.zeros(2, dtype=torch.long), {"masks": torch.zeros(2, 8, 8)})
+
+    views, labels, extra = to_channels_last(batch)
+
+    assert all(view.is_contiguous(memory_format=torch.channels_last) for view in views)
+    assert torch.equal(views[0], images)
+    assert labels is batch[1]
+    assert extra["masks"] is batch[2]["masks"]
+
+
+def test_float32_region():
+    x = torch.randn(4, 4)
+    with torch.autocast("cpu", dtype=torch.bfloat16):
+        assert torch.mm(x, x).dtype == torch.bfloat16
+        with float32_region(x):
+            assert torch.mm(x, x).dtype == torch.float32
+
+
+class _ChannelsLastModel(ChannelsLastMixin, LightningModule):
+    def __init__(self, channels_last: bool) -> None:
+        super().__init__()
+        self.conv = nn.Conv2d(3, 4, 3)
+        self.linear = nn.Linear(4, 2)
+        self.use_channels_last(channels_last)
+
+
+def test_channels_last_mixin():
+    batch = (torch.rand(2, 3, 8, 8), torch.zeros(2))
+
+    model = _ChannelsLastModel(channels_last=False)
+    assert model.conv.weight.is_contiguous()
+    assert model.on_after_batch_transfer(batch, 0) is batch
+
+    model = _ChannelsLastModel(channels_last=True)
+    assert model.conv.weight.is_contiguous(memory_format=torch.channels_last)
+    images, _ = model.on_after_batch_transfer(batch, 0)
+    assert images.is_contiguous(memory_format=torch.channels_last)
@@ -0,0 +1,31 @@
+import pytest
+import torch
+from pl_bolts.utils.self_supervised import multi_crop_forward
+from torch import nn
+
+
+@pytest.mark.parametrize("max_pixels", [None, 1, 3 * 8 * 8, 5 * 16 * 16])
+def test_multi_crop_forward(max_pixels):
+    encoder = nn.Sequential(nn.Conv2d(3, 4, 3), nn.AdaptiveAvgPool2d(1), nn.Flatten())
+    crops = [torch.rand(4, 3, 16, 16), torch.rand(4, 3, 8, 8), torch.rand(4, 3, 16, 16), torch.rand(4, 3, 8, 8)]
+    batch_sizes = []
+
+    def counting_encoder(x):
+        batch_sizes.append(len(x))
+        return encoder(x)
+
+    embeddings = multi_crop_forward(counting_encoder, crops, max_pixels=max_pixels)
+
+    torch.testing.assert_close(embeddings, torch.cat([encoder(crop) for crop in crops]))
+    if max_pixels is None:
+        assert batch_sizes == [8, 8]
+    else:
+        assert all(size <= max(max_pixels // (8 * 8), 1) for size in batch_sizes)
+
+
+def test_multi_crop_forward_single_resolution():
+    encoder = nn.Flatten()
+    crops = [torch.rand(2, 3, 4, 4), torch.rand(2, 3, 4, 4)]
+
+    assert torch.equal(multi_crop_forward(encoder, crops), torch.cat(crops).flatten(1))
+    assert torch.equal(multi_crop_forward(encoder, crops[0]), crops[0].flatten(1))